@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agendador de recálculo dirigido por mudanças
+
+Em vez de recalcular tudo a cada CALCULATION_INTERVAL_MINUTES, cada ciclo:
+
+1. lê os contadores de escrita (pg_stat_user_tables) das tabelas de origem, e só
+   nas que mudaram calcula checksums do conteúdo por escopo (posição ou perfil);
+2. compara com as marcas d'água gravadas (models/recalculo_marcas.py) e recalcula
+   apenas as combinações (posição, perfil de peso de jogo, perfil de SG) em uso
+   cujas entradas mudaram: agregados/cedidos (utils/recalculo.atualizar_bases) e
+   payloads dos módulos (utils/recalculo.preparar_payload_modulo);
+3. grava as marcas novas só depois do recálculo (uma falha é refeita no próximo ciclo).
+
+O intervalo acompanha o mercado: com o mercado aberto encurta conforme o fechamento
+se aproxima (de AGENDADOR_INTERVALO_MAX até AGENDADOR_INTERVALO_MIN); com o mercado
+fechado o agendador fica ocioso (AGENDADOR_INTERVALO_FECHADO), mas uma mudança de
+status ou de rodada dispara um ciclo na hora.
+
+Uso: python agendador_recalculo.py [--uma-vez]
+"""
+
+import hashlib
+import os
+import sys
+import time
+import traceback
+
+from dotenv import load_dotenv
+
+# Adicionar diretório ao path
+sys.path.insert(0, os.path.dirname(__file__))
+load_dotenv()
+
+from database import get_db_connection, close_db_connection
+from models.recalculo_marcas import create_recalculo_marcas_table, get_marcas, save_marcas
+from utils.utilidades import get_temporada_atual
+
+AGENDADOR_INTERVALO_MIN = float(os.getenv('AGENDADOR_INTERVALO_MIN', '60'))
+AGENDADOR_INTERVALO_MAX = float(os.getenv('AGENDADOR_INTERVALO_MAX', '1800'))
+AGENDADOR_INTERVALO_FECHADO = float(os.getenv('AGENDADOR_INTERVALO_FECHADO', '3600'))
+# Com o mercado aberto, o intervalo é esta fração do tempo restante até o fechamento
+AGENDADOR_FRACAO_FECHAMENTO = float(os.getenv('AGENDADOR_FRACAO_FECHAMENTO', '0.1'))
+
+POSICOES = (1, 2, 3, 4, 5, 6)
+
+# Checksum do conteúdo por escopo. Parâmetros: temporada e rodada_atual.
+# Posições: escopo 'posicao:<id>'; perfis: 'perfil:<id>'; partidas: escopo único.
+FONTES = {
+    'acf_atletas': '''
+        SELECT 'posicao:' || t.posicao_id, md5(string_agg(t::text, '|' ORDER BY t.atleta_id))
+        FROM acf_atletas t
+        WHERE t.temporada = %(temporada)s
+        GROUP BY t.posicao_id
+    ''',
+    'acf_pontuados': '''
+        SELECT 'posicao:' || t.posicao_id, md5(string_agg(t::text, '|' ORDER BY t.rodada_id, t.atleta_id))
+        FROM acf_pontuados t
+        WHERE t.temporada = %(temporada)s
+        GROUP BY t.posicao_id
+    ''',
+    'provaveis_cartola': '''
+        SELECT 'posicao:' || a.posicao_id, md5(string_agg(t::text, '|' ORDER BY t::text))
+        FROM provaveis_cartola t
+        JOIN acf_atletas a ON a.atleta_id = t.atleta_id AND a.temporada = %(temporada)s
+        GROUP BY a.posicao_id
+    ''',
+    'acf_destaques': '''
+        SELECT 'posicao:' || a.posicao_id, md5(string_agg(t::text, '|' ORDER BY t::text))
+        FROM acf_destaques t
+        JOIN acf_atletas a ON a.atleta_id = t.atleta_id AND a.temporada = %(temporada)s
+        GROUP BY a.posicao_id
+    ''',
+    'acf_partidas': '''
+        SELECT 'temporada', md5(string_agg(t::text, '|' ORDER BY t::text))
+        FROM acf_partidas t
+        WHERE t.temporada = %(temporada)s
+    ''',
+    'acp_peso_jogo_perfis': '''
+        SELECT 'perfil:' || t.perfil_id, md5(string_agg(t::text, '|' ORDER BY t::text))
+        FROM acp_peso_jogo_perfis t
+        WHERE t.rodada_atual = %(rodada_atual)s
+        GROUP BY t.perfil_id
+    ''',
+    'acp_peso_sg_perfis': '''
+        SELECT 'perfil:' || t.perfil_id, md5(string_agg(t::text, '|' ORDER BY t::text))
+        FROM acp_peso_sg_perfis t
+        WHERE t.rodada_atual = %(rodada_atual)s
+        GROUP BY t.perfil_id
+    ''',
+}
+# Fontes que alimentam agregados/cedidos (exigem atualizar_bases antes dos payloads)
+FONTES_BASES = ('acf_pontuados', 'acf_partidas')
+
+ESCOPO_CONTADORES = 'contadores'
+FONTE_RODADA = 'rodada'
+
+
+def _contadores(conn):
+    """Hash dos contadores de escrita de cada tabela de origem: {tabela: marca}"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT relname, n_tup_ins, n_tup_upd, n_tup_del
+        FROM pg_stat_user_tables
+        WHERE relname = ANY(%s)
+    ''', (list(FONTES),))
+    return {
+        relname: hashlib.sha1(f'{ins}|{upd}|{dele}'.encode()).hexdigest()
+        for relname, ins, upd, dele in cursor.fetchall()
+    }
+
+
+def detectar_mudancas(conn, temporada, rodada_atual):
+    """Compara contadores e checksums com as marcas gravadas.
+
+    Retorna (mudancas, marcas_novas): mudancas = {fonte: set(escopos alterados)} e
+    marcas_novas = {fonte: {escopo: marca}} para gravar depois do recálculo.
+    """
+    gravadas = get_marcas(conn)
+    contadores = _contadores(conn)
+    parametros = {'temporada': temporada, 'rodada_atual': rodada_atual}
+    mudancas = {}
+    marcas_novas = {}
+
+    cursor = conn.cursor()
+    for fonte, query in FONTES.items():
+        if fonte not in contadores:
+            # Tabela inexistente neste banco: nada a acompanhar
+            continue
+        contador = contadores[fonte]
+        anteriores = {escopo: marca for (f, escopo), marca in gravadas.items() if f == fonte}
+        if anteriores.get(ESCOPO_CONTADORES) == contador:
+            continue
+
+        # Os contadores mudaram: confere o conteúdo (escritas que regravam o mesmo dado não contam)
+        try:
+            cursor.execute(query, parametros)
+            checksums = {escopo: marca for escopo, marca in cursor.fetchall() if marca}
+        except Exception as e:
+            conn.rollback()
+            print(f"[AVISO] Checksum de {fonte} indisponível ({e}); considerando tudo alterado")
+            mudancas[fonte] = {'*'}
+            continue
+
+        alterados = {
+            escopo for escopo in set(checksums) | (set(anteriores) - {ESCOPO_CONTADORES})
+            if checksums.get(escopo) != anteriores.get(escopo)
+        }
+        if alterados:
+            mudancas[fonte] = alterados
+        marcas_novas[fonte] = dict(checksums, **{ESCOPO_CONTADORES: contador})
+
+    # Rodada nova: perfis e partidas da rodada mudam por completo
+    rodada_gravada = gravadas.get((FONTE_RODADA, 'atual'))
+    if rodada_gravada != f'{temporada}:{rodada_atual}':
+        mudancas[FONTE_RODADA] = {'*'}
+        marcas_novas[FONTE_RODADA] = {'atual': f'{temporada}:{rodada_atual}'}
+
+    return mudancas, marcas_novas
+
+
+def _ids_escopo(escopos, prefixo):
+    return {int(escopo.split(':', 1)[1]) for escopo in escopos if escopo.startswith(prefixo)}
+
+
+def unidades_afetadas(conn, mudancas):
+    """Combinações (posicao_id, perfil_peso_jogo, perfil_peso_sg) em uso cujas entradas mudaram"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT DISTINCT perfil_peso_jogo, perfil_peso_sg
+        FROM acw_weight_configurations
+    ''')
+    combinacoes = cursor.fetchall()
+
+    tudo = any('*' in escopos for escopos in mudancas.values()) or 'acf_partidas' in mudancas
+    posicoes = set()
+    for fonte in ('acf_atletas', 'acf_pontuados', 'provaveis_cartola', 'acf_destaques'):
+        posicoes |= _ids_escopo(mudancas.get(fonte, ()), 'posicao:')
+    perfis_jogo = _ids_escopo(mudancas.get('acp_peso_jogo_perfis', ()), 'perfil:')
+    perfis_sg = _ids_escopo(mudancas.get('acp_peso_sg_perfis', ()), 'perfil:')
+
+    return [
+        (posicao_id, perfil_jogo, perfil_sg)
+        for posicao_id in POSICOES
+        for perfil_jogo, perfil_sg in combinacoes
+        if tudo or posicao_id in posicoes or perfil_jogo in perfis_jogo or perfil_sg in perfis_sg
+    ]
+
+
+def executar_ciclo():
+    """Detecta mudanças e recalcula o que foi afetado. Retorna quantas unidades foram recalculadas."""
+    from utils.escalacao_lote import rodada_atual_partidas
+    from utils.recalculo import atualizar_bases, preparar_payload_modulo
+    from utils.rodada_snapshot import invalidar_snapshot_rodada
+
+    conn = get_db_connection()
+    try:
+        create_recalculo_marcas_table(conn)
+        temporada = get_temporada_atual()
+        rodada_atual = rodada_atual_partidas(conn)
+        mudancas, marcas_novas = detectar_mudancas(conn, temporada, rodada_atual)
+        if not mudancas:
+            # Só escritas sem mudança de conteúdo: atualiza os contadores e segue
+            for fonte, marcas in marcas_novas.items():
+                save_marcas(conn, fonte, marcas)
+            print(f"[AGENDADOR] Rodada {rodada_atual}: nenhuma mudança nas fontes")
+            return 0
+
+        print(f"[AGENDADOR] Rodada {rodada_atual}: mudanças em "
+              + ', '.join(f"{fonte} ({', '.join(sorted(escopos))})" for fonte, escopos in sorted(mudancas.items())))
+        inicio = time.perf_counter()
+        # Partidas, destaques, perfis e prováveis vêm do snapshot da rodada: descarta o do processo
+        invalidar_snapshot_rodada()
+
+        if FONTE_RODADA in mudancas or any(fonte in mudancas for fonte in FONTES_BASES):
+            rodadas = atualizar_bases(conn, temporada, rodada_atual)
+            print(f"[AGENDADOR] Agregados/cedidos atualizados ({rodadas} rodada(s) aplicada(s))")
+
+        unidades = unidades_afetadas(conn, mudancas)
+        for posicao_id, perfil_jogo, perfil_sg in unidades:
+            preparar_payload_modulo(conn, posicao_id, rodada_atual, perfil_jogo, perfil_sg)
+
+        for fonte, marcas in marcas_novas.items():
+            save_marcas(conn, fonte, marcas)
+        print(f"[AGENDADOR] {len(unidades)} combinação(ões) posição/perfis recalculada(s) "
+              f"em {time.perf_counter() - inicio:.1f}s")
+        return len(unidades)
+    finally:
+        close_db_connection(conn)
+
+
+def proximo_intervalo(status, agora=None):
+    """Segundos até o próximo ciclo, conforme o estado do mercado"""
+    from api_cartola import STATUS_MERCADO_ABERTO, fechamento_timestamp
+
+    if not status:
+        return AGENDADOR_INTERVALO_MAX
+    if status.get('status_mercado') != STATUS_MERCADO_ABERTO:
+        return AGENDADOR_INTERVALO_FECHADO
+    fechamento = fechamento_timestamp(status)
+    if not fechamento:
+        return AGENDADOR_INTERVALO_MAX
+    restante = fechamento - (agora if agora is not None else time.time())
+    return min(max(restante * AGENDADOR_FRACAO_FECHAMENTO, AGENDADOR_INTERVALO_MIN), AGENDADOR_INTERVALO_MAX)
+
+
+def main():
+    from api_cartola import fetch_status_data
+
+    if '--uma-vez' in sys.argv:
+        executar_ciclo()
+        return
+
+    estado_anterior = None
+    proximo_ciclo = 0.0
+    print("[AGENDADOR] Iniciado")
+    while True:
+        status = fetch_status_data(usar_cache=False) or {}
+        estado = (status.get('status_mercado'), status.get('rodada_atual'))
+        agora = time.time()
+        if estado != estado_anterior or agora >= proximo_ciclo:
+            if estado_anterior is not None and estado != estado_anterior:
+                print(f"[AGENDADOR] Mercado mudou de {estado_anterior} para {estado}")
+            try:
+                executar_ciclo()
+            except Exception as e:
+                print(f"[ERRO] Ciclo do agendador: {e}")
+                traceback.print_exc()
+            intervalo = proximo_intervalo(status)
+            proximo_ciclo = time.time() + intervalo
+            print(f"[AGENDADOR] Próximo ciclo em {intervalo / 60:.1f} min")
+        estado_anterior = estado
+        # O status é consultado a cada AGENDADOR_INTERVALO_MIN para notar mudanças de mercado
+        time.sleep(max(min(AGENDADOR_INTERVALO_MIN, proximo_ciclo - time.time()), 1))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n[AGENDADOR] Encerrado")
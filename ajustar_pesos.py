@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Auto-ajuste dos pesos (FATOR_*) de uma ou mais posições pelo backtest da temporada
+
+Procura, num pool de processos, os pesos que maximizam o objetivo (correlação de
+Spearman, acerto no top K ou pontos no top K) nas rodadas já disputadas e mostra a
+proposta ao lado dos pesos atuais. Com --user-id/--team-id parte dos pesos salvos
+do time e usa os perfis da configuração padrão dele; com --salvar grava a proposta
+em acw_posicao_weights quando ela melhora o objetivo.
+
+Uso:
+    python ajustar_pesos.py atacante [meia ...] [--estrategia aleatoria|grade|coordenada]
+        [--objetivo spearman|acerto_top_k|pontos_top_k] [--avaliacoes 2000] [--top-k 5]
+        [--processos N] [--user-id U --team-id T [--salvar]]
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Adicionar diretório ao path
+sys.path.insert(0, os.path.dirname(__file__))
+load_dotenv()
+
+from database import get_db_connection, close_db_connection
+from utils import backtest
+from utils.ajuste_pesos import (
+    ajustar_pesos, proposta_melhora, resumo_texto, ESTRATEGIAS, OBJETIVOS, AJUSTE_AVALIACOES_PADRAO
+)
+from utils.utilidades import get_temporada_atual
+from utils.weights import pesos_time, salvar_pesos_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Auto-ajuste dos pesos das posições pelo backtest')
+    parser.add_argument('modulos', nargs='+', choices=list(backtest.POSICAO_IDS))
+    parser.add_argument('--estrategia', choices=ESTRATEGIAS, default='aleatoria')
+    parser.add_argument('--objetivo', choices=OBJETIVOS, default='spearman')
+    parser.add_argument('--avaliacoes', type=int, default=AJUSTE_AVALIACOES_PADRAO)
+    parser.add_argument('--top-k', type=int, default=backtest.TOP_K_PADRAO)
+    parser.add_argument('--pontos-grade', type=int, default=3)
+    parser.add_argument('--rodada-inicial', type=int, default=2)
+    parser.add_argument('--rodada-final', type=int)
+    parser.add_argument('--processos', type=int)
+    parser.add_argument('--semente', type=int)
+    parser.add_argument('--temporada', type=int)
+    parser.add_argument('--perfil-peso-jogo', type=int, default=1)
+    parser.add_argument('--perfil-peso-sg', type=int, default=2)
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--team-id', type=int)
+    parser.add_argument('--salvar', action='store_true', help='grava a proposta nos pesos do time')
+    args = parser.parse_args()
+
+    if args.salvar and not (args.user_id and args.team_id):
+        parser.error('--salvar exige --user-id e --team-id')
+
+    conn = get_db_connection()
+    try:
+        perfil_peso_jogo, perfil_peso_sg = args.perfil_peso_jogo, args.perfil_peso_sg
+        if args.user_id and args.team_id:
+            from models.user_configurations import get_user_default_configuration
+            config = get_user_default_configuration(conn, args.user_id, args.team_id)
+            if config:
+                perfil_peso_jogo, perfil_peso_sg = config['perfil_peso_jogo'], config['perfil_peso_sg']
+
+        historico = backtest.carregar_historico(conn, args.temporada or get_temporada_atual(),
+                                                perfil_peso_jogo, perfil_peso_sg)
+        for modulo in args.modulos:
+            resultado = ajustar_pesos(
+                historico, modulo, pesos_time(modulo, args.user_id, args.team_id),
+                estrategia=args.estrategia, objetivo=args.objetivo, avaliacoes=args.avaliacoes,
+                top_k=args.top_k, rodada_inicial=args.rodada_inicial, rodada_final=args.rodada_final,
+                pontos_grade=args.pontos_grade, processos=args.processos, semente=args.semente
+            )
+            print(resumo_texto(resultado))
+            if args.salvar:
+                if proposta_melhora(resultado):
+                    salvar_pesos_time(conn, args.user_id, args.team_id, modulo, resultado['melhores'][0]['pesos'])
+                    print(f"  Pesos de {modulo} salvos para o time {args.team_id}")
+                else:
+                    print(f"  A proposta para {modulo} não supera os pesos atuais na busca e na validação; nada salvo")
+            print()
+    finally:
+        close_db_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,21 @@
 import requests
 import os
+import time
 from pathlib import Path
 from utils.utilidades import printdbg
+from utils import http_cartola, cache_cartola
 from database import get_db_connection, close_db_connection
 from models.credenciais import get_credencial_by_env_key, update_tokens_by_env_key
 from models.teams import get_team, update_team_tokens
 
 # Tokens agora são obtidos do banco de dados (tabela 'credenciais').
+# Todas as chamadas HTTP passam por utils.http_cartola (Session com pool, timeout e retry).
 
 API_URL_MERCADO = "https://api.cartola.globo.com/atletas/mercado"
 API_URL_STATUS = "https://api.cartola.globo.com/mercado/status"
 API_URL_PONTUADOS = "https://api.cartola.globo.com/atletas/pontuados/{}"
 API_URL_PARTIDAS = "https://api.cartola.globo.com/partidas/{}"
+API_URL_CLUBES = "https://api.cartola.globo.com/clubes"
 API_URL_ESQUEMAS = "https://api.cartolafc.globo.com/esquemas"
 API_URL_DESTAQUES = "https://api.cartola.globo.com/auth/mercado/destaques"
 API_URL_GATO_MESTRE = "https://api.cartola.globo.com/auth/gatomestre/atletas"
@@ -71,7 +75,7 @@ def refresh_access_token(current_token, env_key="ACCESS_TOKEN_TIME1"):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = http_cartola.post(url, headers=headers, json=payload)
         if response.status_code == 200:
             tokens = response.json()
             new_access_token = tokens.get("access_token")
@@ -95,10 +99,37 @@ def refresh_access_token(current_token, env_key="ACCESS_TOKEN_TIME1"):
         print(f"Erro de rede no refresh: {e}")
         return None
 
-def fetch_cartola_data():
-    """Obtém dados do mercado (não requer autenticação)."""
+# Status do mercado (status_mercado da API)
+STATUS_MERCADO_ABERTO = 1
+
+# TTLs do cache das respostas públicas (segundos), ver utils.cache_cartola
+CACHE_TTL_STATUS_ABERTO = 60
+CACHE_TTL_STATUS_FECHADO = 30
+CACHE_TTL_MERCADO_MAX = 6 * 3600
+CACHE_TTL_MERCADO_FECHADO = 3600
+CACHE_TTL_PARTIDAS_RODADA = 600
+CACHE_TTL_PARTIDAS_ENCERRADA = 24 * 3600
+CACHE_TTL_CLUBES = 24 * 3600
+CACHE_MAX_STALE = 10 * 60
+
+def fechamento_timestamp(status):
+    """Timestamp de fechamento do mercado (a API envia dict com 'timestamp' ou o número direto)."""
+    fechamento = (status or {}).get('fechamento')
+    if isinstance(fechamento, dict):
+        fechamento = fechamento.get('timestamp')
     try:
-        response = requests.get(API_URL_MERCADO)
+        return float(fechamento) if fechamento else None
+    except (TypeError, ValueError):
+        return None
+
+def _ttl_status(status):
+    if status.get('status_mercado') == STATUS_MERCADO_ABERTO:
+        return CACHE_TTL_STATUS_ABERTO
+    return CACHE_TTL_STATUS_FECHADO
+
+def _buscar_cartola_data():
+    try:
+        response = http_cartola.get(API_URL_MERCADO)
         response.raise_for_status()
         data = response.json()
         if 'atletas' in data:
@@ -108,40 +139,95 @@ def fetch_cartola_data():
         print(f"Erro ao consultar a API Cartola (mercado): {e}")
         return None
 
-def fetch_status_data():
-    """Obtém o status do mercado (não requer autenticação)."""
+def _buscar_status_data():
     try:
-        response = requests.get(API_URL_STATUS)
+        response = http_cartola.get(API_URL_STATUS)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         print(f"Erro ao consultar a API Cartola (status): {e}")
         return None
 
+def fetch_cartola_data(usar_cache=True):
+    """Obtém dados do mercado (não requer autenticação).
+    Com cache, a resposta vale até o fechamento do mercado da rodada (ou 1 hora com o
+    mercado fechado); a chave inclui rodada e status, então mudar o mercado a descarta."""
+    if not usar_cache:
+        return _buscar_cartola_data()
+    status = fetch_status_data() or {}
+    chave = f"mercado_{status.get('rodada_atual')}_{status.get('status_mercado')}"
+
+    def ttl_mercado(_data):
+        if status.get('status_mercado') != STATUS_MERCADO_ABERTO:
+            return CACHE_TTL_MERCADO_FECHADO
+        fechamento = fechamento_timestamp(status)
+        if not fechamento:
+            return CACHE_TTL_STATUS_ABERTO
+        return min(max(fechamento - time.time(), CACHE_TTL_STATUS_ABERTO), CACHE_TTL_MERCADO_MAX)
+
+    return cache_cartola.obter(chave, _buscar_cartola_data, ttl_mercado, max_stale=CACHE_MAX_STALE)
+
+def fetch_status_data(usar_cache=True):
+    """Obtém o status do mercado (não requer autenticação).
+    Com cache: 60 s com o mercado aberto, 30 s fechado (compartilhado entre workers)."""
+    if not usar_cache:
+        return _buscar_status_data()
+    return cache_cartola.obter('status', _buscar_status_data, _ttl_status, max_stale=CACHE_MAX_STALE)
+
 def fetch_pontuados_data(rodada):
     """Obtém dados de atletas pontuados para a rodada especificada (não requer autenticação)."""
     try:
-        response = requests.get(API_URL_PONTUADOS.format(rodada))
+        response = http_cartola.get(API_URL_PONTUADOS.format(rodada))
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         print(f"Erro ao consultar a API Cartola (pontuados, rodada {rodada}): {e}")
         return None
 
-def fetch_partidas_data(rodada):
-    """Obtém dados das partidas da rodada especificada (não requer autenticação)."""
+def _buscar_partidas_data(rodada):
     try:
-        response = requests.get(API_URL_PARTIDAS.format(rodada))
+        response = http_cartola.get(API_URL_PARTIDAS.format(rodada))
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         print(f"Erro ao consultar a API Cartola (partidas, rodada {rodada}): {e}")
         return None
 
+def fetch_partidas_data(rodada, usar_cache=True):
+    """Obtém dados das partidas da rodada especificada (não requer autenticação).
+    Com cache: rodadas já encerradas valem 24 horas; a rodada atual/futura, 10 minutos."""
+    if not usar_cache:
+        return _buscar_partidas_data(rodada)
+
+    def ttl_partidas(_data):
+        status = fetch_status_data() or {}
+        rodada_atual = status.get('rodada_atual')
+        if rodada_atual and int(rodada) < int(rodada_atual):
+            return CACHE_TTL_PARTIDAS_ENCERRADA
+        return CACHE_TTL_PARTIDAS_RODADA
+
+    return cache_cartola.obter(f'partidas_{rodada}', lambda: _buscar_partidas_data(rodada),
+                               ttl_partidas, max_stale=CACHE_MAX_STALE)
+
+def fetch_clubes_data(usar_cache=True):
+    """Obtém os clubes (nome, escudos) (não requer autenticação). Com cache de 24 horas."""
+    def buscar():
+        try:
+            response = http_cartola.get(API_URL_CLUBES)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Erro ao consultar a API Cartola (clubes): {e}")
+            return None
+
+    if not usar_cache:
+        return buscar()
+    return cache_cartola.obter('clubes', buscar, CACHE_TTL_CLUBES, max_stale=CACHE_TTL_CLUBES)
+
 def fetch_esquemas_data():
     """Obtém dados dos esquemas disponíveis (não requer autenticação)."""
     try:
-        response = requests.get(API_URL_ESQUEMAS)
+        response = http_cartola.get(API_URL_ESQUEMAS)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -169,7 +255,7 @@ def fetch_destaques_data(access_token=None, env_key="ACCESS_TOKEN_TIME1"):
     }
 
     try:
-        response = requests.get(API_URL_DESTAQUES, headers=headers)
+        response = http_cartola.get(API_URL_DESTAQUES, headers=headers)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -179,7 +265,7 @@ def fetch_destaques_data(access_token=None, env_key="ACCESS_TOKEN_TIME1"):
             if new_token:
                 headers["Authorization"] = f"Bearer {new_token}"
                 try:
-                    response = requests.get(API_URL_DESTAQUES, headers=headers)
+                    response = http_cartola.get(API_URL_DESTAQUES, headers=headers)
                     response.raise_for_status()
                     return response.json()
                 except requests.exceptions.RequestException as e:
@@ -213,7 +299,7 @@ def fetch_gato_mestre_data(access_token=None, env_key="ACCESS_TOKEN_TIME1"):
     }
 
     try:
-        response = requests.get(API_URL_GATO_MESTRE, headers=headers)
+        response = http_cartola.get(API_URL_GATO_MESTRE, headers=headers)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -223,7 +309,7 @@ def fetch_gato_mestre_data(access_token=None, env_key="ACCESS_TOKEN_TIME1"):
             if new_token:
                 headers["Authorization"] = f"Bearer {new_token}"
                 try:
-                    response = requests.get(API_URL_GATO_MESTRE, headers=headers)
+                    response = http_cartola.get(API_URL_GATO_MESTRE, headers=headers)
                     response.raise_for_status()
                     return response.json()
                 except requests.exceptions.RequestException as e:
@@ -271,7 +357,7 @@ def refresh_access_token_by_team_id(conn, team_id: int):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = http_cartola.post(url, headers=headers, json=payload)
         if response.status_code == 200:
             tokens = response.json()
             new_access_token = tokens.get("access_token")
@@ -310,7 +396,7 @@ def fetch_team_data(access_token=None, env_key="ACCESS_TOKEN_TIME1"):
     }
 
     try:
-        response = requests.get(API_URL_TEAM_DATA, headers=headers)
+        response = http_cartola.get(API_URL_TEAM_DATA, headers=headers)
         response.raise_for_status()
         return response.json(), token
     except requests.exceptions.RequestException as e:
@@ -320,7 +406,7 @@ def fetch_team_data(access_token=None, env_key="ACCESS_TOKEN_TIME1"):
             if new_token:
                 headers["Authorization"] = f"Bearer {new_token}"
                 try:
-                    response = requests.get(API_URL_TEAM_DATA, headers=headers)
+                    response = http_cartola.get(API_URL_TEAM_DATA, headers=headers)
                     response.raise_for_status()
                     return response.json(), new_token
                 except requests.exceptions.RequestException as e:
@@ -356,7 +442,7 @@ def fetch_team_info_by_team_id(conn, team_id: int):
     }
 
     try:
-        response = requests.get(API_URL_TEAM_INFO, headers=headers)
+        response = http_cartola.get(API_URL_TEAM_INFO, headers=headers)
         response.raise_for_status()
         team_info = response.json()
         printdbg(f"Sucesso ao buscar informações do time (ID: {team_id})")
@@ -368,7 +454,7 @@ def fetch_team_info_by_team_id(conn, team_id: int):
             if new_token:
                 headers["Authorization"] = f"Bearer {new_token}"
                 try:
-                    response = requests.get(API_URL_TEAM_INFO, headers=headers)
+                    response = http_cartola.get(API_URL_TEAM_INFO, headers=headers)
                     response.raise_for_status()
                     team_info = response.json()
                     printdbg(f"Sucesso ao buscar informações do time após refresh (ID: {team_id})")
@@ -408,7 +494,7 @@ def fetch_team_data_by_team_id(conn, team_id: int):
     }
 
     try:
-        response = requests.get(API_URL_TEAM_DATA, headers=headers)
+        response = http_cartola.get(API_URL_TEAM_DATA, headers=headers)
         response.raise_for_status()
         team_data = response.json()
         printdbg(f"Sucesso ao buscar dados do time (ID: {team_id})")
@@ -420,7 +506,7 @@ def fetch_team_data_by_team_id(conn, team_id: int):
             if new_token:
                 headers["Authorization"] = f"Bearer {new_token}"
                 try:
-                    response = requests.get(API_URL_TEAM_DATA, headers=headers)
+                    response = http_cartola.get(API_URL_TEAM_DATA, headers=headers)
                     response.raise_for_status()
                     team_data = response.json()
                     printdbg(f"Sucesso ao buscar dados do time após refresh (ID: {team_id})")
@@ -462,7 +548,7 @@ def salvar_time_no_cartola(time_para_escalacao, access_token=None, env_key="ACCE
     }
 
     try:
-        response = requests.post(API_URL_SALVAR_TIME, json=time_para_escalacao, headers=headers)
+        response = http_cartola.post(API_URL_SALVAR_TIME, json=time_para_escalacao, headers=headers)
         status = response.status_code
         # Tentar JSON; se falhar, manter texto cru
         try:
@@ -514,7 +600,7 @@ def salvar_time_no_cartola(time_para_escalacao, access_token=None, env_key="ACCE
             if new_token:
                 headers["Authorization"] = f"Bearer {new_token}"
                 try:
-                    response = requests.post(API_URL_SALVAR_TIME, json=time_para_escalacao, headers=headers)
+                    response = http_cartola.post(API_URL_SALVAR_TIME, json=time_para_escalacao, headers=headers)
                     status = response.status_code
                     try:
                         data = response.json()
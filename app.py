@@ -5,6 +5,7 @@ from datetime import datetime, timezone, timedelta
 import os
 from dotenv import load_dotenv
 from utils.utilidades import get_temporada_atual
+from utils.weights import load_weights_from_db, PESOS_PADRAO, pesos_time, salvar_pesos_time, tem_pesos_time
 
 # Carregar variáveis de ambiente do .env
 load_dotenv()
@@ -13,15 +14,25 @@ app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'change-me-to-a-secure-random-value')
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
 
-from database import get_db_connection, close_db_connection
+from database import get_db_connection, close_db_connection, init_app as init_db_pool
+init_db_pool(app)
+from utils.escalacao_lote import (
+    carregar_rankings_escalacao as _carregar_rankings_escalacao,
+    buscar_patrimonio_time as _buscar_patrimonio_time,
+)
 from models.users import (
     authenticate_user,
     get_all_users,
     create_user,
-    update_user_password
+    update_user_password,
+    get_user_by_id,
+    tem_coluna_plano
 )
 from models.teams import get_all_user_teams, create_team, get_team, update_team
 
+# Verificação do schema de acw_users (coluna plano) feita uma vez na inicialização
+tem_coluna_plano()
+
 # Registrar Blueprints
 from routes.pagamento import pagamento_bp
 app.register_blueprint(pagamento_bp)
@@ -86,66 +97,20 @@ def is_user_authenticated():
     return session.get('user_id') is not None
 
 def get_current_user():
-    """Retorna os dados do usuário atual ou None"""
+    """Retorna os dados do usuário atual ou None
+
+    Usa models.users.get_user_by_id: o usuário fica memorizado em `g` durante a
+    requisição (decorators, rota e inject_user compartilham a mesma leitura) e
+    num cache curto entre requisições.
+    """
     user_id = session.get('user_id')
     if not user_id:
         return None
     
-    conn = get_db_connection()
-    if not conn:
-        return None
-    
-    try:
-        cursor = conn.cursor()
-        # Verificar se a coluna plano existe
-        cursor.execute('''
-            SELECT EXISTS (
-                SELECT FROM information_schema.columns 
-                WHERE table_schema = 'public' 
-                AND table_name = 'acw_users'
-                AND column_name = 'plano'
-            )
-        ''')
-        tem_coluna_plano = cursor.fetchone()[0]
-        
-        if tem_coluna_plano:
-            cursor.execute('''
-                SELECT id, username, email, full_name, is_active, is_admin, plano
-                FROM acw_users
-                WHERE id = %s AND is_active = TRUE
-            ''', (user_id,))
-        else:
-            cursor.execute('''
-                SELECT id, username, email, full_name, is_active, is_admin
-                FROM acw_users
-                WHERE id = %s AND is_active = TRUE
-            ''', (user_id,))
-        
-        row = cursor.fetchone()
-        if not row:
-            return None
-        
-        user_data = {
-            'id': row[0],
-            'username': row[1],
-            'email': row[2],
-            'full_name': row[3],
-            'is_active': row[4],
-            'is_admin': row[5]
-        }
-        
-        # Adicionar plano se a coluna existir
-        if tem_coluna_plano and len(row) > 6:
-            user_data['plano'] = row[6] or 'free'
-        else:
-            user_data['plano'] = 'free'
-        
-        return user_data
-    except Exception as e:
-        print(f"Erro ao buscar usuário: {e}")
+    user = get_user_by_id(user_id)
+    if not user or not user.get('is_active'):
         return None
-    finally:
-        close_db_connection(conn)
+    return user
 
 def logout_user():
     """Faz logout do usuário atual"""
@@ -490,11 +455,12 @@ def dashboard():
         # 2. Verificar se posições foram calculadas (verificar se há dados em acw_rankings_teams)
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT COUNT(*) FROM acw_rankings_teams 
-            WHERE user_id = %s AND team_id = %s
+            SELECT EXISTS (
+                SELECT 1 FROM acw_rankings_teams 
+                WHERE user_id = %s AND team_id = %s
+            )
         ''', (user['id'], team_id))
-        count_rankings = cursor.fetchone()[0]
-        tem_calculos = count_rankings > 0
+        tem_calculos = cursor.fetchone()[0]
         
         # 3. Verificar se tem escalação (verificar se há dados em acw_escalacao_config)
         cursor.execute('''
@@ -1042,8 +1008,8 @@ def api_admin_limpar_rankings():
         cursor.execute("SELECT COUNT(*) FROM acw_rankings_teams")
         total_antes = cursor.fetchone()[0]
         
-        # Deletar todos
-        cursor.execute("DELETE FROM acw_rankings_teams")
+        # Deletar todos (TRUNCATE esvazia todas as partições sem varrer linha a linha)
+        cursor.execute("TRUNCATE acw_rankings_teams")
         conn.commit()
         
         # Contar depois
@@ -1067,6 +1033,35 @@ def api_admin_limpar_rankings():
         cursor.close()
         close_db_connection(conn)
 
+@app.route('/api/admin/retencao-rankings', methods=['POST'])
+@admin_required
+def api_admin_retencao_rankings():
+    """API para aplicar a retenção dos rankings (arquiva/apaga partições de rodadas antigas)"""
+    from models.user_rankings import aplicar_retencao_rankings
+    data = request.get_json(silent=True) or {}
+    conn = get_db_connection()
+    
+    try:
+        retiradas = aplicar_retencao_rankings(
+            conn,
+            rodadas_retidas=int(data['rodadas_retidas']) if data.get('rodadas_retidas') is not None else None,
+            modo=data.get('modo')
+        )
+        return jsonify({
+            'success': True,
+            'particoes_retiradas': [{'temporada': t, 'rodada': r} for t, r in retiradas],
+            'mensagem': f'✅ {len(retiradas)} partições de rodada retiradas'
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Erro ao aplicar retenção dos rankings: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
 @app.route('/api/debug/time/<int:team_id>')
 @login_required
 def api_debug_time(team_id):
@@ -1108,12 +1103,10 @@ def api_debug_time(team_id):
         }
         
         # Verificar rankings - QUERY DIRETA
-        cursor.execute("""
+        from models.user_rankings import SQL_QTD_JOGADORES
+        cursor.execute(f"""
             SELECT posicao_id, configuration_id, 
-                   CASE 
-                       WHEN ranking_data::text = '[]' THEN 0
-                       ELSE jsonb_array_length(ranking_data)
-                   END as qtd_jogadores
+                   {SQL_QTD_JOGADORES} as qtd_jogadores
             FROM acw_rankings_teams
             WHERE team_id = %s
               AND rodada_atual = %s
@@ -1128,12 +1121,9 @@ def api_debug_time(team_id):
         
         # Verificar rankings com configuration_id
         if config:
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT posicao_id,
-                       CASE 
-                           WHEN ranking_data::text = '[]' THEN 0
-                           ELSE jsonb_array_length(ranking_data)
-                       END as qtd_jogadores
+                       {SQL_QTD_JOGADORES} as qtd_jogadores
                 FROM acw_rankings_teams
                 WHERE team_id = %s
                   AND rodada_atual = %s
@@ -1356,65 +1346,19 @@ def modulo_individual(modulo):
     finally:
         close_db_connection(conn)
     
-    # Defaults por posição (sincronizados com a API)
-    defaults_posicao = {
-        'goleiro': {
-            'FATOR_MEDIA': 0.2, 'FATOR_FF': 4.5, 'FATOR_FD': 6.5, 'FATOR_SG': 1.5,
-            'FATOR_PESO_JOGO': 1.5, 'FATOR_GOL_ADVERSARIO': 2.0
-        },
-        'lateral': {
-            'FATOR_MEDIA': 3.0, 'FATOR_DS': 8.0, 'FATOR_SG': 2.0, 'FATOR_ESCALACAO': 10.0,
-            'FATOR_FF': 2.0, 'FATOR_FS': 1.0, 'FATOR_FD': 2.0, 'FATOR_G': 4.0,
-            'FATOR_A': 4.0, 'FATOR_PESO_JOGO': 1.0
-        },
-        'zagueiro': {
-            'FATOR_MEDIA': 1.5, 'FATOR_DS': 4.5, 'FATOR_SG': 4.0, 'FATOR_ESCALACAO': 5.0,
-            'FATOR_PESO_JOGO': 5.0
-        },
-        'meia': {
-            'FATOR_MEDIA': 1.0, 'FATOR_DS': 3.6, 'FATOR_FF': 0.7, 'FATOR_FS': 0.8,
-            'FATOR_FD': 0.9, 'FATOR_G': 2.5, 'FATOR_A': 2.0, 'FATOR_ESCALACAO': 10.0,
-            'FATOR_PESO_JOGO': 9.5
-        },
-        'atacante': {
-            'FATOR_MEDIA': 2.5, 'FATOR_DS': 2.0, 'FATOR_FF': 1.2, 'FATOR_FS': 1.3,
-            'FATOR_FD': 1.3, 'FATOR_G': 2.5, 'FATOR_A': 2.5, 'FATOR_ESCALACAO': 10.0,
-            'FATOR_PESO_JOGO': 10.0
-        },
-        'treinador': {
-            'FATOR_PESO_JOGO': 1.0
-        }
-    }
-    
-    defaults_modulo = defaults_posicao.get(modulo, defaults_posicao['goleiro'])
+    # Defaults por posição (utils.weights.PESOS_PADRAO, os mesmos da API e dos cálculos)
+    defaults_modulo = PESOS_PADRAO.get(modulo, PESOS_PADRAO['goleiro'])
     
     # Buscar team_id da sessão
     team_id = session.get('selected_team_id')
     
     # Buscar pesos salvos para este time e módulo (se houver time selecionado)
-    pesos_atuais = {}
-    if team_id:
-        conn = get_db_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT weights_json FROM acw_posicao_weights
-                WHERE user_id = %s AND team_id = %s AND posicao = %s
-            ''', (user['id'], team_id, modulo))
-            peso_row = cursor.fetchone()
-            
-            if peso_row and peso_row[0]:
-                # Pesos salvos encontrados para este time
-                pesos_salvos = peso_row[0] if isinstance(peso_row[0], dict) else json.loads(peso_row[0])
-                for key, default in defaults_modulo.items():
-                    pesos_atuais[key] = float(pesos_salvos.get(key, default))
-            else:
-                # Não há pesos salvos, usar defaults
-                pesos_atuais = {key: float(default) for key, default in defaults_modulo.items()}
-        finally:
-            close_db_connection(conn)
+    pesos_salvos = load_weights_from_db(modulo, user['id'], team_id) if team_id else {}
+    if pesos_salvos:
+        # Pesos salvos encontrados para este time
+        pesos_atuais = {key: float(pesos_salvos.get(key, default)) for key, default in defaults_modulo.items()}
     else:
-        # Sem time selecionado, usar defaults
+        # Não há pesos salvos (ou sem time selecionado), usar defaults
         pesos_atuais = {key: float(default) for key, default in defaults_modulo.items()}
     
     # Renderizar template específico para cada módulo
@@ -1434,12 +1378,98 @@ def modulo_individual(modulo):
                          rodada_atual=rodada_atual,
                          pesos_atuais=pesos_atuais)
 
+POSICAO_IDS_MODULOS = {
+    'goleiro': 1,
+    'lateral': 2,
+    'zagueiro': 3,
+    'meia': 4,
+    'atacante': 5,
+    'treinador': 6
+}
+
+def _parametros_recalculo(conn, user_id, team_id, modulo):
+    """Parâmetros do job recalcular_modulo (rodada, posição e perfis do time). Levanta ValueError."""
+    from models.user_configurations import get_user_default_configuration
+    from utils.escalacao_lote import rodada_atual_partidas
+    
+    posicao_id = POSICAO_IDS_MODULOS.get(modulo)
+    if not posicao_id:
+        raise ValueError('Módulo inválido')
+    config = get_user_default_configuration(conn, user_id, team_id)
+    if not config:
+        raise ValueError('Configuração não encontrada para este time')
+    return {
+        'modulo': modulo,
+        'posicao_id': posicao_id,
+        'rodada_atual': rodada_atual_partidas(conn),
+        'perfil_peso_jogo': config['perfil_peso_jogo'],
+        'perfil_peso_sg': config['perfil_peso_sg']
+    }
+
+def _parametros_ajuste(modulo, data):
+    """Parâmetros do job ajustar_pesos a partir do body JSON. Levanta ValueError."""
+    from utils.ajuste_pesos import ESTRATEGIAS, OBJETIVOS, AJUSTE_AVALIACOES_PADRAO, validar_grade
+    from utils.backtest import TOP_K_PADRAO, BACKTEST_MAX_CONJUNTOS
+    
+    if modulo not in POSICAO_IDS_MODULOS:
+        raise ValueError('Módulo inválido')
+    estrategia = data.get('estrategia', 'aleatoria')
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"estrategia inválida. Use: {', '.join(ESTRATEGIAS)}")
+    objetivo = data.get('objetivo', 'spearman')
+    if objetivo not in OBJETIVOS:
+        raise ValueError(f"objetivo inválido. Use: {', '.join(OBJETIVOS)}")
+    try:
+        avaliacoes = int(data.get('avaliacoes', AJUSTE_AVALIACOES_PADRAO))
+        top_k = int(data.get('top_k', TOP_K_PADRAO))
+        pontos_grade = int(data.get('pontos_grade', 3))
+    except (ValueError, TypeError):
+        raise ValueError('avaliacoes, top_k e pontos_grade devem ser inteiros')
+    if not 1 <= avaliacoes <= BACKTEST_MAX_CONJUNTOS:
+        raise ValueError(f'avaliacoes deve estar entre 1 e {BACKTEST_MAX_CONJUNTOS}')
+    if top_k < 1:
+        raise ValueError('top_k deve ser maior que zero')
+    if estrategia == 'grade':
+        # A grade cresce como pontos ^ fatores: recusa antes de enfileirar o que não cabe em avaliacoes
+        validar_grade(modulo, pontos_grade, avaliacoes)
+    return {
+        'modulo': modulo,
+        'estrategia': estrategia,
+        'objetivo': objetivo,
+        'avaliacoes': avaliacoes,
+        'top_k': top_k,
+        'pontos_grade': pontos_grade,
+        'salvar': bool(data.get('salvar'))
+    }
+
 @app.route('/modulos/<modulo>/recalcular')
 @login_required
 def recalcular_modulo(modulo):
-    """Endpoint para recalcular um módulo específico"""
-    # Por enquanto apenas redireciona de volta (funcionalidade será implementada)
-    flash('Funcionalidade de recálculo será implementada em breve', 'info')
+    """Agenda o recálculo do módulo na fila de jobs (executado pelo worker_jobs.py)"""
+    from models.jobs import enqueue_job, LimiteJobsExcedido
+    
+    user = get_current_user()
+    team_id = session.get('selected_team_id')
+    if not team_id:
+        flash('Selecione um time antes de recalcular.', 'warning')
+        return redirect(url_for('modulo_individual', modulo=modulo))
+    
+    conn = get_db_connection()
+    try:
+        parametros = _parametros_recalculo(conn, user['id'], team_id, modulo)
+        job_id, criado = enqueue_job(conn, 'recalcular_modulo', user['id'], team_id, parametros)
+        if criado:
+            flash(f'Recálculo agendado (tarefa #{job_id}).', 'info')
+        else:
+            flash(f'Já existe um recálculo deste módulo na fila (tarefa #{job_id}).', 'info')
+    except (ValueError, LimiteJobsExcedido) as e:
+        flash(str(e), 'warning')
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao agendar recálculo: {e}")
+        flash(f'Erro ao agendar recálculo: {str(e)}', 'error')
+    finally:
+        close_db_connection(conn)
     return redirect(url_for('modulo_individual', modulo=modulo))
 
 @app.route('/api/modulos/<modulo>/verificar-ranking', methods=['GET'])
@@ -1480,12 +1510,7 @@ def api_verificar_ranking(modulo):
             return jsonify({'has_ranking': False, 'has_weights': False})
         
         # Verificar se há pesos salvos para este time e módulo
-        cursor.execute('''
-            SELECT weights_json FROM acw_posicao_weights
-            WHERE user_id = %s AND team_id = %s AND posicao = %s
-        ''', (user['id'], team_id, modulo))
-        peso_row = cursor.fetchone()
-        has_weights = peso_row is not None and peso_row[0] is not None
+        has_weights = tem_pesos_time(modulo, user['id'], team_id)
         
         # Verificar se há ranking salvo
         from models.user_rankings import get_team_rankings
@@ -1608,6 +1633,60 @@ def api_salvar_ranking(modulo):
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/modulos/salvar-rankings', methods=['POST'])
+@login_required
+def api_salvar_rankings():
+    """API para salvar de uma vez os rankings de várias posições ("calcular tudo")"""
+    user = get_current_user()
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        rankings = data.get('rankings')
+        rodada_atual = data.get('rodada_atual')
+        configuration_id = data.get('configuration_id')
+        
+        if not rankings or not isinstance(rankings, dict) or not rodada_atual:
+            return jsonify({'error': 'Dados incompletos'}), 400
+        
+        posicao_map = {
+            'goleiro': 1, 'lateral': 2, 'zagueiro': 3, 'meia': 4, 'atacante': 5, 'treinador': 6
+        }
+        rankings_por_posicao = {}
+        for modulo, ranking_data in rankings.items():
+            posicao_id = posicao_map.get(modulo)
+            if not posicao_id:
+                return jsonify({'error': f'Módulo inválido: {modulo}'}), 400
+            if not ranking_data:
+                return jsonify({'error': f'Ranking vazio: {modulo}'}), 400
+            rankings_por_posicao[posicao_id] = ranking_data
+        
+        team_id = session.get('selected_team_id')
+        if not team_id:
+            return jsonify({'error': 'Nenhum time selecionado'}), 400
+        
+        conn = get_db_connection()
+        try:
+            from models.user_rankings import save_team_rankings
+            ids = save_team_rankings(
+                conn,
+                user['id'],
+                team_id,
+                configuration_id if configuration_id else None,
+                rodada_atual,
+                rankings_por_posicao
+            )
+            ranking_ids = {modulo: ids.get(posicao_map[modulo]) for modulo in rankings}
+            print(f"[RANKINGS SALVOS] Usuário {user['id']}, Rodada {rodada_atual}, IDs: {ranking_ids}")
+            return jsonify({'success': True, 'ranking_ids': ranking_ids, 'message': 'Rankings salvos com sucesso'})
+        finally:
+            close_db_connection(conn)
+            
+    except Exception as e:
+        print(f"Erro ao salvar rankings: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 def get_atleta_medias_mando(cursor, atleta_id, rodada_atual, temporada_atual):
     """Calcula estatísticas de média básica (sem G/A/SG), casa e fora de um atleta."""
     stats = {
@@ -1618,23 +1697,13 @@ def get_atleta_medias_mando(cursor, atleta_id, rodada_atual, temporada_atual):
         'media_basica_fora': 0.0
     }
     try:
-        cursor.execute('''
-            SELECT 
-                AVG(pontuacao - (COALESCE(scout_g, 0)*8.0 + COALESCE(scout_a, 0)*5.0 + COALESCE(scout_sg, 0)*5.0)) as media_basica,
-                AVG(CASE WHEN jogou_em_casa = TRUE THEN pontuacao END) as media_casa,
-                AVG(CASE WHEN jogou_em_casa = FALSE THEN pontuacao END) as media_fora,
-                AVG(CASE WHEN jogou_em_casa = TRUE THEN (pontuacao - (COALESCE(scout_g, 0)*8.0 + COALESCE(scout_a, 0)*5.0 + COALESCE(scout_sg, 0)*5.0)) END) as media_basica_casa,
-                AVG(CASE WHEN jogou_em_casa = FALSE THEN (pontuacao - (COALESCE(scout_g, 0)*8.0 + COALESCE(scout_a, 0)*5.0 + COALESCE(scout_sg, 0)*5.0)) END) as media_basica_fora
-            FROM acf_pontuados
-            WHERE atleta_id = %s AND rodada_id < %s AND temporada = %s AND entrou_em_campo = TRUE
-        ''', (atleta_id, rodada_atual, temporada_atual))
-        row = cursor.fetchone()
-        if row:
-            stats['media_basica'] = float(row[0]) if row[0] is not None else 0.0
-            stats['media_casa'] = float(row[1]) if row[1] is not None else 0.0
-            stats['media_fora'] = float(row[2]) if row[2] is not None else 0.0
-            stats['media_basica_casa'] = float(row[3]) if row[3] is not None else 0.0
-            stats['media_basica_fora'] = float(row[4]) if row[4] is not None else 0.0
+        from models.scouts_agregados import medias_scouts_atleta
+        medias = medias_scouts_atleta(cursor.connection, temporada_atual, rodada_atual, atleta_id)
+        stats['media_basica'] = medias['media_basica']
+        stats['media_casa'] = medias['casa']['pontuacao']
+        stats['media_fora'] = medias['fora']['pontuacao']
+        stats['media_basica_casa'] = medias['casa']['media_basica']
+        stats['media_basica_fora'] = medias['fora']['media_basica']
     except Exception as e:
         print(f"Erro ao buscar médias básicas e mando: {e}")
     return stats
@@ -1748,26 +1817,14 @@ def api_atacante_detalhes(atleta_id):
         media_a = 0
 
         try:
-            cursor.execute('''
-                SELECT 
-                    AVG(COALESCE(scout_ds, 0)) as avg_ds,
-                    AVG(COALESCE(scout_ff, 0)) as avg_ff,
-                    AVG(COALESCE(scout_fs, 0)) as avg_fs,
-                    AVG(COALESCE(scout_fd, 0)) as avg_fd,
-                    AVG(COALESCE(scout_g, 0)) as avg_g,
-                    AVG(COALESCE(scout_a, 0)) as avg_a
-                FROM acf_pontuados
-                WHERE atleta_id = %s AND rodada_id < %s AND temporada = %s AND entrou_em_campo = TRUE
-            ''', (atleta_id, rodada_atual, temporada_atual))
-            
-            stats_row = cursor.fetchone()
-            if stats_row and len(stats_row) >= 6:
-                media_ds = float(stats_row[0]) if stats_row[0] is not None else 0
-                media_ff = float(stats_row[1]) if stats_row[1] is not None else 0
-                media_fs = float(stats_row[2]) if stats_row[2] is not None else 0
-                media_fd = float(stats_row[3]) if stats_row[3] is not None else 0
-                media_g = float(stats_row[4]) if stats_row[4] is not None else 0
-                media_a = float(stats_row[5]) if stats_row[5] is not None else 0
+            from models.scouts_agregados import medias_scouts_atleta
+            medias = medias_scouts_atleta(conn, temporada_atual, rodada_atual, atleta_id)
+            media_ds = medias['ds']
+            media_ff = medias['ff']
+            media_fs = medias['fs']
+            media_fd = medias['fd']
+            media_g = medias['g']
+            media_a = medias['a']
         except Exception as e:
             print(f"Erro ao buscar médias de scouts do atacante: {e}")
         
@@ -1880,21 +1937,16 @@ def api_atacante_detalhes(atleta_id):
                 from models.user_configurations import get_user_default_configuration
                 config = get_user_default_configuration(conn, user['id'], team_id)
                 if config:
-                    from models.user_rankings import get_team_rankings
-                    rankings = get_team_rankings(
-                        conn, user['id'], team_id=team_id,
-                        configuration_id=config.get('id'), posicao_id=5,
-                        rodada_atual=rodada_atual
+                    from models.user_rankings import get_ranking_columns
+                    # Só as colunas necessárias do ranking salvo (recorte feito no banco)
+                    colunas = get_ranking_columns(
+                        conn, user['id'], team_id, config.get('id'), 5, rodada_atual,
+                        colunas=('atleta_id', 'pontuacao_total')
                     )
-                    if rankings and len(rankings) > 0:
-                        ranking_data = rankings[0].get('ranking_data', [])
-                        if isinstance(ranking_data, dict):
-                            ranking_data = ranking_data.get('ranking', ranking_data.get('resultados', []))
-                        if isinstance(ranking_data, list):
-                            for item in ranking_data:
-                                if isinstance(item, dict) and item.get('atleta_id') == atleta_id:
-                                    pontuacao_total = item.get('pontuacao_total', 0)
-                                    break
+                    for item_id, pontos in zip(colunas.get('atleta_id', []), colunas.get('pontuacao_total', [])):
+                        if item_id == atleta_id:
+                            pontuacao_total = pontos if pontos is not None else 0
+                            break
             except Exception as e:
                 print(f"Erro ao buscar pontuação do ranking: {e}")
         
@@ -2006,33 +2058,10 @@ def api_salvar_pesos(modulo):
         if not team_id:
             return jsonify({'error': 'Nenhum time selecionado. Selecione um time primeiro.'}), 400
         
-        # Salvar pesos no banco
+        # Salvar pesos no banco (upsert por user_id, team_id, posicao)
         conn = get_db_connection()
         try:
-            cursor = conn.cursor()
-            
-            # Verificar se existe registro
-            cursor.execute('''
-                SELECT id FROM acw_posicao_weights 
-                WHERE user_id = %s AND team_id = %s AND posicao = %s
-            ''', (user['id'], team_id, modulo))
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Atualizar
-                cursor.execute('''
-                    UPDATE acw_posicao_weights 
-                    SET weights_json = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE user_id = %s AND team_id = %s AND posicao = %s
-                ''', (json.dumps(pesos, ensure_ascii=False), user['id'], team_id, modulo))
-            else:
-                # Inserir
-                cursor.execute('''
-                    INSERT INTO acw_posicao_weights (user_id, team_id, posicao, weights_json)
-                    VALUES (%s, %s, %s, %s)
-                ''', (user['id'], team_id, modulo, json.dumps(pesos, ensure_ascii=False)))
-            
-            conn.commit()
+            salvar_pesos_time(conn, user['id'], team_id, modulo, pesos)
             return jsonify({'success': True, 'message': 'Pesos salvos com sucesso'})
         finally:
             close_db_connection(conn)
@@ -2043,6 +2072,130 @@ def api_salvar_pesos(modulo):
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/modulos/<modulo>/backtest', methods=['POST'])
+@login_required
+def api_backtest_pesos(modulo):
+    """Backtest de conjuntos de pesos do módulo nas rodadas já disputadas da temporada.
+
+    Body JSON (todos opcionais): pesos (um conjunto) ou conjuntos (lista), top_k,
+    rodada_inicial, rodada_final. Cada conjunto é aplicado sobre os pesos salvos do
+    time (ou os padrões); sem pesos/conjuntos, avalia os pesos salvos. Usa os perfis
+    de peso de jogo/SG da configuração padrão do time.
+    """
+    import math
+    import time
+    from models.plans import check_permission
+    from models.user_configurations import get_user_default_configuration
+    from utils import backtest
+
+    user = get_current_user()
+    if not check_permission(user['id'], 'editarPesosModulos'):
+        return jsonify({'error': 'Edição de pesos está disponível apenas no plano Pro.'}), 403
+    if modulo not in backtest.POSICAO_IDS:
+        return jsonify({'error': 'Módulo inválido'}), 400
+    team_id = session.get('selected_team_id')
+    if not team_id:
+        return jsonify({'error': 'Nenhum time selecionado. Selecione um time primeiro.'}), 400
+
+    data = request.get_json(silent=True) or {}
+    conjuntos = data.get('conjuntos')
+    if conjuntos is None:
+        conjuntos = [data.get('pesos') or {}]
+    if not isinstance(conjuntos, list) or not conjuntos:
+        return jsonify({'error': 'conjuntos deve ser uma lista não vazia'}), 400
+    if len(conjuntos) > backtest.BACKTEST_MAX_CONJUNTOS:
+        return jsonify({'error': f'Máximo de {backtest.BACKTEST_MAX_CONJUNTOS} conjuntos de pesos por backtest'}), 400
+    try:
+        top_k = int(data.get('top_k', backtest.TOP_K_PADRAO))
+        rodada_inicial = int(data.get('rodada_inicial', 2))
+        rodada_final = int(data['rodada_final']) if data.get('rodada_final') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_k, rodada_inicial e rodada_final devem ser inteiros'}), 400
+    if top_k < 1:
+        return jsonify({'error': 'top_k deve ser maior que zero'}), 400
+
+    try:
+        conjuntos = backtest.completar_pesos(pesos_time(modulo, user['id'], team_id), conjuntos)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    try:
+        config = get_user_default_configuration(conn, user['id'], team_id)
+        if not config:
+            return jsonify({'error': 'Configuração não encontrada para este time'}), 404
+
+        inicio = time.perf_counter()
+        historico = backtest.obter_historico(conn, get_temporada_atual(),
+                                             config['perfil_peso_jogo'], config['perfil_peso_sg'])
+        resultado = backtest.executar_backtest(historico, modulo, conjuntos, top_k=top_k,
+                                               rodada_inicial=rodada_inicial, rodada_final=rodada_final)
+
+        # Detalhe por rodada só faz sentido (e cabe na resposta) com um conjunto
+        por_rodada = resultado.pop('por_rodada')
+        if len(conjuntos) == 1:
+            resultado['por_rodada'] = [{
+                'rodada_id': m['rodada_id'],
+                'atletas': m['atletas'],
+                'spearman': None if math.isnan(m['spearman'][0]) else float(m['spearman'][0]),
+                'acerto_top_k': float(m['acerto_top_k'][0]),
+                'pontos_top_k': float(m['pontos_top_k'][0]),
+                'pontos_top_k_ideal': m['pontos_top_k_ideal'],
+            } for m in por_rodada]
+        resultado['conjuntos'] = conjuntos
+        resultado['tempo_s'] = round(time.perf_counter() - inicio, 3)
+        return jsonify({'success': True, **resultado})
+    except Exception as e:
+        print(f"Erro no backtest de pesos: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
+@app.route('/api/modulos/<modulo>/ajustar-pesos', methods=['POST'])
+@login_required
+def api_ajustar_pesos(modulo):
+    """Agenda o auto-ajuste dos pesos do módulo para o time selecionado (job ajustar_pesos).
+
+    Body JSON (opcional): estrategia ('aleatoria', 'grade' ou 'coordenada'), objetivo
+    ('spearman', 'acerto_top_k' ou 'pontos_top_k'), avaliacoes, top_k, pontos_grade (só
+    para a grade: pontos ^ fatores tem de caber em avaliacoes, senão 400) e salvar (grava
+    a proposta nos pesos do time se ela melhorar o objetivo também nas rodadas de
+    validação). Retorna 202 com job_id; o resultado sai em GET /api/jobs/<job_id>.
+    """
+    from models.jobs import enqueue_job, LimiteJobsExcedido
+    from models.plans import check_permission
+
+    user = get_current_user()
+    if not check_permission(user['id'], 'editarPesosModulos'):
+        return jsonify({'error': 'Edição de pesos está disponível apenas no plano Pro.'}), 403
+    team_id = session.get('selected_team_id')
+    if not team_id:
+        return jsonify({'error': 'Nenhum time selecionado. Selecione um time primeiro.'}), 400
+    try:
+        parametros = _parametros_ajuste(modulo, request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    try:
+        job_id, criado = enqueue_job(conn, 'ajustar_pesos', user['id'], team_id, parametros)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'criado': criado,
+            'status_url': url_for('api_job_status', job_id=job_id)
+        }), 202
+    except LimiteJobsExcedido as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao agendar auto-ajuste de pesos: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
 @app.route('/api/modulos/lateral/detalhes/<int:atleta_id>')
 @login_required
 def api_lateral_detalhes(atleta_id):
@@ -2162,26 +2315,14 @@ def api_lateral_detalhes(atleta_id):
         temporada_atual = get_temporada_atual()
 
         try:
-            cursor.execute('''
-                SELECT 
-                    AVG(COALESCE(scout_ds, 0)) as avg_ds,
-                    AVG(COALESCE(scout_a, 0)) as avg_a,
-                    AVG(COALESCE(scout_g, 0)) as avg_g,
-                    AVG(COALESCE(scout_ff, 0)) as avg_ff,
-                    AVG(COALESCE(scout_fs, 0)) as avg_fs,
-                    AVG(COALESCE(scout_fd, 0)) as avg_fd
-                FROM acf_pontuados
-                WHERE atleta_id = %s AND rodada_id < %s AND temporada = %s AND entrou_em_campo = TRUE
-            ''', (atleta_id, rodada_atual, temporada_atual))
-            
-            stats_row = cursor.fetchone()
-            if stats_row and len(stats_row) >= 6:
-                media_ds = float(stats_row[0]) if stats_row[0] is not None else 0
-                media_a = float(stats_row[1]) if stats_row[1] is not None else 0
-                media_g = float(stats_row[2]) if stats_row[2] is not None else 0
-                media_ff = float(stats_row[3]) if stats_row[3] is not None else 0
-                media_fs = float(stats_row[4]) if stats_row[4] is not None else 0
-                media_fd = float(stats_row[5]) if stats_row[5] is not None else 0
+            from models.scouts_agregados import medias_scouts_atleta
+            medias = medias_scouts_atleta(conn, temporada_atual, rodada_atual, atleta_id)
+            media_ds = medias['ds']
+            media_a = medias['a']
+            media_g = medias['g']
+            media_ff = medias['ff']
+            media_fs = medias['fs']
+            media_fd = medias['fd']
         except Exception as e:
             print(f"Erro ao buscar médias de scouts do lateral: {e}")
 
@@ -2217,21 +2358,16 @@ def api_lateral_detalhes(atleta_id):
                 from models.user_configurations import get_user_default_configuration
                 config = get_user_default_configuration(conn, user['id'], team_id)
                 if config:
-                    from models.user_rankings import get_team_rankings
-                    rankings = get_team_rankings(
-                        conn, user['id'], team_id=team_id,
-                        configuration_id=config.get('id'), posicao_id=2,
-                        rodada_atual=rodada_atual
+                    from models.user_rankings import get_ranking_columns
+                    # Só as colunas necessárias do ranking salvo (recorte feito no banco)
+                    colunas = get_ranking_columns(
+                        conn, user['id'], team_id, config.get('id'), 2, rodada_atual,
+                        colunas=('atleta_id', 'pontuacao_total')
                     )
-                    if rankings and len(rankings) > 0:
-                        ranking_data = rankings[0].get('ranking_data', [])
-                        if isinstance(ranking_data, dict):
-                            ranking_data = ranking_data.get('ranking', ranking_data.get('resultados', []))
-                        if isinstance(ranking_data, list):
-                            for item in ranking_data:
-                                if isinstance(item, dict) and item.get('atleta_id') == atleta_id:
-                                    pontuacao_total = item.get('pontuacao_total', 0)
-                                    break
+                    for item_id, pontos in zip(colunas.get('atleta_id', []), colunas.get('pontuacao_total', [])):
+                        if item_id == atleta_id:
+                            pontuacao_total = pontos if pontos is not None else 0
+                            break
             except Exception as e:
                 print(f"Erro ao buscar pontuação do ranking: {e}")
 
@@ -2417,16 +2553,9 @@ def api_goleiro_detalhes(atleta_id):
         media_gols_sofridos = 0
 
         try:
-            cursor.execute('''
-                SELECT 
-                    AVG(COALESCE(scout_de, 0)) as avg_de
-                FROM acf_pontuados
-                WHERE atleta_id = %s AND rodada_id < %s AND temporada = %s AND entrou_em_campo = TRUE
-            ''', (atleta_id, rodada_atual, temporada_atual))
-            
-            stats_row = cursor.fetchone()
-            if stats_row and stats_row[0] is not None:
-                media_de = float(stats_row[0])
+            from models.scouts_agregados import medias_scouts_atleta
+            medias = medias_scouts_atleta(conn, temporada_atual, rodada_atual, atleta_id)
+            media_de = medias['de']
             
             # Buscar média de gols sofridos pelo clube do goleiro na temporada
             if clube_id:
@@ -2478,21 +2607,16 @@ def api_goleiro_detalhes(atleta_id):
                 from models.user_configurations import get_user_default_configuration
                 config = get_user_default_configuration(conn, user['id'], team_id)
                 if config:
-                    from models.user_rankings import get_team_rankings
-                    rankings = get_team_rankings(
-                        conn, user['id'], team_id=team_id,
-                        configuration_id=config.get('id'), posicao_id=1,
-                        rodada_atual=rodada_atual
+                    from models.user_rankings import get_ranking_columns
+                    # Só as colunas necessárias do ranking salvo (recorte feito no banco)
+                    colunas = get_ranking_columns(
+                        conn, user['id'], team_id, config.get('id'), 1, rodada_atual,
+                        colunas=('atleta_id', 'pontuacao_total')
                     )
-                    if rankings and len(rankings) > 0:
-                        ranking_data = rankings[0].get('ranking_data', [])
-                        if isinstance(ranking_data, dict):
-                            ranking_data = ranking_data.get('ranking', ranking_data.get('resultados', []))
-                        if isinstance(ranking_data, list):
-                            for item in ranking_data:
-                                if isinstance(item, dict) and item.get('atleta_id') == atleta_id:
-                                    pontuacao_total = item.get('pontuacao_total', 0)
-                                    break
+                    for item_id, pontos in zip(colunas.get('atleta_id', []), colunas.get('pontuacao_total', [])):
+                        if item_id == atleta_id:
+                            pontuacao_total = pontos if pontos is not None else 0
+                            break
             except Exception as e:
                 print(f"Erro ao buscar pontuação do ranking: {e}")
 
@@ -2676,20 +2800,11 @@ def api_zagueiro_detalhes(atleta_id):
         temporada_atual = get_temporada_atual()
 
         try:
-            cursor.execute('''
-                SELECT 
-                    AVG(COALESCE(scout_ds, 0)) as avg_ds,
-                    AVG(COALESCE(scout_fc, 0)) as avg_fc,
-                    AVG(COALESCE(scout_g, 0)) as avg_g
-                FROM acf_pontuados
-                WHERE atleta_id = %s AND rodada_id < %s AND temporada = %s AND entrou_em_campo = TRUE
-            ''', (atleta_id, rodada_atual, temporada_atual))
-            
-            stats_row = cursor.fetchone()
-            if stats_row and len(stats_row) >= 3:
-                media_ds = float(stats_row[0]) if stats_row[0] is not None else 0
-                media_fc = float(stats_row[1]) if stats_row[1] is not None else 0
-                media_g = float(stats_row[2]) if stats_row[2] is not None else 0
+            from models.scouts_agregados import medias_scouts_atleta
+            medias = medias_scouts_atleta(conn, temporada_atual, rodada_atual, atleta_id)
+            media_ds = medias['ds']
+            media_fc = medias['fc']
+            media_g = medias['g']
         except Exception as e:
             print(f"Erro ao buscar médias de scouts do zagueiro: {e}")
 
@@ -2710,21 +2825,16 @@ def api_zagueiro_detalhes(atleta_id):
                 from models.user_configurations import get_user_default_configuration
                 config = get_user_default_configuration(conn, user['id'], team_id)
                 if config:
-                    from models.user_rankings import get_team_rankings
-                    rankings = get_team_rankings(
-                        conn, user['id'], team_id=team_id,
-                        configuration_id=config.get('id'), posicao_id=3,
-                        rodada_atual=rodada_atual
+                    from models.user_rankings import get_ranking_columns
+                    # Só as colunas necessárias do ranking salvo (recorte feito no banco)
+                    colunas = get_ranking_columns(
+                        conn, user['id'], team_id, config.get('id'), 3, rodada_atual,
+                        colunas=('atleta_id', 'pontuacao_total')
                     )
-                    if rankings and len(rankings) > 0:
-                        ranking_data = rankings[0].get('ranking_data', [])
-                        if isinstance(ranking_data, dict):
-                            ranking_data = ranking_data.get('ranking', ranking_data.get('resultados', []))
-                        if isinstance(ranking_data, list):
-                            for item in ranking_data:
-                                if isinstance(item, dict) and item.get('atleta_id') == atleta_id:
-                                    pontuacao_total = item.get('pontuacao_total', 0)
-                                    break
+                    for item_id, pontos in zip(colunas.get('atleta_id', []), colunas.get('pontuacao_total', [])):
+                        if item_id == atleta_id:
+                            pontuacao_total = pontos if pontos is not None else 0
+                            break
             except Exception as e:
                 print(f"Erro ao buscar pontuação do ranking: {e}")
 
@@ -2899,26 +3009,14 @@ def api_meia_detalhes(atleta_id):
         media_fd = 0
 
         try:
-            cursor.execute('''
-                SELECT 
-                    AVG(COALESCE(scout_a, 0)) as avg_a,
-                    AVG(COALESCE(scout_g, 0)) as avg_g,
-                    AVG(COALESCE(scout_ds, 0)) as avg_ds,
-                    AVG(COALESCE(scout_ff, 0)) as avg_ff,
-                    AVG(COALESCE(scout_fs, 0)) as avg_fs,
-                    AVG(COALESCE(scout_fd, 0)) as avg_fd
-                FROM acf_pontuados
-                WHERE atleta_id = %s AND rodada_id < %s AND temporada = %s AND entrou_em_campo = TRUE
-            ''', (atleta_id, rodada_atual, temporada_atual))
-            
-            stats_row = cursor.fetchone()
-            if stats_row and len(stats_row) >= 6:
-                media_a = float(stats_row[0]) if stats_row[0] is not None else 0
-                media_g = float(stats_row[1]) if stats_row[1] is not None else 0
-                media_ds = float(stats_row[2]) if stats_row[2] is not None else 0
-                media_ff = float(stats_row[3]) if stats_row[3] is not None else 0
-                media_fs = float(stats_row[4]) if stats_row[4] is not None else 0
-                media_fd = float(stats_row[5]) if stats_row[5] is not None else 0
+            from models.scouts_agregados import medias_scouts_atleta
+            medias = medias_scouts_atleta(conn, temporada_atual, rodada_atual, atleta_id)
+            media_a = medias['a']
+            media_g = medias['g']
+            media_ds = medias['ds']
+            media_ff = medias['ff']
+            media_fs = medias['fs']
+            media_fd = medias['fd']
         except Exception as e:
             print(f"Erro ao buscar médias de scouts do meia: {e}")
 
@@ -2956,21 +3054,16 @@ def api_meia_detalhes(atleta_id):
                 from models.user_configurations import get_user_default_configuration
                 config = get_user_default_configuration(conn, user['id'], team_id)
                 if config:
-                    from models.user_rankings import get_team_rankings
-                    rankings = get_team_rankings(
-                        conn, user['id'], team_id=team_id,
-                        configuration_id=config.get('id'), posicao_id=4,
-                        rodada_atual=rodada_atual
+                    from models.user_rankings import get_ranking_columns
+                    # Só as colunas necessárias do ranking salvo (recorte feito no banco)
+                    colunas = get_ranking_columns(
+                        conn, user['id'], team_id, config.get('id'), 4, rodada_atual,
+                        colunas=('atleta_id', 'pontuacao_total')
                     )
-                    if rankings and len(rankings) > 0:
-                        ranking_data = rankings[0].get('ranking_data', [])
-                        if isinstance(ranking_data, dict):
-                            ranking_data = ranking_data.get('ranking', ranking_data.get('resultados', []))
-                        if isinstance(ranking_data, list):
-                            for item in ranking_data:
-                                if isinstance(item, dict) and item.get('atleta_id') == atleta_id:
-                                    pontuacao_total = item.get('pontuacao_total', 0)
-                                    break
+                    for item_id, pontos in zip(colunas.get('atleta_id', []), colunas.get('pontuacao_total', [])):
+                        if item_id == atleta_id:
+                            pontuacao_total = pontos if pontos is not None else 0
+                            break
             except Exception as e:
                 print(f"Erro ao buscar pontuação do ranking: {e}")
 
@@ -3082,19 +3175,6 @@ def api_modulo_dados(modulo):
         if not config:
             return jsonify({'error': 'Configuração não encontrada para este time'}), 404
         
-        # Buscar partidas da rodada atual
-        cursor.execute('''
-            SELECT clube_casa_id, clube_visitante_id
-            FROM acf_partidas
-            WHERE rodada_id = %s AND valida = TRUE
-        ''', (rodada_atual,))
-        partidas = cursor.fetchall()
-        
-        adversarios_dict = {}
-        for casa_id, visitante_id in partidas:
-            adversarios_dict[casa_id] = visitante_id
-            adversarios_dict[visitante_id] = casa_id
-        
         # Buscar dados de atletas baseado no módulo
         posicao_map = {
             'goleiro': 1,
@@ -3110,318 +3190,26 @@ def api_modulo_dados(modulo):
         if not posicao_id:
             return jsonify({'error': 'Módulo inválido'}), 400
         
-        # Buscar atletas com dados necessários (sem peso_jogo e peso_sg, eles vêm das tabelas de perfis)
-        cursor.execute('''
-            SELECT a.atleta_id, a.apelido, a.clube_id, a.pontos_num, a.media_num, 
-                   a.preco_num, a.jogos_num, c.nome as clube_nome,
-                   c.abreviacao as clube_abrev, COALESCE(a.foto_custom, a.foto) as foto
-            FROM acf_atletas a
-            JOIN acf_clubes c ON a.clube_id = c.id
-            WHERE a.posicao_id = %s AND a.status_id = 7 AND a.temporada = %s
-        ''', (posicao_id, get_temporada_atual()))
-        atletas_raw = cursor.fetchall()
-        
-        # Buscar peso_jogo e peso_sg das tabelas de perfis baseado na configuração do usuário
+        # Parte compartilhada (atletas, perfis, scouts, gols, clubes, escalações):
+        # montada uma vez por versão dos dados e servida já serializada/comprimida
+        from utils import payload_modulos
+        from utils.dados_modulo import montar_dados_modulo
         perfil_peso_jogo = config['perfil_peso_jogo']
         perfil_peso_sg = config['perfil_peso_sg']
-        
-        # Buscar peso_jogo para todos os clubes dos atletas
-        clube_ids = []
-        if atletas_raw:
-            clube_ids = [row[2] for row in atletas_raw if len(row) > 2]  # clube_id é o terceiro campo
-        
-        peso_jogo_dict = {}
-        if clube_ids and len(clube_ids) > 0 and perfil_peso_jogo:
-            try:
-                placeholders = ','.join(['%s'] * len(clube_ids))
-                cursor.execute(f'''
-                    SELECT clube_id, peso_jogo
-                    FROM acp_peso_jogo_perfis
-                    WHERE perfil_id = %s AND rodada_atual = %s AND clube_id IN ({placeholders})
-                ''', [perfil_peso_jogo, rodada_atual] + clube_ids)
-                
-                for row in cursor.fetchall():
-                    if row and len(row) >= 2:
-                        clube_id, peso_jogo = row
-                        peso_jogo_dict[clube_id] = float(peso_jogo) if peso_jogo else 0
-            except Exception as e:
-                print(f"Erro ao buscar peso_jogo: {e}")
-        
-        # Buscar peso_sg para todos os clubes dos atletas
-        peso_sg_dict = {}
-        if clube_ids and len(clube_ids) > 0 and perfil_peso_sg:
-            try:
-                placeholders = ','.join(['%s'] * len(clube_ids))
-                cursor.execute(f'''
-                    SELECT clube_id, peso_sg
-                    FROM acp_peso_sg_perfis
-                    WHERE perfil_id = %s AND rodada_atual = %s AND clube_id IN ({placeholders})
-                ''', [perfil_peso_sg, rodada_atual] + clube_ids)
-                
-                for row in cursor.fetchall():
-                    if row and len(row) >= 2:
-                        clube_id, peso_sg = row
-                        peso_sg_dict[clube_id] = float(peso_sg) if peso_sg else 0
-            except Exception as e:
-                print(f"Erro ao buscar peso_sg: {e}")
-        
-        # Buscar escudos
-        from utils.team_shields import get_team_shield
-        
-        atletas = []
-        for row in atletas_raw:
-            if not row or len(row) < 10:
-                continue
-            try:
-                atleta_id, apelido, clube_id, pontos, media, preco, jogos, clube_nome, clube_abrev, foto = row
-                escudo_url = get_team_shield(clube_id, size='45x45')
-                adversario_id = adversarios_dict.get(clube_id)
-                
-                atletas.append({
-                    'atleta_id': atleta_id,
-                    'apelido': apelido,
-                    'clube_id': clube_id,
-                    'clube_nome': clube_nome,
-                    'clube_abrev': clube_abrev,
-                    'foto': foto or '',
-                    'clube_escudo_url': escudo_url,
-                    'pontos_num': float(pontos) if pontos else 0,
-                    'media_num': float(media) if media else 0,
-                    'preco_num': float(preco) if preco else 0,
-                    'jogos_num': int(jogos) if jogos else 0,
-                    'peso_jogo': peso_jogo_dict.get(clube_id, 0),
-                    'peso_sg': peso_sg_dict.get(clube_id, 0),
-                    'adversario_id': adversario_id
-                })
-            except Exception as e:
-                print(f"Erro ao processar atleta: {e}, row: {row}")
-                continue
-        
-        # Buscar dados de pontuados para cálculos
-        # 1. Buscar médias de scouts por atleta
-        atleta_ids = [a['atleta_id'] for a in atletas]
-        pontuados_data = {}
-        
-        if atleta_ids:
-            placeholders = ','.join(['%s'] * len(atleta_ids))
-            try:
-                cursor.execute(f'''
-                    SELECT atleta_id, 
-                           AVG(scout_ds) as avg_ds,
-                           AVG(scout_ff) as avg_ff, 
-                           AVG(scout_fd) as avg_fd,
-                           AVG(scout_fs) as avg_fs,
-                           AVG(scout_g) as avg_g,
-                           AVG(scout_a) as avg_a
-                    FROM acf_pontuados
-                    WHERE atleta_id IN ({placeholders}) AND rodada_id <= %s AND entrou_em_campo = TRUE
-                    GROUP BY atleta_id
-                ''', atleta_ids + [rodada_atual - 1])
-                
-                for row in cursor.fetchall():
-                    if row and len(row) >= 7:
-                        atleta_id, avg_ds, avg_ff, avg_fd, avg_fs, avg_g, avg_a = row
-                        pontuados_data[atleta_id] = {
-                            'avg_ds': float(avg_ds) if avg_ds else 0,
-                            'avg_ff': float(avg_ff) if avg_ff else 0,
-                            'avg_fd': float(avg_fd) if avg_fd else 0,
-                            'avg_fs': float(avg_fs) if avg_fs else 0,
-                            'avg_g': float(avg_g) if avg_g else 0,
-                            'avg_a': float(avg_a) if avg_a else 0
-                        }
-            except Exception as e:
-                print(f"Erro ao buscar dados de pontuados por atleta: {e}")
-        
-        # 2. Buscar médias de desarmes cedidos por adversários (por posição)
-        if adversarios_dict and posicao_id:
-            adversario_ids = list(set(adversarios_dict.values()))
-            if adversario_ids and len(adversario_ids) > 0:
-                placeholders = ','.join(['%s'] * len(adversario_ids))
-                try:
-                    # Buscar média de desarmes cedidos pelos adversários para esta posição
-                    cursor.execute(f'''
-                        SELECT p.clube_id, AVG(p.scout_ds) as avg_ds_cedidos
-                        FROM acf_pontuados p
-                        JOIN acf_partidas pt ON p.rodada_id = pt.rodada_id
-                        WHERE p.posicao_id = %s 
-                          AND ((pt.clube_casa_id IN ({placeholders}) AND p.clube_id = pt.clube_visitante_id)
-                               OR (pt.clube_visitante_id IN ({placeholders}) AND p.clube_id = pt.clube_casa_id))
-                          AND p.rodada_id <= %s AND p.entrou_em_campo = TRUE
-                        GROUP BY p.clube_id
-                    ''', [posicao_id] + adversario_ids + adversario_ids + [rodada_atual - 1])
-                    
-                    for row in cursor.fetchall():
-                        if row and len(row) >= 2:
-                            clube_id, avg_ds_cedidos = row
-                            if clube_id not in pontuados_data:
-                                pontuados_data[clube_id] = {}
-                            pontuados_data[clube_id]['avg_ds_cedidos'] = float(avg_ds_cedidos) if avg_ds_cedidos else 0
-                except Exception as e:
-                    print(f"Erro ao buscar desarmes cedidos por adversários: {e}")
-        
-        # 3. Buscar escalações (top 20 destaques)
-        escalacoes_data = {}
-        try:
-            cursor.execute('''
-                SELECT atleta_id, escalacoes
-                FROM acf_destaques
-                ORDER BY escalacoes DESC
-                LIMIT 20
-            ''')
-            for row in cursor.fetchall():
-                if row and len(row) >= 2:
-                    atleta_id, escalacoes = row
-                    escalacoes_data[atleta_id] = float(escalacoes) if escalacoes else 0
-        except Exception as e:
-            print(f"Erro ao buscar escalações: {e}")
-        
-        # Buscar dados de partidas para média de gols
-        gols_data = {}
-        if adversarios_dict:
-            adversario_ids = list(set(adversarios_dict.values()))
-            if adversario_ids and len(adversario_ids) > 0:
-                placeholders = ','.join(['%s'] * len(adversario_ids))
-                try:
-                    # Query simplificada: buscar gols marcados por cada clube adversário
-                    cursor.execute(f'''
-                        SELECT 
-                            clube_casa_id as clube_id,
-                            SUM(placar_oficial_mandante) as gols_marcados,
-                            COUNT(*) as jogos
-                        FROM acf_partidas
-                        WHERE clube_casa_id IN ({placeholders})
-                          AND rodada_id < %s AND valida = TRUE 
-                          AND placar_oficial_mandante IS NOT NULL
-                        GROUP BY clube_casa_id
-                    ''', adversario_ids + [rodada_atual])
-                    
-                    for row in cursor.fetchall():
-                        if row and len(row) >= 3:
-                            clube_id, gols_marcados, jogos = row
-                            if jogos and jogos > 0:
-                                gols_data[clube_id] = {
-                                    'gols_marcados': float(gols_marcados) if gols_marcados else 0,
-                                    'jogos': int(jogos),
-                                    'media_gols': float(gols_marcados) / float(jogos) if jogos > 0 else 0
-                                }
-                    
-                    # Também buscar para clubes visitantes
-                    cursor.execute(f'''
-                        SELECT 
-                            clube_visitante_id as clube_id,
-                            SUM(placar_oficial_visitante) as gols_marcados,
-                            COUNT(*) as jogos
-                        FROM acf_partidas
-                        WHERE clube_visitante_id IN ({placeholders})
-                          AND rodada_id < %s AND valida = TRUE 
-                          AND placar_oficial_visitante IS NOT NULL
-                        GROUP BY clube_visitante_id
-                    ''', adversario_ids + [rodada_atual])
-                    
-                    for row in cursor.fetchall():
-                        if row and len(row) >= 3:
-                            clube_id, gols_marcados, jogos = row
-                            if clube_id in gols_data:
-                                # Somar aos dados existentes
-                                gols_data[clube_id]['gols_marcados'] += float(gols_marcados) if gols_marcados else 0
-                                gols_data[clube_id]['jogos'] += int(jogos)
-                                total_jogos = gols_data[clube_id]['jogos']
-                                gols_data[clube_id]['media_gols'] = gols_data[clube_id]['gols_marcados'] / total_jogos if total_jogos > 0 else 0
-                            elif jogos and jogos > 0:
-                                gols_data[clube_id] = {
-                                    'gols_marcados': float(gols_marcados) if gols_marcados else 0,
-                                    'jogos': int(jogos),
-                                    'media_gols': float(gols_marcados) / float(jogos) if jogos > 0 else 0
-                                }
-                except Exception as e:
-                    print(f"Erro ao buscar dados de gols: {e}")
-                    import traceback
-                    traceback.print_exc()
-        
-        # Buscar nomes dos clubes adversários
-        clubes_dict = {}
-        if adversarios_dict:
-            todos_clube_ids = set(adversarios_dict.keys()) | set(adversarios_dict.values())
-            if todos_clube_ids:
-                placeholders = ','.join(['%s'] * len(todos_clube_ids))
-                cursor.execute(f'''
-                    SELECT id, nome, abreviacao
-                    FROM acf_clubes
-                    WHERE id IN ({placeholders})
-                ''', list(todos_clube_ids))
-                
-                for row in cursor.fetchall():
-                    clube_id, nome, abreviacao = row
-                    escudo_url = get_team_shield(clube_id, size='45x45')
-                    clubes_dict[clube_id] = {
-                        'nome': nome,
-                        'abreviacao': abreviacao,
-                        'escudo_url': escudo_url
-                    }
-        
-        # Adicionar nome do adversário aos atletas
-        for atleta in atletas:
-            if atleta['adversario_id'] and atleta['adversario_id'] in clubes_dict:
-                atleta['adversario_nome'] = clubes_dict[atleta['adversario_id']]['nome']
-            else:
-                atleta['adversario_nome'] = 'N/A'
-        
-        # Buscar pesos do módulo
-        from utils.weights import get_weight
-        
-        # Defaults por posição
-        defaults_posicao = {
-            'goleiro': {
-                'FATOR_MEDIA': 0.2, 'FATOR_FF': 4.5, 'FATOR_FD': 6.5, 'FATOR_SG': 1.5,
-                'FATOR_PESO_JOGO': 1.5, 'FATOR_GOL_ADVERSARIO': 2.0
-            },
-            'lateral': {
-                'FATOR_MEDIA': 3.0, 'FATOR_DS': 8.0, 'FATOR_SG': 2.0, 'FATOR_ESCALACAO': 10.0,
-                'FATOR_FF': 2.0, 'FATOR_FS': 1.0, 'FATOR_FD': 2.0, 'FATOR_G': 4.0,
-                'FATOR_A': 4.0, 'FATOR_PESO_JOGO': 1.0
-            },
-            'zagueiro': {
-                'FATOR_MEDIA': 1.5, 'FATOR_DS': 4.5, 'FATOR_SG': 4.0, 'FATOR_ESCALACAO': 5.0,
-                'FATOR_PESO_JOGO': 5.0
-            },
-            'meia': {
-                'FATOR_MEDIA': 1.0, 'FATOR_DS': 3.6, 'FATOR_FF': 0.7, 'FATOR_FS': 0.8,
-                'FATOR_FD': 0.9, 'FATOR_G': 2.5, 'FATOR_A': 2.0, 'FATOR_ESCALACAO': 10.0,
-                'FATOR_PESO_JOGO': 9.5
-            },
-            'atacante': {
-                'FATOR_MEDIA': 2.5, 'FATOR_DS': 2.0, 'FATOR_FF': 1.2, 'FATOR_FS': 1.3,
-                'FATOR_FD': 1.3, 'FATOR_G': 2.5, 'FATOR_A': 2.5, 'FATOR_ESCALACAO': 10.0,
-                'FATOR_PESO_JOGO': 10.0
-            },
-            'treinador': {
-                'FATOR_PESO_JOGO': 1.0
-            }
-        }
-        
-        defaults_modulo = defaults_posicao.get(modulo, defaults_posicao['goleiro'])
+        versao = payload_modulos.versao_dados(conn)
+        payload = payload_modulos.obter_payload(
+            ('modulo', rodada_atual, posicao_id, perfil_peso_jogo, perfil_peso_sg),
+            versao,
+            lambda: montar_dados_modulo(conn, posicao_id, rodada_atual, perfil_peso_jogo, perfil_peso_sg, versao)
+        )
         
         # Buscar pesos do time selecionado
         team_id = session.get('selected_team_id')
         if not team_id:
             return jsonify({'error': 'Nenhum time selecionado. Selecione um time primeiro.'}), 400
         
-        # Buscar pesos salvos para este time e módulo
-        cursor.execute('''
-            SELECT weights_json FROM acw_posicao_weights
-            WHERE user_id = %s AND team_id = %s AND posicao = %s
-        ''', (user['id'], team_id, modulo))
-        peso_row = cursor.fetchone()
-        
-        if peso_row and peso_row[0]:
-            pesos_salvos = peso_row[0] if isinstance(peso_row[0], dict) else json.loads(peso_row[0])
-        else:
-            # Se não houver pesos salvos, usar defaults
-            pesos_salvos = {}
-        
-        pesos = {}
-        for key, default in defaults_modulo.items():
-            pesos[key] = float(pesos_salvos.get(key, default))
+        # Pesos salvos do time sobre os defaults da posição (utils.weights, via cache)
+        pesos = pesos_time(modulo if modulo in PESOS_PADRAO else 'goleiro', user['id'], team_id)
         
         # Verificar se já existe ranking salvo para esta rodada e módulo
         from models.user_rankings import get_team_rankings
@@ -3491,16 +3279,7 @@ def api_modulo_dados(modulo):
         
         print(f"[API] Retornando ranking_salvo para JSON: tipo={type(ranking_para_json)}, tamanho={len(ranking_para_json) if ranking_para_json else 0}")
         
-        return jsonify({
-            'rodada_atual': rodada_atual,
-            'perfil_peso_jogo': config['perfil_peso_jogo'],
-            'perfil_peso_sg': config['perfil_peso_sg'],
-            'atletas': atletas,
-            'adversarios_dict': adversarios_dict,
-            'clubes_dict': clubes_dict,
-            'pontuados_data': pontuados_data,
-            'gols_data': gols_data,
-            'escalacoes_data': escalacoes_data,
+        return payload_modulos.responder(payload, {
             'pesos': pesos,
             'ranking_salvo': ranking_para_json,  # Usar versão validada
             'configuration_id': config.get('id')
@@ -3924,132 +3703,10 @@ def api_escalacao_dados():
         if not config:
             return jsonify({'error': 'Configuração não encontrada'}), 404
         
-        # Buscar rankings salvos de todas as posições
-        from models.user_rankings import get_team_rankings
-        posicao_map = {
-            'goleiro': 1, 'lateral': 2, 'zagueiro': 3, 
-            'meia': 4, 'atacante': 5, 'treinador': 6
-        }
-        
-        rankings_por_posicao = {}
-        for pos_nome, pos_id in posicao_map.items():
-            rankings = get_team_rankings(
-                conn, user['id'],
-                team_id=team_id,
-                configuration_id=config.get('id'),
-                posicao_id=pos_id,
-                rodada_atual=rodada_atual
-            )
-            if rankings:
-                ranking_data = rankings[0].get('ranking_data', [])
-                if isinstance(ranking_data, list) and len(ranking_data) > 0:
-                    # Normalizar campos: garantir que preco_num exista
-                    # Se não estiver no ranking salvo, buscar da tabela atletas
-                    ranking_normalizado = []
-                    atleta_ids_sem_preco = []
-                    
-                    # Primeira passagem: identificar jogadores sem preço
-                    print(f"[DEBUG] Processando ranking {pos_nome} com {len(ranking_data)} jogadores")
-                    for jogador in ranking_data:
-                        jogador_norm = dict(jogador)
-                        # Verificar se tem preço válido (> 0)
-                        preco_num_val = jogador_norm.get('preco_num', 0)
-                        preco_val = jogador_norm.get('preco', 0)
-                        
-                        # Tentar converter para float
-                        try:
-                            if preco_num_val:
-                                preco_num_val = float(preco_num_val)
-                            else:
-                                preco_num_val = 0
-                            if preco_val:
-                                preco_val = float(preco_val)
-                            else:
-                                preco_val = 0
-                        except (ValueError, TypeError):
-                            preco_num_val = 0
-                            preco_val = 0
-                        
-                        preco_existe = (preco_num_val and preco_num_val > 0) or (preco_val and preco_val > 0)
-                        
-                        if not preco_existe and jogador_norm.get('atleta_id'):
-                            atleta_ids_sem_preco.append(jogador_norm['atleta_id'])
-                            # Log para debug (apenas primeiros 3)
-                            if len(atleta_ids_sem_preco) <= 3:
-                                print(f"[DEBUG] Jogador {jogador_norm.get('apelido', 'N/A')} (ID: {jogador_norm.get('atleta_id')}) sem preço válido. preco_num={preco_num_val}, preco={preco_val}")
-                    
-                    # Buscar preços e status_id da tabela atletas
-                    preco_dict = {}
-                    status_dict = {}
-                    
-                    # Buscar para todos os atletas do ranking (para garantir status_id atualizado)
-                    atleta_ids_ranking = [j['atleta_id'] for j in ranking_data if j.get('atleta_id')]
-                    if atleta_ids_ranking:
-                        placeholders = ','.join(['%s'] * len(atleta_ids_ranking))
-                        cursor.execute(f'''
-                            SELECT atleta_id, preco_num, status_id
-                            FROM acf_atletas
-                            WHERE atleta_id IN ({placeholders}) AND temporada = %s
-                        ''', atleta_ids_ranking + [get_temporada_atual()])
-                        rows_atletas = cursor.fetchall()
-                        
-                        for row in rows_atletas:
-                            atleta_id = row[0]
-                            preco_val = float(row[1]) if row[1] else 0.0
-                            status_val = int(row[2]) if row[2] else 0
-                            
-                            preco_dict[atleta_id] = preco_val
-                            status_dict[atleta_id] = status_val
-                        
-                        print(f"[DEBUG] Buscados preços e status para {len(rows_atletas)} atletas da posição {pos_nome}")
-                    
-                    if atleta_ids_sem_preco:
-                        print(f"[DEBUG] {len(atleta_ids_sem_preco)} atletas sem preço na posição {pos_nome}")
-                    
-                    # Segunda passagem: normalizar todos os jogadores
-                    for jogador in ranking_data:
-                        jogador_norm = dict(jogador)
-                        atleta_id = jogador_norm.get('atleta_id')
-                        
-                        # Normalizar preço: tentar preco_num, depois preco, depois buscar da tabela
-                        preco_valor = None
-                        if 'preco_num' in jogador_norm and jogador_norm.get('preco_num'):
-                            try:
-                                preco_valor = float(jogador_norm['preco_num'])
-                            except (ValueError, TypeError):
-                                pass
-                        
-                        if preco_valor is None or preco_valor <= 0:
-                            if 'preco' in jogador_norm and jogador_norm.get('preco'):
-                                try:
-                                    preco_valor = float(jogador_norm['preco'])
-                                except (ValueError, TypeError):
-                                    pass
-                        
-                        if (preco_valor is None or preco_valor <= 0) and atleta_id and atleta_id in preco_dict:
-                            preco_valor = preco_dict[atleta_id]
-                        
-                        # Garantir que preco_valor seja um número válido
-                        if preco_valor is None or preco_valor <= 0:
-                            preco_valor = 0.0
-                        
-                        # Atualizar campos de preço
-                        jogador_norm['preco_num'] = preco_valor
-                        jogador_norm['preco'] = preco_valor
-                        
-                        # Adicionar status_id atual da tabela (não do ranking salvo)
-                        if atleta_id and atleta_id in status_dict:
-                            jogador_norm['status_id'] = status_dict[atleta_id]
-                        else:
-                            jogador_norm['status_id'] = 0  # Status desconhecido
-                        
-                        ranking_normalizado.append(jogador_norm)
-                    
-                    rankings_por_posicao[pos_nome] = ranking_normalizado
-                    print(f"[DEBUG] Ranking {pos_nome}: {len(ranking_normalizado)} jogadores normalizados")
-                    if ranking_normalizado:
-                        sample = ranking_normalizado[0]
-                        print(f"[DEBUG] Exemplo de jogador normalizado: atleta_id={sample.get('atleta_id')}, preco_num={sample.get('preco_num')}, preco={sample.get('preco')}")
+        # Buscar rankings salvos de todas as posições (preço e status atuais em lote)
+        rankings_por_posicao = _carregar_rankings_escalacao(
+            conn, user['id'], team_id, config.get('id'), rodada_atual
+        )
         
         # Buscar configuração de escalação
         from models.user_escalacao_config import get_user_escalacao_config
@@ -4304,6 +3961,166 @@ def api_escalacao_dados():
     finally:
         close_db_connection(conn)
 
+@app.route('/api/escalacao-ideal/otimizar', methods=['POST'])
+@login_required
+def api_escalacao_otimizar():
+    """Calcula no servidor a escalação ótima (exata) com os rankings salvos do time.
+
+    Body JSON (todos opcionais): patrimonio, formacao, posicao_capitao,
+    posicao_reserva_luxo, excluir_ids, fixos_ids. Sem patrimônio, busca na API do Cartola;
+    formação e capitão vêm da configuração de escalação do time.
+    
+    Sem excluídos/fixos, a escalação sai da fronteira custo x pontuação pré-calculada
+    (utils/fronteira_escalacao.py), compartilhada por todos com os mesmos candidatos.
+    Com risco ('esperado', 'piso' ou 'teto') a escalação é escolhida pela simulação de
+    Monte Carlo (utils/simulacao_escalacao.py); nivel_risco (1-10, padrão = o máximo do
+    plano) afasta o percentil da mediana e é limitado pelo nivelRisco do plano.
+    """
+    user = get_current_user()
+    data = request.get_json(silent=True) or {}
+    conn = get_db_connection()
+    
+    try:
+        from models.user_configurations import get_user_default_configuration
+        from models.user_escalacao_config import get_user_escalacao_config
+        from utils.otimizador_escalacao import otimizar_escalacao
+        
+        team_id = session.get('selected_team_id')
+        if not team_id:
+            return jsonify({'error': 'Nenhum time selecionado'}), 400
+        
+        modo_risco = data.get('risco')
+        if modo_risco is not None:
+            from models.plans import get_nivel_risco
+            from utils.simulacao_escalacao import MODOS_RISCO, NIVEL_RISCO_MAXIMO
+            if modo_risco not in MODOS_RISCO:
+                return jsonify({'error': f"risco inválido. Use: {', '.join(MODOS_RISCO)}"}), 400
+            nivel_permitido = get_nivel_risco(user['id'])
+            try:
+                nivel_risco = int(data.get('nivel_risco') or min(nivel_permitido, NIVEL_RISCO_MAXIMO))
+            except (ValueError, TypeError):
+                return jsonify({'error': 'nivel_risco inválido'}), 400
+            if not 1 <= nivel_risco <= NIVEL_RISCO_MAXIMO:
+                return jsonify({'error': f'nivel_risco deve estar entre 1 e {NIVEL_RISCO_MAXIMO}'}), 400
+            if nivel_risco > nivel_permitido:
+                return jsonify({
+                    'error': f'Seu plano permite nível de risco até {nivel_permitido}. Faça upgrade para usar níveis maiores.'
+                }), 403
+        
+        cursor = conn.cursor()
+        cursor.execute('SELECT rodada_id FROM acf_partidas ORDER BY partida_data DESC LIMIT 1')
+        rodada_result = cursor.fetchone()
+        rodada_atual = rodada_result[0] if rodada_result and rodada_result[0] else 1
+        
+        config = get_user_default_configuration(conn, user['id'], team_id)
+        if not config:
+            return jsonify({'error': 'Configuração não encontrada'}), 404
+        escalacao_config = get_user_escalacao_config(conn, user['id'], team_id) or {}
+        
+        # Rankings salvos, com preços ausentes completados por acf_atletas
+        rankings_por_posicao = _carregar_rankings_escalacao(
+            conn, user['id'], team_id, config.get('id'), rodada_atual
+        )
+        
+        patrimonio = data.get('patrimonio')
+        if patrimonio is None:
+            patrimonio = _buscar_patrimonio_time(conn, team_id)
+        try:
+            patrimonio = float(patrimonio)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Patrimônio inválido'}), 400
+        if patrimonio <= 0:
+            return jsonify({'error': 'Patrimônio não encontrado. Verifique as credenciais do time.'}), 400
+        
+        posicao_capitao = data.get('posicao_capitao') or escalacao_config.get('posicao_capitao') or 'atacantes'
+        parametros = dict(
+            formacao=data.get('formacao') or escalacao_config.get('formation') or '4-3-3',
+            posicao_capitao=posicao_capitao,
+            posicao_reserva_luxo=data.get('posicao_reserva_luxo') or escalacao_config.get('posicao_reserva_luxo') or posicao_capitao,
+            excluir_ids=data.get('excluir_ids') or [],
+            fixos_ids=data.get('fixos_ids') or []
+        )
+        if modo_risco is not None:
+            from utils.simulacao_escalacao import otimizar_escalacao_risco
+            try:
+                escalacao = otimizar_escalacao_risco(
+                    conn, rodada_atual, rankings_por_posicao, patrimonio,
+                    modo=modo_risco, nivel=nivel_risco, **parametros
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 422
+        elif parametros['excluir_ids'] or parametros['fixos_ids']:
+            escalacao = otimizar_escalacao(rankings_por_posicao, patrimonio, **parametros)
+        else:
+            # Sem restrições: consulta na fronteira custo x pontuação da rodada
+            from utils.fronteira_escalacao import melhor_escalacao
+            escalacao = melhor_escalacao(
+                rodada_atual, rankings_por_posicao, patrimonio, formacao=parametros['formacao'],
+                posicao_capitao=posicao_capitao, posicao_reserva_luxo=parametros['posicao_reserva_luxo']
+            )
+        if escalacao is None:
+            return jsonify({'error': 'Não foi possível encontrar escalação válida dentro do patrimônio'}), 422
+        
+        escalacao['rodada_atual'] = rodada_atual
+        return jsonify({'success': True, 'escalacao': escalacao})
+    except Exception as e:
+        print(f"Erro ao otimizar escalação: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
+@app.route('/api/escalacao-ideal/fronteira')
+@login_required
+def api_escalacao_fronteira():
+    """Fronteira custo x pontuação prevista da rodada para os rankings do time selecionado.
+
+    Query string (opcional): formacao (padrão = configuração de escalação do time).
+    Retorna os pontos {custo, pontuacao}: para um patrimônio X, a melhor escalação é a
+    do último ponto com custo <= X.
+    """
+    user = get_current_user()
+    conn = get_db_connection()
+    
+    try:
+        from models.user_configurations import get_user_default_configuration
+        from models.user_escalacao_config import get_user_escalacao_config
+        from utils.escalacao_lote import rodada_atual_partidas
+        from utils.fronteira_escalacao import assinatura_candidatos, obter_fronteira
+        
+        team_id = session.get('selected_team_id')
+        if not team_id:
+            return jsonify({'error': 'Nenhum time selecionado'}), 400
+        config = get_user_default_configuration(conn, user['id'], team_id)
+        if not config:
+            return jsonify({'error': 'Configuração não encontrada'}), 404
+        escalacao_config = get_user_escalacao_config(conn, user['id'], team_id) or {}
+        
+        rodada_atual = rodada_atual_partidas(conn)
+        rankings_por_posicao = _carregar_rankings_escalacao(
+            conn, user['id'], team_id, config.get('id'), rodada_atual
+        )
+        formacao = request.args.get('formacao') or escalacao_config.get('formation') or '4-3-3'
+        fronteira = obter_fronteira(rodada_atual, rankings_por_posicao, formacao)
+        return jsonify({
+            'success': True,
+            'rodada_atual': rodada_atual,
+            'formacao': fronteira['formacao'],
+            'assinatura': assinatura_candidatos(rankings_por_posicao),
+            'pontos': [
+                {'custo': round(custo / 100, 2), 'pontuacao': round(float(pontos), 2)}
+                for custo, pontos in zip(fronteira['custos'].tolist(), fronteira['pontos'].tolist())
+            ]
+        })
+    except Exception as e:
+        print(f"Erro ao calcular fronteira da escalação: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
 @app.route('/diagnostico/goleiros-nulos')
 @login_required
 def diagnostico_goleiros_nulos():
@@ -4440,39 +4257,14 @@ def api_escalar_time():
         if not access_token:
             return jsonify({'error': 'Token de acesso não encontrado'}), 401
         
-        # Mapear posições para IDs numéricos (usado pela API do Cartola)
-        posicao_id_map = {
-            'goleiros': 1,
-            'laterais': 2,
-            'zagueiros': 3,
-            'meias': 4,
-            'atacantes': 5,
-            'treinadores': 6
-        }
-        
         # Preparar payload para API do Cartola
+        from utils.escalacao_lote import montar_time_para_escalacao, enviar_escalacao_cartola
+        import requests
+        
         titulares = escalacao.get('titulares', {})
-        reservas = escalacao.get('reservas', {})
-        
-        # Mapa de atleta_id -> info para debug
-        atletas_info_map = {}
-
-        # Array de IDs dos titulares (12 atletas)
-        atletas_ids = []
-        atletas_debug = []  # Lista legível para retornar na resposta
-        for posicao in ['goleiros', 'zagueiros', 'laterais', 'meias', 'atacantes', 'treinadores']:
-            jogadores = titulares.get(posicao, [])
-            print(f"[DEBUG] Posição {posicao}: {len(jogadores)} jogadores")
-            for jogador in jogadores:
-                atleta_id = jogador.get('atleta_id')
-                apelido = jogador.get('apelido', 'N/A')
-                preco = jogador.get('preco_num') or jogador.get('preco') or 0
-                print(f"[DEBUG]   - Jogador: {apelido} (ID: {atleta_id})")
-                atletas_ids.append(atleta_id)
-                atletas_info_map[atleta_id] = {'apelido': apelido, 'posicao': posicao, 'preco': preco, 'tipo': 'titular'}
-                eh_capitao = jogador.get('eh_capitao', False)
-                atletas_debug.append({'atleta_id': atleta_id, 'apelido': apelido, 'posicao': posicao, 'preco': preco, 'tipo': 'titular', 'capitao': eh_capitao})
-
+        formacao = data.get('formacao', '4-3-3')
+        time_para_escalacao, atletas_debug = montar_time_para_escalacao(escalacao, formacao)
+        atletas_ids = time_para_escalacao['atletas']
         print(f"[DEBUG] Total de atletas: {len(atletas_ids)}")
         
         # Validar 12 atletas
@@ -4487,104 +4279,14 @@ def api_escalar_time():
                 }
             }), 400
         
-        # Identificar capitão
-        capitao_id = None
-        for posicao_jogadores in titulares.values():
-            for jogador in posicao_jogadores:
-                if jogador.get('eh_capitao'):
-                    capitao_id = jogador.get('atleta_id')
-                    break
-            if capitao_id:
-                break
-        
-        # Mapear reservas {posicao_id: atleta_id}
-        # IMPORTANTE: Reserva de luxo também deve estar aqui!
-        # As chaves devem ser STRINGS com os IDs das posições
-        reservas_map = {}
-        for posicao, jogadores in reservas.items():
-            for jogador in jogadores:
-                posicao_id = posicao_id_map.get(posicao)
-                if posicao_id:
-                    atleta_id = jogador.get('atleta_id')
-                    apelido = jogador.get('apelido', 'N/A')
-                    preco = jogador.get('preco_num') or jogador.get('preco') or 0
-                    reservas_map[str(posicao_id)] = atleta_id  # String!
-                    eh_luxo = jogador.get('eh_reserva_luxo', False)
-                    tipo_reserva = 'reserva_luxo' if eh_luxo else 'reserva'
-                    atletas_info_map[atleta_id] = {'apelido': apelido, 'posicao': posicao, 'preco': preco, 'tipo': tipo_reserva}
-                    atletas_debug.append({'atleta_id': atleta_id, 'apelido': apelido, 'posicao': posicao, 'preco': preco, 'tipo': tipo_reserva, 'capitao': False})
-                    print(f"[DEBUG] Reserva posição {posicao_id} ({posicao}): {apelido} (ID: {atleta_id}) - Luxo: {eh_luxo}")
-        
-        # Identificar reserva de luxo
-        reserva_luxo_id = None
-        for jogadores in reservas.values():
-            for jogador in jogadores:
-                if jogador.get('eh_reserva_luxo'):
-                    reserva_luxo_id = jogador.get('atleta_id')
-                    print(f"[DEBUG] Reserva de luxo identificado: {jogador.get('apelido')} (ID: {reserva_luxo_id})")
-                    break
-            if reserva_luxo_id:
-                break
-        
-        print(f"[DEBUG] Total de atletas (incluindo reservas): {len(atletas_ids)}")
-        
-        print(f"[DEBUG] Reservas completas: {reservas_map}")
-        print(f"[DEBUG] Capitão: {capitao_id}")
-        print(f"[DEBUG] Reserva luxo: {reserva_luxo_id}")
-        
-        # Obter esquema da formação (mapear 4-3-3 -> ID 3, etc)
-        esquema_map = {
-            '4-3-3': 3,
-            '4-4-2': 1,
-            '3-5-2': 2,
-            '3-4-3': 4,
-            '4-5-1': 5,
-            '5-4-1': 6
-        }
-        formacao = data.get('formacao', '4-3-3')
-        esquema_id = esquema_map.get(formacao, 3)
-        
-        # Montar payload
-        time_para_escalacao = {
-            'esquema': esquema_id,
-            'atletas': atletas_ids,
-            'capitao': capitao_id,
-            'reservas': reservas_map,
-            'reserva_luxo_id': reserva_luxo_id
-        }
-        
         print(f"[DEBUG] Escalando time {team_id}")
         print(f"[DEBUG] Payload: {time_para_escalacao}")
         
-        # Enviar para API do Cartola
-        # Criar uma função auxiliar que usa team_id
-        from api_cartola import API_URL_SALVAR_TIME, refresh_access_token_by_team_id
-        import requests
-        
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Accept": "application/json, text/plain, */*",
-            "Content-Type": "application/json;charset=UTF-8",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Origin": "https://cartola.globo.com",
-            "Referer": "https://cartola.globo.com/",
-            "x-glb-app": "cartola_web",
-            "x-glb-auth": "oidc",
-        }
-        
         try:
-            # Timeout de 10 segundos para não travar o cliente
-            response = requests.post(API_URL_SALVAR_TIME, json=time_para_escalacao, headers=headers, timeout=10)
-            
-            if response.status_code == 401:
-                # Token expirado, tentar refresh
-                print(f"[DEBUG] Token expirado, tentando refresh...")
-                new_token = refresh_access_token_by_team_id(conn, team_id)
-                if new_token:
-                    headers["Authorization"] = f"Bearer {new_token}"
-                    response = requests.post(API_URL_SALVAR_TIME, json=time_para_escalacao, headers=headers, timeout=10)
-                else:
-                    return jsonify({'error': 'Falha ao atualizar token'}), 401
+            # Enviar para API do Cartola (renova o token uma vez em caso de 401)
+            response = enviar_escalacao_cartola(conn, team_id, access_token, time_para_escalacao)
+            if response is None:
+                return jsonify({'error': 'Falha ao atualizar token'}), 401
             
             # Processar resposta
             if 200 <= response.status_code < 300:
@@ -4644,6 +4346,190 @@ def api_escalar_time():
     finally:
         close_db_connection(conn)
 
+@app.route('/api/escalacao-ideal/escalar-lote', methods=['POST'])
+@login_required
+def api_escalar_lote():
+    """Escala vários times no worker de jobs, em paralelo (Escalar Todos os Times).
+
+    Body JSON (opcional): team_ids, max_repetidos. Sem team_ids, escala todos os times
+    do usuário. Cada time usa seus rankings salvos e sua configuração de escalação; o
+    time selecionado na sessão não muda. Times com os mesmos rankings e configuração
+    recebem escalações diferentes, com no máximo max_repetidos (0-12) titulares em
+    comum. Retorna 202 com lote_id para acompanhar em
+    GET /api/escalacao-ideal/escalar-lote/<lote_id>.
+    """
+    from models.jobs import LimiteJobsExcedido
+    from models.plans import check_permission
+    from utils.escalacao_lote import iniciar_lote
+    
+    user = get_current_user()
+    if not check_permission(user['id'], 'multiEscalacao'):
+        return jsonify({'error': 'Multi-escalação está disponível apenas no plano Pro.'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    conn = get_db_connection()
+    
+    try:
+        times = get_all_user_teams(conn, user['id'])
+        team_ids = data.get('team_ids')
+        if team_ids is not None:
+            try:
+                team_ids = {int(team_id) for team_id in team_ids}
+            except (ValueError, TypeError):
+                return jsonify({'error': 'team_ids inválido'}), 400
+            desconhecidos = team_ids - {time['id'] for time in times}
+            if desconhecidos:
+                return jsonify({'error': f'Times não encontrados: {sorted(desconhecidos)}'}), 404
+            times = [time for time in times if time['id'] in team_ids]
+        if not times:
+            return jsonify({'error': 'Nenhum time para escalar'}), 400
+        
+        max_repetidos = data.get('max_repetidos')
+        if max_repetidos is not None:
+            try:
+                max_repetidos = int(max_repetidos)
+            except (ValueError, TypeError):
+                return jsonify({'error': 'max_repetidos inválido'}), 400
+            if not 0 <= max_repetidos <= 12:
+                return jsonify({'error': 'max_repetidos deve estar entre 0 e 12'}), 400
+        
+        lote_id = iniciar_lote(conn, user['id'], [{'id': t['id'], 'team_name': t.get('team_name')} for t in times],
+                               max_repetidos=max_repetidos)
+        return jsonify({
+            'success': True,
+            'lote_id': lote_id,
+            'total': len(times),
+            'status_url': url_for('api_escalar_lote_status', lote_id=lote_id)
+        }), 202
+    except LimiteJobsExcedido as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        print(f"Erro ao iniciar escalação em lote: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
+@app.route('/api/escalacao-ideal/escalar-lote/<lote_id>')
+@login_required
+def api_escalar_lote_status(lote_id):
+    """Progresso de um lote de escalação: estado de cada time e totais"""
+    from models.escalacao_lotes import get_escalacao_lote
+    
+    user = get_current_user()
+    conn = get_db_connection()
+    
+    try:
+        lote = get_escalacao_lote(conn, lote_id, user['id'])
+        if not lote:
+            return jsonify({'error': 'Lote não encontrado'}), 404
+        lote['times'].sort(key=lambda t: (t.get('team_name') or '', t.get('team_id') or 0))
+        return jsonify(lote)
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao consultar lote de escalação: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def api_criar_job():
+    """Enfileira um job para o worker (trabalho pesado fora da requisição).
+
+    Body JSON: tipo ('recalcular_modulo', 'escalacao_ideal', 'escalar_time' ou
+    'ajustar_pesos'), team_id (padrão: time selecionado) e, para recalcular_modulo e
+    ajustar_pesos, modulo (mais os parâmetros de /api/modulos/<modulo>/ajustar-pesos
+    no caso de ajustar_pesos). Retorna 202 com job_id;
+    um job pendente idêntico não é duplicado (criado=false, mesmo job_id).
+    """
+    from models.jobs import enqueue_job, LimiteJobsExcedido, TIPOS_JOB
+    
+    user = get_current_user()
+    data = request.get_json(silent=True) or {}
+    tipo = data.get('tipo')
+    if tipo not in TIPOS_JOB:
+        return jsonify({'error': f"tipo inválido. Use: {', '.join(sorted(TIPOS_JOB))}"}), 400
+    
+    try:
+        team_id = int(data.get('team_id') or session.get('selected_team_id') or 0)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'team_id inválido'}), 400
+    if not team_id:
+        return jsonify({'error': 'Nenhum time selecionado'}), 400
+    
+    conn = get_db_connection()
+    try:
+        if not get_team(conn, team_id, user['id']):
+            return jsonify({'error': 'Time não encontrado'}), 404
+        
+        parametros = {}
+        try:
+            if tipo == 'recalcular_modulo':
+                parametros = _parametros_recalculo(conn, user['id'], team_id, data.get('modulo'))
+            elif tipo == 'ajustar_pesos':
+                from models.plans import check_permission
+                if not check_permission(user['id'], 'editarPesosModulos'):
+                    return jsonify({'error': 'Edição de pesos está disponível apenas no plano Pro.'}), 403
+                parametros = _parametros_ajuste(data.get('modulo'), data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            job_id, criado = enqueue_job(conn, tipo, user['id'], team_id, parametros)
+        except LimiteJobsExcedido as e:
+            return jsonify({'error': str(e)}), 429
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'criado': criado,
+            'status_url': url_for('api_job_status', job_id=job_id)
+        }), 202
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao enfileirar job: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
+@app.route('/api/jobs/<int:job_id>')
+@login_required
+def api_job_status(job_id):
+    """Status de um job do usuário (posição na fila, resultado ou erro)"""
+    from models.jobs import get_job
+    
+    user = get_current_user()
+    conn = get_db_connection()
+    try:
+        job = get_job(conn, job_id, user['id'])
+        if not job:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        return jsonify(job)
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao consultar job: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
+@app.route('/api/jobs')
+@login_required
+def api_listar_jobs():
+    """Jobs mais recentes do usuário"""
+    from models.jobs import get_user_jobs
+    
+    user = get_current_user()
+    conn = get_db_connection()
+    try:
+        return jsonify({'jobs': get_user_jobs(conn, user['id'], limite=max(1, min(request.args.get('limite', 20, type=int), 100)))})
+    except Exception as e:
+        conn.rollback()
+        print(f"Erro ao listar jobs: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        close_db_connection(conn)
+
 @app.route('/api/user/permissions')
 @login_required
 def api_user_permissions():
@@ -4700,6 +4586,9 @@ def admin_fotos():
                 cursor = conn.cursor()
                 cursor.execute("UPDATE acf_atletas SET foto_custom = %s WHERE atleta_id = %s", (foto_url, int(atleta_id)))
                 conn.commit()
+                # A foto faz parte do payload compartilhado dos módulos
+                from utils.payload_modulos import invalidar_payloads
+                invalidar_payloads()
                 flash('Foto atualizada!', 'success')
         
         cursor = conn.cursor()
@@ -4750,6 +4639,30 @@ def api_admin_alterar_plano():
     else:
         return jsonify({'success': False, 'error': 'Erro ao alterar plano'}), 500
 
+@app.route('/api/admin/db-pool')
+@login_required
+def api_admin_db_pool():
+    """API com as métricas do pool de conexões deste worker (admin only)"""
+    from database import get_pool_metrics
+
+    user = get_current_user()
+    if not user or not user.get('is_admin', False):
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+
+    return jsonify({'success': True, 'pool': get_pool_metrics()})
+
+@app.route('/api/admin/http-cartola')
+@login_required
+def api_admin_http_cartola():
+    """API com latência e erros por endpoint da API do Cartola neste worker (admin only)"""
+    from utils.http_cartola import get_http_metrics
+
+    user = get_current_user()
+    if not user or not user.get('is_admin', False):
+        return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+
+    return jsonify({'success': True, 'endpoints': get_http_metrics()})
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
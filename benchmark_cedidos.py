@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da matriz de scouts cedidos (models/scouts_cedidos.py)
+
+Gera uma temporada sintética num schema temporário do PostgreSQL configurado
+(POSTGRES_*), roda as consultas antigas de cedidos e a matriz montada uma vez por
+rodada, e imprime os tempos. O schema é removido no final.
+
+Uso:
+    python benchmark_cedidos.py [--clubes 20] [--rodadas 38] [--repeticoes 20]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# Adicionar diretório ao path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from database import POSTGRES_CONFIG
+from utils.scouts import SCOUTS
+import models.scouts_cedidos as scouts_cedidos
+
+TEMPORADA = 2099
+POSICOES = {1: 3, 2: 5, 3: 5, 4: 8, 5: 6}  # posicao_id -> atletas por clube
+TITULARES = {1: 1, 2: 2, 3: 2, 4: 4, 5: 3}  # posicao_id -> atletas em campo por partida
+
+
+def criar_tabelas(cursor):
+    scouts = ',\n            '.join(f'scout_{s} INTEGER' for s in SCOUTS)
+    cursor.execute('''
+        CREATE TABLE acf_partidas (
+            id SERIAL PRIMARY KEY,
+            temporada INTEGER,
+            rodada_id INTEGER,
+            clube_casa_id INTEGER,
+            clube_visitante_id INTEGER,
+            valida BOOLEAN,
+            partida_data TIMESTAMP,
+            placar_oficial_mandante INTEGER,
+            placar_oficial_visitante INTEGER
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE acf_pontuados (
+            atleta_id INTEGER,
+            rodada_id INTEGER,
+            clube_id INTEGER,
+            posicao_id INTEGER,
+            entrou_em_campo BOOLEAN,
+            jogou_em_casa BOOLEAN,
+            pontuacao DOUBLE PRECISION,
+            temporada INTEGER,
+            {scouts},
+            PRIMARY KEY (atleta_id, rodada_id, temporada)
+        )
+    ''')
+    cursor.execute('CREATE INDEX ON acf_pontuados (rodada_id)')
+    cursor.execute('CREATE INDEX ON acf_partidas (rodada_id)')
+
+
+def gerar_temporada(cursor, n_clubes: int, n_rodadas: int, semente: int = 42):
+    """Turno e returno em rodízio; cada partida com os titulares de cada posição."""
+    rnd = random.Random(semente)
+    clubes = list(range(1, n_clubes + 1))
+    elenco = {}
+    atleta_id = 1
+    for clube_id in clubes:
+        for posicao_id, quantidade in POSICOES.items():
+            elenco[(clube_id, posicao_id)] = list(range(atleta_id, atleta_id + quantidade))
+            atleta_id += quantidade
+
+    partidas, pontuados = [], []
+    rodizio = clubes[:]
+    for rodada_id in range(1, n_rodadas + 1):
+        metade = len(rodizio) // 2
+        for i in range(metade):
+            casa, visitante = rodizio[i], rodizio[-1 - i]
+            if rodada_id % 2 == 0:
+                casa, visitante = visitante, casa
+            partidas.append((TEMPORADA, rodada_id, casa, visitante, True, None,
+                             rnd.randint(0, 3), rnd.randint(0, 3)))
+            for clube_id, em_casa in ((casa, True), (visitante, False)):
+                for posicao_id, em_campo in TITULARES.items():
+                    for aid in rnd.sample(elenco[(clube_id, posicao_id)], em_campo):
+                        # Scouts zerados ficam NULL, como vêm da API
+                        scouts = [rnd.choice([None, None, 1, 2]) for _ in SCOUTS]
+                        pontuados.append((aid, rodada_id, clube_id, posicao_id, True, em_casa,
+                                          round(rnd.uniform(-2, 12), 1), TEMPORADA, *scouts))
+        rodizio = [rodizio[0]] + [rodizio[-1]] + rodizio[1:-1]
+
+    execute_values(cursor, '''
+        INSERT INTO acf_partidas (temporada, rodada_id, clube_casa_id, clube_visitante_id, valida,
+                                  partida_data, placar_oficial_mandante, placar_oficial_visitante)
+        VALUES %s
+    ''', partidas)
+    colunas = ', '.join(f'scout_{s}' for s in SCOUTS)
+    execute_values(cursor, f'''
+        INSERT INTO acf_pontuados (atleta_id, rodada_id, clube_id, posicao_id, entrou_em_campo,
+                                   jogou_em_casa, pontuacao, temporada, {colunas})
+        VALUES %s
+    ''', pontuados)
+    cursor.execute('ANALYZE acf_partidas')
+    cursor.execute('ANALYZE acf_pontuados')
+    return len(partidas), len(pontuados)
+
+
+def consulta_antiga_dados(cursor, posicao_id: int, adversario_ids: list, rodada_atual: int):
+    """Passo 2 antigo de /api/modulos/<modulo>/dados (IN nos dois lados de um OR)."""
+    placeholders = ','.join(['%s'] * len(adversario_ids))
+    cursor.execute(f'''
+        SELECT p.clube_id, AVG(p.scout_ds) as avg_ds_cedidos
+        FROM acf_pontuados p
+        JOIN acf_partidas pt ON p.rodada_id = pt.rodada_id
+        WHERE p.posicao_id = %s
+          AND ((pt.clube_casa_id IN ({placeholders}) AND p.clube_id = pt.clube_visitante_id)
+               OR (pt.clube_visitante_id IN ({placeholders}) AND p.clube_id = pt.clube_casa_id))
+          AND p.rodada_id <= %s AND p.entrou_em_campo = TRUE
+        GROUP BY p.clube_id
+    ''', [posicao_id] + adversario_ids + adversario_ids + [rodada_atual - 1])
+    return cursor.fetchall()
+
+
+def consulta_antiga_calculo(cursor, rodada_atual: int):
+    """carregar_cedidos antigo (UNION ALL de mandante e visitante, todas as posições)."""
+    colunas = ', '.join(f'p.scout_{s}' for s in SCOUTS)
+    medias = ', '.join(f'AVG(c.scout_{s})' for s in SCOUTS)
+    cursor.execute(f'''
+        SELECT c.adversario_id, c.posicao_id, {medias}
+        FROM (
+            SELECT pt.clube_casa_id AS adversario_id, p.posicao_id, {colunas}
+            FROM acf_pontuados p
+            JOIN acf_partidas pt ON p.rodada_id = pt.rodada_id AND p.clube_id = pt.clube_visitante_id
+            WHERE p.entrou_em_campo = TRUE AND p.rodada_id <= %s
+            UNION ALL
+            SELECT pt.clube_visitante_id AS adversario_id, p.posicao_id, {colunas}
+            FROM acf_pontuados p
+            JOIN acf_partidas pt ON p.rodada_id = pt.rodada_id AND p.clube_id = pt.clube_casa_id
+            WHERE p.entrou_em_campo = TRUE AND p.rodada_id <= %s
+        ) c
+        GROUP BY c.adversario_id, c.posicao_id
+    ''', (rodada_atual - 1, rodada_atual - 1))
+    return cursor.fetchall()
+
+
+def medir(funcao, repeticoes: int) -> dict:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {'mediana': statistics.median(tempos), 'max': max(tempos)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da matriz de scouts cedidos')
+    parser.add_argument('--clubes', type=int, default=20)
+    parser.add_argument('--rodadas', type=int, default=38)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    schema = f'bench_cedidos_{os.getpid()}'
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'CREATE SCHEMA {schema}')
+        cursor.execute(f'SET search_path TO {schema}')
+        criar_tabelas(cursor)
+        n_partidas, n_pontuados = gerar_temporada(cursor, args.clubes, args.rodadas)
+        conn.commit()
+        print(f"Temporada sintética: {args.clubes} clubes, {args.rodadas} rodadas, "
+              f"{n_partidas} partidas, {n_pontuados} pontuados")
+
+        rodada_atual = args.rodadas + 1
+        adversarios = list(range(1, args.clubes + 1))
+        scouts_cedidos._tabelas_prontas = False  # tabelas no schema temporário
+
+        resultados = {}
+        resultados['antigo: dados (1 posição)'] = medir(
+            lambda: consulta_antiga_dados(cursor, 3, adversarios, rodada_atual), args.repeticoes)
+        resultados['antigo: dados (5 posições)'] = medir(
+            lambda: [consulta_antiga_dados(cursor, p, adversarios, rodada_atual) for p in POSICOES],
+            args.repeticoes)
+        resultados['antigo: carregar_cedidos'] = medir(
+            lambda: consulta_antiga_calculo(cursor, rodada_atual), args.repeticoes)
+
+        inicio = time.perf_counter()
+        scouts_cedidos.montar_matriz_cedidos(conn, TEMPORADA, rodada_atual - 1, forcar=True)
+        montagem_ms = (time.perf_counter() - inicio) * 1000
+
+        def ler_do_banco():
+            scouts_cedidos.invalidar_matriz_cedidos()
+            return scouts_cedidos.matriz_cedidos(conn, TEMPORADA, rodada_atual)
+
+        resultados['matriz: leitura da tabela'] = medir(ler_do_banco, args.repeticoes)
+        resultados['matriz: leitura em memória'] = medir(
+            lambda: scouts_cedidos.matriz_cedidos(conn, TEMPORADA, rodada_atual), args.repeticoes)
+
+        print(f"\nMontagem da matriz (uma vez por rodada): {montagem_ms:.2f} ms\n")
+        print(f"{'Consulta':<32} {'Mediana (ms)':>14} {'Máx (ms)':>10}")
+        print("-" * 58)
+        for nome, tempos in resultados.items():
+            print(f"{nome:<32} {tempos['mediana']:>14.3f} {tempos['max']:>10.3f}")
+    finally:
+        conn.rollback()
+        cursor.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+        scouts_cedidos._tabelas_prontas = False
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do formato de armazenamento dos rankings salvos (acw_rankings_teams.ranking_data)
+
+Compara a lista de dicts (formato antigo) com o formato colunar de
+models/user_rankings.py em tamanho e em tempo de gravação/leitura, usando
+rankings sintéticos com os mesmos campos gerados pelos cálculos em JS.
+
+Sem argumentos mede só a serialização em Python. Com --db, grava os dois
+formatos numa tabela de um schema temporário do PostgreSQL configurado
+(POSTGRES_*) e mede tamanho em disco (pg_column_size) e latência de leitura
+completa e do top-K de poucas colunas.
+
+Uso:
+    python benchmark_rankings.py [--jogadores 20 100 300] [--repeticoes 200] [--db]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# Adicionar diretório ao path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from models.user_rankings import ranking_para_colunas, ranking_de_colunas
+
+COLUNAS_QUENTES = ('atleta_id', 'pontuacao_total', 'preco')
+TOP_K = 5
+
+
+def gerar_ranking(n: int, rnd: random.Random) -> list:
+    """Ranking sintético com os campos de CalculoAtacante (static/js/calculo_atacante.js)."""
+    ranking = []
+    for i in range(n):
+        clube_id = rnd.randint(262, 2305)
+        ranking.append({
+            'atleta_id': rnd.randint(30000, 130000),
+            'apelido': f'Jogador {i}',
+            'clube_id': clube_id,
+            'clube_nome': f'Clube {clube_id}',
+            'clube_abrev': 'CLU',
+            'clube_escudo_url': f'https://s.sde.globo.com/media/organizations/2024/04/{clube_id}_45x45.png',
+            'pontuacao_total': round(rnd.uniform(0, 80), 2),
+            'media': round(rnd.uniform(0, 10), 2),
+            'preco': round(rnd.uniform(1, 25), 2),
+            'jogos': rnd.randint(0, 38),
+            'peso_jogo': round(rnd.uniform(0, 10), 2),
+            'media_ds': round(rnd.uniform(0, 3), 2),
+            'media_ds_cedidos': round(rnd.uniform(0, 3), 2),
+            'media_ff': round(rnd.uniform(0, 2), 2),
+            'media_fs': round(rnd.uniform(0, 2), 2),
+            'media_fd': round(rnd.uniform(0, 2), 2),
+            'media_g': round(rnd.uniform(0, 1), 2),
+            'media_a': round(rnd.uniform(0, 1), 2),
+            'adversario_id': rnd.randint(262, 2305),
+            'adversario_nome': 'Adversário',
+            'peso_escalacao': round(rnd.uniform(1, 3), 4),
+            'foto': f'https://s.sde.globo.com/media/person_role/2024/04/{i}_FORMATO.png',
+            'rank': i + 1,
+        })
+    ranking.sort(key=lambda j: j['pontuacao_total'], reverse=True)
+    return ranking
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """Mediana em microssegundos."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+    return statistics.median(tempos)
+
+
+def benchmark_python(tamanhos, repeticoes: int):
+    rnd = random.Random(42)
+    print(f"{'Jogadores':>9} {'Formato':<8} {'Bytes':>9} {'Gravar (µs)':>12} {'Ler (µs)':>10} {'Top-K (µs)':>11}")
+    print("-" * 64)
+    for n in tamanhos:
+        ranking = gerar_ranking(n, rnd)
+        lista = json.dumps(ranking, ensure_ascii=False)
+        colunar = json.dumps(ranking_para_colunas(ranking), ensure_ascii=False, separators=(',', ':'))
+        assert ranking_de_colunas(json.loads(colunar)) == ranking
+
+        def topk_lista():
+            jogadores = json.loads(lista)[:TOP_K]
+            return {c: [j[c] for j in jogadores] for c in COLUNAS_QUENTES}
+
+        # No banco o recorte é feito antes de trafegar (get_ranking_columns);
+        # aqui só as colunas pedidas são decodificadas
+        colunas_json = {c: json.dumps(ranking_para_colunas(ranking)['colunas'][c]) for c in COLUNAS_QUENTES}
+
+        def topk_colunar():
+            return {c: json.loads(v)[:TOP_K] for c, v in colunas_json.items()}
+
+        linhas = [
+            ('lista', len(lista.encode()),
+             medir(lambda: json.dumps(ranking, ensure_ascii=False), repeticoes),
+             medir(lambda: json.loads(lista), repeticoes),
+             medir(topk_lista, repeticoes)),
+            ('colunar', len(colunar.encode()),
+             medir(lambda: json.dumps(ranking_para_colunas(ranking), ensure_ascii=False, separators=(',', ':')), repeticoes),
+             medir(lambda: ranking_de_colunas(json.loads(colunar)), repeticoes),
+             medir(topk_colunar, repeticoes)),
+        ]
+        for formato, tamanho, gravar, ler, topk in linhas:
+            print(f"{n:>9} {formato:<8} {tamanho:>9} {gravar:>12.1f} {ler:>10.1f} {topk:>11.1f}")
+
+
+def benchmark_banco(tamanhos, repeticoes: int):
+    import psycopg2
+    from database import POSTGRES_CONFIG
+
+    rnd = random.Random(7)
+    schema = f'bench_rankings_{os.getpid()}'
+    conn = psycopg2.connect(**POSTGRES_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'CREATE SCHEMA {schema}')
+        cursor.execute(f'SET search_path TO {schema}')
+        cursor.execute('CREATE TABLE rankings (id SERIAL PRIMARY KEY, formato TEXT, n INTEGER, ranking_data JSONB)')
+        for n in tamanhos:
+            for _ in range(50):
+                ranking = gerar_ranking(n, rnd)
+                cursor.execute('INSERT INTO rankings (formato, n, ranking_data) VALUES (%s, %s, %s)',
+                               ('lista', n, json.dumps(ranking, ensure_ascii=False)))
+                cursor.execute('INSERT INTO rankings (formato, n, ranking_data) VALUES (%s, %s, %s)',
+                               ('colunar', n, json.dumps(ranking_para_colunas(ranking), ensure_ascii=False,
+                                                         separators=(',', ':'))))
+        conn.commit()
+
+        projecao_topk = ', '.join(
+            f"jsonb_path_query_array(ranking_data->'colunas'->'{c}', '$[0 to {TOP_K - 1}]')"
+            for c in COLUNAS_QUENTES
+        )
+        print(f"\n{'Jogadores':>9} {'Formato':<8} {'Disco (B)':>10} {'Ler tudo (ms)':>14} {'Top-K (ms)':>11}")
+        print("-" * 58)
+        for n in tamanhos:
+            for formato in ('lista', 'colunar'):
+                cursor.execute('SELECT AVG(pg_column_size(ranking_data)) FROM rankings WHERE formato = %s AND n = %s',
+                               (formato, n))
+                disco = float(cursor.fetchone()[0])
+                cursor.execute('SELECT id FROM rankings WHERE formato = %s AND n = %s', (formato, n))
+                ids = [row[0] for row in cursor.fetchall()]
+
+                def ler_tudo():
+                    cursor.execute('SELECT ranking_data FROM rankings WHERE id = %s', (rnd.choice(ids),))
+                    dados = cursor.fetchone()[0]
+                    return ranking_de_colunas(dados)
+
+                if formato == 'lista':
+                    def ler_topk():
+                        cursor.execute('SELECT ranking_data FROM rankings WHERE id = %s', (rnd.choice(ids),))
+                        jogadores = cursor.fetchone()[0][:TOP_K]
+                        return {c: [j[c] for j in jogadores] for c in COLUNAS_QUENTES}
+                else:
+                    def ler_topk():
+                        cursor.execute(f'SELECT {projecao_topk} FROM rankings WHERE id = %s', (rnd.choice(ids),))
+                        return dict(zip(COLUNAS_QUENTES, cursor.fetchone()))
+
+                tudo = medir(ler_tudo, repeticoes) / 1000
+                topk = medir(ler_topk, repeticoes) / 1000
+                print(f"{n:>9} {formato:<8} {disco:>10.0f} {tudo:>14.3f} {topk:>11.3f}")
+    finally:
+        conn.rollback()
+        cursor.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do formato dos rankings salvos')
+    parser.add_argument('--jogadores', type=int, nargs='+', default=[20, 100, 300])
+    parser.add_argument('--repeticoes', type=int, default=200)
+    parser.add_argument('--db', action='store_true', help='mede também no PostgreSQL configurado')
+    args = parser.parse_args()
+
+    benchmark_python(args.jogadores, args.repeticoes)
+    if args.db:
+        benchmark_banco(args.jogadores, args.repeticoes)
+
+
+if __name__ == '__main__':
+    main()
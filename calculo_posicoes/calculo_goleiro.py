@@ -22,16 +22,12 @@ from utils.utilidades import get_temporada_atual
 
 
 # Fator de peso para a média
-from utils.weights import get_weight
+from utils.weights import get_weight, pesos_padrao
+from utils.scouts import carregar_agregados_rodada
+from utils.pontuacao import montar_features, pontuar, ranking
 
-DEFAULTS = {
-    'FATOR_MEDIA': 0.2,
-    'FATOR_FF': 4.5,
-    'FATOR_FD': 6.5,
-    'FATOR_SG': 1.5,
-    'FATOR_PESO_JOGO': 1.5,
-    'FATOR_GOL_ADVERSARIO': 2.0,
-}
+# Fatores multiplicadores (padrões centralizados em utils.weights)
+DEFAULTS = pesos_padrao('goleiro')
 
 # Função para carregar pesos dinamicamente
 def _load_weights():
@@ -45,9 +41,10 @@ def _load_weights():
         'FATOR_GOL_ADVERSARIO': float(get_weight('goleiro', 'FATOR_GOL_ADVERSARIO', DEFAULTS['FATOR_GOL_ADVERSARIO']))
     }
 
-def calcular_melhores_goleiros(top_n=10, rodada_atual=5, min_jogos_pref=3, rodada_min_jogos=8, usar_provaveis_cartola=None):
+def calcular_melhores_goleiros(top_n=10, rodada_atual=5, min_jogos_pref=3, rodada_min_jogos=8, usar_provaveis_cartola=None, agregados=None,
+        atletas_linhas=None, pesos=None, salvar=True):
     # Carregar pesos dinamicamente a cada execução
-    weights = _load_weights()
+    weights = pesos if pesos is not None else _load_weights()
     FATOR_MEDIA = weights['FATOR_MEDIA']
     FATOR_FF = weights['FATOR_FF']
     FATOR_FD = weights['FATOR_FD']
@@ -64,14 +61,15 @@ def calcular_melhores_goleiros(top_n=10, rodada_atual=5, min_jogos_pref=3, rodad
     printdbg(f"[PESOS GOLEIRO] FATOR_GOL_ADVERSARIO: {FATOR_GOL_ADVERSARIO} (padrão: {DEFAULTS['FATOR_GOL_ADVERSARIO']})")
     
     # Se não for especificado, usa o valor da configuração global
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Com o snapshot do orquestrador (atletas, agregados e pesos) e salvar=False, não usa o banco
+    conn = get_db_connection() if atletas_linhas is None or agregados is None or salvar else None
+    cursor = conn.cursor() if conn else None
 
     # Define minimum games based on round
     min_jogos = min_jogos_pref if rodada_atual >= rodada_min_jogos else 1
 
     # Filtrar goleiro (posicao_id = 1) com jogos
-    if usar_provaveis_cartola:
+    if atletas_linhas is None and usar_provaveis_cartola:
         # Usando dados da nova API de prováveis
         printdbg("Usando dados da API de prováveis para jogadores prováveis")
         cursor.execute('''
@@ -82,7 +80,7 @@ def calcular_melhores_goleiros(top_n=10, rodada_atual=5, min_jogos_pref=3, rodad
             JOIN provaveis_cartola p ON a.atleta_id = p.atleta_id
             WHERE a.posicao_id = 1 AND a.jogos_num >= %s AND p.status = 'provavel' AND a.temporada = %s
         ''', (min_jogos, get_temporada_atual()))
-    else:
+    elif atletas_linhas is None:
         # Usando dados do Cartola para jogadores prováveis (status_id = 7)
         printdbg("Usando dados do Cartola para jogadores prováveis")
         cursor.execute('''
@@ -92,147 +90,41 @@ def calcular_melhores_goleiros(top_n=10, rodada_atual=5, min_jogos_pref=3, rodad
             JOIN acf_clubes c ON a.clube_id = c.id
             WHERE a.posicao_id = 1 AND a.jogos_num >= %s AND a.status_id = 7 AND a.temporada = %s
         ''', (min_jogos, get_temporada_atual()))
-    goleiros = cursor.fetchall()
+    goleiros = cursor.fetchall() if atletas_linhas is None else list(atletas_linhas)
 
     printdbg(f"Total de goleiros encontrados: {len(goleiros)}")
 
-    # Buscar peso_jogo e peso_sg das tabelas de perfis (usando perfil padrão 1 e 2)
-    # Como não temos perfil do usuário aqui, vamos usar os perfis padrão
-    perfil_peso_jogo_padrao = 1
-    perfil_peso_sg_padrao = 2
-    
-    # Coletar todos os clube_ids únicos
-    clube_ids = list(set([g[2] for g in goleiros]))
-    peso_jogo_dict = {}
-    peso_sg_dict = {}
-    
-    if clube_ids:
-        placeholders = ','.join(['%s'] * len(clube_ids))
-        # Buscar peso_jogo
-        try:
-            cursor.execute(f'''
-                SELECT clube_id, peso_jogo
-                FROM acp_peso_jogo_perfis
-                WHERE perfil_id = %s AND rodada_atual = %s AND clube_id IN ({placeholders})
-            ''', [perfil_peso_jogo_padrao, rodada_atual] + clube_ids)
-            for row in cursor.fetchall():
-                if row and len(row) >= 2:
-                    clube_id, peso_jogo = row
-                    peso_jogo_dict[clube_id] = float(peso_jogo) if peso_jogo else 0
-        except Exception as e:
-            printdbg(f"Erro ao buscar peso_jogo: {e}")
-        
-        # Buscar peso_sg
-        try:
-            cursor.execute(f'''
-                SELECT clube_id, peso_sg
-                FROM acp_peso_sg_perfis
-                WHERE perfil_id = %s AND rodada_atual = %s AND clube_id IN ({placeholders})
-            ''', [perfil_peso_sg_padrao, rodada_atual] + clube_ids)
-            for row in cursor.fetchall():
-                if row and len(row) >= 2:
-                    clube_id, peso_sg = row
-                    peso_sg_dict[clube_id] = float(peso_sg) if peso_sg else 0
-        except Exception as e:
-            printdbg(f"Erro ao buscar peso_sg: {e}")
-
-    # Calcular pontuação total
-    resultados = []
-    for goleiro in goleiros:
-        atleta_id, apelido, clube_id, pontos, media, preco, jogos, clube_nome = goleiro
-        peso_jogo = peso_jogo_dict.get(clube_id, 0)
-        peso_sg = peso_sg_dict.get(clube_id, 0)
-
-        printdbg(f"\nProcessando goleiro: {apelido} (ID: {atleta_id}, Clube: {clube_nome})")
-        printdbg(f"  Média: {media:.2f}, Peso Jogo (original): {peso_jogo if peso_jogo is not None else 'N/A'}, "
-                 f"Peso SG: {peso_sg if peso_sg is not None else 'N/A'}")
-
-        # Fator 1: Média do jogador
-        pontos_media = media * FATOR_MEDIA
-        printdbg(f"  Pontos Média: {pontos_media:.2f}")
-
-        # Default values if weights are missing
-        peso_sg = peso_sg if peso_sg is not None else 0
-        peso_jogo_original = peso_jogo
-
-        # Encontrar o adversário na rodada atual
-        cursor.execute('''
-            SELECT p.clube_casa_id, p.clube_visitante_id
-            FROM acf_partidas p
-            WHERE p.rodada_id = %s AND p.valida = TRUE AND 
-                  (p.clube_casa_id = %s OR p.clube_visitante_id = %s)
-        ''', (rodada_atual, clube_id, clube_id))
-        partida = cursor.fetchone()
+    # Agregações da rodada (confrontos, finalizações e gols por clube, perfis) carregadas em lote
+    if agregados is None:
+        agregados = carregar_agregados_rodada(cursor, rodada_atual)
 
-        peso_finalizacoes = 0
-        media_gols_adversario = 0
-        if partida:
-            clube_casa_id, clube_visitante_id = partida
-            adversario_id = clube_visitante_id if clube_id == clube_casa_id else clube_casa_id
-            printdbg(f"  Partida encontrada: Clube {clube_nome} vs Adversário ID {adversario_id}")
-
-            peso_jogo = peso_jogo_original * FATOR_PESO_JOGO
-
-            # Calcular finalizações esperadas do adversário (média das últimas rodadas)
-            cursor.execute('''
-                SELECT AVG(p.scout_ff), AVG(p.scout_fd)
-                FROM acf_pontuados p
-                WHERE p.clube_id = %s AND p.rodada_id <= %s AND p.entrou_em_campo = TRUE
-            ''', (adversario_id, rodada_atual - 1))
-            ff_avg, fd_avg = cursor.fetchone()
-            ff_avg = float(ff_avg) if ff_avg is not None else 0.0
-            fd_avg = float(fd_avg) if fd_avg is not None else 0.0
-
-            peso_finalizacoes = (ff_avg * FATOR_FF) + (fd_avg * FATOR_FD)
-            printdbg(f"  Finalizações Adversário: FF_avg={ff_avg:.2f} * {FATOR_FF} + "
-                     f"FD_avg={fd_avg:.2f} * {FATOR_FD} = {peso_finalizacoes:.2f}")
-
-            # Calcular média de gols do adversário usando a tabela de partidas
-            cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN p.clube_casa_id = %s THEN p.placar_oficial_mandante ELSE 0 END) +
-                    SUM(CASE WHEN p.clube_visitante_id = %s THEN p.placar_oficial_visitante ELSE 0 END) AS gols_marcados,
-                    COUNT(*) AS jogos
-                FROM acf_partidas p
-                WHERE (p.clube_casa_id = %s OR p.clube_visitante_id = %s) 
-                  AND p.rodada_id < %s AND p.valida = TRUE 
-                  AND p.placar_oficial_mandante IS NOT NULL AND p.placar_oficial_visitante IS NOT NULL
-            ''', (adversario_id, adversario_id, adversario_id, adversario_id, rodada_atual))
-            result = cursor.fetchone()
-            if result and result[1] > 0:
-                gols_marcados, jogos = result
-                media_gols_adversario = float(gols_marcados) / float(jogos)
-                printdbg(f"  Média de Gols Adversário (partidas): {gols_marcados}/{jogos} = {media_gols_adversario:.2f}")
-            else:
-                printdbg(f"  Sem dados de gols para o adversário ID {adversario_id} nas partidas. Usando 0.")
-        else:
-            printdbg("  Nenhuma partida encontrada para este goleiro na rodada atual. Usando valores padrão.")
-            peso_jogo = 0
-
-        # Calcular pontuação total
-        base_pontuacao = pontos_media + peso_jogo + peso_finalizacoes - (media_gols_adversario * FATOR_GOL_ADVERSARIO)
-        pontuacao_total = base_pontuacao * (FATOR_SG + peso_sg)
-        printdbg(f"  Cálculo: (({pontos_media:.2f} (média) + {peso_jogo:.2f} (jogo) + "
-                 f"{peso_finalizacoes:.2f} (finalizações) - {media_gols_adversario:.2f} (gols adversário) * {FATOR_GOL_ADVERSARIO}) * "
-                 f"({FATOR_SG} + {peso_sg:.2f} (SG)) = {pontuacao_total:.2f}")
-
-        resultados.append({
-            'atleta_id': atleta_id,
-            'apelido': apelido,
-            'clube_id': clube_id,
-            'clube_nome': clube_nome,
-            'pontuacao_total': pontuacao_total,
-            'media': media,
-            'preco': preco,
-            'jogos': jogos,
-            'peso_jogo': peso_jogo,
-            'peso_sg': peso_sg,
-            'peso_finalizacoes': peso_finalizacoes,
-            'media_gols_adversario': media_gols_adversario
-        })
+    # Pontuação vetorizada de todos os goleiros de uma vez (utils.pontuacao)
+    atletas = [
+        {'atleta_id': g[0], 'apelido': g[1], 'clube_id': g[2], 'media': g[4], 'preco': g[5],
+         'jogos': g[6], 'clube_nome': g[7]}
+        for g in goleiros
+    ]
+    features = montar_features(1, atletas, agregados)
+    calculo = pontuar('goleiro', features, weights)
 
     # Ordenar por pontuação total e pegar os top N
-    melhores = sorted(resultados, key=lambda x: x['pontuacao_total'], reverse=True)[:top_n]
+    melhores = []
+    for i in ranking(calculo['pontuacao_total'], top_n):
+        atleta = atletas[i]
+        melhores.append({
+            'atleta_id': atleta['atleta_id'],
+            'apelido': atleta['apelido'],
+            'clube_id': atleta['clube_id'],
+            'clube_nome': atleta['clube_nome'],
+            'pontuacao_total': float(calculo['pontuacao_total'][i]),
+            'media': atleta['media'],
+            'preco': atleta['preco'],
+            'jogos': atleta['jogos'],
+            'peso_jogo': float(calculo['peso_jogo'][i]),
+            'peso_sg': float(calculo['peso_sg'][i]),
+            'peso_finalizacoes': float(calculo['peso_finalizacoes'][i]),
+            'media_gols_adversario': float(calculo['media_gols_adversario'][i])
+        })
 
     # Imprimir resultados detalhados
     print("\nMelhores Goleiros:")
@@ -247,12 +139,14 @@ def calcular_melhores_goleiros(top_n=10, rodada_atual=5, min_jogos_pref=3, rodad
               f"{goleiro['peso_finalizacoes']:<12.2f} {goleiro['media_gols_adversario']:<12.2f}")
     print("-" * 100)
 
-    # Salvar na tabela ranking_por_posicao
-    from main import update_ranking_por_posicao
-    update_ranking_por_posicao(conn, melhores, 1, rodada_atual)
-    printdbg(f"Ranking de goleiros salvo na tabela ranking_por_posicao")
+    # Salvar na tabela ranking_por_posicao (o orquestrador grava todas as posições de uma vez)
+    if salvar:
+        from main import update_ranking_por_posicao
+        update_ranking_por_posicao(conn, melhores, 1, rodada_atual)
+        printdbg(f"Ranking de goleiros salvo na tabela ranking_por_posicao")
     
-    close_db_connection(conn)
+    if conn:
+        close_db_connection(conn)
     return melhores
 
 def main():
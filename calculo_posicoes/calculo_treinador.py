@@ -3,148 +3,78 @@ from utils.utilidades import printdbg
 import math
 from api_cartola import fetch_status_data
 from utils.utilidades import get_temporada_atual
-from utils.weights import get_weight
+from utils.weights import get_weight, pesos_padrao
+from utils.scouts import carregar_agregados_rodada
+from utils.pontuacao import montar_features, pontuar, ranking
+
+# Fatores multiplicadores (padrões centralizados em utils.weights)
+DEFAULTS = pesos_padrao('treinador')
 
 # Função para carregar pesos dinamicamente
 def _load_weights():
     """Carrega os pesos do banco de dados a cada execução."""
     return {
-        'FATOR_PESO_JOGO': float(get_weight('treinador', 'FATOR_PESO_JOGO', 1.0))
+        'FATOR_PESO_JOGO': float(get_weight('treinador', 'FATOR_PESO_JOGO', DEFAULTS['FATOR_PESO_JOGO']))
     }
 
 
-def calcular_melhores_treinadores(rodada_atual, top_n=100, usar_provaveis_cartola=None):
+def calcular_melhores_treinadores(rodada_atual, top_n=100, usar_provaveis_cartola=None, agregados=None,
+        atletas_linhas=None, pesos=None, salvar=True):
     # Carregar pesos dinamicamente a cada execução
-    weights = _load_weights()
+    weights = pesos if pesos is not None else _load_weights()
     FATOR_PESO_JOGO = weights['FATOR_PESO_JOGO']
     
     # Log dos pesos carregados
-    printdbg(f"[PESOS TREINADOR] FATOR_PESO_JOGO: {FATOR_PESO_JOGO} (padrão: 1.0)")
+    printdbg(f"[PESOS TREINADOR] FATOR_PESO_JOGO: {FATOR_PESO_JOGO} (padrão: {DEFAULTS['FATOR_PESO_JOGO']})")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Com o snapshot do orquestrador (atletas, agregados e pesos) e salvar=False, não usa o banco
+    conn = get_db_connection() if atletas_linhas is None or agregados is None or salvar else None
+    cursor = conn.cursor() if conn else None
 
     # Filtrar treinadores (posicao_id = 6) com jogos e status Provável, obtendo nome do clube
     # NOTA: Para técnicos, sempre usamos status_id = 7 (Cartola) pois a API provaveis_cartola não tem dados de técnicos
-    cursor.execute('''
-        SELECT a.atleta_id, a.apelido, c.nome, a.pontos_num, a.media_num, a.preco_num, a.jogos_num, 
-               a.clube_id
-        FROM acf_atletas a
-        JOIN acf_clubes c ON a.clube_id = c.id
-        WHERE a.posicao_id = 6 AND a.jogos_num > 0 AND a.status_id = 7 AND a.temporada = %s
-    ''', (get_temporada_atual(),))
-    treinadores = cursor.fetchall()
-
-    printdbg(f"Total de treinadores encontrados: {len(treinadores)}")
-
-    # Buscar peso_jogo e peso_sg das tabelas de perfis (usando perfil padrão 1 e 2)
-    perfil_peso_jogo_padrao = 1
-    perfil_peso_sg_padrao = 2
-    
-    # Coletar todos os clube_ids únicos
-    clube_ids = list(set([t[7] for t in treinadores]))
-    peso_jogo_dict = {}
-    peso_sg_dict = {}
-    
-    if clube_ids:
-        placeholders = ','.join(['%s'] * len(clube_ids))
-        # Buscar peso_jogo
-        try:
-            cursor.execute(f'''
-                SELECT clube_id, peso_jogo
-                FROM acp_peso_jogo_perfis
-                WHERE perfil_id = %s AND rodada_atual = %s AND clube_id IN ({placeholders})
-            ''', [perfil_peso_jogo_padrao, rodada_atual] + clube_ids)
-            for row in cursor.fetchall():
-                if row and len(row) >= 2:
-                    clube_id, peso_jogo = row
-                    peso_jogo_dict[clube_id] = float(peso_jogo) if peso_jogo else 0
-        except Exception as e:
-            printdbg(f"Erro ao buscar peso_jogo: {e}")
-        
-        # Buscar peso_sg
-        try:
-            cursor.execute(f'''
-                SELECT clube_id, peso_sg
-                FROM acp_peso_sg_perfis
-                WHERE perfil_id = %s AND rodada_atual = %s AND clube_id IN ({placeholders})
-            ''', [perfil_peso_sg_padrao, rodada_atual] + clube_ids)
-            for row in cursor.fetchall():
-                if row and len(row) >= 2:
-                    clube_id, peso_sg = row
-                    peso_sg_dict[clube_id] = float(peso_sg) if peso_sg else 0
-        except Exception as e:
-            printdbg(f"Erro ao buscar peso_sg: {e}")
-
-    # Calcular pontuação total
-    resultados = []
-    for treinador in treinadores:
-        atleta_id, apelido, clube_nome, pontos, media, preco, jogos, clube_id = treinador
-        peso_jogo = peso_jogo_dict.get(clube_id, 0)
-        peso_sg = peso_sg_dict.get(clube_id, 0)
-
-        printdbg(f"\nProcessando treinador: {apelido} (ID: {atleta_id}, Clube: {clube_nome})")
-        printdbg(f"  Peso Jogo (original): {peso_jogo if peso_jogo is not None else 'N/A'}")
-        printdbg(f"  Peso SG: {peso_sg if peso_sg is not None else 'N/A'}")
-
-        # Default values if weights are missing
-        peso_sg = peso_sg if peso_sg is not None else 0
-
-        # Encontrar o adversário na rodada atual
+    if atletas_linhas is None:
         cursor.execute('''
-            SELECT p.clube_casa_id, p.clube_visitante_id
-            FROM acf_partidas p
-            WHERE p.rodada_id = %s AND p.valida = TRUE AND 
-                  (p.clube_casa_id = %s OR p.clube_visitante_id = %s)
-        ''', (rodada_atual, clube_id, clube_id))
-        partida = cursor.fetchone()
-
-        peso_sg_adversario = 0
-        if partida:
-            clube_casa_id, clube_visitante_id = partida
-            adversario_id = clube_visitante_id if clube_id == clube_casa_id else clube_casa_id
-            printdbg(f"  Partida encontrada: Clube {clube_nome} vs Adversário ID {adversario_id}")
+            SELECT a.atleta_id, a.apelido, a.clube_id, a.pontos_num, a.media_num, a.preco_num, a.jogos_num,
+                   c.nome
+            FROM acf_atletas a
+            JOIN acf_clubes c ON a.clube_id = c.id
+            WHERE a.posicao_id = 6 AND a.jogos_num > 0 AND a.status_id = 7 AND a.temporada = %s
+        ''', (get_temporada_atual(),))
+    treinadores = cursor.fetchall() if atletas_linhas is None else list(atletas_linhas)
 
-            # Obter peso_sg do adversário da tabela de perfis
-            try:
-                cursor.execute('''
-                    SELECT peso_sg
-                    FROM acp_peso_sg_perfis
-                    WHERE perfil_id = %s AND rodada_atual = %s AND clube_id = %s
-                ''', (perfil_peso_sg_padrao, rodada_atual, adversario_id))
-                peso_sg_adversario_result = cursor.fetchone()
-                if peso_sg_adversario_result:
-                    peso_sg_adversario = float(peso_sg_adversario_result[0]) if peso_sg_adversario_result[0] is not None else 0.0
-                else:
-                    peso_sg_adversario = 0.0
-                printdbg(f"  Peso SG Adversário: {peso_sg_adversario:.2f}")
-            except Exception as e:
-                printdbg(f"  Erro ao buscar peso_sg do adversário: {e}")
-                peso_sg_adversario = 0.0
-        else:
-            printdbg("  Nenhuma partida encontrada para este treinador na rodada atual. Usando peso_sg_adversario = 0.")
-            peso_jogo = 0
+    printdbg(f"Total de treinadores encontrados: {len(treinadores)}")
 
-        # Calcular pontuação total (apenas peso de jogo)
-        pontuacao_total = peso_jogo * FATOR_PESO_JOGO
-        printdbg(f"  Cálculo: {peso_jogo:.2f} * {FATOR_PESO_JOGO:.2f} = {pontuacao_total:.2f}")
+    # Agregações da rodada (confrontos e perfis padrão 1 e 2) carregadas em lote
+    if agregados is None:
+        agregados = carregar_agregados_rodada(cursor, rodada_atual)
 
-        resultados.append({
-            'atleta_id': atleta_id,
-            'apelido': apelido,
-            'clube_nome': clube_nome,
-            'clube_id': clube_id,  # Adicionado para compatibilidade com update_ranking_por_posicao
-            'pontuacao_total': pontuacao_total,
-            'media': media,
-            'preco': preco,
-            'jogos': jogos,
-            'peso_jogo': peso_jogo,
-            'peso_sg': peso_sg,
-            'peso_sg_adversario': peso_sg_adversario
-        })
+    # Pontuação vetorizada de todos os treinadores de uma vez (utils.pontuacao)
+    atletas = [
+        {'atleta_id': t[0], 'apelido': t[1], 'clube_id': t[2], 'media': t[4], 'preco': t[5],
+         'jogos': t[6], 'clube_nome': t[7]}
+        for t in treinadores
+    ]
+    features = montar_features(6, atletas, agregados)
+    calculo = pontuar('treinador', features, weights)
 
     # Ordenar por pontuação total e pegar os top N
-    melhores = sorted(resultados, key=lambda x: x['pontuacao_total'], reverse=True)[:top_n]
+    melhores = []
+    for i in ranking(calculo['pontuacao_total'], top_n):
+        atleta = atletas[i]
+        melhores.append({
+            'atleta_id': atleta['atleta_id'],
+            'apelido': atleta['apelido'],
+            'clube_nome': atleta['clube_nome'],
+            'clube_id': atleta['clube_id'],
+            'pontuacao_total': float(calculo['pontuacao_total'][i]),
+            'media': atleta['media'],
+            'preco': atleta['preco'],
+            'jogos': atleta['jogos'],
+            'peso_jogo': float(calculo['peso_jogo'][i]),
+            'peso_sg': float(calculo['peso_sg'][i]),
+            'peso_sg_adversario': float(calculo['peso_sg_adversario'][i])
+        })
 
     # Imprimir resultados detalhados
     print("\nMelhores Treinadores (Ordenados por Peso de Jogo):")
@@ -155,12 +85,14 @@ def calcular_melhores_treinadores(rodada_atual, top_n=100, usar_provaveis_cartol
         print(f"{treinador['apelido']:<20} {treinador['atleta_id']:<10} {treinador['clube_nome']:<20} {treinador['pontuacao_total']:<12.2f} {treinador['peso_jogo']:<12.2f}")
     print("-" * 70)
 
-    # Salvar na tabela ranking_por_posicao
-    from main import update_ranking_por_posicao
-    update_ranking_por_posicao(conn, melhores, 6, rodada_atual)
-    printdbg(f"Ranking de treinadores salvo na tabela ranking_por_posicao")
+    # Salvar na tabela ranking_por_posicao (o orquestrador grava todas as posições de uma vez)
+    if salvar:
+        from main import update_ranking_por_posicao
+        update_ranking_por_posicao(conn, melhores, 6, rodada_atual)
+        printdbg(f"Ranking de treinadores salvo na tabela ranking_por_posicao")
     
-    close_db_connection(conn)
+    if conn:
+        close_db_connection(conn)
     return melhores
 
 def main():
@@ -0,0 +1,236 @@
+"""
+Recálculo das seis posições em paralelo a partir de um snapshot único da rodada.
+
+Antes cada calcular_melhores_* abria a própria conexão, buscava seus atletas, as
+agregações da rodada e os pesos, e gravava seu ranking, uma posição depois da outra.
+Aqui:
+
+1. o processo principal monta o snapshot uma vez: atletas de todas as posições
+   (uma query), agregados da rodada (utils.scouts.carregar_agregados_rodada, com o
+   RoundSnapshot de utils.rodada_snapshot) e os pesos de cada posição;
+2. as seis posições rodam num pool de processos (ORQUESTRADOR_PROCESSOS); os
+   agregados vão para cada processo uma vez só (initializer), e as posições recebem
+   só as próprias linhas, sem tocar no banco (salvar=False);
+3. os rankings são gravados em ranking_por_posicao numa única transação.
+
+O tempo total tende ao da posição mais lenta em vez da soma das seis.
+
+Uso: python calculo_posicoes/orquestrador.py [--sequencial]
+"""
+
+import importlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Ensure project root is on sys.path when running this file directly
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+from psycopg2.extras import execute_values
+
+from database import get_db_connection, close_db_connection
+from utils.utilidades import printdbg, get_temporada_atual
+from utils.scouts import carregar_agregados_rodada
+
+ORQUESTRADOR_PROCESSOS = int(os.getenv('ORQUESTRADOR_PROCESSOS', '6'))
+
+# posicao_id -> (módulo, função, parâmetros usados pelo main() de cada módulo)
+POSICOES = {
+    1: ('calculo_posicoes.calculo_goleiro', 'calcular_melhores_goleiros',
+        {'top_n': 20, 'usar_provaveis_cartola': True}),
+    2: ('calculo_posicoes.calculo_lateral', 'calcular_melhores_laterais',
+        {'top_n': 20, 'usar_provaveis_cartola': False}),
+    3: ('calculo_posicoes.calculo_zagueiro', 'calcular_melhores_zagueiros',
+        {'top_n': 20, 'usar_provaveis_cartola': False}),
+    4: ('calculo_posicoes.calculo_meia', 'calcular_melhores_meias',
+        {'top_n': 20, 'usar_provaveis_cartola': False}),
+    5: ('calculo_posicoes.calculo_atacante', 'calcular_melhores_atacantes',
+        {'top_n': 20, 'min_jogos_pref': 2, 'usar_provaveis_cartola': False}),
+    6: ('calculo_posicoes.calculo_treinador', 'calcular_melhores_treinadores', {}),
+}
+# Posições cujas queries trazem a.peso_jogo antes do nome do clube
+POSICOES_COM_PESO_JOGO = (4, 5)
+# Padrões de min_jogos_pref/rodada_min_jogos dos calcular_melhores_* (treinador: jogos > 0)
+MIN_JOGOS_PREF = 3
+RODADA_MIN_JOGOS = 8
+
+# Agregados da rodada no processo do pool (definidos uma vez pelo initializer)
+_agregados_processo = None
+
+
+def carregar_snapshot(conn, rodada_atual, perfil_peso_jogo=1, perfil_peso_sg=2):
+    """Atletas de todas as posições (uma query), agregados da rodada e pesos por posição.
+
+    Confrontos, clubes, destaques, perfis e prováveis vêm do RoundSnapshot da rodada
+    (agregados['snapshot']); os perfis de peso de jogo/SG são os dos agregados.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT a.posicao_id, a.atleta_id, a.apelido, a.clube_id, a.pontos_num, a.media_num,
+               a.preco_num, a.jogos_num, a.peso_jogo, c.nome, a.status_id
+        FROM acf_atletas a
+        JOIN acf_clubes c ON a.clube_id = c.id
+        WHERE a.posicao_id = ANY(%s) AND a.jogos_num > 0 AND a.temporada = %s
+    ''', (list(POSICOES), get_temporada_atual()))
+    atletas = cursor.fetchall()
+
+    pesos = {
+        posicao_id: importlib.import_module(modulo)._load_weights()
+        for posicao_id, (modulo, _, _) in POSICOES.items()
+    }
+    return {
+        'rodada_atual': rodada_atual,
+        'atletas': atletas,
+        'agregados': carregar_agregados_rodada(cursor, rodada_atual, perfil_peso_jogo, perfil_peso_sg),
+        'pesos': pesos,
+    }
+
+
+def linhas_posicao(snapshot, posicao_id):
+    """Linhas no formato dos calcular_melhores_*, com os mesmos filtros das queries deles"""
+    _, _, parametros = POSICOES[posicao_id]
+    if posicao_id == 6:
+        min_jogos, usar_provaveis = 1, False
+    else:
+        min_jogos = (parametros.get('min_jogos_pref', MIN_JOGOS_PREF)
+                     if snapshot['rodada_atual'] >= RODADA_MIN_JOGOS else 1)
+        usar_provaveis = parametros.get('usar_provaveis_cartola')
+    provaveis = snapshot['agregados']['snapshot'].provaveis
+    colunas = (1, 2, 3, 4, 5, 6, 7, 8, 9) if posicao_id in POSICOES_COM_PESO_JOGO else (1, 2, 3, 4, 5, 6, 7, 9)
+    return [
+        tuple(linha[i] for i in colunas)
+        for linha in snapshot['atletas']
+        if linha[0] == posicao_id and linha[7] >= min_jogos
+        and (linha[1] in provaveis if usar_provaveis else linha[10] == 7)
+    ]
+
+
+def _inicializar_processo(agregados):
+    global _agregados_processo
+    _agregados_processo = agregados
+
+
+def _calcular_posicao(posicao_id, rodada_atual, linhas, pesos, agregados=None):
+    modulo, funcao, parametros = POSICOES[posicao_id]
+    inicio = time.perf_counter()
+    melhores = getattr(importlib.import_module(modulo), funcao)(
+        rodada_atual=rodada_atual,
+        agregados=agregados if agregados is not None else _agregados_processo,
+        atletas_linhas=linhas,
+        pesos=pesos,
+        salvar=False,
+        **parametros
+    )
+    return posicao_id, melhores, time.perf_counter() - inicio
+
+
+def salvar_rankings(conn, rankings, rodada_atual):
+    """Grava os rankings de todas as posições em ranking_por_posicao numa transação"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            DELETE FROM ranking_por_posicao
+            WHERE rodada_atual = %s AND posicao_id = ANY(%s)
+        ''', (rodada_atual, list(rankings)))
+        execute_values(cursor, '''
+            INSERT INTO ranking_por_posicao (atleta_id, apelido, clube_id, pontuacao_total, posicao_id, rodada_atual)
+            VALUES %s
+        ''', [
+            (j['atleta_id'], j['apelido'], j['clube_id'], j['pontuacao_total'], posicao_id, rodada_atual)
+            for posicao_id, melhores in rankings.items()
+            for j in melhores
+        ])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def calcular_posicoes(conn, rodada_atual, posicao_ids, pesos=None, perfil_peso_jogo=1, perfil_peso_sg=2):
+    """Rankings de algumas posições, na sequência e sem gravar ({posicao_id: melhores}).
+
+    Usado para os rankings de um time (pesos e perfis da configuração dele).
+    pesos: {posicao_id: pesos}; posições ausentes usam os pesos globais.
+    """
+    snapshot = carregar_snapshot(conn, rodada_atual, perfil_peso_jogo, perfil_peso_sg)
+    pesos = pesos or {}
+    return {
+        posicao_id: _calcular_posicao(posicao_id, rodada_atual, linhas_posicao(snapshot, posicao_id),
+                                      pesos.get(posicao_id, snapshot['pesos'][posicao_id]),
+                                      agregados=snapshot['agregados'])[1]
+        for posicao_id in posicao_ids
+    }
+
+
+def calcular_todas_posicoes(rodada_atual, processos=None, salvar=True):
+    """Calcula as seis posições em paralelo e grava tudo de uma vez.
+
+    Retorna {'rankings': {posicao_id: melhores}, 'tempos': {posicao_id: s}, 'snapshot_s', 'total_s'}.
+    processos=1 roda na sequência, no próprio processo (mesmo snapshot).
+    """
+    processos = ORQUESTRADOR_PROCESSOS if processos is None else processos
+    inicio = time.perf_counter()
+
+    conn = get_db_connection()
+    try:
+        snapshot = carregar_snapshot(conn, rodada_atual)
+    finally:
+        close_db_connection(conn)
+    snapshot_s = time.perf_counter() - inicio
+
+    tarefas = [
+        (posicao_id, rodada_atual, linhas_posicao(snapshot, posicao_id), snapshot['pesos'][posicao_id])
+        for posicao_id in POSICOES
+    ]
+    if processos <= 1:
+        resultados = [_calcular_posicao(*tarefa, agregados=snapshot['agregados']) for tarefa in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(tarefas)),
+                                 initializer=_inicializar_processo,
+                                 initargs=(snapshot['agregados'],)) as pool:
+            futuros = [pool.submit(_calcular_posicao, *tarefa) for tarefa in tarefas]
+            resultados = [futuro.result() for futuro in futuros]
+
+    rankings = {posicao_id: melhores for posicao_id, melhores, _ in resultados}
+    tempos = {posicao_id: tempo for posicao_id, _, tempo in resultados}
+
+    if salvar:
+        conn = get_db_connection()
+        try:
+            salvar_rankings(conn, rankings, rodada_atual)
+        finally:
+            close_db_connection(conn)
+        printdbg(f"Rankings das {len(rankings)} posições salvos em ranking_por_posicao")
+
+    return {
+        'rankings': rankings,
+        'tempos': tempos,
+        'snapshot_s': snapshot_s,
+        'total_s': time.perf_counter() - inicio,
+    }
+
+
+def main():
+    from api_cartola import fetch_status_data
+
+    status_data = fetch_status_data()
+    if not status_data:
+        printdbg("Erro ao obter dados de status.")
+        return
+    rodada_atual = status_data['rodada_atual']
+
+    resultado = calcular_todas_posicoes(rodada_atual, processos=1 if '--sequencial' in sys.argv else None)
+    print(f"\nSnapshot: {resultado['snapshot_s']:.2f}s")
+    for posicao_id, tempo in sorted(resultado['tempos'].items()):
+        print(f"  {POSICOES[posicao_id][1]:<32} {tempo:.2f}s ({len(resultado['rankings'][posicao_id])} atletas)")
+    print(f"Total: {resultado['total_s']:.2f}s "
+          f"(posição mais lenta: {max(resultado['tempos'].values()):.2f}s, "
+          f"soma das posições: {sum(resultado['tempos'].values()):.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
 import os
+import threading
+import time
 
 # Configurações do PostgreSQL - OBRIGATÓRIO usar variáveis de ambiente
 POSTGRES_CONFIG = {
@@ -17,23 +20,258 @@ missing_vars = [var for var in required_vars if not os.getenv(var)]
 if missing_vars:
     raise ValueError(f"Variáveis de ambiente obrigatórias não definidas: {', '.join(missing_vars)}")
 
-def get_db_connection():
-    """Conecta ao banco de dados PostgreSQL"""
+# Pool de conexões (por processo/worker do gunicorn)
+POOL_ENABLED = os.getenv('DB_POOL_ENABLED', '1') != '0'
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX', '10'))
+POOL_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+POOL_HEALTHCHECK_SECONDS = float(os.getenv('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+_pool_lock = threading.Lock()
+_pool_pid = None
+_pool_slots = None
+_idle = []  # [(conn, momento_devolucao)] conexões ociosas, a mais recente no fim
+_in_use = set()
+_metrics = {
+    'checkouts': 0,
+    'checkins': 0,
+    'created': 0,
+    'discarded': 0,
+    'health_checks': 0,
+    'health_failures': 0,
+    'timeouts': 0,
+    'errors': 0,
+    'request_reuses': 0,
+}
+
+
+class _PoolConnection(extensions.connection):
+    """Conexão marcada com o pid do processo que a abriu (ver _checkin)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pid = os.getpid()
+
+
+def _new_connection():
+    conn = psycopg2.connect(connection_factory=_PoolConnection, **POSTGRES_CONFIG)
+    conn.autocommit = False
+    _metrics['created'] += 1
+    return conn
+
+
+def _ensure_pool():
+    """Inicializa o pool do processo atual.
+
+    Após um fork (workers do gunicorn) as conexões herdadas são apenas esquecidas:
+    fechá-las no filho encerraria a sessão que ainda pertence ao processo pai.
+    """
+    global _pool_pid, _pool_slots, _idle, _in_use
+    pid = os.getpid()
+    if _pool_pid == pid:
+        return
+    with _pool_lock:
+        if _pool_pid == pid:
+            return
+        _idle = []
+        _in_use = set()
+        _pool_slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+        _pool_pid = pid
+        for _ in range(POOL_MIN_SIZE):
+            try:
+                _idle.append((_new_connection(), time.monotonic()))
+            except psycopg2.Error as e:
+                print(f"Erro ao pré-aquecer pool do PostgreSQL: {e}")
+                break
+
+
+def _discard(conn):
+    _metrics['discarded'] += 1
     try:
-        conn = psycopg2.connect(**POSTGRES_CONFIG)
-        conn.autocommit = False
-        return conn
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+
+def _is_healthy(conn, devolvida_em):
+    """Valida a conexão antes de entregá-la (as ociosas há muito tempo fazem SELECT 1)."""
+    if conn.closed:
+        return False
+    if time.monotonic() - devolvida_em < POOL_HEALTHCHECK_SECONDS:
+        return True
+    _metrics['health_checks'] += 1
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        _metrics['health_failures'] += 1
+        return False
+
+
+def _checkout():
+    _ensure_pool()
+    if not _pool_slots.acquire(timeout=POOL_TIMEOUT_SECONDS):
+        _metrics['timeouts'] += 1
+        print(f"Pool do PostgreSQL esgotado ({POOL_MAX_SIZE} conexões em uso)")
+        return None
+    try:
+        while True:
+            with _pool_lock:
+                item = _idle.pop() if _idle else None
+            if item is None:
+                conn = _new_connection()
+                break
+            conn, devolvida_em = item
+            if _is_healthy(conn, devolvida_em):
+                break
+            _discard(conn)
     except psycopg2.Error as e:
+        _pool_slots.release()
+        _metrics['errors'] += 1
         print(f"Erro ao conectar ao PostgreSQL: {e}")
         return None
+    with _pool_lock:
+        _in_use.add(id(conn))
+    _metrics['checkouts'] += 1
+    return conn
+
+
+def _checkin(conn):
+    """Devolve a conexão ao pool, descartando-a se estiver quebrada."""
+    _ensure_pool()
+    with _pool_lock:
+        if id(conn) not in _in_use:
+            # Não saiu do pool deste processo. Herdada de antes de um fork é só esquecida,
+            # como em _ensure_pool (a sessão ainda pertence ao pai); aberta por este
+            # processo e desconhecida do pool, é fechada.
+            if getattr(conn, 'pid', None) == os.getpid() and not conn.closed:
+                _discard(conn)
+            return
+        _in_use.discard(id(conn))
+    _metrics['checkins'] += 1
+    try:
+        if conn.closed:
+            _metrics['discarded'] += 1
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            _discard(conn)
+            return
+        with _pool_lock:
+            _idle.append((conn, time.monotonic()))
+    finally:
+        _pool_slots.release()
+
+
+def _request_scope():
+    """Retorna o `g` do Flask quando há contexto de aplicação ativo, senão None."""
+    try:
+        from flask import g, has_app_context
+    except ImportError:
+        return None
+    return g if has_app_context() else None
+
+
+def get_db_connection():
+    """Conecta ao banco de dados PostgreSQL
+
+    Usa o pool do processo. Dentro de uma requisição Flask a conexão fica reservada
+    (guardada em `g`) e é reaproveitada pelos chamadores seguintes, voltando ao pool
+    só no teardown da requisição. Um chamador aninhado (a conexão da requisição
+    ainda não foi liberada por quem a pegou) recebe outra conexão do pool, com
+    transação própria: commit/rollback dele não afetam o trabalho do chamador externo.
+    """
+    if not POOL_ENABLED:
+        try:
+            return _new_connection()
+        except psycopg2.Error as e:
+            print(f"Erro ao conectar ao PostgreSQL: {e}")
+            return None
+
+    scope = _request_scope()
+    if scope is not None:
+        conn = scope.get('_db_conn')
+        if conn is not None and not conn.closed:
+            if scope._db_conn_refs > 0:
+                # Aninhado: conexão separada, devolvida ao pool no close_db_connection
+                return _checkout()
+            scope._db_conn_refs = 1
+            _metrics['request_reuses'] += 1
+            return conn
+        if conn is not None:
+            scope.pop('_db_conn', None)
+            _checkin(conn)
+        conn = _checkout()
+        if conn is not None:
+            scope._db_conn = conn
+            scope._db_conn_refs = 1
+        return conn
+    return _checkout()
 
 def close_db_connection(conn):
-    """Fecha a conexão com o banco de dados"""
-    if conn:
+    """Fecha a conexão com o banco de dados
+
+    Com o pool, a conexão é devolvida em vez de fechada. A conexão da requisição
+    permanece reservada até o teardown; quando o chamador que a pegou a libera,
+    qualquer transação não confirmada é desfeita (mesmo efeito que o close() tinha).
+    """
+    if not conn:
+        return
+    if not POOL_ENABLED:
         try:
             conn.close()
         except psycopg2.Error as e:
             print(f"Erro ao fechar conexão: {e}")
+        return
+
+    scope = _request_scope()
+    if scope is not None and scope.get('_db_conn') is conn:
+        scope._db_conn_refs = 0
+        if conn.closed:
+            scope.pop('_db_conn', None)
+            _checkin(conn)
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error as e:
+            print(f"Erro ao liberar conexão: {e}")
+        return
+    _checkin(conn)
+
+def release_request_connection(exc=None):
+    """Devolve ao pool a conexão reservada pela requisição (teardown do Flask)."""
+    scope = _request_scope()
+    if scope is None:
+        return
+    conn = scope.pop('_db_conn', None)
+    scope.pop('_db_conn_refs', None)
+    if conn is not None:
+        _checkin(conn)
+
+def init_app(app):
+    """Registra o teardown que libera a conexão da requisição."""
+    app.teardown_appcontext(release_request_connection)
+
+def get_pool_metrics():
+    """Métricas do pool deste processo."""
+    mesmo_processo = _pool_pid == os.getpid()
+    return {
+        'enabled': POOL_ENABLED,
+        'pid': os.getpid(),
+        'min_size': POOL_MIN_SIZE,
+        'max_size': POOL_MAX_SIZE,
+        'in_use': len(_in_use) if mesmo_processo else 0,
+        'idle': len(_idle) if mesmo_processo else 0,
+        **_metrics,
+    }
 
 def execute_query(query, params=None, fetch_one=False, fetch_all=False):
     """Executa uma query e retorna o resultado"""
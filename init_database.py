@@ -140,6 +140,35 @@ def init_all_tables():
         from models.user_rankings import create_rankings_teams_table
         print("📋 Criando tabela acw_rankings_teams...")
         create_rankings_teams_table(conn)
+        from models.user_rankings import migrate_rankings_to_columnar
+        print("📋 Convertendo rankings salvos para o formato colunar...")
+        migrate_rankings_to_columnar(conn)
+        from models.user_rankings import aplicar_retencao_rankings
+        print("📋 Aplicando retenção de rodadas em acw_rankings_teams...")
+        aplicar_retencao_rankings(conn)
+        
+        # Criar tabela de lotes de escalação (Escalar Todos os Times)
+        from models.escalacao_lotes import create_escalacao_lotes_table
+        print("📋 Criando tabela acw_escalacao_lotes...")
+        create_escalacao_lotes_table(conn)
+        
+        # Criar tabela da fila de jobs (worker_jobs.py)
+        from models.jobs import create_jobs_table
+        print("📋 Criando tabela acw_jobs...")
+        create_jobs_table(conn)
+        
+        # Criar tabela de marcas d'água do agendador de recálculo
+        from models.recalculo_marcas import create_recalculo_marcas_table
+        print("📋 Criando tabela acw_recalculo_marcas...")
+        create_recalculo_marcas_table(conn)
+        
+        # Criar tabelas de somas materializadas de scouts
+        from models.scouts_agregados import create_scouts_agregados_tables
+        print("📋 Criando tabelas acw_scouts_agregados...")
+        create_scouts_agregados_tables(conn)
+        from models.scouts_cedidos import create_scouts_cedidos_tables
+        print("📋 Criando tabelas acw_scouts_cedidos...")
+        create_scouts_cedidos_tables(conn)
         
         # Criar tabela de configurações de escalação ideal por usuário
         from models.user_escalacao_config import create_user_escalacao_config_table
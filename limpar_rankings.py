@@ -2,6 +2,10 @@
 # -*- coding: utf-8 -*-
 """
 Script para limpar rankings antigos e resolver problema de configuration_id
+
+A retenção automática (models/user_rankings.aplicar_retencao_rankings) roda a cada
+rodada nova; a opção 3 a aplica na hora. Rodadas antigas são arquivadas/apagadas
+como partições inteiras.
 """
 
 import sys
@@ -63,6 +67,12 @@ def mostrar_estado_atual():
         team_id, team_name, config_id, total = row
         print(f"   Time {team_id} ({team_name}): {total} rankings com config_id={config_id}")
     
+    # Partições por rodada (tabela particionada por temporada/rodada)
+    from models.user_rankings import listar_particoes_rankings, RANKINGS_RODADAS_RETIDAS
+    print(f"\n🗂️  PARTIÇÕES DE RODADA (retenção: {RANKINGS_RODADAS_RETIDAS} mais recentes):")
+    for temporada, rodada in listar_particoes_rankings(conn):
+        print(f"   Temporada {temporada}, rodada {rodada}")
+    
     # Total de rankings
     cursor.execute("SELECT COUNT(*) FROM acw_rankings_teams")
     total_rankings = cursor.fetchone()[0]
@@ -99,7 +109,7 @@ def limpar_rankings():
     
     # Deletar todos os rankings
     print("\n🗑️  Deletando rankings...")
-    cursor.execute("DELETE FROM acw_rankings_teams")
+    cursor.execute("TRUNCATE acw_rankings_teams")
     conn.commit()
     
     # Verificar
@@ -112,6 +122,32 @@ def limpar_rankings():
     cursor.close()
     close_db_connection(conn)
 
+def aplicar_retencao():
+    """Aplica a retenção: mantém as N rodadas mais recentes e arquiva/apaga as demais"""
+    from models.user_rankings import (
+        aplicar_retencao_rankings, RANKINGS_RODADAS_RETIDAS, RANKINGS_RETENCAO_MODO
+    )
+    
+    print("\n" + "="*80)
+    print("  RETENÇÃO DE RANKINGS")
+    print("="*80)
+    
+    resposta = input(f"\nRodadas a manter [{RANKINGS_RODADAS_RETIDAS}]: ").strip()
+    rodadas = int(resposta) if resposta else RANKINGS_RODADAS_RETIDAS
+    modo = input(f"Modo (arquivar/remover) [{RANKINGS_RETENCAO_MODO}]: ").strip() or RANKINGS_RETENCAO_MODO
+    
+    conn = get_db_connection()
+    try:
+        retiradas = aplicar_retencao_rankings(conn, rodadas_retidas=rodadas, modo=modo)
+        if retiradas:
+            for temporada, rodada in retiradas:
+                print(f"   🗑️  Temporada {temporada}, rodada {rodada}")
+            print(f"✅ Feito! {len(retiradas)} partições retiradas ({modo})")
+        else:
+            print("✅ Nada a fazer: não há rodadas além das mantidas")
+    finally:
+        close_db_connection(conn)
+
 def verificar_configuracoes():
     """Verifica se as configurações estão corretas"""
     conn = get_db_connection()
@@ -165,18 +201,21 @@ def menu():
         print("="*80)
         print("\n1. Mostrar estado atual")
         print("2. Verificar configurações")
-        print("3. LIMPAR TODOS OS RANKINGS (irreversível!)")
-        print("4. Sair")
+        print("3. Aplicar retenção (manter só as rodadas mais recentes)")
+        print("4. LIMPAR TODOS OS RANKINGS (irreversível!)")
+        print("5. Sair")
         
-        escolha = input("\nEscolha uma opção (1-4): ")
+        escolha = input("\nEscolha uma opção (1-5): ")
         
         if escolha == '1':
             mostrar_estado_atual()
         elif escolha == '2':
             verificar_configuracoes()
         elif escolha == '3':
-            limpar_rankings()
+            aplicar_retencao()
         elif escolha == '4':
+            limpar_rankings()
+        elif escolha == '5':
             print("\n👋 Até logo!")
             break
         else:
@@ -0,0 +1,98 @@
+"""
+Modelo dos lotes de escalação de vários times (Escalar Todos os Times)
+
+Cada lote guarda o estado de cada time em `times` (JSONB, chave = team_id), para
+que o progresso possa ser consultado por qualquer worker do gunicorn enquanto o
+worker_jobs.py processa os times (job 'escalar_lote').
+"""
+import psycopg2
+import json
+import uuid
+from typing import Dict, List, Optional
+
+# Estados de um time no lote
+TIME_NA_FILA = 'na_fila'
+TIME_CALCULANDO = 'calculando'
+TIME_ENVIANDO = 'enviando'
+TIME_ESCALADO = 'escalado'
+TIME_ERRO = 'erro'
+ESTADOS_FINAIS = (TIME_ESCALADO, TIME_ERRO)
+
+def create_escalacao_lotes_table(conn: psycopg2.extensions.connection):
+    """Cria a tabela de lotes de escalação"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS acw_escalacao_lotes (
+            id VARCHAR(32) PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'executando',
+            total INTEGER NOT NULL,
+            concluidos INTEGER NOT NULL DEFAULT 0,
+            sucessos INTEGER NOT NULL DEFAULT 0,
+            times JSONB NOT NULL DEFAULT '{}'::jsonb,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES acw_users(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_escalacao_lotes_user ON acw_escalacao_lotes(user_id, created_at DESC)')
+    conn.commit()
+
+def create_escalacao_lote(conn: psycopg2.extensions.connection, user_id: int, times: List[Dict]) -> str:
+    """Cria um lote com os times na fila. times: [{'id', 'team_name'}]. Retorna o id do lote."""
+    lote_id = uuid.uuid4().hex
+    estado = {
+        str(time['id']): {'team_id': time['id'], 'team_name': time.get('team_name'), 'status': TIME_NA_FILA}
+        for time in times
+    }
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO acw_escalacao_lotes (id, user_id, total, times)
+        VALUES (%s, %s, %s, %s::jsonb)
+    ''', (lote_id, user_id, len(estado), json.dumps(estado, ensure_ascii=False)))
+    conn.commit()
+    return lote_id
+
+def update_escalacao_lote_time(conn: psycopg2.extensions.connection, lote_id: str, team_id: int, dados: Dict):
+    """Atualiza (mescla) o estado de um time do lote; estados finais contam no progresso.
+
+    A atualização é atômica na linha, então várias threads podem atualizar o mesmo lote.
+    """
+    final = dados.get('status') in ESTADOS_FINAIS
+    sucesso = dados.get('status') == TIME_ESCALADO
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE acw_escalacao_lotes
+        SET times = jsonb_set(times, ARRAY[%s], COALESCE(times->%s, '{}'::jsonb) || %s::jsonb),
+            concluidos = concluidos + %s,
+            sucessos = sucessos + %s,
+            status = CASE WHEN concluidos + %s >= total THEN 'concluido' ELSE status END,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    ''', (str(team_id), str(team_id), json.dumps(dados, ensure_ascii=False, default=str),
+          int(final), int(sucesso), int(final), lote_id))
+    conn.commit()
+
+def get_escalacao_lote(conn: psycopg2.extensions.connection, lote_id: str, user_id: int) -> Optional[Dict]:
+    """Busca um lote do usuário"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, status, total, concluidos, sucessos, times, created_at, updated_at
+        FROM acw_escalacao_lotes
+        WHERE id = %s AND user_id = %s
+    ''', (lote_id, user_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    times = row[5] if isinstance(row[5], dict) else json.loads(row[5] or '{}')
+    return {
+        'id': row[0],
+        'status': row[1],
+        'total': row[2],
+        'concluidos': row[3],
+        'sucessos': row[4],
+        'falhas': row[3] - row[4],
+        'times': list(times.values()),
+        'created_at': row[6],
+        'updated_at': row[7]
+    }
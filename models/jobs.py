@@ -0,0 +1,311 @@
+"""
+Fila de jobs em PostgreSQL (acw_jobs) para o trabalho pesado sair das requisições
+
+As rotas só enfileiram (enqueue_job) e respondem 202; o processo worker_jobs.py
+pega os jobs com SELECT ... FOR UPDATE SKIP LOCKED (vários workers sem disputa),
+executa e grava resultado ou erro. Regras:
+
+- deduplicação: um job pendente idêntico (mesmo tipo, usuário, time e parâmetros)
+  não é duplicado; quem enfileira recebe o id do que já está na fila;
+- limite por usuário: no máximo JOBS_MAX_EXECUTANDO_POR_USUARIO jobs do mesmo
+  usuário executando ao mesmo tempo, e JOBS_MAX_PENDENTES_POR_USUARIO na fila;
+- jobs presos (worker morto, sem heartbeat há JOBS_TIMEOUT segundos) voltam para
+  a fila até JOBS_MAX_TENTATIVAS; falhas são repetidas com espera crescente.
+
+Cada enfileiramento faz NOTIFY no canal JOBS_CANAL, para o worker acordar na hora.
+"""
+import psycopg2
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+JOBS_MAX_EXECUTANDO_POR_USUARIO = int(os.getenv('JOBS_MAX_EXECUTANDO_POR_USUARIO', '2'))
+JOBS_MAX_PENDENTES_POR_USUARIO = int(os.getenv('JOBS_MAX_PENDENTES_POR_USUARIO', '20'))
+JOBS_MAX_TENTATIVAS = int(os.getenv('JOBS_MAX_TENTATIVAS', '3'))
+# Segundos sem heartbeat para um job em execução ser considerado abandonado
+JOBS_TIMEOUT = int(os.getenv('JOBS_TIMEOUT', '300'))
+JOBS_CANAL = 'acw_jobs'
+
+# Tipos executados pelo worker_jobs.py que o usuário pode enfileirar (POST /api/jobs)
+TIPOS_JOB = ('recalcular_modulo', 'escalacao_ideal', 'escalar_time', 'ajustar_pesos')
+# Tipos enfileirados só pelo próprio app, com parâmetros montados no servidor
+TIPOS_JOB_INTERNOS = ('escalar_lote',)
+
+JOB_PENDENTE = 'pendente'
+JOB_EXECUTANDO = 'executando'
+JOB_CONCLUIDO = 'concluido'
+JOB_ERRO = 'erro'
+
+# Chave do pg_advisory_xact_lock que serializa a escolha do próximo job (limite por usuário exato)
+_LOCK_PROXIMO_JOB = 7_400_017
+
+_COLUNAS = '''id, tipo, user_id, team_id, parametros, status, tentativas, resultado, erro,
+              created_at, started_at, finished_at'''
+
+
+class LimiteJobsExcedido(Exception):
+    """O usuário já tem JOBS_MAX_PENDENTES_POR_USUARIO jobs na fila"""
+
+
+def create_jobs_table(conn: psycopg2.extensions.connection):
+    """Cria a tabela da fila de jobs"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS acw_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            tipo VARCHAR(50) NOT NULL,
+            user_id INTEGER NOT NULL,
+            team_id INTEGER,
+            parametros JSONB NOT NULL DEFAULT '{}'::jsonb,
+            chave VARCHAR(64) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pendente',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            resultado JSONB,
+            erro TEXT,
+            worker VARCHAR(100),
+            disponivel_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES acw_users(id) ON DELETE CASCADE,
+            FOREIGN KEY (team_id) REFERENCES acw_teams(id) ON DELETE CASCADE
+        )
+    ''')
+    # Deduplicação: só um job pendente por chave
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_pendente_chave
+        ON acw_jobs(chave) WHERE status = 'pendente'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_fila
+        ON acw_jobs(disponivel_em, id) WHERE status = 'pendente'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_usuario
+        ON acw_jobs(user_id, status)
+    ''')
+    conn.commit()
+
+
+def _chave_job(tipo: str, user_id: int, team_id: Optional[int], parametros: Dict) -> str:
+    conteudo = json.dumps([tipo, user_id, team_id, parametros], sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def _job_dict(row) -> Dict[str, Any]:
+    return {
+        'id': row[0],
+        'tipo': row[1],
+        'user_id': row[2],
+        'team_id': row[3],
+        'parametros': row[4] or {},
+        'status': row[5],
+        'tentativas': row[6],
+        'resultado': row[7],
+        'erro': row[8],
+        'created_at': row[9],
+        'started_at': row[10],
+        'finished_at': row[11]
+    }
+
+
+def enqueue_job(conn: psycopg2.extensions.connection, tipo: str, user_id: int,
+                team_id: Optional[int] = None, parametros: Optional[Dict] = None) -> Tuple[int, bool]:
+    """Enfileira um job. Retorna (job_id, criado); criado=False se já havia um pendente idêntico.
+
+    Levanta LimiteJobsExcedido se o usuário já tem JOBS_MAX_PENDENTES_POR_USUARIO pendentes.
+    """
+    parametros = parametros or {}
+    chave = _chave_job(tipo, user_id, team_id, parametros)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT id FROM acw_jobs WHERE chave = %s AND status = 'pendente'
+        ''', (chave,))
+        row = cursor.fetchone()
+        if row:
+            conn.commit()
+            return row[0], False
+
+        cursor.execute('''
+            SELECT COUNT(*) FROM acw_jobs WHERE user_id = %s AND status = 'pendente'
+        ''', (user_id,))
+        if cursor.fetchone()[0] >= JOBS_MAX_PENDENTES_POR_USUARIO:
+            conn.rollback()
+            raise LimiteJobsExcedido(
+                f'Você já tem {JOBS_MAX_PENDENTES_POR_USUARIO} tarefas na fila. Aguarde algumas terminarem.'
+            )
+
+        # ON CONFLICT cobre a corrida entre dois enfileiramentos idênticos simultâneos
+        cursor.execute('''
+            INSERT INTO acw_jobs (tipo, user_id, team_id, parametros, chave)
+            VALUES (%s, %s, %s, %s::jsonb, %s)
+            ON CONFLICT (chave) WHERE status = 'pendente'
+            DO UPDATE SET chave = EXCLUDED.chave
+            RETURNING id, (xmax = 0)
+        ''', (tipo, user_id, team_id, json.dumps(parametros, ensure_ascii=False, default=str), chave))
+        job_id, criado = cursor.fetchone()
+        if criado:
+            cursor.execute('SELECT pg_notify(%s, %s)', (JOBS_CANAL, str(job_id)))
+        conn.commit()
+        return job_id, criado
+    except LimiteJobsExcedido:
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def claim_next_job(conn: psycopg2.extensions.connection, worker: str) -> Optional[Dict[str, Any]]:
+    """Pega o próximo job pendente respeitando o limite por usuário e o marca como executando.
+
+    Usa FOR UPDATE SKIP LOCKED; a escolha é serializada por advisory lock para que a
+    contagem de jobs em execução por usuário seja exata entre vários workers.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (_LOCK_PROXIMO_JOB,))
+        cursor.execute(f'''
+            WITH candidato AS (
+                SELECT j.id
+                FROM acw_jobs j
+                WHERE j.status = 'pendente' AND j.disponivel_em <= CURRENT_TIMESTAMP
+                  AND (
+                      SELECT COUNT(*) FROM acw_jobs e
+                      WHERE e.user_id = j.user_id AND e.status = 'executando'
+                  ) < %s
+                ORDER BY j.disponivel_em, j.id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE acw_jobs
+            SET status = 'executando', tentativas = tentativas + 1, worker = %s,
+                started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+            FROM candidato
+            WHERE acw_jobs.id = candidato.id
+            RETURNING {', '.join('acw_jobs.' + c.strip() for c in _COLUNAS.split(','))}
+        ''', (JOBS_MAX_EXECUTANDO_POR_USUARIO, worker))
+        row = cursor.fetchone()
+        conn.commit()
+        return _job_dict(row) if row else None
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def heartbeat_job(conn: psycopg2.extensions.connection, job_id: int):
+    """Renova o heartbeat de um job em execução"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE acw_jobs SET heartbeat_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status = 'executando'
+    ''', (job_id,))
+    conn.commit()
+
+
+def finish_job(conn: psycopg2.extensions.connection, job_id: int, resultado: Optional[Dict] = None):
+    """Marca o job como concluído com o resultado"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE acw_jobs
+        SET status = 'concluido', resultado = %s::jsonb, erro = NULL, finished_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    ''', (json.dumps(resultado, ensure_ascii=False, default=str) if resultado is not None else None, job_id))
+    conn.commit()
+
+
+def fail_job(conn: psycopg2.extensions.connection, job_id: int, erro: str, repetir: bool = True):
+    """Registra a falha: volta para a fila com espera crescente ou, esgotadas as tentativas, fica em erro.
+
+    Se já houver um pendente idêntico (mesma chave) na fila, o job fica em erro em vez
+    de duplicá-lo (o índice uq_jobs_pendente_chave não permite dois pendentes).
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        WITH volta AS (
+            SELECT %s AND j.tentativas < %s AND NOT EXISTS (
+                SELECT 1 FROM acw_jobs p WHERE p.chave = j.chave AND p.status = 'pendente' AND p.id <> j.id
+            ) AS repetir
+            FROM acw_jobs j
+            WHERE j.id = %s
+        )
+        UPDATE acw_jobs
+        SET status = CASE WHEN volta.repetir THEN 'pendente' ELSE 'erro' END,
+            disponivel_em = CURRENT_TIMESTAMP + (INTERVAL '10 seconds' * POWER(2, tentativas)),
+            finished_at = CASE WHEN volta.repetir THEN NULL ELSE CURRENT_TIMESTAMP END,
+            erro = %s
+        FROM volta
+        WHERE id = %s
+    ''', (repetir, JOBS_MAX_TENTATIVAS, job_id, erro[:2000], job_id))
+    conn.commit()
+
+
+def requeue_stale_jobs(conn: psycopg2.extensions.connection) -> int:
+    """Devolve à fila (ou marca erro) os jobs em execução sem heartbeat há JOBS_TIMEOUT segundos.
+
+    Só um job por chave volta à fila, e só se não houver um pendente idêntico: dois
+    jobs iguais podem estar em execução ao mesmo tempo, e devolver os dois violaria
+    uq_jobs_pendente_chave. Os demais ficam em erro. Retorna quantos voltaram à fila.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE acw_jobs
+        SET status = 'pendente', finished_at = NULL, disponivel_em = CURRENT_TIMESTAMP,
+            erro = 'Job abandonado (worker sem heartbeat)'
+        WHERE id IN (
+            SELECT DISTINCT ON (j.chave) j.id FROM acw_jobs j
+            WHERE j.status = 'executando'
+              AND j.heartbeat_at < CURRENT_TIMESTAMP - (INTERVAL '1 second' * %s)
+              AND j.tentativas < %s
+              AND NOT EXISTS (
+                  SELECT 1 FROM acw_jobs p WHERE p.chave = j.chave AND p.status = 'pendente'
+              )
+            ORDER BY j.chave, j.id
+        )
+    ''', (JOBS_TIMEOUT, JOBS_MAX_TENTATIVAS))
+    recolocados = cursor.rowcount
+    cursor.execute('''
+        UPDATE acw_jobs
+        SET status = 'erro', finished_at = CURRENT_TIMESTAMP, erro = 'Job abandonado (worker sem heartbeat)'
+        WHERE status = 'executando'
+          AND heartbeat_at < CURRENT_TIMESTAMP - (INTERVAL '1 second' * %s)
+    ''', (JOBS_TIMEOUT,))
+    conn.commit()
+    return recolocados
+
+
+def get_job(conn: psycopg2.extensions.connection, job_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Busca um job (do usuário, se user_id for informado), com a posição na fila se pendente"""
+    cursor = conn.cursor()
+    query = f'SELECT {_COLUNAS}, disponivel_em FROM acw_jobs WHERE id = %s'
+    params = [job_id]
+    if user_id is not None:
+        query += ' AND user_id = %s'
+        params.append(user_id)
+    cursor.execute(query, params)
+    row = cursor.fetchone()
+    if not row:
+        return None
+    job = _job_dict(row)
+    if job['status'] == JOB_PENDENTE:
+        cursor.execute('''
+            SELECT COUNT(*) FROM acw_jobs
+            WHERE status = 'pendente' AND (disponivel_em, id) < (%s, %s)
+        ''', (row[12], job_id))
+        job['posicao_fila'] = cursor.fetchone()[0] + 1
+    return job
+
+
+def get_user_jobs(conn: psycopg2.extensions.connection, user_id: int, limite: int = 20) -> List[Dict[str, Any]]:
+    """Jobs mais recentes do usuário"""
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {_COLUNAS}
+        FROM acw_jobs
+        WHERE user_id = %s
+        ORDER BY id DESC
+        LIMIT %s
+    ''', (user_id, limite))
+    return [_job_dict(row) for row in cursor.fetchall()]
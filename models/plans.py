@@ -9,6 +9,7 @@ Sem dependências do Stripe por enquanto
 import psycopg2
 from typing import Optional, Dict, Any
 from database import get_db_connection, close_db_connection
+from models.users import get_user_by_id, tem_coluna_plano, invalidar_cache_usuario
 
 # JSON Oficial dos Planos (conforme documentação)
 PLANS_CONFIG = {
@@ -114,6 +115,8 @@ def add_plano_column_to_users():
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_plano ON acw_users(plano)')
             
             conn.commit()
+            tem_coluna_plano(recarregar=True)
+            invalidar_cache_usuario()
             print("[OK] Coluna 'plano' adicionada a tabela acw_users!")
             return True
         else:
@@ -167,56 +170,24 @@ def create_plan_history_table():
 def get_user_plan(user_id: int) -> str:
     """
     Retorna o plano atual do usuário.
-    Sistema simplificado: busca diretamente da tabela acw_users.
+    Sistema simplificado: lido da tabela acw_users via models.users.get_user_by_id
+    (memorizado por requisição e em cache curto entre requisições).
     Retorna 'free' como padrão se não encontrar.
     """
-    conn = get_db_connection()
-    if not conn:
-        return 'free'
-    
-    cursor = conn.cursor()
-    
-    try:
-        # Verificar se a coluna plano existe
-        cursor.execute('''
-            SELECT EXISTS (
-                SELECT FROM information_schema.columns 
-                WHERE table_schema = 'public' 
-                AND table_name = 'acw_users'
-                AND column_name = 'plano'
-            )
-        ''')
-        
-        coluna_existe = cursor.fetchone()[0]
-        
-        if not coluna_existe:
-            # Se a coluna não existe, retornar free e tentar criar
-            print("[AVISO] Coluna 'plano' nao existe. Execute add_plano_column_to_users() primeiro.")
-            return 'free'
-        
-        # Buscar plano do usuário
-        cursor.execute('''
-            SELECT plano FROM acw_users
-            WHERE id = %s
-        ''', (user_id,))
-        
-        result = cursor.fetchone()
-        if result and result[0]:
-            plano = result[0]
-            # Validar se o plano é válido
-            if plano in PLANS_CONFIG:
-                return plano
-            else:
-                print(f"[AVISO] Plano invalido '{plano}' para usuario {user_id}. Retornando 'free'.")
-                return 'free'
-        
+    if not tem_coluna_plano():
+        print("[AVISO] Coluna 'plano' nao existe. Execute add_plano_column_to_users() primeiro.")
         return 'free'
-        
-    except psycopg2.Error as e:
-        print(f"Erro ao buscar plano do usuário: {e}")
+
+    user = get_user_by_id(user_id)
+    if not user:
         return 'free'
-    finally:
-        close_db_connection(conn)
+
+    plano = user.get('plano') or 'free'
+    # Validar se o plano é válido
+    if plano in PLANS_CONFIG:
+        return plano
+    print(f"[AVISO] Plano invalido '{plano}' para usuario {user_id}. Retornando 'free'.")
+    return 'free'
 
 
 def get_user_plan_config(user_id: int) -> Dict[str, Any]:
@@ -237,6 +208,14 @@ def set_user_plan(user_id: int, plano: str, motivo: str = None) -> bool:
         print(f"[ERRO] Plano invalido: {plano}")
         return False
     
+    if not tem_coluna_plano():
+        print("❌ Coluna 'plano' não existe. Execute add_plano_column_to_users() primeiro.")
+        return False
+    
+    # Buscar plano anterior direto do banco (sem valor em cache)
+    invalidar_cache_usuario(user_id)
+    plano_anterior = get_user_plan(user_id)
+    
     conn = get_db_connection()
     if not conn:
         return False
@@ -244,25 +223,6 @@ def set_user_plan(user_id: int, plano: str, motivo: str = None) -> bool:
     cursor = conn.cursor()
     
     try:
-        # Verificar se a coluna existe
-        cursor.execute('''
-            SELECT EXISTS (
-                SELECT FROM information_schema.columns 
-                WHERE table_schema = 'public' 
-                AND table_name = 'acw_users'
-                AND column_name = 'plano'
-            )
-        ''')
-        
-        coluna_existe = cursor.fetchone()[0]
-        
-        if not coluna_existe:
-            print("❌ Coluna 'plano' não existe. Execute add_plano_column_to_users() primeiro.")
-            return False
-        
-        # Buscar plano anterior
-        plano_anterior = get_user_plan(user_id)
-        
         # Se o plano não mudou, não fazer nada
         if plano_anterior == plano:
             return True
@@ -285,6 +245,7 @@ def set_user_plan(user_id: int, plano: str, motivo: str = None) -> bool:
             pass
         
         conn.commit()
+        invalidar_cache_usuario(user_id)
         print(f"[OK] Plano do usuario {user_id} alterado de '{plano_anterior}' para '{plano}'")
         return True
         
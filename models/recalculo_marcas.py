@@ -0,0 +1,46 @@
+"""
+Marcas d'água das fontes do recálculo (agendador_recalculo.py)
+
+Cada linha guarda, para uma tabela de origem (fonte) e um escopo dentro dela
+('contadores', 'posicao:3', 'perfil:2', ...), a última marca vista: o hash dos
+contadores de escrita do PostgreSQL ou o checksum do conteúdo. O agendador só
+recalcula o que tem marca diferente da gravada, e só grava as marcas novas
+depois que o recálculo termina.
+"""
+import psycopg2
+from psycopg2.extras import execute_values
+from typing import Dict, Tuple
+
+def create_recalculo_marcas_table(conn: psycopg2.extensions.connection):
+    """Cria a tabela de marcas d'água do recálculo"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS acw_recalculo_marcas (
+            fonte VARCHAR(50) NOT NULL,
+            escopo VARCHAR(50) NOT NULL,
+            marca VARCHAR(64) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (fonte, escopo)
+        )
+    ''')
+    conn.commit()
+
+def get_marcas(conn: psycopg2.extensions.connection) -> Dict[Tuple[str, str], str]:
+    """Todas as marcas gravadas: {(fonte, escopo): marca}"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT fonte, escopo, marca FROM acw_recalculo_marcas')
+    return {(fonte, escopo): marca for fonte, escopo, marca in cursor.fetchall()}
+
+def save_marcas(conn: psycopg2.extensions.connection, fonte: str, marcas: Dict[str, str]):
+    """Substitui as marcas de uma fonte ({escopo: marca}); escopos ausentes são removidos"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('DELETE FROM acw_recalculo_marcas WHERE fonte = %s', (fonte,))
+        if marcas:
+            execute_values(cursor, '''
+                INSERT INTO acw_recalculo_marcas (fonte, escopo, marca) VALUES %s
+            ''', [(fonte, escopo, marca) for escopo, marca in marcas.items()])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,318 @@
+"""
+Modelo para as somas materializadas de scouts por atleta (acw_scouts_agregados)
+
+Em vez de recalcular AVG(scout_*) sobre todo o histórico de acf_pontuados a cada
+requisição, a tabela guarda por (temporada, atleta, mando) o número de jogos e a
+soma de cada scout e da pontuação, já filtrando entrou_em_campo = TRUE. As médias
+(geral, casa e fora) saem de uma leitura por chave primária.
+
+A atualização é incremental: cada rodada aplicada fica registrada em
+acw_scouts_agregados_rodadas com uma "impressão digital" (linhas e soma da
+pontuação). Novas rodadas são somadas com INSERT ... ON CONFLICT DO UPDATE; se a
+última rodada aplicada mudou no acf_pontuados (correção de pontuação), a temporada
+é reconstruída. acw_scouts_agregados_estado guarda até qual rodada as somas valem.
+
+Scouts nulos contam como 0 (mesma semântica de AVG(COALESCE(scout, 0)) usada nas
+telas de detalhes) e jogou_em_casa nulo conta como fora.
+"""
+import os
+import psycopg2
+from typing import Dict, Iterable, Optional
+
+from database import get_db_connection, close_db_connection
+from utils.scouts import SCOUTS
+
+# Chave do pg_advisory_xact_lock que serializa as atualizações entre workers
+_LOCK_ATUALIZACAO = 7_400_009
+# Intervalo (segundos) para reconferir rodadas que chegaram atrasadas ou foram corrigidas
+SCOUTS_AGREGADOS_VERIFICACAO = float(os.getenv('SCOUTS_AGREGADOS_VERIFICACAO', '300'))
+# Tabelas criadas neste processo (evita CREATE IF NOT EXISTS a cada leitura)
+_tabelas_prontas = False
+
+_COLUNAS_SOMA = ['soma_pontuacao'] + [f'soma_{s}' for s in SCOUTS]
+
+
+def create_scouts_agregados_tables(conn: psycopg2.extensions.connection):
+    """Cria as tabelas de somas de scouts, de rodadas aplicadas e de estado"""
+    global _tabelas_prontas
+    cursor = conn.cursor()
+    colunas_soma = ',\n            '.join(f'{c} DOUBLE PRECISION NOT NULL DEFAULT 0' for c in _COLUNAS_SOMA)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS acw_scouts_agregados (
+            temporada INTEGER NOT NULL,
+            atleta_id INTEGER NOT NULL,
+            jogou_em_casa BOOLEAN NOT NULL,
+            jogos INTEGER NOT NULL DEFAULT 0,
+            {colunas_soma},
+            ultima_rodada INTEGER NOT NULL,
+            PRIMARY KEY (temporada, atleta_id, jogou_em_casa)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS acw_scouts_agregados_rodadas (
+            temporada INTEGER NOT NULL,
+            rodada_id INTEGER NOT NULL,
+            linhas INTEGER NOT NULL,
+            soma_pontuacao DOUBLE PRECISION NOT NULL,
+            aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (temporada, rodada_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS acw_scouts_agregados_estado (
+            temporada INTEGER PRIMARY KEY,
+            ate_rodada INTEGER NOT NULL,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    _tabelas_prontas = True
+
+
+def _garantir_tabelas(conn) -> bool:
+    if _tabelas_prontas:
+        return True
+    try:
+        create_scouts_agregados_tables(conn)
+        return True
+    except psycopg2.Error as e:
+        print(f"[AVISO] Tabelas de scouts agregados indisponíveis: {e}")
+        conn.rollback()
+        return False
+
+
+def _select_somas(filtro: str) -> str:
+    """SELECT das somas por atleta e mando sobre acf_pontuados (usado na carga e no fallback)."""
+    somas = ',\n               '.join(
+        ['SUM(COALESCE(pontuacao, 0))'] + [f'SUM(COALESCE(scout_{s}, 0))' for s in SCOUTS]
+    )
+    return f'''
+        SELECT atleta_id, COALESCE(jogou_em_casa, FALSE), COUNT(*),
+               {somas},
+               MAX(rodada_id)
+        FROM acf_pontuados
+        WHERE temporada = %s AND entrou_em_campo = TRUE AND {filtro}
+        GROUP BY atleta_id, COALESCE(jogou_em_casa, FALSE)
+    '''
+
+
+def _impressoes(cursor, temporada: int, de_rodada: int, ate_rodada: int) -> Dict[int, tuple]:
+    cursor.execute('''
+        SELECT rodada_id, COUNT(*), COALESCE(SUM(pontuacao), 0)
+        FROM acf_pontuados
+        WHERE temporada = %s AND entrou_em_campo = TRUE AND rodada_id >= %s AND rodada_id <= %s
+        GROUP BY rodada_id
+    ''', (temporada, de_rodada, ate_rodada))
+    return {row[0]: (int(row[1]), float(row[2])) for row in cursor.fetchall()}
+
+
+def _mesma_impressao(a: tuple, b: tuple) -> bool:
+    return a[0] == b[0] and abs(a[1] - b[1]) < 1e-6
+
+
+def atualizar_scouts_agregados(conn: psycopg2.extensions.connection, temporada: int,
+                               ate_rodada: int, reconstruir: bool = False) -> int:
+    """
+    Aplica em acw_scouts_agregados as rodadas de acf_pontuados até `ate_rodada`.
+    Retorna quantas rodadas foram aplicadas (-1 em erro).
+    """
+    if not _garantir_tabelas(conn):
+        return -1
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', (_LOCK_ATUALIZACAO, temporada))
+
+        cursor.execute('''
+            SELECT rodada_id, linhas, soma_pontuacao
+            FROM acw_scouts_agregados_rodadas
+            WHERE temporada = %s
+        ''', (temporada,))
+        aplicadas = {row[0]: (int(row[1]), float(row[2])) for row in cursor.fetchall()}
+        ultima = max(aplicadas) if aplicadas else 0
+
+        atuais = _impressoes(cursor, temporada, ultima, ate_rodada)
+        if not reconstruir and ultima:
+            # Rodada já aplicada depois do limite pedido, ou corrigida no acf_pontuados
+            reconstruir = ultima > ate_rodada or not _mesma_impressao(atuais.get(ultima, (0, 0.0)), aplicadas[ultima])
+
+        if reconstruir:
+            cursor.execute('DELETE FROM acw_scouts_agregados WHERE temporada = %s', (temporada,))
+            cursor.execute('DELETE FROM acw_scouts_agregados_rodadas WHERE temporada = %s', (temporada,))
+            atuais = _impressoes(cursor, temporada, 0, ate_rodada)
+            novas = sorted(atuais)
+        else:
+            novas = sorted(r for r in atuais if r > ultima)
+
+        if novas:
+            atualizacoes = ',\n                '.join(
+                f'{c} = acw_scouts_agregados.{c} + EXCLUDED.{c}' for c in _COLUNAS_SOMA
+            )
+            cursor.execute(f'''
+                INSERT INTO acw_scouts_agregados
+                    (atleta_id, jogou_em_casa, jogos, {', '.join(_COLUNAS_SOMA)}, ultima_rodada, temporada)
+                SELECT s.*, %s FROM ({_select_somas('rodada_id = ANY(%s)')}) s
+                ON CONFLICT (temporada, atleta_id, jogou_em_casa) DO UPDATE SET
+                jogos = acw_scouts_agregados.jogos + EXCLUDED.jogos,
+                {atualizacoes},
+                ultima_rodada = GREATEST(acw_scouts_agregados.ultima_rodada, EXCLUDED.ultima_rodada)
+            ''', (temporada, temporada, novas))
+            cursor.executemany('''
+                INSERT INTO acw_scouts_agregados_rodadas (temporada, rodada_id, linhas, soma_pontuacao)
+                VALUES (%s, %s, %s, %s)
+            ''', [(temporada, r, atuais[r][0], atuais[r][1]) for r in novas])
+
+        cursor.execute('''
+            INSERT INTO acw_scouts_agregados_estado (temporada, ate_rodada, atualizado_em)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (temporada) DO UPDATE SET
+                ate_rodada = EXCLUDED.ate_rodada,
+                atualizado_em = CURRENT_TIMESTAMP
+        ''', (temporada, ate_rodada))
+        conn.commit()
+        if novas:
+            print(f"[OK] Scouts agregados da temporada {temporada}: {len(novas)} rodada(s) aplicada(s) até a {ate_rodada}")
+        return len(novas)
+    except psycopg2.Error as e:
+        print(f"[ERRO] Erro ao atualizar scouts agregados: {e}")
+        conn.rollback()
+        return -1
+
+
+def _atualizar_em_conexao_propria(temporada: int, ate_rodada: int) -> bool:
+    """Cria as tabelas e aplica as rodadas pendentes numa conexão separada.
+
+    A atualização faz DDL/DML e commit; numa conexão própria ela não encerra a
+    transação de quem só está lendo as médias (o agendador de recálculo já aplica as
+    rodadas novas via utils/recalculo.py, isto cobre o que chegar antes dele).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        return atualizar_scouts_agregados(conn, temporada, ate_rodada) >= 0
+    finally:
+        close_db_connection(conn)
+
+
+def _somas_materializadas(conn, temporada: int, rodada_atual: int,
+                          atleta_ids: Optional[list]) -> Optional[list]:
+    """Linhas de somas válidas para `rodada_atual` (rodadas < rodada_atual) ou None se indisponível.
+
+    Só lê em `conn` (dentro de um SAVEPOINT, para que um erro não aborte a transação
+    do chamador); criação e atualização das tabelas vão para outra conexão.
+    """
+    ate_rodada = rodada_atual - 1
+    if not _tabelas_prontas and not _atualizar_em_conexao_propria(temporada, ate_rodada):
+        return None
+    cursor = conn.cursor()
+    cursor.execute('SAVEPOINT scouts_agregados')
+    try:
+        cursor.execute('''
+            SELECT ate_rodada, EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - atualizado_em))
+            FROM acw_scouts_agregados_estado
+            WHERE temporada = %s
+        ''', (temporada,))
+        row = cursor.fetchone()
+        if row is not None and row[0] > ate_rodada:
+            # Consulta de uma rodada passada: as somas já incluem rodadas posteriores
+            return None
+        if row is None or row[0] < ate_rodada or float(row[1] or 0) > SCOUTS_AGREGADOS_VERIFICACAO:
+            # Rodada nova (ou reconferência periódica): aplica só o que falta
+            if not _atualizar_em_conexao_propria(temporada, ate_rodada):
+                return None
+
+        query = f'''
+            SELECT atleta_id, jogou_em_casa, jogos, {', '.join(_COLUNAS_SOMA)}
+            FROM acw_scouts_agregados
+            WHERE temporada = %s
+        '''
+        params = [temporada]
+        if atleta_ids is not None:
+            query += ' AND atleta_id = ANY(%s)'
+            params.append(atleta_ids)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    except psycopg2.Error as e:
+        print(f"[AVISO] Erro ao ler scouts agregados: {e}")
+        cursor.execute('ROLLBACK TO SAVEPOINT scouts_agregados')
+        return None
+    finally:
+        cursor.execute('RELEASE SAVEPOINT scouts_agregados')
+
+
+def _somas_diretas(conn, temporada: int, rodada_atual: int, atleta_ids: Optional[list]) -> list:
+    """Mesmas somas calculadas direto sobre acf_pontuados (fallback)."""
+    cursor = conn.cursor()
+    filtro = 'rodada_id < %s'
+    params = [temporada, rodada_atual]
+    if atleta_ids is not None:
+        filtro += ' AND atleta_id = ANY(%s)'
+        params.append(atleta_ids)
+    cursor.execute(_select_somas(filtro), params)
+    # Descarta MAX(rodada_id) para ficar no formato da tabela
+    return [row[:-1] for row in cursor.fetchall()]
+
+
+def _medias(jogos: int, somas: Dict[str, float]) -> Dict[str, float]:
+    if not jogos:
+        return {s: 0.0 for s in ['pontuacao', 'media_basica'] + list(SCOUTS)}
+    medias = {s: somas[s] / jogos for s in SCOUTS}
+    medias['pontuacao'] = somas['pontuacao'] / jogos
+    # Média básica: pontuação sem G (8), A (5) e SG (5)
+    medias['media_basica'] = (somas['pontuacao'] - 8.0 * somas['g'] - 5.0 * somas['a'] - 5.0 * somas['sg']) / jogos
+    return medias
+
+
+def medias_scouts_atletas(conn: psycopg2.extensions.connection, temporada: int, rodada_atual: int,
+                          atleta_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """
+    Médias por atleta das rodadas anteriores a `rodada_atual`.
+
+    Retorna {atleta_id: {'jogos', 'pontuacao', 'media_basica', 'ds', 'ff', ...,
+    'casa': {...}, 'fora': {...}}}. Lê acw_scouts_agregados (atualizando-a se houver
+    rodada nova) e cai para o cálculo direto em acf_pontuados quando a tabela não
+    serve para a rodada pedida.
+    """
+    if atleta_ids is not None:
+        atleta_ids = list(atleta_ids)
+        if not atleta_ids:
+            return {}
+    linhas = _somas_materializadas(conn, temporada, rodada_atual, atleta_ids)
+    if linhas is None:
+        linhas = _somas_diretas(conn, temporada, rodada_atual, atleta_ids)
+
+    chaves = ['pontuacao'] + list(SCOUTS)
+    acumulado: Dict[int, Dict] = {}
+    for row in linhas:
+        atleta_id, em_casa, jogos = row[0], row[1], int(row[2] or 0)
+        somas = {k: float(v or 0) for k, v in zip(chaves, row[3:])}
+        atleta = acumulado.setdefault(atleta_id, {
+            'jogos': 0, 'somas': dict.fromkeys(chaves, 0.0), 'casa': (0, None), 'fora': (0, None)
+        })
+        atleta['jogos'] += jogos
+        for k in chaves:
+            atleta['somas'][k] += somas[k]
+        atleta['casa' if em_casa else 'fora'] = (jogos, somas)
+
+    resultado = {}
+    for atleta_id, atleta in acumulado.items():
+        medias = _medias(atleta['jogos'], atleta['somas'])
+        medias['jogos'] = atleta['jogos']
+        for mando in ('casa', 'fora'):
+            jogos, somas = atleta[mando]
+            medias[mando] = _medias(jogos, somas) if somas else _medias(0, {})
+            medias[mando]['jogos'] = jogos
+        resultado[atleta_id] = medias
+    return resultado
+
+
+def medias_scouts_atleta(conn: psycopg2.extensions.connection, temporada: int,
+                         rodada_atual: int, atleta_id: int) -> Dict:
+    """Médias de um atleta (ver medias_scouts_atletas); zeros se ele não jogou."""
+    medias = medias_scouts_atletas(conn, temporada, rodada_atual, [atleta_id]).get(atleta_id)
+    if medias is None:
+        medias = _medias(0, {})
+        medias['jogos'] = 0
+        medias['casa'] = dict(medias)
+        medias['fora'] = dict(medias)
+    return medias
@@ -0,0 +1,287 @@
+"""
+Modelo para a matriz de scouts cedidos por clube e posição (acw_scouts_cedidos)
+
+"Cedido" pelo clube X = scouts dos atletas que jogaram CONTRA X. Em vez de juntar
+acf_pontuados com acf_partidas a cada requisição (JOIN com OR/IN por adversário,
+difícil de indexar), a matriz clube x posição x scout é montada uma vez por
+rodada, com as somas separadas por mando do clube que cedeu ('casa' quando X era
+o mandante da partida, 'fora' quando era o visitante).
+
+Cada montagem fica registrada em acw_scouts_cedidos_estado com a "impressão
+digital" (linhas e soma da pontuação) da última rodada usada; se essa rodada
+mudar no acf_pontuados (dados atrasados ou corrigidos), a matriz é refeita.
+
+Scouts nulos contam como 0, como em models/scouts_agregados.py.
+"""
+import os
+import threading
+import time
+import psycopg2
+from typing import Dict, Optional
+
+from database import get_db_connection, close_db_connection
+from utils.scouts import SCOUTS
+
+# Chave do pg_advisory_xact_lock que serializa as montagens entre workers
+_LOCK_MONTAGEM = 7_400_010
+# Intervalo (segundos) para reconferir a última rodada e recarregar a cópia em memória
+SCOUTS_CEDIDOS_VERIFICACAO = float(os.getenv('SCOUTS_CEDIDOS_VERIFICACAO', '300'))
+MANDOS = ('casa', 'fora')
+
+_COLUNAS_SOMA = [f'soma_{s}' for s in SCOUTS]
+
+# Tabelas criadas neste processo (evita CREATE IF NOT EXISTS a cada leitura)
+_tabelas_prontas = False
+# Cópia em memória das matrizes já lidas: (temporada, ate_rodada) -> (carregada_em, matriz)
+_memo_lock = threading.Lock()
+_memo: Dict[tuple, tuple] = {}
+
+
+def create_scouts_cedidos_tables(conn: psycopg2.extensions.connection):
+    """Cria as tabelas da matriz de cedidos e do estado das montagens"""
+    global _tabelas_prontas
+    cursor = conn.cursor()
+    colunas_soma = ',\n            '.join(f'{c} DOUBLE PRECISION NOT NULL DEFAULT 0' for c in _COLUNAS_SOMA)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS acw_scouts_cedidos (
+            temporada INTEGER NOT NULL,
+            ate_rodada INTEGER NOT NULL,
+            clube_id INTEGER NOT NULL,
+            posicao_id INTEGER NOT NULL,
+            mando VARCHAR(4) NOT NULL,
+            jogos INTEGER NOT NULL DEFAULT 0,
+            {colunas_soma},
+            PRIMARY KEY (temporada, ate_rodada, clube_id, posicao_id, mando)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS acw_scouts_cedidos_estado (
+            temporada INTEGER NOT NULL,
+            ate_rodada INTEGER NOT NULL,
+            linhas INTEGER NOT NULL,
+            soma_pontuacao DOUBLE PRECISION NOT NULL,
+            montada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (temporada, ate_rodada)
+        )
+    ''')
+    conn.commit()
+    _tabelas_prontas = True
+
+
+def _garantir_tabelas(conn) -> bool:
+    if _tabelas_prontas:
+        return True
+    try:
+        create_scouts_cedidos_tables(conn)
+        return True
+    except psycopg2.Error as e:
+        print(f"[AVISO] Tabelas de scouts cedidos indisponíveis: {e}")
+        conn.rollback()
+        return False
+
+
+def _select_cedidos() -> str:
+    """SELECT das somas cedidas por clube, posição e mando (usado na montagem e no fallback).
+
+    Parâmetros: (temporada, ate_rodada) para cada lado da partida.
+    """
+    colunas = ', '.join(f'p.scout_{s}' for s in SCOUTS)
+    somas = ', '.join(f'SUM(COALESCE(c.scout_{s}, 0))' for s in SCOUTS)
+    return f'''
+        SELECT c.clube_id, c.posicao_id, c.mando, COUNT(*), {somas}
+        FROM (
+            SELECT pt.clube_casa_id AS clube_id, 'casa' AS mando, p.posicao_id, {colunas}
+            FROM acf_pontuados p
+            JOIN acf_partidas pt ON pt.temporada = p.temporada AND pt.rodada_id = p.rodada_id
+                                AND pt.clube_visitante_id = p.clube_id
+            WHERE p.temporada = %s AND p.rodada_id <= %s AND p.entrou_em_campo = TRUE
+            UNION ALL
+            SELECT pt.clube_visitante_id AS clube_id, 'fora' AS mando, p.posicao_id, {colunas}
+            FROM acf_pontuados p
+            JOIN acf_partidas pt ON pt.temporada = p.temporada AND pt.rodada_id = p.rodada_id
+                                AND pt.clube_casa_id = p.clube_id
+            WHERE p.temporada = %s AND p.rodada_id <= %s AND p.entrou_em_campo = TRUE
+        ) c
+        GROUP BY c.clube_id, c.posicao_id, c.mando
+    '''
+
+
+def _impressao(cursor, temporada: int, rodada_id: int) -> tuple:
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(SUM(pontuacao), 0)
+        FROM acf_pontuados
+        WHERE temporada = %s AND rodada_id = %s AND entrou_em_campo = TRUE
+    ''', (temporada, rodada_id))
+    row = cursor.fetchone()
+    return int(row[0]), float(row[1])
+
+
+def montar_matriz_cedidos(conn: psycopg2.extensions.connection, temporada: int, ate_rodada: int,
+                          forcar: bool = False) -> bool:
+    """
+    Monta (ou confere) a matriz de cedidos com as rodadas da temporada até `ate_rodada`.
+    Só refaz as somas se a matriz não existir, se a última rodada mudou ou se `forcar`.
+    Retorna False em erro.
+    """
+    if not _garantir_tabelas(conn):
+        return False
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', (_LOCK_MONTAGEM, temporada))
+        impressao = _impressao(cursor, temporada, ate_rodada)
+
+        cursor.execute('''
+            SELECT linhas, soma_pontuacao FROM acw_scouts_cedidos_estado
+            WHERE temporada = %s AND ate_rodada = %s
+        ''', (temporada, ate_rodada))
+        row = cursor.fetchone()
+        if (not forcar and row is not None and int(row[0]) == impressao[0]
+                and abs(float(row[1]) - impressao[1]) < 1e-6):
+            # Matriz em dia: só renova a data da conferência
+            cursor.execute('''
+                UPDATE acw_scouts_cedidos_estado SET montada_em = CURRENT_TIMESTAMP
+                WHERE temporada = %s AND ate_rodada = %s
+            ''', (temporada, ate_rodada))
+            conn.commit()
+            return True
+
+        cursor.execute('DELETE FROM acw_scouts_cedidos WHERE temporada = %s AND ate_rodada = %s',
+                       (temporada, ate_rodada))
+        cursor.execute(f'''
+            INSERT INTO acw_scouts_cedidos
+                (clube_id, posicao_id, mando, jogos, {', '.join(_COLUNAS_SOMA)}, temporada, ate_rodada)
+            SELECT s.*, %s, %s FROM ({_select_cedidos()}) s
+        ''', (temporada, ate_rodada, temporada, ate_rodada, temporada, ate_rodada))
+        cursor.execute('''
+            INSERT INTO acw_scouts_cedidos_estado (temporada, ate_rodada, linhas, soma_pontuacao, montada_em)
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (temporada, ate_rodada) DO UPDATE SET
+                linhas = EXCLUDED.linhas,
+                soma_pontuacao = EXCLUDED.soma_pontuacao,
+                montada_em = CURRENT_TIMESTAMP
+        ''', (temporada, ate_rodada, impressao[0], impressao[1]))
+        conn.commit()
+        print(f"[OK] Matriz de cedidos da temporada {temporada} montada até a rodada {ate_rodada}")
+        return True
+    except psycopg2.Error as e:
+        print(f"[ERRO] Erro ao montar matriz de cedidos: {e}")
+        conn.rollback()
+        return False
+
+
+def _montar_em_conexao_propria(temporada: int, ate_rodada: int) -> bool:
+    """Cria as tabelas e monta a matriz numa conexão separada.
+
+    A montagem faz DDL/DML e commit; numa conexão própria ela não encerra a
+    transação de quem só está lendo a matriz.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        return montar_matriz_cedidos(conn, temporada, ate_rodada)
+    finally:
+        close_db_connection(conn)
+
+
+def _linhas_materializadas(conn, temporada: int, ate_rodada: int) -> Optional[list]:
+    """Linhas da matriz para `ate_rodada`, montando-a se preciso; None se indisponível.
+
+    Só lê em `conn` (dentro de um SAVEPOINT); a montagem vai para outra conexão.
+    """
+    if not _tabelas_prontas and not _montar_em_conexao_propria(temporada, ate_rodada):
+        return None
+    cursor = conn.cursor()
+    cursor.execute('SAVEPOINT scouts_cedidos')
+    try:
+        cursor.execute('''
+            SELECT EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - montada_em))
+            FROM acw_scouts_cedidos_estado
+            WHERE temporada = %s AND ate_rodada = %s
+        ''', (temporada, ate_rodada))
+        row = cursor.fetchone()
+        if row is None or float(row[0] or 0) > SCOUTS_CEDIDOS_VERIFICACAO:
+            if not _montar_em_conexao_propria(temporada, ate_rodada):
+                return None
+
+        cursor.execute(f'''
+            SELECT clube_id, posicao_id, mando, jogos, {', '.join(_COLUNAS_SOMA)}
+            FROM acw_scouts_cedidos
+            WHERE temporada = %s AND ate_rodada = %s
+        ''', (temporada, ate_rodada))
+        return cursor.fetchall()
+    except psycopg2.Error as e:
+        print(f"[AVISO] Erro ao ler matriz de cedidos: {e}")
+        cursor.execute('ROLLBACK TO SAVEPOINT scouts_cedidos')
+        return None
+    finally:
+        cursor.execute('RELEASE SAVEPOINT scouts_cedidos')
+
+
+def _linhas_diretas(conn, temporada: int, ate_rodada: int) -> list:
+    """Mesmas somas calculadas direto sobre acf_pontuados (fallback)."""
+    cursor = conn.cursor()
+    cursor.execute(_select_cedidos(), (temporada, ate_rodada, temporada, ate_rodada))
+    return cursor.fetchall()
+
+
+def _medias(jogos: int, somas: Dict[str, float]) -> Dict[str, float]:
+    medias = {s: (somas[s] / jogos if jogos else 0.0) for s in SCOUTS}
+    medias['jogos'] = jogos
+    return medias
+
+
+def _montar_dicionario(linhas: list) -> Dict[int, Dict[int, Dict]]:
+    acumulado: Dict[tuple, Dict] = {}
+    for row in linhas:
+        clube_id, posicao_id, mando, jogos = row[0], row[1], row[2], int(row[3] or 0)
+        somas = {s: float(v or 0) for s, v in zip(SCOUTS, row[4:])}
+        celula = acumulado.setdefault((posicao_id, clube_id), {
+            'jogos': 0, 'somas': dict.fromkeys(SCOUTS, 0.0), 'casa': (0, None), 'fora': (0, None)
+        })
+        celula['jogos'] += jogos
+        for s in SCOUTS:
+            celula['somas'][s] += somas[s]
+        celula[mando] = (jogos, somas)
+
+    matriz: Dict[int, Dict[int, Dict]] = {}
+    for (posicao_id, clube_id), celula in acumulado.items():
+        medias = _medias(celula['jogos'], celula['somas'])
+        for mando in MANDOS:
+            jogos, somas = celula[mando]
+            medias[mando] = _medias(jogos, somas) if somas else _medias(0, dict.fromkeys(SCOUTS, 0.0))
+        matriz.setdefault(posicao_id, {})[clube_id] = medias
+    return matriz
+
+
+def matriz_cedidos(conn: psycopg2.extensions.connection, temporada: int,
+                   rodada_atual: int) -> Dict[int, Dict[int, Dict]]:
+    """
+    Médias de scouts cedidos por clube e posição nas rodadas anteriores a `rodada_atual`.
+
+    Retorna {posicao_id: {clube_id: {'jogos', 'ds', 'ff', ..., 'casa': {...}, 'fora': {...}}}},
+    onde 'casa'/'fora' é o mando do clube que cedeu. O resultado é compartilhado entre
+    as chamadas do processo: não altere o dicionário retornado.
+    """
+    ate_rodada = rodada_atual - 1
+    chave = (temporada, ate_rodada)
+    with _memo_lock:
+        memo = _memo.get(chave)
+    if memo is not None and time.monotonic() - memo[0] < SCOUTS_CEDIDOS_VERIFICACAO:
+        return memo[1]
+
+    linhas = _linhas_materializadas(conn, temporada, ate_rodada)
+    if linhas is None:
+        linhas = _linhas_diretas(conn, temporada, ate_rodada)
+    matriz = _montar_dicionario(linhas)
+    with _memo_lock:
+        # Só a temporada/rodada mais recente interessa; descarta as demais
+        _memo.clear()
+        _memo[chave] = (time.monotonic(), matriz)
+    return matriz
+
+
+def invalidar_matriz_cedidos() -> None:
+    """Descarta a cópia em memória deste processo (a próxima leitura consulta o banco)."""
+    with _memo_lock:
+        _memo.clear()
@@ -1,89 +1,397 @@
 """
 Modelo para gerenciamento de rankings calculados por usuário
+
+ranking_data é gravado em formato colunar: em vez de uma lista de dicts com as
+mesmas chaves repetidas por jogador, um objeto
+    {"formato": "colunar", "versao": 1, "n": N, "colunas": {"atleta_id": [...], ...}}
+com um array por campo, na ordem do ranking. As leituras de get_team_rankings e
+get_latest_team_rankings continuam devolvendo a lista de dicts; get_ranking_columns
+lê só as colunas pedidas (e só o top-K) direto no banco. Linhas antigas (lista de
+dicts) continuam legíveis e são convertidas por migrate_rankings_to_columnar.
+
+acw_rankings_teams é particionada por temporada (LIST) e, em cada temporada, por
+rodada (RANGE): uma partição por rodada, criada na primeira gravação da rodada
+(garantir_particao_rankings). A retenção (aplicar_retencao_rankings) mantém as
+RANKINGS_RODADAS_RETIDAS rodadas mais recentes e arquiva ou apaga as demais
+partições inteiras, sem DELETE.
 """
 import psycopg2
 import json
-from typing import List, Dict, Optional
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
 from database import get_db_connection, close_db_connection
 
-def create_rankings_teams_table(conn: psycopg2.extensions.connection):
-    """Cria a tabela de rankings calculados por time"""
-    cursor = conn.cursor()
+# Retenção: quantas rodadas (as mais recentes com rankings) ficam na tabela principal
+RANKINGS_RODADAS_RETIDAS = int(os.getenv('RANKINGS_RODADAS_RETIDAS', '6'))
+# 'arquivar' move as partições antigas para RANKINGS_SCHEMA_ARQUIVO; 'remover' as apaga
+RANKINGS_RETENCAO_MODO = os.getenv('RANKINGS_RETENCAO_MODO', 'arquivar')
+RANKINGS_SCHEMA_ARQUIVO = os.getenv('RANKINGS_SCHEMA_ARQUIVO', 'acw_arquivo')
+
+# Chave do pg_advisory_xact_lock que serializa criação/remoção de partições entre workers
+_LOCK_PARTICOES = 7_400_015
+_PARTICAO_RODADA = re.compile(r'^acw_rankings_teams_(\d{4})_r(\d{2})$')
+_particoes_prontas = set()
+
+def _nome_particao_temporada(temporada: int) -> str:
+    return f'acw_rankings_teams_{int(temporada)}'
+
+def _nome_particao_rodada(temporada: int, rodada: int) -> str:
+    return f'acw_rankings_teams_{int(temporada)}_r{int(rodada):02d}'
+
+def _criar_tabela_particionada(cursor):
+    """Tabela principal particionada por temporada (LIST) e, dentro dela, por rodada (RANGE)"""
+    cursor.execute('CREATE SEQUENCE IF NOT EXISTS acw_rankings_teams_id_seq')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS acw_rankings_teams (
-            id SERIAL PRIMARY KEY,
+            id INTEGER NOT NULL DEFAULT nextval('acw_rankings_teams_id_seq'),
             user_id INTEGER NOT NULL,
             team_id INTEGER NOT NULL,
             configuration_id INTEGER REFERENCES acw_weight_configurations(id),
             posicao_id INTEGER NOT NULL,
+            temporada INTEGER NOT NULL DEFAULT EXTRACT(YEAR FROM CURRENT_DATE)::integer,
             rodada_atual INTEGER NOT NULL,
             ranking_data JSONB NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, temporada, rodada_atual),
             FOREIGN KEY (user_id) REFERENCES acw_users(id) ON DELETE CASCADE,
             FOREIGN KEY (team_id) REFERENCES acw_teams(id) ON DELETE CASCADE
-        )
+        ) PARTITION BY LIST (temporada)
     ''')
-    # Criar índices
+    cursor.execute('ALTER SEQUENCE acw_rankings_teams_id_seq OWNED BY acw_rankings_teams.id')
+    # Criar índices (propagados para todas as partições)
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_rankings_teams_user_team ON acw_rankings_teams(user_id, team_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_rankings_teams_config ON acw_rankings_teams(team_id, configuration_id, posicao_id, rodada_atual)')
+
+def _criar_particao(cursor, temporada: int, rodada: int):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {_nome_particao_temporada(temporada)}
+        PARTITION OF acw_rankings_teams FOR VALUES IN ({int(temporada)})
+        PARTITION BY RANGE (rodada_atual)
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {_nome_particao_rodada(temporada, rodada)}
+        PARTITION OF {_nome_particao_temporada(temporada)}
+        FOR VALUES FROM ({int(rodada)}) TO ({int(rodada) + 1})
+    ''')
+
+def _migrar_para_particionada(conn: psycopg2.extensions.connection):
+    """Converte a tabela antiga (não particionada) na particionada, copiando os rankings.
+    
+    Linhas antigas não tinham temporada: usa o ano de created_at. Duplicatas da chave
+    única ficam só com a mais recente.
+    """
+    cursor = conn.cursor()
+    print("   🔄 Particionando acw_rankings_teams por temporada/rodada...")
+    cursor.execute('ALTER TABLE acw_rankings_teams RENAME TO acw_rankings_teams_legado')
+    cursor.execute('ALTER TABLE acw_rankings_teams_legado RENAME CONSTRAINT acw_rankings_teams_pkey TO acw_rankings_teams_legado_pkey')
+    cursor.execute('ALTER SEQUENCE IF EXISTS acw_rankings_teams_id_seq OWNED BY NONE')
+    for indice in ('idx_rankings_teams_user_team', 'idx_rankings_teams_config', 'uq_rankings_teams_chave'):
+        cursor.execute(f'DROP INDEX IF EXISTS {indice}')
+    _criar_tabela_particionada(cursor)
+    cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS uq_rankings_teams_chave ON acw_rankings_teams ({_CHAVE_RANKING})')
+    
+    temporada_legado = 'COALESCE(EXTRACT(YEAR FROM created_at)::integer, EXTRACT(YEAR FROM CURRENT_DATE)::integer)'
+    cursor.execute(f'SELECT DISTINCT {temporada_legado}, rodada_atual FROM acw_rankings_teams_legado')
+    for temporada, rodada in cursor.fetchall():
+        _criar_particao(cursor, temporada, rodada)
+    cursor.execute(f'''
+        INSERT INTO acw_rankings_teams (id, user_id, team_id, configuration_id, posicao_id, temporada,
+                                        rodada_atual, ranking_data, created_at)
+        SELECT id, user_id, team_id, configuration_id, posicao_id, {temporada_legado},
+               rodada_atual, ranking_data, created_at
+        FROM acw_rankings_teams_legado
+        ORDER BY created_at DESC NULLS LAST, id DESC
+        ON CONFLICT ({_CHAVE_RANKING}) DO NOTHING
+    ''')
+    copiadas = cursor.rowcount
+    cursor.execute('DROP TABLE acw_rankings_teams_legado')
+    cursor.execute("SELECT setval('acw_rankings_teams_id_seq', COALESCE((SELECT MAX(id) FROM acw_rankings_teams), 0) + 1, false)")
+    print(f"   ✅ {copiadas} rankings copiados para a tabela particionada")
+
+def create_rankings_teams_table(conn: psycopg2.extensions.connection):
+    """Cria a tabela de rankings calculados por time (particionada por temporada e rodada)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT pg_advisory_xact_lock(%s)', (_LOCK_PARTICOES,))
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('acw_rankings_teams')")
+    row = cursor.fetchone()
+    if row and row[0] == 'r':
+        _migrar_para_particionada(conn)
+    else:
+        _criar_tabela_particionada(cursor)
     conn.commit()
+    ensure_rankings_unique_key(conn)
+
+# Chave única de um ranking salvo (configuration_id nulo conta como 0). Inclui as
+# colunas de partição, exigência do PostgreSQL para índices únicos particionados
+_CHAVE_RANKING = 'user_id, team_id, (COALESCE(configuration_id, 0)), posicao_id, temporada, rodada_atual'
+_chave_unica_pronta = False
+
+def ensure_rankings_unique_key(conn: psycopg2.extensions.connection):
+    """Remove rankings duplicados (mantém o mais recente) e cria o índice único usado no upsert"""
+    global _chave_unica_pronta
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('uq_rankings_teams_chave')")
+    if cursor.fetchone()[0] is None:
+        cursor.execute('''
+            DELETE FROM acw_rankings_teams r
+            USING acw_rankings_teams o
+            WHERE r.user_id = o.user_id AND r.team_id = o.team_id
+              AND COALESCE(r.configuration_id, 0) = COALESCE(o.configuration_id, 0)
+              AND r.posicao_id = o.posicao_id AND r.temporada = o.temporada
+              AND r.rodada_atual = o.rodada_atual
+              AND (COALESCE(r.created_at, 'epoch'), r.id) < (COALESCE(o.created_at, 'epoch'), o.id)
+        ''')
+        if cursor.rowcount:
+            print(f"[OK] {cursor.rowcount} rankings duplicados removidos de acw_rankings_teams")
+        cursor.execute(f'''
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_rankings_teams_chave
+            ON acw_rankings_teams ({_CHAVE_RANKING})
+        ''')
+    conn.commit()
+    _chave_unica_pronta = True
+
+def garantir_particao_rankings(conn: psycopg2.extensions.connection, temporada: int, rodada_atual: int) -> bool:
+    """Garante a partição de (temporada, rodada_atual). Retorna True se ela acabou de ser criada.
+    
+    O CREATE roda na transação de `conn` e o commit (ou rollback) fica com o chamador;
+    a partição só entra em _particoes_prontas depois de confirmada. Quem criou
+    a partição de uma rodada nova dispara a retenção (aplicar_retencao_em_conexao_propria)
+    depois do seu commit.
+    """
+    chave = (int(temporada), int(rodada_atual))
+    if chave in _particoes_prontas:
+        return False
+    cursor = conn.cursor()
+    cursor.execute('SELECT to_regclass(%s)', (_nome_particao_rodada(*chave),))
+    if cursor.fetchone()[0] is not None:
+        _particoes_prontas.add(chave)
+        return False
+    cursor.execute('SELECT pg_advisory_xact_lock(%s)', (_LOCK_PARTICOES,))
+    cursor.execute('SELECT to_regclass(%s)', (_nome_particao_rodada(*chave),))
+    if cursor.fetchone()[0] is not None:
+        # Criada por outro worker enquanto esperávamos o lock
+        return False
+    _criar_particao(cursor, *chave)
+    return True
+
+def aplicar_retencao_em_conexao_propria() -> None:
+    """Aplica a retenção numa conexão separada (DDL com commit próprio), só registrando falhas"""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        aplicar_retencao_rankings(conn)
+    except Exception as e:
+        print(f"[AVISO] Falha ao aplicar retenção dos rankings: {e}")
+    finally:
+        close_db_connection(conn)
+
+def listar_particoes_rankings(conn: psycopg2.extensions.connection) -> List[Tuple[int, int]]:
+    """(temporada, rodada) de cada partição de rodada da tabela principal, da mais antiga à mais recente"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_inherits ip ON ip.inhrelid = p.oid
+        WHERE ip.inhparent = 'acw_rankings_teams'::regclass
+    ''')
+    particoes = []
+    for (nome,) in cursor.fetchall():
+        match = _PARTICAO_RODADA.match(nome)
+        if match:
+            particoes.append((int(match.group(1)), int(match.group(2))))
+    return sorted(particoes)
+
+def aplicar_retencao_rankings(
+    conn: psycopg2.extensions.connection,
+    rodadas_retidas: Optional[int] = None,
+    modo: Optional[str] = None
+) -> List[Tuple[int, int]]:
+    """Mantém só as `rodadas_retidas` partições de rodada mais recentes na tabela principal.
+    
+    As mais antigas são desanexadas e movidas para o schema de arquivo (modo
+    'arquivar') ou apagadas (modo 'remover') — DDL de partição, sem DELETE linha a
+    linha. Partições de temporada que ficam vazias também saem. Retorna as
+    (temporada, rodada) retiradas.
+    """
+    rodadas_retidas = RANKINGS_RODADAS_RETIDAS if rodadas_retidas is None else rodadas_retidas
+    modo = modo or RANKINGS_RETENCAO_MODO
+    if modo not in ('arquivar', 'remover'):
+        raise ValueError(f"Modo de retenção inválido: {modo}")
+    if rodadas_retidas < 1:
+        raise ValueError("rodadas_retidas deve ser pelo menos 1")
+    
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (_LOCK_PARTICOES,))
+        particoes = listar_particoes_rankings(conn)
+        antigas = particoes[:-rodadas_retidas] if len(particoes) > rodadas_retidas else []
+        if antigas and modo == 'arquivar':
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {RANKINGS_SCHEMA_ARQUIVO}')
+        for temporada, rodada in antigas:
+            nome = _nome_particao_rodada(temporada, rodada)
+            if modo == 'arquivar':
+                cursor.execute(f'ALTER TABLE {_nome_particao_temporada(temporada)} DETACH PARTITION {nome}')
+                cursor.execute('SELECT to_regclass(%s)', (f'{RANKINGS_SCHEMA_ARQUIVO}.{nome}',))
+                if cursor.fetchone()[0] is None:
+                    cursor.execute(f'ALTER TABLE {nome} SET SCHEMA {RANKINGS_SCHEMA_ARQUIVO}')
+                else:
+                    # Rodada já arquivada antes (recalculada depois): junta no arquivo existente
+                    cursor.execute(f'INSERT INTO {RANKINGS_SCHEMA_ARQUIVO}.{nome} SELECT * FROM {nome}')
+                    cursor.execute(f'DROP TABLE {nome}')
+            else:
+                cursor.execute(f'DROP TABLE {nome}')
+            _particoes_prontas.discard((temporada, rodada))
+        restantes = {temporada for temporada, _ in particoes[len(antigas):]}
+        for temporada in {temporada for temporada, _ in antigas} - restantes:
+            cursor.execute(f'DROP TABLE IF EXISTS {_nome_particao_temporada(temporada)}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if antigas:
+        destino = f'arquivadas em {RANKINGS_SCHEMA_ARQUIVO}' if modo == 'arquivar' else 'removidas'
+        print(f"[OK] Retenção de rankings: {len(antigas)} partições de rodada {destino}")
+    return antigas
 
 # Alias para compatibilidade com o nome esperado pelo app.py
 def create_user_rankings_table(conn: psycopg2.extensions.connection):
     """Alias para create_rankings_teams_table por compatibilidade"""
     return create_rankings_teams_table(conn)
 
-def save_team_ranking(
+FORMATO_COLUNAR = 'colunar'
+VERSAO_COLUNAR = 1
+
+# Quantidade de jogadores de um ranking_data em SQL (formato colunar ou lista antiga)
+SQL_QTD_JOGADORES = (
+    "CASE WHEN jsonb_typeof(ranking_data) = 'array' THEN jsonb_array_length(ranking_data) "
+    "ELSE COALESCE((ranking_data->>'n')::int, 0) END"
+)
+
+def ranking_para_colunas(ranking_data):
+    """Converte uma lista de dicts em formato colunar (outros valores voltam inalterados).
+    
+    Campos ausentes num jogador viram null na coluna.
+    """
+    if not isinstance(ranking_data, list) or not all(isinstance(j, dict) for j in ranking_data):
+        return ranking_data
+    colunas = {}
+    for jogador in ranking_data:
+        for campo in jogador:
+            if campo not in colunas:
+                colunas[campo] = None
+    for campo in colunas:
+        colunas[campo] = [jogador.get(campo) for jogador in ranking_data]
+    return {'formato': FORMATO_COLUNAR, 'versao': VERSAO_COLUNAR, 'n': len(ranking_data), 'colunas': colunas}
+
+def ranking_de_colunas(ranking_data):
+    """Converte o formato colunar de volta para lista de dicts (outros valores voltam inalterados)."""
+    if not (isinstance(ranking_data, dict) and ranking_data.get('formato') == FORMATO_COLUNAR):
+        return ranking_data
+    colunas = ranking_data.get('colunas') or {}
+    campos = list(colunas)
+    return [dict(zip(campos, valores)) for valores in zip(*(colunas[c] for c in campos))]
+
+def _ranking_json(ranking_data) -> str:
+    # Garantir que ranking_data seja serializável
+    if not isinstance(ranking_data, (dict, list)):
+        ranking_data = list(ranking_data) if hasattr(ranking_data, '__iter__') else []
+    return json.dumps(ranking_para_colunas(ranking_data), ensure_ascii=False, separators=(',', ':'))
+
+def save_team_rankings(
     conn: psycopg2.extensions.connection,
     user_id: int,
     team_id: int,
     configuration_id: Optional[int],
-    posicao_id: int,
     rodada_atual: int,
-    ranking_data
-) -> int:
-    """Salva um ranking calculado para um time"""
-    cursor = conn.cursor()
+    rankings: Dict[int, object],
+    temporada: Optional[int] = None
+) -> Dict[int, int]:
+    """Salva rankings de várias posições de um time num único INSERT ... ON CONFLICT.
     
-    # Verificar se já existe ranking para esta combinação
-    if configuration_id:
-        cursor.execute('''
-            SELECT id FROM acw_rankings_teams
-            WHERE user_id = %s AND team_id = %s AND configuration_id = %s AND posicao_id = %s AND rodada_atual = %s
-        ''', (user_id, team_id, configuration_id, posicao_id, rodada_atual))
-    else:
-        cursor.execute('''
-            SELECT id FROM acw_rankings_teams
-            WHERE user_id = %s AND team_id = %s AND configuration_id IS NULL AND posicao_id = %s AND rodada_atual = %s
-        ''', (user_id, team_id, posicao_id, rodada_atual))
+    rankings: {posicao_id: ranking_data}. Rankings idênticos ao já salvo não são
+    regravados. temporada padrão: get_temporada_atual(). Retorna {posicao_id: id do ranking}.
+    """
+    if not rankings:
+        return {}
+    if not _chave_unica_pronta:
+        ensure_rankings_unique_key(conn)
+    if temporada is None:
+        from utils.utilidades import get_temporada_atual
+        temporada = get_temporada_atual()
     
-    existing = cursor.fetchone()
-    
-    # Garantir que ranking_data seja serializável
-    if not isinstance(ranking_data, (dict, list)):
-        ranking_data = list(ranking_data) if hasattr(ranking_data, '__iter__') else []
-    
-    ranking_json = json.dumps(ranking_data, ensure_ascii=False)
-    
-    if existing:
-        # Atualizar
-        cursor.execute('''
-            UPDATE acw_rankings_teams
-            SET ranking_data = %s, created_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-        ''', (ranking_json, existing[0]))
-        conn.commit()
-        return existing[0]
-    else:
-        # Criar novo
-        cursor.execute('''
-            INSERT INTO acw_rankings_teams (user_id, team_id, configuration_id, posicao_id, rodada_atual, ranking_data)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
-        ''', (user_id, team_id, configuration_id, posicao_id, rodada_atual, ranking_json))
-        ranking_id = cursor.fetchone()[0]
+    cursor = conn.cursor()
+    valores = [(posicao_id, _ranking_json(ranking_data)) for posicao_id, ranking_data in rankings.items()]
+    placeholders = ', '.join(['(%s, %s::jsonb)'] * len(valores))
+    params = [p for valor in valores for p in valor]
+    try:
+        particao_nova = garantir_particao_rankings(conn, temporada, rodada_atual)
+        cursor.execute(f'''
+            WITH novos (posicao_id, ranking_data) AS (
+                VALUES {placeholders}
+            ),
+            gravados AS (
+                INSERT INTO acw_rankings_teams (user_id, team_id, configuration_id, posicao_id, temporada, rodada_atual, ranking_data)
+                SELECT %s, %s, %s::integer, n.posicao_id, %s, %s, n.ranking_data FROM novos n
+                ON CONFLICT ({_CHAVE_RANKING}) DO UPDATE
+                SET ranking_data = EXCLUDED.ranking_data, created_at = CURRENT_TIMESTAMP
+                WHERE acw_rankings_teams.ranking_data IS DISTINCT FROM EXCLUDED.ranking_data
+                RETURNING posicao_id, id
+            )
+            SELECT posicao_id, id FROM gravados
+            UNION ALL
+            SELECT r.posicao_id, r.id
+            FROM acw_rankings_teams r
+            JOIN novos n ON n.posicao_id = r.posicao_id
+            WHERE r.user_id = %s AND r.team_id = %s AND COALESCE(r.configuration_id, 0) = COALESCE(%s::integer, 0)
+              AND r.temporada = %s AND r.rodada_atual = %s
+              AND NOT EXISTS (SELECT 1 FROM gravados g WHERE g.posicao_id = r.posicao_id)
+        ''', params + [user_id, team_id, configuration_id, temporada, rodada_atual,
+                        user_id, team_id, configuration_id, temporada, rodada_atual])
+        ids = {row[0]: row[1] for row in cursor.fetchall()}
         conn.commit()
-        return ranking_id
+    except Exception:
+        conn.rollback()
+        raise
+    if particao_nova:
+        _particoes_prontas.add((int(temporada), int(rodada_atual)))
+        aplicar_retencao_em_conexao_propria()
+    return ids
+
+def save_team_ranking(
+    conn: psycopg2.extensions.connection,
+    user_id: int,
+    team_id: int,
+    configuration_id: Optional[int],
+    posicao_id: int,
+    rodada_atual: int,
+    ranking_data,
+    temporada: Optional[int] = None
+) -> int:
+    """Salva um ranking calculado para um time (upsert atômico, ver save_team_rankings)"""
+    ids = save_team_rankings(conn, user_id, team_id, configuration_id, rodada_atual,
+                             {posicao_id: ranking_data}, temporada=temporada)
+    return ids[posicao_id]
+
+def _parse_ranking_data(ranking_data):
+    """Normaliza o ranking_data lido do banco para dict/list (formato colunar vira lista de dicts)."""
+    # PostgreSQL JSONB pode retornar dict, list ou str dependendo da versão
+    if ranking_data is None:
+        return []
+    if isinstance(ranking_data, (dict, list)):
+        # Já está no formato correto (dict ou list); colunar volta a ser lista de dicts
+        return ranking_de_colunas(ranking_data)
+    if isinstance(ranking_data, str):
+        # É uma string JSON, precisa fazer parse
+        try:
+            return ranking_de_colunas(json.loads(ranking_data))
+        except (json.JSONDecodeError, TypeError):
+            return []
+    # Outro tipo não esperado
+    return []
 
 def get_team_rankings(
     conn: psycopg2.extensions.connection,
@@ -91,17 +399,21 @@ def get_team_rankings(
     team_id: Optional[int] = None,
     configuration_id: Optional[int] = None,
     posicao_id: Optional[int] = None,
-    rodada_atual: Optional[int] = None
+    rodada_atual: Optional[int] = None,
+    temporada: Optional[int] = None
 ) -> List[Dict]:
-    """Busca rankings salvos de um time"""
+    """Busca rankings salvos de um time na temporada (padrão: get_temporada_atual())"""
+    if temporada is None:
+        from utils.utilidades import get_temporada_atual
+        temporada = get_temporada_atual()
     cursor = conn.cursor()
     
     query = '''
         SELECT id, user_id, team_id, configuration_id, posicao_id, rodada_atual, ranking_data, created_at
         FROM acw_rankings_teams
-        WHERE user_id = %s
+        WHERE user_id = %s AND temporada = %s
     '''
-    params = [user_id]
+    params = [user_id, temporada]
     
     if team_id:
         query += ' AND team_id = %s'
@@ -126,23 +438,7 @@ def get_team_rankings(
     
     result = []
     for row in rows:
-        ranking_data = row[6]  # ranking_data está na posição 6
-        
-        # PostgreSQL JSONB pode retornar dict, list ou str dependendo da versão
-        if ranking_data is None:
-            ranking_data = []
-        elif isinstance(ranking_data, (dict, list)):
-            # Já está no formato correto (dict ou list)
-            pass
-        elif isinstance(ranking_data, str):
-            # É uma string JSON, precisa fazer parse
-            try:
-                ranking_data = json.loads(ranking_data)
-            except (json.JSONDecodeError, TypeError):
-                ranking_data = []
-        else:
-            # Outro tipo não esperado
-            ranking_data = []
+        ranking_data = _parse_ranking_data(row[6])  # ranking_data está na posição 6
         
         result.append({
             'id': row[0],
@@ -156,3 +452,175 @@ def get_team_rankings(
         })
     return result
 
+def get_latest_team_rankings(
+    conn: psycopg2.extensions.connection,
+    user_id: int,
+    team_id: int,
+    configuration_id: Optional[int],
+    rodada_atual: int,
+    posicao_ids: Optional[Iterable[int]] = None,
+    temporada: Optional[int] = None
+) -> Dict[int, Dict]:
+    """Busca, numa única query, o ranking mais recente de cada posição do time na rodada.
+    
+    Retorna {posicao_id: ranking} no mesmo formato de get_team_rankings. Posições sem
+    ranking salvo não aparecem no dicionário. temporada padrão: get_temporada_atual().
+    """
+    if temporada is None:
+        from utils.utilidades import get_temporada_atual
+        temporada = get_temporada_atual()
+    cursor = conn.cursor()
+    
+    query = '''
+        SELECT DISTINCT ON (posicao_id)
+               id, user_id, team_id, configuration_id, posicao_id, rodada_atual, ranking_data, created_at
+        FROM acw_rankings_teams
+        WHERE user_id = %s AND team_id = %s AND temporada = %s AND rodada_atual = %s
+    '''
+    params = [user_id, team_id, temporada, rodada_atual]
+    
+    if configuration_id:
+        query += ' AND configuration_id = %s'
+        params.append(configuration_id)
+    
+    if posicao_ids is not None:
+        query += ' AND posicao_id = ANY(%s)'
+        params.append(list(posicao_ids))
+    
+    query += ' ORDER BY posicao_id, created_at DESC, id DESC'
+    
+    cursor.execute(query, params)
+    
+    result = {}
+    for row in cursor.fetchall():
+        result[row[4]] = {
+            'id': row[0],
+            'user_id': row[1],
+            'team_id': row[2],
+            'configuration_id': row[3],
+            'posicao_id': row[4],
+            'rodada_atual': row[5],
+            'ranking_data': _parse_ranking_data(row[6]),
+            'created_at': row[7]
+        }
+    return result
+
+def get_atletas_preco_status(
+    conn: psycopg2.extensions.connection,
+    atleta_ids: Iterable[int],
+    temporada: int
+) -> Dict[int, Tuple[float, int]]:
+    """Preço e status_id atuais (acf_atletas) de vários atletas numa única query.
+    
+    Retorna {atleta_id: (preco_num, status_id)}.
+    """
+    atleta_ids = list({a for a in atleta_ids if a})
+    if not atleta_ids:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT atleta_id, preco_num, status_id
+        FROM acf_atletas
+        WHERE atleta_id = ANY(%s) AND temporada = %s
+    ''', (atleta_ids, temporada))
+    return {
+        row[0]: (float(row[1]) if row[1] else 0.0, int(row[2]) if row[2] else 0)
+        for row in cursor.fetchall()
+    }
+
+def get_ranking_columns(
+    conn: psycopg2.extensions.connection,
+    user_id: int,
+    team_id: int,
+    configuration_id: Optional[int],
+    posicao_id: int,
+    rodada_atual: int,
+    colunas: Iterable[str] = ('atleta_id', 'pontuacao_total', 'preco_num'),
+    top_k: Optional[int] = None,
+    temporada: Optional[int] = None
+) -> Dict[str, list]:
+    """Lê só algumas colunas (e opcionalmente só o top-K) do ranking mais recente da posição.
+    
+    O recorte é feito no banco sobre o formato colunar, sem trazer o ranking inteiro.
+    Retorna {coluna: [valores]} ({} se não houver ranking salvo). temporada padrão:
+    get_temporada_atual().
+    """
+    colunas = list(colunas)
+    if not colunas:
+        return {}
+    if temporada is None:
+        from utils.utilidades import get_temporada_atual
+        temporada = get_temporada_atual()
+    cursor = conn.cursor()
+    
+    if top_k is not None:
+        # Caminho jsonpath com literal inteiro (top_k é convertido para int)
+        caminho = f'$[0 to {max(int(top_k), 1) - 1}]'
+        projecao = ', '.join(["jsonb_path_query_array(ranking_data->'colunas'->%s, %s::jsonpath)"] * len(colunas))
+        params = [p for c in colunas for p in (c, caminho)]
+    else:
+        projecao = ', '.join(["ranking_data->'colunas'->%s"] * len(colunas))
+        params = list(colunas)
+    
+    query = f'''
+        SELECT jsonb_typeof(ranking_data) = 'array', {projecao},
+               CASE WHEN jsonb_typeof(ranking_data) = 'array' THEN ranking_data END
+        FROM acw_rankings_teams
+        WHERE user_id = %s AND team_id = %s AND posicao_id = %s AND temporada = %s AND rodada_atual = %s
+    '''
+    params += [user_id, team_id, posicao_id, temporada, rodada_atual]
+    if configuration_id:
+        query += ' AND configuration_id = %s'
+        params.append(configuration_id)
+    query += ' ORDER BY created_at DESC, id DESC LIMIT 1'
+    
+    cursor.execute(query, params)
+    row = cursor.fetchone()
+    if not row:
+        return {}
+    if row[0]:
+        # Linha ainda no formato antigo (lista de dicts): recorta em Python
+        jogadores = _parse_ranking_data(row[-1])
+        if top_k is not None:
+            jogadores = jogadores[:max(int(top_k), 1)]
+        return {c: [j.get(c) if isinstance(j, dict) else None for j in jogadores] for c in colunas}
+    resultado = {}
+    for coluna, valores in zip(colunas, row[1:-1]):
+        if isinstance(valores, str):
+            valores = json.loads(valores)
+        resultado[coluna] = valores if isinstance(valores, list) else []
+    return resultado
+
+def migrate_rankings_to_columnar(conn: psycopg2.extensions.connection, lote: int = 200) -> int:
+    """Converte para o formato colunar os rankings salvos como lista de dicts.
+    
+    Processa em lotes (um commit por lote) e retorna quantas linhas foram convertidas.
+    """
+    cursor = conn.cursor()
+    convertidas = 0
+    ultimo_id = 0
+    while True:
+        cursor.execute('''
+            SELECT id, ranking_data
+            FROM acw_rankings_teams
+            WHERE id > %s AND jsonb_typeof(ranking_data) = 'array'
+            ORDER BY id
+            LIMIT %s
+        ''', (ultimo_id, lote))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        valores = []
+        for ranking_id, ranking_data in rows:
+            ranking_data = ranking_data if isinstance(ranking_data, list) else _parse_ranking_data(ranking_data)
+            valores.append((_ranking_json(ranking_data), ranking_id))
+        cursor.executemany(
+            'UPDATE acw_rankings_teams SET ranking_data = %s::jsonb WHERE id = %s',
+            valores
+        )
+        conn.commit()
+        convertidas += len(rows)
+        ultimo_id = rows[-1][0]
+    if convertidas:
+        print(f"[OK] {convertidas} rankings convertidos para o formato colunar")
+    return convertidas
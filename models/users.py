@@ -2,12 +2,32 @@
 Modelo para gerenciamento de usuários do sistema
 """
 
+import os
+import tempfile
+import threading
+import time
 import psycopg2
 import hashlib
 import secrets
 from datetime import datetime, timedelta
 from database import get_db_connection, close_db_connection, execute_query, execute_query
 
+# Cache de usuários por user_id compartilhado entre requisições (segundos)
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL', '30'))
+# Arquivo marcador tocado a cada invalidação: os demais workers da mesma máquina
+# comparam o mtime e descartam o cache sem esperar o TTL (mesmo esquema de utils.weights).
+USER_CACHE_MARKER = os.getenv(
+    'USER_CACHE_MARKER', os.path.join(tempfile.gettempdir(), 'aerocartola_usuarios.version')
+)
+
+_user_cache_lock = threading.Lock()
+_user_cache = {
+    'marcador': None,
+    'usuarios': {},  # user_id -> (dados, carregado_em)
+}
+# None = ainda não verificado; resolvido uma vez por processo (ver tem_coluna_plano)
+_coluna_plano = None
+
 
 def create_users_table():
     """Cria a tabela de usuários se não existir"""
@@ -351,6 +371,160 @@ def create_default_users():
         close_db_connection(conn)
 
 
+def tem_coluna_plano(recarregar: bool = False) -> bool:
+    """
+    Indica se acw_users possui a coluna 'plano'.
+    A consulta ao information_schema é feita uma única vez por processo (na
+    inicialização do app); chame com recarregar=True após alterar o schema.
+    """
+    global _coluna_plano
+    if _coluna_plano is not None and not recarregar:
+        return _coluna_plano
+
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT EXISTS (
+                SELECT FROM information_schema.columns 
+                WHERE table_schema = 'public' 
+                AND table_name = 'acw_users'
+                AND column_name = 'plano'
+            )
+        ''')
+        _coluna_plano = bool(cursor.fetchone()[0])
+        return _coluna_plano
+    except psycopg2.Error as e:
+        print(f"Erro ao verificar coluna plano: {e}")
+        conn.rollback()
+        return False
+    finally:
+        close_db_connection(conn)
+
+
+def _memo_requisicao():
+    """Dicionário de usuários já carregados na requisição atual (em `g`), ou None fora do Flask."""
+    try:
+        from flask import g, has_app_context
+    except ImportError:
+        return None
+    if not has_app_context():
+        return None
+    if not hasattr(g, '_usuarios'):
+        g._usuarios = {}
+    return g._usuarios
+
+
+def _ler_marcador_usuarios():
+    try:
+        return os.stat(USER_CACHE_MARKER).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _buscar_usuario(user_id: int) -> dict:
+    """Lê o usuário direto do banco (inclui inativos; o chamador decide o filtro)."""
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        coluna_plano = tem_coluna_plano()
+        cursor.execute(f'''
+            SELECT id, username, email, full_name, is_active, is_admin{', plano' if coluna_plano else ''}
+            FROM acw_users
+            WHERE id = %s
+        ''', (user_id,))
+
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        return {
+            'id': row[0],
+            'username': row[1],
+            'email': row[2],
+            'full_name': row[3],
+            'is_active': row[4],
+            'is_admin': row[5],
+            'plano': (row[6] if coluna_plano else None) or 'free'
+        }
+    except psycopg2.Error as e:
+        print(f"Erro ao buscar usuário: {e}")
+        conn.rollback()
+        return None
+    finally:
+        close_db_connection(conn)
+
+
+def get_user_by_id(user_id: int) -> dict:
+    """
+    Retorna os dados do usuário (id, username, email, full_name, is_active,
+    is_admin, plano) ou None.
+
+    Dentro de uma requisição o resultado fica memorizado em `g`, e entre
+    requisições num cache do processo com TTL curto (USER_CACHE_TTL).
+    Alterações em acw_users que mudem esses campos devem chamar
+    invalidar_cache_usuario().
+    """
+    if not user_id:
+        return None
+
+    memo = _memo_requisicao()
+    if memo is not None and user_id in memo:
+        user = memo[user_id]
+        return dict(user) if user else None
+
+    marcador = _ler_marcador_usuarios()
+    agora = time.monotonic()
+    with _user_cache_lock:
+        if _user_cache['marcador'] != marcador:
+            _user_cache['usuarios'].clear()
+            _user_cache['marcador'] = marcador
+        entrada = _user_cache['usuarios'].get(user_id)
+
+    if entrada is not None and agora - entrada[1] < USER_CACHE_TTL_SECONDS:
+        user = entrada[0]
+    else:
+        user = _buscar_usuario(user_id)
+        if user is not None:
+            with _user_cache_lock:
+                _user_cache['usuarios'][user_id] = (user, agora)
+
+    if memo is not None:
+        memo[user_id] = user
+    return dict(user) if user else None
+
+
+def invalidar_cache_usuario(user_id: int = None) -> None:
+    """
+    Descarta o cache do usuário (ou de todos, se user_id for None) neste processo
+    e na requisição atual, e toca o arquivo marcador para os outros workers.
+    """
+    with _user_cache_lock:
+        if user_id is None:
+            _user_cache['usuarios'].clear()
+        else:
+            _user_cache['usuarios'].pop(user_id, None)
+
+    memo = _memo_requisicao()
+    if memo is not None:
+        if user_id is None:
+            memo.clear()
+        else:
+            memo.pop(user_id, None)
+
+    try:
+        with open(USER_CACHE_MARKER, 'a'):
+            os.utime(USER_CACHE_MARKER, None)
+    except OSError:
+        pass
+
+
 def update_user_password(user_id: int, new_password: str) -> bool:
     """Atualiza a senha de um usuário"""
     conn = get_db_connection()
@@ -23,6 +23,7 @@ import json
 import sys
 import argparse
 from database import get_db_connection, close_db_connection
+from utils.weights import invalidar_pesos
 
 # Nome do time de origem (case-insensitive)
 SOURCE_TEAM_NAME = 'Aero-RBSV'
@@ -275,6 +276,7 @@ def main():
         
         # Commit das alterações
         conn.commit()
+        invalidar_pesos()
         
         print()
         print("=" * 60)
@@ -292,6 +292,7 @@ def webhook_received():
         cancel_subscription,
         STRIPE_PLAN_MAPPING
     )
+    from models.users import invalidar_cache_usuario
     from datetime import datetime
     
     # Processar eventos do Stripe
@@ -327,6 +328,7 @@ def webhook_received():
                 )
                 
                 if success:
+                    invalidar_cache_usuario(int(user_id))
                     print(f'[OK] Assinatura salva no banco: {subscription_id} para user_id {user_id}')
                 else:
                     print(f'[ERRO] Falha ao salvar assinatura no banco')
@@ -360,6 +362,7 @@ def webhook_received():
             )
             
             if success:
+                invalidar_cache_usuario(int(user_id))
                 print(f'[OK] Assinatura criada salva no banco: {subscription_id}')
         
     elif event_type == 'customer.subscription.updated':
@@ -406,6 +409,7 @@ def webhook_received():
             )
             
             if success:
+                invalidar_cache_usuario(int(user_id))
                 print(f'[OK] Assinatura atualizada no banco: {subscription_id}')
         
     elif event_type == 'customer.subscription.deleted':
@@ -416,6 +420,8 @@ def webhook_received():
         
         success = cancel_subscription(subscription_id, canceled_at)
         if success:
+            # O evento não traz o user_id: descarta o cache de todos os usuários
+            invalidar_cache_usuario()
             print(f'[OK] Assinatura cancelada no banco: {subscription_id}')
         
     elif event_type == 'customer.subscription.trial_will_end':
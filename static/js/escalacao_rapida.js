@@ -191,6 +191,30 @@ class EscalacaoRapida {
         this.log(`✅ Ranking de ${modulo} salvo com sucesso`, 'success');
     }
 
+    /**
+     * Salva os rankings de todos os módulos numa única requisição
+     */
+    async salvarRankingsLote(rankings) {
+        this.log(`💾 Salvando rankings de ${Object.keys(rankings).length} módulos...`, 'info');
+        
+        const response = await fetch('/api/modulos/salvar-rankings', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                rankings: rankings,
+                rodada_atual: this.rodadaAtual,
+                configuration_id: this.configurationId
+            })
+        });
+        
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(`Erro ao salvar rankings: ${error.error || 'Erro desconhecido'}`);
+        }
+        
+        this.log('✅ Rankings salvos com sucesso', 'success');
+    }
+
     /**
      * Calcula todos os rankings
      */
@@ -217,10 +241,7 @@ class EscalacaoRapida {
                 // 3. Calcular ranking
                 const ranking = await this.calcularRankingModulo(modulo, dados);
                 
-                // 4. Salvar ranking
-                await this.salvarRankingModulo(modulo, ranking);
-                
-                // Armazenar ranking
+                // Armazenar ranking (salvo em lote ao final)
                 this.rankingsCalculados[modulo] = ranking;
                 
                 modulosProcessados++;
@@ -232,6 +253,9 @@ class EscalacaoRapida {
             }
         }
         
+        // 4. Salvar todos os rankings de uma vez
+        await this.salvarRankingsLote(this.rankingsCalculados);
+        
         this.log('═'.repeat(60), 'info');
         this.log('✅ TODOS OS RANKINGS CALCULADOS COM SUCESSO!', 'success');
         this.log('═'.repeat(60), 'info');
@@ -1,16 +1,28 @@
 /**
  * Escalar Todos os Times - Cartola FC
- * Escala todos os times do usuário de uma vez, respeitando as configurações individuais de cada time
+ * Escala todos os times do usuário de uma vez, respeitando as configurações individuais de cada time.
+ * O cálculo e o envio ao Cartola rodam no servidor, em paralelo (/api/escalacao-ideal/escalar-lote);
+ * aqui só acompanhamos o progresso por polling, sem trocar o time selecionado.
  */
 
+// Peso de cada estado do time no progresso total
+const PROGRESSO_ESTADO_TIME = {
+    na_fila: 0,
+    calculando: 0.3,
+    enviando: 0.7,
+    escalado: 1,
+    erro: 1
+};
+
 class EscalarTodosTimes {
     constructor() {
-        this.timesProcessados = 0;
         this.timesTotal = 0;
-        this.timeOriginal = null;
         this.resultados = [];
         this.progressCallback = null;
         this.logCallback = null;
+        this.intervaloPolling = 1000;
+        this.tempoMaximo = 5 * 60 * 1000;
+        this.estadosAnteriores = {};
     }
 
     /**
@@ -46,134 +58,6 @@ class EscalarTodosTimes {
         }
     }
 
-    /**
-     * Carrega scripts de cálculo necessários
-     */
-    async carregarScriptsCalculo() {
-        // Verificar se já estão carregados
-        if (window.EscalacaoRapida && window.EscalacaoIdeal && 
-            window.CalculoGoleiro && window.CalculoLateral && 
-            window.CalculoZagueiro && window.CalculoMeia && 
-            window.CalculoAtacante && window.CalculoTreinador) {
-            return;
-        }
-        
-        // Verificar se os scripts já estão no DOM (carregados pelo dashboard ou módulos)
-        const scriptsNoDOM = document.querySelectorAll('script[src*="calculo_"], script[src*="escalacao"]');
-        if (scriptsNoDOM.length > 0) {
-            // Aguardar um pouco para que os scripts sejam processados
-            for (let i = 0; i < 20; i++) {
-                await new Promise(resolve => setTimeout(resolve, 200));
-                
-                if (window.EscalacaoRapida && window.EscalacaoIdeal && 
-                    window.CalculoGoleiro && window.CalculoLateral && 
-                    window.CalculoZagueiro && window.CalculoMeia && 
-                    window.CalculoAtacante && window.CalculoTreinador) {
-                    return;
-                }
-            }
-        }
-        
-        // Se ainda não estiverem carregados, carregar dinamicamente
-        const scripts = [
-            'calculo_goleiro.js',
-            'calculo_lateral.js',
-            'calculo_zagueiro.js',
-            'calculo_meia.js',
-            'calculo_atacante.js',
-            'calculo_treinador.js',
-            'escalacao_ideal.js',
-            'escalacao_rapida.js'
-        ];
-        
-        for (const scriptName of scripts) {
-            // Verificar se a classe já existe antes de tentar carregar
-            if (scriptName.includes('calculo_goleiro') && window.CalculoGoleiro) continue;
-            if (scriptName.includes('calculo_lateral') && window.CalculoLateral) continue;
-            if (scriptName.includes('calculo_zagueiro') && window.CalculoZagueiro) continue;
-            if (scriptName.includes('calculo_meia') && window.CalculoMeia) continue;
-            if (scriptName.includes('calculo_atacante') && window.CalculoAtacante) continue;
-            if (scriptName.includes('calculo_treinador') && window.CalculoTreinador) continue;
-            if (scriptName.includes('escalacao_ideal') && window.EscalacaoIdeal) continue;
-            if (scriptName.includes('escalacao_rapida') && window.EscalacaoRapida) continue;
-            
-            // Verificar se o script já foi carregado no DOM
-            const existingScript = document.querySelector(`script[src*="${scriptName}"]`);
-            if (existingScript) {
-                // Aguardar mais tempo para que seja processado
-                for (let i = 0; i < 10; i++) {
-                    await new Promise(resolve => setTimeout(resolve, 200));
-                    // Verificar se a classe foi carregada
-                    if (scriptName.includes('calculo_goleiro') && window.CalculoGoleiro) break;
-                    if (scriptName.includes('calculo_lateral') && window.CalculoLateral) break;
-                    if (scriptName.includes('calculo_zagueiro') && window.CalculoZagueiro) break;
-                    if (scriptName.includes('calculo_meia') && window.CalculoMeia) break;
-                    if (scriptName.includes('calculo_atacante') && window.CalculoAtacante) break;
-                    if (scriptName.includes('calculo_treinador') && window.CalculoTreinador) break;
-                    if (scriptName.includes('escalacao_ideal') && window.EscalacaoIdeal) break;
-                    if (scriptName.includes('escalacao_rapida') && window.EscalacaoRapida) break;
-                }
-                continue;
-            }
-            
-            // Tentar diferentes caminhos
-            const caminhos = [
-                `/static/js/${scriptName}`,
-                `${window.location.origin}/static/js/${scriptName}`,
-                `static/js/${scriptName}`
-            ];
-            
-            let carregado = false;
-            for (const src of caminhos) {
-                try {
-                    await new Promise((resolve, reject) => {
-                        const script = document.createElement('script');
-                        script.src = src;
-                        script.async = false;
-                        script.onload = () => {
-                            carregado = true;
-                            resolve();
-                        };
-                        script.onerror = () => {
-                            reject(new Error(`Erro ao carregar ${src}`));
-                        };
-                        document.head.appendChild(script);
-                    });
-                    break; // Se carregou com sucesso, sair do loop
-                } catch (error) {
-                    // Tentar próximo caminho
-                    continue;
-                }
-            }
-            
-            // Pequena pausa entre scripts
-            await new Promise(resolve => setTimeout(resolve, 200));
-        }
-        
-        // Aguardar um pouco mais para garantir que tudo foi processado
-        await new Promise(resolve => setTimeout(resolve, 1000));
-    }
-    
-    /**
-     * Carrega um script dinamicamente
-     */
-    async carregarScript(src) {
-        return new Promise((resolve, reject) => {
-            // Verificar se o script já foi carregado
-            const existingScript = document.querySelector(`script[src="${src}"]`);
-            if (existingScript) {
-                resolve();
-                return;
-            }
-            
-            const script = document.createElement('script');
-            script.src = src;
-            script.onload = resolve;
-            script.onerror = () => reject(new Error(`Erro ao carregar script: ${src}`));
-            document.head.appendChild(script);
-        });
-    }
-
     /**
      * Busca todos os times do usuário
      */
@@ -199,98 +83,55 @@ class EscalarTodosTimes {
     }
 
     /**
-     * Salva o time original selecionado
-     */
-    async salvarTimeOriginal() {
-        // Buscar time atual da sessão
-        const response = await fetch('/api/credenciais/lista');
-        if (response.ok) {
-            const data = await response.json();
-            const timeSelecionado = data.times.find(t => t.selected);
-            if (timeSelecionado) {
-                this.timeOriginal = timeSelecionado.id;
-            }
-        }
-    }
-
-    /**
-     * Seleciona um time
+     * Cria o lote de escalação no servidor
      */
-    async selecionarTime(teamId) {
-        const response = await fetch('/api/time/selecionar', {
+    async iniciarLote(times) {
+        const response = await fetch('/api/escalacao-ideal/escalar-lote', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ team_id: teamId })
+            body: JSON.stringify({ team_ids: times.map(t => t.id) })
         });
-        
+        const data = await response.json().catch(() => ({}));
         if (!response.ok) {
-            throw new Error(`Erro ao selecionar time ${teamId}`);
+            throw new Error(data.error || `Erro ao iniciar escalação (HTTP ${response.status})`);
         }
-        
-        // Aguardar um pouco para garantir que a sessão foi atualizada
-        await new Promise(resolve => setTimeout(resolve, 500));
+        return data;
     }
 
     /**
-     * Volta para o time original
+     * Consulta o progresso do lote
      */
-    async voltarTimeOriginal() {
-        if (this.timeOriginal) {
-            await this.selecionarTime(this.timeOriginal);
+    async consultarLote(loteId) {
+        const response = await fetch(`/api/escalacao-ideal/escalar-lote/${encodeURIComponent(loteId)}`);
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            throw new Error(data.error || `Erro ao consultar escalação (HTTP ${response.status})`);
         }
+        return data;
     }
 
     /**
-     * Escala um time específico
+     * Registra no log as mudanças de estado de cada time desde a última consulta
      */
-    async escalarTime(time) {
-        this.log(`🚀 Processando time: ${time.team_name}`, 'info');
-        
-        try {
-            // 1. Selecionar o time
-            await this.selecionarTime(time.id);
-            
-            // 2. Verificar se EscalacaoRapida está disponível (já deveria estar carregado)
-            if (!window.EscalacaoRapida) {
-                throw new Error('Classe EscalacaoRapida não encontrada. Os scripts devem ser carregados antes de processar os times.');
+    registrarMudancas(lote) {
+        for (const time of lote.times) {
+            if (this.estadosAnteriores[time.team_id] === time.status) continue;
+            this.estadosAnteriores[time.team_id] = time.status;
+            
+            const nome = time.team_name || `Time ${time.team_id}`;
+            if (time.status === 'calculando') {
+                this.log(`🧮 [${nome}] Calculando escalação...`, 'info');
+            } else if (time.status === 'enviando') {
+                this.log(`📤 [${nome}] Enviando ao Cartola...`, 'info');
+            } else if (time.status === 'escalado') {
+                const pontos = time.pontuacao_prevista !== undefined ? ` (previsão: ${time.pontuacao_prevista} pts)` : '';
+                this.log(`✅ Time ${nome} escalado com sucesso!${pontos}`, 'success');
+                if (time.repetida) {
+                    this.log(`⚠️ [${nome}] Sem escalação diferente dentro do patrimônio: repete titulares de outro time`, 'warning');
+                }
+            } else if (time.status === 'erro') {
+                this.log(`❌ Erro ao escalar time ${nome}: ${time.erro}`, 'error');
             }
-            
-            const escalacaoRapida = new window.EscalacaoRapida();
-            
-            // Configurar callbacks
-            escalacaoRapida.setProgressCallback((percent, mensagem) => {
-                // Ajustar progresso para o time atual
-                const progressBase = (this.timesProcessados / this.timesTotal) * 100;
-                const progressTime = (percent / this.timesTotal);
-                const progressTotal = progressBase + progressTime;
-                this.updateProgress(
-                    Math.min(progressTotal, 100),
-                    `${time.team_name}: ${mensagem}`
-                );
-            });
-            
-            escalacaoRapida.setLogCallback((mensagem, tipo) => {
-                this.log(`[${time.team_name}] ${mensagem}`, tipo);
-            });
-            
-            // 3. Executar escalação rápida
-            const resultado = await escalacaoRapida.executar();
-            
-            this.log(`✅ Time ${time.team_name} escalado com sucesso!`, 'success');
-            
-            return {
-                success: true,
-                time: time,
-                resultado: resultado
-            };
-            
-        } catch (error) {
-            this.log(`❌ Erro ao escalar time ${time.team_name}: ${error.message}`, 'error');
-            return {
-                success: false,
-                time: time,
-                erro: error.message
-            };
         }
     }
 
@@ -301,41 +142,43 @@ class EscalarTodosTimes {
         try {
             this.updateProgress(0, 'Iniciando...');
             
-            // 1. Carregar scripts de cálculo ANTES de tudo
-            await this.carregarScriptsCalculo();
-            
-            // Verificar se os scripts foram carregados
-            if (!window.EscalacaoRapida) {
-                throw new Error('Não foi possível carregar os scripts necessários. Os scripts podem não estar disponíveis nesta página. Tente usar a funcionalidade na página de módulos ou recarregue a página.');
-            }
-            
-            // 2. Salvar time original
-            await this.salvarTimeOriginal();
-            
-            // 3. Buscar todos os times
+            // 1. Buscar todos os times
             const times = await this.buscarTodosTimes();
             this.timesTotal = times.length;
-            this.timesProcessados = 0;
             
-            // 4. Processar cada time
-            for (const time of times) {
-                this.timesProcessados++;
+            // 2. Criar o lote no servidor
+            const { lote_id: loteId } = await this.iniciarLote(times);
+            this.log(`🚀 Escalação de ${times.length} times iniciada no servidor`, 'info');
+            
+            // 3. Acompanhar o progresso
+            const inicio = Date.now();
+            let lote;
+            while (true) {
+                lote = await this.consultarLote(loteId);
+                this.registrarMudancas(lote);
                 
-                const resultado = await this.escalarTime(time);
-                this.resultados.push(resultado);
+                const progresso = lote.times.reduce((soma, t) => soma + (PROGRESSO_ESTADO_TIME[t.status] || 0), 0);
+                this.updateProgress(
+                    Math.min((progresso / Math.max(lote.total, 1)) * 100, 100),
+                    `${lote.concluidos}/${lote.total} times processados`
+                );
                 
-                // Pequena pausa entre times para não sobrecarregar
-                if (this.timesProcessados < this.timesTotal) {
-                    await new Promise(resolve => setTimeout(resolve, 1000));
+                if (lote.status === 'concluido') break;
+                if (Date.now() - inicio > this.tempoMaximo) {
+                    throw new Error('A escalação está demorando mais que o esperado. Confira o resultado nos times em alguns minutos.');
                 }
+                await new Promise(resolve => setTimeout(resolve, this.intervaloPolling));
             }
             
-            // 4. Voltar para o time original
-            await this.voltarTimeOriginal();
-            
-            // 5. Resumo final
-            const sucessos = this.resultados.filter(r => r.success).length;
-            const falhas = this.resultados.filter(r => !r.success).length;
+            // 4. Resumo final
+            this.resultados = lote.times.map(t => ({
+                success: t.status === 'escalado',
+                time: { id: t.team_id, team_name: t.team_name },
+                resultado: t,
+                erro: t.erro
+            }));
+            const sucessos = lote.sucessos;
+            const falhas = lote.falhas;
             
             this.log(`📊 Resumo: ${sucessos}/${this.timesTotal} times escalados com sucesso`, sucessos === this.timesTotal ? 'success' : 'info');
             
@@ -358,14 +201,6 @@ class EscalarTodosTimes {
             
         } catch (error) {
             this.log(`❌ ERRO GERAL: ${error.message}`, 'error');
-            
-            // Tentar voltar para o time original mesmo em caso de erro
-            try {
-                await this.voltarTimeOriginal();
-            } catch (e) {
-                this.log(`⚠️ Aviso: Não foi possível restaurar o time original`, 'warning');
-            }
-            
             throw error;
         }
     }
@@ -536,9 +371,9 @@ document.addEventListener('DOMContentLoaded', function() {
         const confirmado = await showConfirm(
             'Deseja escalar TODOS os seus times?\n\n' +
             'Esta ação irá:\n' +
-            '1. Calcular rankings de todas as posições para cada time\n' +
-            '2. Calcular a escalação ideal de cada time\n' +
-            '3. Escalar todos os times no Cartola FC\n\n' +
+            '1. Usar os rankings já calculados de cada time\n' +
+            '2. Calcular a escalação ideal de cada time no servidor\n' +
+            '3. Escalar todos os times no Cartola FC, em paralelo\n\n' +
             '⚠️ Cada time usará suas próprias configurações (pesos, perfis, preferências).\n' +
             '⚠️ Esta ação não pode ser desfeita!',
             '⚡ Escalar Todos os Times',
@@ -0,0 +1,300 @@
+"""
+Busca automática de pesos (FATOR_*) por posição sobre o backtest (utils/backtest.py).
+
+As features de cada rodada são montadas uma vez (backtest.preparar_rodadas, com
+cache no histórico) e enviadas uma vez para cada processo do pool (initializer);
+depois disso cada lote de candidatos vai como uma lista de dicts e volta como três
+arrays de métricas. Estratégias:
+
+- aleatoria: `avaliacoes` conjuntos sorteados no intervalo de cada fator;
+- grade: produto cartesiano de `pontos_grade` valores por fator (limitado a `avaliacoes`);
+- coordenada: a partir dos pesos atuais, cada iteração avalia num lote só a troca de
+  cada fator por atual x AJUSTE_MULTIPLICADORES e aplica a melhor; para quando nenhuma
+  troca melhora o objetivo ou as avaliações acabam.
+
+O intervalo de cada fator é [0, AJUSTE_ESCALA_MAXIMA x padrão da posição] (ou
+[0, AJUSTE_ESCALA_MAXIMA] quando o padrão é 0). Fatores sem histórico
+(backtest.FATORES_SEM_HISTORICO) ficam com o valor atual.
+
+Validação: as últimas AJUSTE_FRACAO_VALIDACAO das rodadas ficam fora da busca. Os
+pesos atuais e os melhores candidatos são medidos nelas depois, e proposta_melhora()
+só aceita a proposta se ela também superar os atuais nessas rodadas.
+"""
+
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils import backtest
+from utils.weights import pesos_padrao
+
+AJUSTE_PROCESSOS = int(os.getenv('AJUSTE_PROCESSOS', str(os.cpu_count() or 2)))
+AJUSTE_AVALIACOES_PADRAO = int(os.getenv('AJUSTE_AVALIACOES_PADRAO', '2000'))
+AJUSTE_ESCALA_MAXIMA = 3.0
+AJUSTE_MULTIPLICADORES = (0.0, 0.5, 0.8, 1.25, 2.0)
+# Fração das rodadas (as mais recentes) reservada para validar a proposta
+AJUSTE_FRACAO_VALIDACAO = float(os.getenv('AJUSTE_FRACAO_VALIDACAO', '0.3'))
+# Abaixo disso não compensa repartir o lote entre processos
+_LOTE_MINIMO_POR_PROCESSO = 64
+
+ESTRATEGIAS = ('aleatoria', 'grade', 'coordenada')
+OBJETIVOS = ('spearman', 'acerto_top_k', 'pontos_top_k')
+
+# Rodadas do backtest no processo do pool (definidas uma vez pelo initializer)
+_contexto_processo: Dict[str, Any] = {}
+
+
+def _inicializar_processo(modulo: str, rodadas: List[Dict[str, Any]], top_k: int):
+    _contexto_processo.update({'modulo': modulo, 'rodadas': rodadas, 'top_k': top_k})
+
+
+def _avaliar_no_processo(conjuntos: List[Dict[str, float]]):
+    metricas = backtest.avaliar_rodadas(_contexto_processo['rodadas'], _contexto_processo['modulo'],
+                                        conjuntos, _contexto_processo['top_k'])
+    return tuple(metricas[objetivo] for objetivo in OBJETIVOS)
+
+
+class _Avaliador:
+    """Avalia lotes de conjuntos de pesos, repartidos entre os processos do pool"""
+
+    def __init__(self, modulo: str, rodadas: List[Dict[str, Any]], top_k: int, processos: int):
+        self.modulo, self.rodadas, self.top_k = modulo, rodadas, top_k
+        self.processos = max(1, processos)
+        self.avaliados = 0
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def avaliar(self, conjuntos: List[Dict[str, float]]) -> Dict[str, np.ndarray]:
+        self.avaliados += len(conjuntos)
+        partes = min(self.processos, max(1, len(conjuntos) // _LOTE_MINIMO_POR_PROCESSO))
+        if partes == 1:
+            metricas = backtest.avaliar_rodadas(self.rodadas, self.modulo, conjuntos, self.top_k)
+            return {objetivo: metricas[objetivo] for objetivo in OBJETIVOS}
+        if self._pool is None:
+            # Criado no primeiro lote grande; spawn porque o worker da fila chama isto de dentro de threads
+            self._pool = ProcessPoolExecutor(max_workers=self.processos,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_inicializar_processo,
+                                             initargs=(self.modulo, self.rodadas, self.top_k))
+        tamanho = -(-len(conjuntos) // partes)
+        lotes = [conjuntos[i:i + tamanho] for i in range(0, len(conjuntos), tamanho)]
+        resultados = list(self._pool.map(_avaliar_no_processo, lotes))
+        return {
+            objetivo: np.concatenate([resultado[i] for resultado in resultados])
+            for i, objetivo in enumerate(OBJETIVOS)
+        }
+
+
+def _intervalos(modulo: str, atuais: Dict[str, float]) -> Dict[str, tuple]:
+    padrao = pesos_padrao(modulo)
+    return {
+        fator: (0.0, AJUSTE_ESCALA_MAXIMA * (padrao.get(fator) or 1.0))
+        for fator in atuais if fator not in backtest.FATORES_SEM_HISTORICO
+    }
+
+
+def _candidatos_aleatorios(atuais, intervalos, quantidade, rnd):
+    return [
+        {**atuais, **{fator: round(rnd.uniform(minimo, maximo), 3) for fator, (minimo, maximo) in intervalos.items()}}
+        for _ in range(quantidade)
+    ]
+
+
+def validar_grade(modulo: str, pontos: int, limite: int) -> int:
+    """Combinações da grade da posição (pontos ^ fatores ajustáveis); ValueError se passar de `limite`"""
+    fatores = [fator for fator in pesos_padrao(modulo) if fator not in backtest.FATORES_SEM_HISTORICO]
+    if pontos < 2:
+        raise ValueError('pontos_grade deve ser pelo menos 2')
+    total = pontos ** len(fatores)
+    if total > limite:
+        maximo = int(limite ** (1 / len(fatores)) + 1e-9) if fatores else pontos
+        raise ValueError(f'Grade com {total} combinações ({pontos} pontos x {len(fatores)} fatores) '
+                         f'excede o limite de {limite} avaliações'
+                         + (f'; use pontos_grade até {maximo}' if maximo >= 2 else '; use outra estratégia'))
+    return total
+
+
+def _candidatos_grade(atuais, intervalos, pontos, limite):
+    eixos = {fator: np.linspace(minimo, maximo, pontos).round(3).tolist() for fator, (minimo, maximo) in intervalos.items()}
+    total = pontos ** len(eixos)
+    if total > limite:
+        raise ValueError(f'Grade com {total} combinações ({pontos} pontos x {len(eixos)} fatores) '
+                         f'excede o limite de {limite} avaliações')
+    return [{**atuais, **dict(zip(eixos, valores))} for valores in itertools.product(*eixos.values())]
+
+
+def _melhores(candidatos, metricas, objetivo, quantidade):
+    valores = np.nan_to_num(metricas[objetivo], nan=-np.inf)
+    ordem = np.argsort(-valores, kind='stable')[:quantidade]
+    return [_resumo(candidatos[i], metricas, i) for i in ordem]
+
+
+def _resumo(pesos, metricas, i):
+    return {
+        'pesos': pesos,
+        **_valores(metricas, i),
+    }
+
+
+def _valores(metricas, i):
+    return {objetivo: None if np.isnan(metricas[objetivo][i]) else float(metricas[objetivo][i])
+            for objetivo in OBJETIVOS}
+
+
+def _separar_validacao(rodadas: List[Dict[str, Any]], fracao: float):
+    """(rodadas da busca, rodadas de validação): as mais recentes ficam para a validação"""
+    quantidade = min(max(int(round(len(rodadas) * fracao)), 1), len(rodadas) - 1) if fracao > 0 else 0
+    if quantidade <= 0:
+        return rodadas, []
+    return rodadas[:-quantidade], rodadas[-quantidade:]
+
+
+def ajustar_pesos(historico: Dict[str, Any], modulo: str, pesos_atuais: Optional[Dict[str, float]] = None,
+                  estrategia: str = 'aleatoria', objetivo: str = 'spearman',
+                  avaliacoes: int = AJUSTE_AVALIACOES_PADRAO, top_k: int = backtest.TOP_K_PADRAO,
+                  rodada_inicial: int = 2, rodada_final: Optional[int] = None, pontos_grade: int = 3,
+                  processos: Optional[int] = None, semente: Optional[int] = None,
+                  quantidade_melhores: int = 5,
+                  fracao_validacao: float = AJUSTE_FRACAO_VALIDACAO) -> Dict[str, Any]:
+    """Procura os pesos da posição que maximizam `objetivo` no backtest.
+
+    A busca usa as rodadas que sobram depois de reservar `fracao_validacao` das mais
+    recentes; atuais e melhores trazem também as métricas nessas rodadas ('validacao').
+    Retorna os pesos atuais e suas métricas, os `quantidade_melhores` melhores
+    candidatos (o primeiro é a proposta) e quantos conjuntos foram avaliados.
+    ValueError para estratégia/objetivo inválidos ou grade grande demais.
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"estrategia inválida. Use: {', '.join(ESTRATEGIAS)}")
+    if objetivo not in OBJETIVOS:
+        raise ValueError(f"objetivo inválido. Use: {', '.join(OBJETIVOS)}")
+    atuais = backtest.completar_pesos(pesos_padrao(modulo), [pesos_atuais or {}])[0]
+    intervalos = _intervalos(modulo, atuais)
+    inicio = time.perf_counter()
+
+    rodadas = backtest.preparar_rodadas(historico, modulo, top_k, rodada_inicial, rodada_final)
+    if not rodadas:
+        raise ValueError('Nenhuma rodada disputada com atletas suficientes para o backtest')
+    rodadas, validacao = _separar_validacao(rodadas, fracao_validacao)
+    processos = AJUSTE_PROCESSOS if processos is None else processos
+    rnd = random.Random(semente)
+
+    with _Avaliador(modulo, rodadas, top_k, processos) as avaliador:
+        metricas_atuais = avaliador.avaliar([atuais])
+        if estrategia == 'coordenada':
+            candidatos, metricas = _busca_coordenada(avaliador, atuais, metricas_atuais, intervalos,
+                                                     objetivo, avaliacoes)
+        else:
+            if estrategia == 'aleatoria':
+                candidatos = _candidatos_aleatorios(atuais, intervalos, avaliacoes, rnd)
+            else:
+                candidatos = _candidatos_grade(atuais, intervalos, pontos_grade, avaliacoes)
+            metricas = avaliador.avaliar(candidatos)
+        avaliados = avaliador.avaliados
+
+    atuais_resumo = _resumo(atuais, metricas_atuais, 0)
+    melhores = _melhores(candidatos, metricas, objetivo, quantidade_melhores)
+    if validacao:
+        # Poucos conjuntos: avaliados direto, fora do pool
+        fora = backtest.avaliar_rodadas(validacao, modulo, [atuais_resumo['pesos']] + [m['pesos'] for m in melhores],
+                                        top_k)
+        for i, resumo in enumerate([atuais_resumo] + melhores):
+            resumo['validacao'] = _valores(fora, i)
+
+    return {
+        'modulo': modulo,
+        'estrategia': estrategia,
+        'objetivo': objetivo,
+        'top_k': top_k,
+        'rodadas': [r['rodada_id'] for r in rodadas],
+        'rodadas_validacao': [r['rodada_id'] for r in validacao],
+        'avaliados': avaliados,
+        'atuais': atuais_resumo,
+        'melhores': melhores,
+        'tempo_s': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def _busca_coordenada(avaliador: _Avaliador, atuais: Dict[str, float], metricas_atuais: Dict[str, np.ndarray],
+                      intervalos: Dict[str, tuple], objetivo: str, avaliacoes: int):
+    """Subida por coordenadas; retorna todos os candidatos avaliados e suas métricas"""
+    melhor, melhor_valor = dict(atuais), np.nan_to_num(metricas_atuais[objetivo][0], nan=-np.inf)
+    candidatos: List[Dict[str, float]] = [dict(atuais)]
+    metricas = {o: list(v) for o, v in metricas_atuais.items()}
+    while avaliador.avaliados < avaliacoes:
+        vizinhos = []
+        for fator, (minimo, maximo) in intervalos.items():
+            # Fator zerado não sai do lugar multiplicando: parte do meio do intervalo
+            referencia = melhor[fator] or (maximo - minimo) / 2
+            for multiplicador in AJUSTE_MULTIPLICADORES:
+                valor = round(min(max(referencia * multiplicador, minimo), maximo), 3)
+                if valor != melhor[fator]:
+                    vizinhos.append({**melhor, fator: valor})
+        vizinhos = vizinhos[:avaliacoes - avaliador.avaliados]
+        if not vizinhos:
+            break
+        resultado = avaliador.avaliar(vizinhos)
+        candidatos.extend(vizinhos)
+        for o in OBJETIVOS:
+            metricas[o].extend(resultado[o])
+        valores = np.nan_to_num(resultado[objetivo], nan=-np.inf)
+        i = int(np.argmax(valores))
+        if valores[i] <= melhor_valor:
+            break
+        melhor, melhor_valor = vizinhos[i], valores[i]
+    return candidatos, {o: np.asarray(v, dtype=np.float64) for o, v in metricas.items()}
+
+
+def proposta_melhora(resultado: Dict[str, Any]) -> bool:
+    """Se o melhor candidato supera os pesos atuais no objetivo, nas rodadas da busca e nas
+    de validação (só então vale salvar). Sem rodadas de validação, não salva."""
+    if not resultado['melhores'] or not resultado.get('rodadas_validacao'):
+        return False
+    objetivo = resultado['objetivo']
+    proposta, atuais = resultado['melhores'][0], resultado['atuais']
+    for melhor, atual in ((proposta[objetivo], atuais[objetivo]),
+                          (proposta['validacao'][objetivo], atuais['validacao'][objetivo])):
+        if melhor is None or (atual is not None and melhor <= atual):
+            return False
+    return True
+
+
+def resumo_texto(resultado: Dict[str, Any]) -> str:
+    """Resumo legível (linha de comando) do resultado de ajustar_pesos"""
+    objetivo = resultado['objetivo']
+
+    def _fmt(valor):
+        return '-' if valor is None else f'{valor:.4f}'
+
+    def _metricas(resumo):
+        texto = '  '.join(f'{o}={_fmt(resumo[o])}' for o in OBJETIVOS)
+        if 'validacao' in resumo:
+            texto += f"  | validação {objetivo}={_fmt(resumo['validacao'][objetivo])}"
+        return texto
+
+    linhas = [
+        f"{resultado['modulo']}: {resultado['avaliados']} conjuntos ({resultado['estrategia']}) em "
+        f"{len(resultado['rodadas'])} rodadas (+{len(resultado['rodadas_validacao'])} de validação), "
+        f"{resultado['tempo_s']:.1f}s; objetivo {objetivo}",
+        '  atuais:   ' + _metricas(resultado['atuais']),
+    ]
+    for posicao, candidato in enumerate(resultado['melhores'], start=1):
+        linhas.append(f"  #{posicao}:       " + _metricas(candidato))
+    if resultado['melhores']:
+        proposta = resultado['melhores'][0]['pesos']
+        linhas.append('  proposta: ' + ', '.join(f'{fator}={valor:g}' for fator, valor in proposta.items()))
+    return '\n'.join(linhas)
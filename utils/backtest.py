@@ -0,0 +1,373 @@
+"""
+Backtest vetorizado dos pesos (FATOR_*) de cada posição sobre as rodadas passadas.
+
+Para cada rodada r já disputada da temporada, as features de utils.pontuacao são
+reconstruídas só com o que existia antes de r (médias de scouts e pontuação do
+atleta, scouts cedidos pelo adversário, finalizações e gols do adversário, todos
+até r - 1), os atletas que entraram em campo em r são pontuados sob cada conjunto de
+pesos e o ranking previsto é comparado com a pontuação real da rodada:
+
+- correlação de Spearman entre a pontuação prevista e a real;
+- acerto no top K: fração dos K melhores previstos que estão entre os K melhores reais;
+- pontos no top K: média da pontuação real dos K melhores previstos.
+
+O histórico da temporada (acf_pontuados, acf_partidas e pesos dos perfis) é lido em
+três queries e transformado em somas acumuladas por rodada (arrays atleta x rodada e
+clube x rodada), então as features de qualquer rodada saem por indexação. As
+métricas de todos os conjuntos de pesos de uma rodada são calculadas numa passada
+(utils.pontuacao.pontuar_lote), o que permite avaliar milhares de conjuntos na
+temporada inteira em segundos.
+
+Limitações do histórico: acf_destaques e acf_atletas.peso_jogo só existem para a
+rodada atual, então FATOR_ESCALACAO não tem efeito no backtest e atacantes/meias
+usam o peso_jogo do perfil da rodada no lugar do peso_jogo do atleta. Os pesos dos
+perfis vêm de acp_peso_jogo_perfis/acp_peso_sg_perfis da própria rodada (0 quando
+a rodada não está mais lá). Scouts nulos contam como 0.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.pontuacao import POSICAO_IDS, SCOUTS_ATLETA, pontuar_lote
+from utils.utilidades import printdbg
+
+# Por quanto tempo o histórico carregado é reaproveitado no processo (segundos)
+BACKTEST_CACHE_TTL = float(os.getenv('BACKTEST_CACHE_TTL', '600'))
+# Limite de conjuntos de pesos por chamada da API
+BACKTEST_MAX_CONJUNTOS = int(os.getenv('BACKTEST_MAX_CONJUNTOS', '5000'))
+TOP_K_PADRAO = 5
+# Fatores sem efeito no backtest (dados sem histórico, ver docstring do módulo)
+FATORES_SEM_HISTORICO = ('FATOR_ESCALACAO',)
+
+_SEM_ADVERSARIO = -1
+# Colunas de scouts do clube usadas pelo goleiro (médias do adversário)
+_SCOUTS_CLUBE = ('ff', 'fd')
+
+_memo_lock = threading.Lock()
+_memo: Dict[tuple, tuple] = {}
+
+
+def _dividir(soma: np.ndarray, quantidade: np.ndarray) -> np.ndarray:
+    return np.divide(soma, quantidade, out=np.zeros_like(soma, dtype=np.float64), where=quantidade > 0)
+
+
+def carregar_historico(conn, temporada: int, perfil_peso_jogo: int = 1, perfil_peso_sg: int = 2) -> Dict[str, Any]:
+    """Lê a temporada e monta as somas acumuladas por rodada usadas no backtest.
+
+    Índice de rodada k nas somas acumuladas = tudo até a rodada k (inclusive); as
+    features da rodada r usam o índice r - 1.
+    """
+    cursor = conn.cursor()
+    colunas = ', '.join(f'COALESCE(scout_{s}, 0)' for s in SCOUTS_ATLETA)
+    cursor.execute(f'''
+        SELECT atleta_id, rodada_id, clube_id, posicao_id, COALESCE(pontuacao, 0), {colunas}
+        FROM acf_pontuados
+        WHERE temporada = %s AND entrou_em_campo = TRUE AND rodada_id > 0
+    ''', (temporada,))
+    linhas = cursor.fetchall()
+    cursor.execute('''
+        SELECT rodada_id, clube_casa_id, clube_visitante_id, placar_oficial_mandante, placar_oficial_visitante
+        FROM acf_partidas
+        WHERE temporada = %s AND valida = TRUE AND rodada_id > 0
+        ORDER BY id
+    ''', (temporada,))
+    partidas = cursor.fetchall()
+
+    dados = np.array(linhas, dtype=np.float64).reshape(len(linhas), 5 + len(SCOUTS_ATLETA))
+    atleta_ids, atleta_idx = np.unique(dados[:, 0].astype(np.int64), return_inverse=True)
+    rodada = dados[:, 1].astype(np.int64)
+    posicao = dados[:, 3].astype(np.int64)
+    n_rodadas = int(max(rodada.max(initial=0), max((p[0] for p in partidas), default=0)))
+
+    clube_ids = np.unique(np.concatenate([
+        dados[:, 2].astype(np.int64),
+        np.array([c for p in partidas for c in (p[1], p[2])], dtype=np.int64),
+    ]))
+    indice_clube = {int(c): i for i, c in enumerate(clube_ids)}
+    clube_idx = np.searchsorted(clube_ids, dados[:, 2].astype(np.int64))
+    n_clubes = len(clube_ids)
+
+    # Adversário de cada clube por rodada (vale a primeira partida, como no snapshot da rodada)
+    adversario = np.full((n_rodadas + 1, n_clubes), _SEM_ADVERSARIO, dtype=np.int64)
+    gols = np.zeros((n_clubes, n_rodadas + 1))
+    jogos_gols = np.zeros((n_clubes, n_rodadas + 1))
+    for rodada_id, casa_id, visitante_id, placar_casa, placar_visitante in partidas:
+        casa, visitante = indice_clube[casa_id], indice_clube[visitante_id]
+        for clube, outro in ((casa, visitante), (visitante, casa)):
+            if adversario[rodada_id, clube] == _SEM_ADVERSARIO:
+                adversario[rodada_id, clube] = outro
+        if placar_casa is not None and placar_visitante is not None:
+            gols[casa, rodada_id] += placar_casa
+            gols[visitante, rodada_id] += placar_visitante
+            jogos_gols[[casa, visitante], rodada_id] += 1
+
+    # Por atleta: jogos, soma da pontuação e dos scouts em cada rodada
+    jogos = np.zeros((len(atleta_ids), n_rodadas + 1))
+    somas = np.zeros((len(atleta_ids), n_rodadas + 1, 1 + len(SCOUTS_ATLETA)))
+    np.add.at(jogos, (atleta_idx, rodada), 1)
+    np.add.at(somas, (atleta_idx, rodada), dados[:, 4:])
+
+    # Por clube: scouts ff/fd de todos os atletas que entraram em campo
+    colunas_clube = [5 + SCOUTS_ATLETA.index(s) for s in _SCOUTS_CLUBE]
+    linhas_clube = np.zeros((n_clubes, n_rodadas + 1))
+    somas_clube = np.zeros((n_clubes, n_rodadas + 1, len(_SCOUTS_CLUBE)))
+    np.add.at(linhas_clube, (clube_idx, rodada), 1)
+    np.add.at(somas_clube, (clube_idx, rodada), dados[:, colunas_clube])
+
+    # Cedidos: ds dos atletas de cada posição que jogaram contra o clube
+    adversario_linha = adversario[rodada, clube_idx]
+    contra = adversario_linha != _SEM_ADVERSARIO
+    coluna_ds = 5 + SCOUTS_ATLETA.index('ds')
+    cedidos_ds = np.zeros((7, n_clubes, n_rodadas + 1))
+    cedidos_linhas = np.zeros((7, n_clubes, n_rodadas + 1))
+    np.add.at(cedidos_ds, (posicao[contra], adversario_linha[contra], rodada[contra]), dados[contra, coluna_ds])
+    np.add.at(cedidos_linhas, (posicao[contra], adversario_linha[contra], rodada[contra]), 1)
+
+    def _pesos_perfil(tabela: str, coluna: str, perfil_id: int) -> np.ndarray:
+        matriz = np.zeros((n_rodadas + 1, n_clubes))
+        try:
+            cursor.execute(f'''
+                SELECT rodada_atual, clube_id, {coluna}
+                FROM {tabela}
+                WHERE perfil_id = %s AND rodada_atual BETWEEN 1 AND %s
+            ''', (perfil_id, n_rodadas))
+            for rodada_id, clube_id, peso in cursor.fetchall():
+                i = indice_clube.get(clube_id)
+                if i is not None:
+                    matriz[rodada_id, i] = float(peso) if peso else 0.0
+        except Exception as e:
+            printdbg(f"Erro ao buscar {coluna} do perfil {perfil_id}: {e}")
+            conn.rollback()
+        return matriz
+
+    historico = {
+        'temporada': temporada,
+        'n_rodadas': n_rodadas,
+        'rodadas_disputadas': np.unique(rodada).tolist(),
+        'atleta_ids': atleta_ids,
+        'clube_ids': clube_ids,
+        'linha_atleta': atleta_idx,
+        'linha_rodada': rodada,
+        'linha_posicao': posicao,
+        'linha_clube': clube_idx,
+        'linha_pontuacao': dados[:, 4].copy(),
+        'adversario': adversario,
+        'jogos': np.cumsum(jogos, axis=1),
+        'somas': np.cumsum(somas, axis=1),
+        'linhas_clube': np.cumsum(linhas_clube, axis=1),
+        'somas_clube': np.cumsum(somas_clube, axis=1),
+        'gols': np.cumsum(gols, axis=1),
+        'jogos_gols': np.cumsum(jogos_gols, axis=1),
+        'cedidos_ds': np.cumsum(cedidos_ds, axis=2),
+        'cedidos_linhas': np.cumsum(cedidos_linhas, axis=2),
+        'peso_jogo': _pesos_perfil('acp_peso_jogo_perfis', 'peso_jogo', perfil_peso_jogo),
+        'peso_sg': _pesos_perfil('acp_peso_sg_perfis', 'peso_sg', perfil_peso_sg),
+    }
+    printdbg(f"Histórico do backtest: {len(linhas)} pontuados, {len(atleta_ids)} atletas, "
+             f"{n_rodadas} rodadas, {len(partidas)} partidas")
+    return historico
+
+
+def obter_historico(conn, temporada: int, perfil_peso_jogo: int = 1, perfil_peso_sg: int = 2) -> Dict[str, Any]:
+    """Histórico da temporada, reaproveitado no processo por BACKTEST_CACHE_TTL segundos"""
+    chave = (temporada, perfil_peso_jogo, perfil_peso_sg)
+    with _memo_lock:
+        memo = _memo.get(chave)
+    if memo is not None and time.monotonic() - memo[0] < BACKTEST_CACHE_TTL:
+        return memo[1]
+
+    historico = carregar_historico(conn, temporada, perfil_peso_jogo, perfil_peso_sg)
+    with _memo_lock:
+        _memo[chave] = (time.monotonic(), historico)
+    return historico
+
+
+def features_rodada(historico: Dict[str, Any], posicao_id: int, rodada_id: int):
+    """(features no formato de utils.pontuacao.montar_features, pontuação real) da rodada.
+
+    Só entram atletas da posição que jogaram na rodada e já tinham jogado antes dela.
+    """
+    h = historico
+    antes = rodada_id - 1
+    linhas = np.flatnonzero((h['linha_rodada'] == rodada_id) & (h['linha_posicao'] == posicao_id))
+    atletas = h['linha_atleta'][linhas]
+    jogos = h['jogos'][atletas, antes]
+    jogou_antes = jogos > 0
+    linhas, atletas, jogos = linhas[jogou_antes], atletas[jogou_antes], jogos[jogou_antes]
+
+    clubes = h['linha_clube'][linhas]
+    adversarios = h['adversario'][rodada_id, clubes]
+    tem = adversarios != _SEM_ADVERSARIO
+    adv = np.where(tem, adversarios, 0)
+
+    def _do_adversario(valores: np.ndarray) -> np.ndarray:
+        return np.where(tem, valores, 0.0)
+
+    medias = h['somas'][atletas, antes] / jogos[:, None]
+    peso_jogo_perfil = h['peso_jogo'][rodada_id, clubes]
+    medias_clube = _dividir(h['somas_clube'][adv, antes], h['linhas_clube'][adv, antes][:, None])
+    features = {
+        'n': len(linhas),
+        'tem_partida': tem,
+        'media': medias[:, 0],
+        # acf_atletas.peso_jogo não tem histórico: usa o do perfil na rodada
+        'peso_jogo_atleta': peso_jogo_perfil,
+        'peso_jogo_perfil': peso_jogo_perfil,
+        'peso_sg_perfil': h['peso_sg'][rodada_id, clubes],
+        'peso_sg_adversario': _do_adversario(h['peso_sg'][rodada_id, adv]),
+        'ds_cedidos': _do_adversario(_dividir(h['cedidos_ds'][posicao_id, adv, antes],
+                                              h['cedidos_linhas'][posicao_id, adv, antes])),
+        'ff_adversario': _do_adversario(medias_clube[:, _SCOUTS_CLUBE.index('ff')]),
+        'fd_adversario': _do_adversario(medias_clube[:, _SCOUTS_CLUBE.index('fd')]),
+        'gols_adversario': _do_adversario(_dividir(h['gols'][adv, antes], h['jogos_gols'][adv, antes])),
+        'escalacoes': np.zeros(len(linhas)),
+        'percentual_escalacoes': np.zeros(len(linhas)),
+    }
+    for i, scout in enumerate(SCOUTS_ATLETA, start=1):
+        features[scout] = medias[:, i]
+    return features, h['linha_pontuacao'][linhas]
+
+
+def _postos(valores: np.ndarray) -> np.ndarray:
+    """Postos (0..n-1) ao longo do último eixo, com média nos empates"""
+    ordem = np.argsort(valores, axis=-1, kind='stable')
+    ordenados = np.take_along_axis(valores, ordem, axis=-1)
+    n = valores.shape[-1]
+    # Início e fim de cada bloco de empate: posto médio = (início + fim) / 2
+    novo_bloco = np.ones(ordenados.shape, dtype=bool)
+    novo_bloco[..., 1:] = ordenados[..., 1:] != ordenados[..., :-1]
+    posicoes = np.broadcast_to(np.arange(n), ordenados.shape)
+    inicio = np.maximum.accumulate(np.where(novo_bloco, posicoes, 0), axis=-1)
+    fim_bloco = np.ones(ordenados.shape, dtype=bool)
+    fim_bloco[..., :-1] = novo_bloco[..., 1:]
+    fim = np.flip(np.minimum.accumulate(np.flip(np.where(fim_bloco, posicoes, n), axis=-1), axis=-1), axis=-1)
+    postos = np.empty(ordenados.shape)
+    np.put_along_axis(postos, ordem, (inicio + fim) / 2.0, axis=-1)
+    return postos
+
+
+def metricas_rodada(pontuacoes: np.ndarray, reais: np.ndarray, top_k: int) -> Dict[str, np.ndarray]:
+    """Métricas de cada conjunto de pesos (linhas de `pontuacoes`) numa rodada"""
+    k = min(top_k, len(reais))
+    postos_previstos = _postos(pontuacoes)
+    postos_reais = _postos(reais)
+    previstos_c = postos_previstos - postos_previstos.mean(axis=1, keepdims=True)
+    reais_c = postos_reais - postos_reais.mean()
+    denominador = np.linalg.norm(previstos_c, axis=1) * np.linalg.norm(reais_c)
+    spearman = np.divide(previstos_c @ reais_c, denominador,
+                         out=np.full(len(pontuacoes), np.nan), where=denominador > 0)
+
+    # Top K previsto de cada conjunto (ordem interna irrelevante) x top K real
+    top_previsto = np.argpartition(-pontuacoes, k - 1, axis=1)[:, :k]
+    no_top_real = np.zeros(len(reais), dtype=bool)
+    no_top_real[np.argsort(-reais, kind='stable')[:k]] = True
+    return {
+        'spearman': spearman,
+        'acerto_top_k': no_top_real[top_previsto].mean(axis=1),
+        'pontos_top_k': reais[top_previsto].mean(axis=1),
+        'pontos_top_k_ideal': float(np.sort(reais)[::-1][:k].mean()),
+    }
+
+
+def preparar_rodadas(historico: Dict[str, Any], modulo: str, top_k: int = TOP_K_PADRAO,
+                     rodada_inicial: int = 2, rodada_final: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Features e pontuação real de cada rodada avaliável do intervalo.
+
+    As features de cada (posição, rodada) ficam guardadas no próprio histórico
+    (historico['features']), então backtests e buscas de pesos seguidos sobre o mesmo
+    histórico não as reconstroem. A lista retornada é o que avaliar_rodadas() consome
+    e pode ser enviada a outros processos.
+    """
+    posicao_id = POSICAO_IDS[modulo]
+    rodada_final = historico['n_rodadas'] if rodada_final is None else rodada_final
+    cache = historico.setdefault('features', {})
+    rodadas = []
+    for rodada_id in historico['rodadas_disputadas']:
+        if rodada_id < max(rodada_inicial, 2) or rodada_id > rodada_final:
+            continue
+        if (posicao_id, rodada_id) not in cache:
+            cache[(posicao_id, rodada_id)] = features_rodada(historico, posicao_id, rodada_id)
+        features, reais = cache[(posicao_id, rodada_id)]
+        # Com K atletas ou menos o top K é sempre o mesmo e a correlação não informa nada
+        if features['n'] <= max(top_k, 2):
+            continue
+        rodadas.append({'rodada_id': rodada_id, 'features': features, 'reais': reais})
+    return rodadas
+
+
+def avaliar_rodadas(rodadas: Sequence[Dict[str, Any]], modulo: str, conjuntos_pesos: Sequence[Dict[str, float]],
+                    top_k: int = TOP_K_PADRAO) -> Dict[str, Any]:
+    """Métricas de cada conjunto de pesos: médias sobre as rodadas (arrays) e por rodada"""
+    por_rodada: List[Dict[str, Any]] = []
+    for rodada in rodadas:
+        pontuacoes = pontuar_lote(modulo, rodada['features'], conjuntos_pesos)
+        metricas = metricas_rodada(pontuacoes, rodada['reais'], top_k)
+        metricas.update({'rodada_id': rodada['rodada_id'], 'atletas': rodada['features']['n']})
+        por_rodada.append(metricas)
+
+    def _media(chave: str) -> np.ndarray:
+        if not por_rodada:
+            return np.full(len(conjuntos_pesos), np.nan)
+        valores = np.vstack([m[chave] for m in por_rodada])
+        validos = (~np.isnan(valores)).sum(axis=0)
+        return np.divide(np.nansum(valores, axis=0), validos,
+                         out=np.full(len(conjuntos_pesos), np.nan), where=validos > 0)
+
+    return {
+        'spearman': _media('spearman'),
+        'acerto_top_k': _media('acerto_top_k'),
+        'pontos_top_k': _media('pontos_top_k'),
+        'pontos_top_k_ideal': (float(np.mean([m['pontos_top_k_ideal'] for m in por_rodada]))
+                               if por_rodada else None),
+        'por_rodada': por_rodada,
+    }
+
+
+def _lista(valores: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else float(v) for v in valores]
+
+
+def executar_backtest(historico: Dict[str, Any], modulo: str, conjuntos_pesos: Sequence[Dict[str, float]],
+                      top_k: int = TOP_K_PADRAO, rodada_inicial: int = 2,
+                      rodada_final: Optional[int] = None) -> Dict[str, Any]:
+    """Avalia os conjuntos de pesos da posição em cada rodada disputada do intervalo.
+
+    Cada conjunto precisa ter todos os FATOR_* do kernel da posição. Retorna as
+    métricas por conjunto (médias sobre as rodadas, na ordem de `conjuntos_pesos`) e
+    por rodada.
+    """
+    rodadas = preparar_rodadas(historico, modulo, top_k, rodada_inicial, rodada_final)
+    metricas = avaliar_rodadas(rodadas, modulo, conjuntos_pesos, top_k)
+    return {
+        'modulo': modulo,
+        'temporada': historico['temporada'],
+        'top_k': top_k,
+        'rodadas': [r['rodada_id'] for r in rodadas],
+        'spearman': _lista(metricas['spearman']),
+        'acerto_top_k': _lista(metricas['acerto_top_k']),
+        'pontos_top_k': _lista(metricas['pontos_top_k']),
+        'pontos_top_k_ideal': metricas['pontos_top_k_ideal'],
+        'por_rodada': metricas['por_rodada'],
+    }
+
+
+def completar_pesos(base: Dict[str, float], conjuntos_pesos: Sequence[Dict[str, Any]]) -> List[Dict[str, float]]:
+    """Cada conjunto sobre os pesos base (só as chaves de `base` são aceitas). ValueError se inválido."""
+    completos = []
+    for i, conjunto in enumerate(conjuntos_pesos):
+        if not isinstance(conjunto, dict):
+            raise ValueError(f'Conjunto de pesos {i} inválido')
+        desconhecidas = set(conjunto) - set(base)
+        if desconhecidas:
+            raise ValueError(f'Pesos desconhecidos no conjunto {i}: {sorted(desconhecidas)}')
+        try:
+            completos.append({chave: float(conjunto.get(chave, padrao)) for chave, padrao in base.items()})
+        except (TypeError, ValueError):
+            raise ValueError(f'Valor não numérico no conjunto de pesos {i}')
+    return completos
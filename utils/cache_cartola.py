@@ -0,0 +1,204 @@
+"""
+Cache compartilhado das respostas públicas da API do Cartola.
+
+As respostas (status do mercado, atletas do mercado, partidas, clubes) ficam em
+arquivos JSON num diretório comum (CARTOLA_CACHE_DIR), então uma atualização
+serve todos os workers do gunicorn da máquina. Cada processo mantém ainda uma
+cópia em memória, relida só quando o arquivo muda (mtime).
+
+Política por entrada:
+- dentro do TTL: devolve o valor salvo;
+- vencido, mas dentro da janela de "stale" (max_stale): devolve o valor antigo
+  na hora e atualiza em segundo plano (stale-while-revalidate);
+- sem valor utilizável: busca de forma síncrona. Se a busca falhar e houver um
+  valor antigo, ele é devolvido (stale-if-error).
+
+Só um processo por vez atualiza cada chave (arquivo .lock criado com O_EXCL);
+os demais continuam servindo o valor antigo ou aguardam a gravação.
+
+Os TTLs ligados ao estado do mercado ficam em api_cartola.py (quem conhece os
+endpoints); este módulo é genérico.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+CARTOLA_CACHE_DIR = os.getenv(
+    'CARTOLA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'aerocartola_cache')
+)
+# Lock de atualização considerado abandonado depois desse tempo (segundos)
+CARTOLA_CACHE_LOCK_TIMEOUT = float(os.getenv('CARTOLA_CACHE_LOCK_TIMEOUT', '30'))
+# Espera máxima por outro processo que está atualizando a mesma chave (segundos)
+CARTOLA_CACHE_WAIT = float(os.getenv('CARTOLA_CACHE_WAIT', '10'))
+
+_lock = threading.Lock()
+_memoria: Dict[str, Dict[str, Any]] = {}  # chave -> {'mtime': ..., 'entrada': ...}
+_em_atualizacao: set = set()
+
+
+def _caminho(chave: str, sufixo: str = '.json') -> str:
+    nome = re.sub(r'[^A-Za-z0-9_.-]', '_', chave)
+    return os.path.join(CARTOLA_CACHE_DIR, nome + sufixo)
+
+
+def _ler(chave: str) -> Optional[Dict[str, Any]]:
+    caminho = _caminho(chave)
+    try:
+        mtime = os.stat(caminho).st_mtime_ns
+    except OSError:
+        return None
+    with _lock:
+        memo = _memoria.get(chave)
+        if memo is not None and memo['mtime'] == mtime:
+            return memo['entrada']
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            entrada = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _lock:
+        _memoria[chave] = {'mtime': mtime, 'entrada': entrada}
+    return entrada
+
+
+def _gravar(chave: str, dados: Any, ttl: float) -> Dict[str, Any]:
+    agora = time.time()
+    entrada = {'chave': chave, 'salvo_em': agora, 'expira_em': agora + ttl, 'dados': dados}
+    try:
+        os.makedirs(CARTOLA_CACHE_DIR, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=CARTOLA_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f)
+        os.replace(temporario, _caminho(chave))
+    except (OSError, TypeError, ValueError) as e:
+        print(f"[AVISO] Falha ao gravar cache do Cartola ({chave}): {e}")
+    return entrada
+
+
+def _adquirir_lock(chave: str) -> bool:
+    caminho = _caminho(chave, '.lock')
+    try:
+        os.makedirs(CARTOLA_CACHE_DIR, exist_ok=True)
+        fd = os.open(caminho, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+        return True
+    except FileExistsError:
+        try:
+            if time.time() - os.stat(caminho).st_mtime > CARTOLA_CACHE_LOCK_TIMEOUT:
+                os.remove(caminho)
+                return _adquirir_lock(chave)
+        except OSError:
+            pass
+        return False
+    except OSError:
+        # Diretório sem permissão de escrita: segue sem coordenação entre processos
+        return True
+
+
+def _liberar_lock(chave: str) -> None:
+    try:
+        os.remove(_caminho(chave, '.lock'))
+    except OSError:
+        pass
+
+
+def _resolver_ttl(ttl: Union[float, Callable[[Any], float]], dados: Any) -> float:
+    return float(ttl(dados) if callable(ttl) else ttl)
+
+
+def _atualizar(chave: str, buscar: Callable[[], Any], ttl) -> Optional[Dict[str, Any]]:
+    """Busca e grava a chave. Retorna a nova entrada ou None se a busca falhar."""
+    dados = buscar()
+    if dados is None:
+        return None
+    return _gravar(chave, dados, _resolver_ttl(ttl, dados))
+
+
+def _revalidar_em_segundo_plano(chave: str, buscar: Callable[[], Any], ttl) -> None:
+    with _lock:
+        if chave in _em_atualizacao:
+            return
+        _em_atualizacao.add(chave)
+
+    def _executar():
+        try:
+            if _adquirir_lock(chave):
+                try:
+                    _atualizar(chave, buscar, ttl)
+                finally:
+                    _liberar_lock(chave)
+        except Exception as e:
+            print(f"[AVISO] Falha ao revalidar cache do Cartola ({chave}): {e}")
+        finally:
+            with _lock:
+                _em_atualizacao.discard(chave)
+
+    threading.Thread(target=_executar, name=f'cache-cartola-{chave}', daemon=True).start()
+
+
+def obter(chave: str, buscar: Callable[[], Any], ttl: Union[float, Callable[[Any], float]],
+          max_stale: float = 0) -> Any:
+    """Retorna o valor em cache da chave, buscando/revalidando conforme a política do módulo.
+
+    Args:
+        chave: identificador da resposta (vira nome de arquivo).
+        buscar: função sem argumentos que consulta a API; deve retornar None em erro.
+        ttl: segundos de validade, ou função (dados) -> segundos.
+        max_stale: por quantos segundos após vencer o valor ainda pode ser servido
+            enquanto é atualizado em segundo plano.
+    """
+    entrada = _ler(chave)
+    agora = time.time()
+    if entrada is not None:
+        if agora < entrada['expira_em']:
+            return entrada['dados']
+        if agora < entrada['expira_em'] + max_stale:
+            _revalidar_em_segundo_plano(chave, buscar, ttl)
+            return entrada['dados']
+
+    if _adquirir_lock(chave):
+        try:
+            nova = _atualizar(chave, buscar, ttl)
+        finally:
+            _liberar_lock(chave)
+    else:
+        # Outro processo já está buscando: aguarda a gravação em vez de repetir a chamada
+        nova = None
+        limite = time.monotonic() + CARTOLA_CACHE_WAIT
+        while time.monotonic() < limite:
+            time.sleep(0.05)
+            gravada = _ler(chave)
+            if gravada is not None and gravada['expira_em'] > agora and gravada is not entrada:
+                nova = gravada
+                break
+        if nova is None:
+            nova = _atualizar(chave, buscar, ttl)
+
+    if nova is not None:
+        return nova['dados']
+    return entrada['dados'] if entrada is not None else None
+
+
+def invalidar(chave: Optional[str] = None) -> None:
+    """Remove a chave (ou todo o cache, se None) para todos os processos."""
+    with _lock:
+        if chave is None:
+            _memoria.clear()
+        else:
+            _memoria.pop(chave, None)
+    try:
+        if chave is not None:
+            os.remove(_caminho(chave))
+            return
+        for nome in os.listdir(CARTOLA_CACHE_DIR):
+            if nome.endswith('.json'):
+                os.remove(os.path.join(CARTOLA_CACHE_DIR, nome))
+    except OSError:
+        pass
@@ -0,0 +1,209 @@
+"""
+Parte compartilhada de /api/modulos/<modulo>/dados.
+
+Tudo o que é igual para os usuários de uma mesma rodada, posição e perfis de peso de
+jogo/SG (atletas, médias de scouts, cedidos, gols, clubes, escalações). É montada por
+utils.payload_modulos.obter_payload na primeira requisição ou, antes dela, pelo
+worker da fila (utils/recalculo.py), sem importar a aplicação web.
+"""
+
+from utils.rodada_snapshot import obter_snapshot_rodada
+from utils.team_shields import get_team_shield
+from utils.utilidades import get_temporada_atual
+
+
+def montar_dados_modulo(conn, posicao_id, rodada_atual, perfil_peso_jogo, perfil_peso_sg, versao):
+    """Parte de /api/modulos/<modulo>/dados que é igual para todos os usuários com a
+    mesma rodada, posição e perfis (cacheada em utils.payload_modulos sob `versao`,
+    a versão dos dados; o snapshot da rodada usado é o da mesma versão)."""
+    cursor = conn.cursor()
+    
+    # Confrontos, clubes, destaques e pesos dos perfis: snapshot da rodada compartilhado no processo,
+    # recarregado se foi lido numa versão dos dados anterior à do payload
+    snapshot = obter_snapshot_rodada(conn, rodada_atual, versao=versao)
+    adversarios_dict = snapshot.confrontos()
+    
+    # Buscar atletas com dados necessários (sem peso_jogo e peso_sg, eles vêm das tabelas de perfis)
+    cursor.execute('''
+        SELECT a.atleta_id, a.apelido, a.clube_id, a.pontos_num, a.media_num, 
+               a.preco_num, a.jogos_num, c.nome as clube_nome,
+               c.abreviacao as clube_abrev, COALESCE(a.foto_custom, a.foto) as foto
+        FROM acf_atletas a
+        JOIN acf_clubes c ON a.clube_id = c.id
+        WHERE a.posicao_id = %s AND a.status_id = 7 AND a.temporada = %s
+    ''', (posicao_id, get_temporada_atual()))
+    atletas_raw = cursor.fetchall()
+    
+    # peso_jogo e peso_sg por clube nos perfis do usuário
+    peso_jogo_dict = snapshot.pesos_jogo(perfil_peso_jogo) if perfil_peso_jogo else {}
+    peso_sg_dict = snapshot.pesos_sg(perfil_peso_sg) if perfil_peso_sg else {}
+    
+    atletas = []
+    for row in atletas_raw:
+        if not row or len(row) < 10:
+            continue
+        try:
+            atleta_id, apelido, clube_id, pontos, media, preco, jogos, clube_nome, clube_abrev, foto = row
+            escudo_url = get_team_shield(clube_id, size='45x45')
+            adversario_id = adversarios_dict.get(clube_id)
+            
+            atletas.append({
+                'atleta_id': atleta_id,
+                'apelido': apelido,
+                'clube_id': clube_id,
+                'clube_nome': clube_nome,
+                'clube_abrev': clube_abrev,
+                'foto': foto or '',
+                'clube_escudo_url': escudo_url,
+                'pontos_num': float(pontos) if pontos else 0,
+                'media_num': float(media) if media else 0,
+                'preco_num': float(preco) if preco else 0,
+                'jogos_num': int(jogos) if jogos else 0,
+                'peso_jogo': peso_jogo_dict.get(clube_id, 0),
+                'peso_sg': peso_sg_dict.get(clube_id, 0),
+                'adversario_id': adversario_id
+            })
+        except Exception as e:
+            print(f"Erro ao processar atleta: {e}, row: {row}")
+            continue
+    
+    # Buscar dados de pontuados para cálculos
+    # 1. Buscar médias de scouts por atleta
+    atleta_ids = [a['atleta_id'] for a in atletas]
+    pontuados_data = {}
+    
+    if atleta_ids:
+        try:
+            from models.scouts_agregados import medias_scouts_atletas
+            medias = medias_scouts_atletas(conn, get_temporada_atual(), rodada_atual, atleta_ids)
+            for atleta_id, m in medias.items():
+                pontuados_data[atleta_id] = {
+                    'avg_ds': m['ds'],
+                    'avg_ff': m['ff'],
+                    'avg_fd': m['fd'],
+                    'avg_fs': m['fs'],
+                    'avg_g': m['g'],
+                    'avg_a': m['a']
+                }
+        except Exception as e:
+            # Sem as médias o payload ficaria incompleto e seria cacheado assim: propaga
+            print(f"Erro ao buscar dados de pontuados por atleta: {e}")
+            raise
+    
+    # 2. Buscar médias de desarmes cedidos por adversários (por posição)
+    # Lidas da matriz clube x posição montada uma vez por rodada; chave = adversário
+    if adversarios_dict and posicao_id:
+        adversario_ids = set(adversarios_dict.values())
+        try:
+            from models.scouts_cedidos import matriz_cedidos
+            cedidos = matriz_cedidos(conn, get_temporada_atual(), rodada_atual).get(posicao_id, {})
+            for clube_id in adversario_ids:
+                medias = cedidos.get(clube_id)
+                if not medias:
+                    continue
+                if clube_id not in pontuados_data:
+                    pontuados_data[clube_id] = {}
+                pontuados_data[clube_id]['avg_ds_cedidos'] = medias['ds']
+                pontuados_data[clube_id]['avg_ds_cedidos_casa'] = medias['casa']['ds']
+                pontuados_data[clube_id]['avg_ds_cedidos_fora'] = medias['fora']['ds']
+        except Exception as e:
+            print(f"Erro ao buscar desarmes cedidos por adversários: {e}")
+            raise
+    
+    # 3. Escalações (top 20 destaques)
+    escalacoes_data = snapshot.escalacoes()
+    
+    # Buscar dados de partidas para média de gols
+    gols_data = {}
+    if adversarios_dict:
+        adversario_ids = list(set(adversarios_dict.values()))
+        if adversario_ids and len(adversario_ids) > 0:
+            placeholders = ','.join(['%s'] * len(adversario_ids))
+            try:
+                # Query simplificada: buscar gols marcados por cada clube adversário
+                cursor.execute(f'''
+                    SELECT 
+                        clube_casa_id as clube_id,
+                        SUM(placar_oficial_mandante) as gols_marcados,
+                        COUNT(*) as jogos
+                    FROM acf_partidas
+                    WHERE clube_casa_id IN ({placeholders})
+                      AND rodada_id < %s AND valida = TRUE 
+                      AND placar_oficial_mandante IS NOT NULL
+                    GROUP BY clube_casa_id
+                ''', adversario_ids + [rodada_atual])
+                
+                for row in cursor.fetchall():
+                    if row and len(row) >= 3:
+                        clube_id, gols_marcados, jogos = row
+                        if jogos and jogos > 0:
+                            gols_data[clube_id] = {
+                                'gols_marcados': float(gols_marcados) if gols_marcados else 0,
+                                'jogos': int(jogos),
+                                'media_gols': float(gols_marcados) / float(jogos) if jogos > 0 else 0
+                            }
+                
+                # Também buscar para clubes visitantes
+                cursor.execute(f'''
+                    SELECT 
+                        clube_visitante_id as clube_id,
+                        SUM(placar_oficial_visitante) as gols_marcados,
+                        COUNT(*) as jogos
+                    FROM acf_partidas
+                    WHERE clube_visitante_id IN ({placeholders})
+                      AND rodada_id < %s AND valida = TRUE 
+                      AND placar_oficial_visitante IS NOT NULL
+                    GROUP BY clube_visitante_id
+                ''', adversario_ids + [rodada_atual])
+                
+                for row in cursor.fetchall():
+                    if row and len(row) >= 3:
+                        clube_id, gols_marcados, jogos = row
+                        if clube_id in gols_data:
+                            # Somar aos dados existentes
+                            gols_data[clube_id]['gols_marcados'] += float(gols_marcados) if gols_marcados else 0
+                            gols_data[clube_id]['jogos'] += int(jogos)
+                            total_jogos = gols_data[clube_id]['jogos']
+                            gols_data[clube_id]['media_gols'] = gols_data[clube_id]['gols_marcados'] / total_jogos if total_jogos > 0 else 0
+                        elif jogos and jogos > 0:
+                            gols_data[clube_id] = {
+                                'gols_marcados': float(gols_marcados) if gols_marcados else 0,
+                                'jogos': int(jogos),
+                                'media_gols': float(gols_marcados) / float(jogos) if jogos > 0 else 0
+                            }
+            except Exception as e:
+                print(f"Erro ao buscar dados de gols: {e}")
+                raise
+    
+    # Nomes dos clubes com partida na rodada
+    clubes_dict = {}
+    todos_clube_ids = set(adversarios_dict.keys()) | set(adversarios_dict.values())
+    for clube_id in todos_clube_ids:
+        clube = snapshot.dados_clube(clube_id)
+        if clube is None:
+            continue
+        nome, abreviacao = clube
+        clubes_dict[clube_id] = {
+            'nome': nome,
+            'abreviacao': abreviacao,
+            'escudo_url': get_team_shield(clube_id, size='45x45')
+        }
+    
+    # Adicionar nome do adversário aos atletas
+    for atleta in atletas:
+        if atleta['adversario_id'] and atleta['adversario_id'] in clubes_dict:
+            atleta['adversario_nome'] = clubes_dict[atleta['adversario_id']]['nome']
+        else:
+            atleta['adversario_nome'] = 'N/A'
+    
+    return {
+        'rodada_atual': rodada_atual,
+        'perfil_peso_jogo': perfil_peso_jogo,
+        'perfil_peso_sg': perfil_peso_sg,
+        'atletas': atletas,
+        'adversarios_dict': adversarios_dict,
+        'clubes_dict': clubes_dict,
+        'pontuados_data': pontuados_data,
+        'gols_data': gols_data,
+        'escalacoes_data': escalacoes_data
+    }
@@ -0,0 +1,698 @@
+"""
+Escalação ideal no servidor e escalação de vários times em lote.
+
+Antes, "Escalar Todos os Times" rodava no navegador, um time por vez: selecionava o
+time na sessão, esperava, recalculava tudo em JS e enviava. Aqui cada time é
+escalado no servidor a partir dos próprios rankings (os salvos da rodada; as posições
+sem ranking são calculadas com os pesos e perfis do time e salvas) e da própria
+configuração de escalação, inclusive fechar defesa e hack do goleiro, sem tocar no
+time selecionado da sessão:
+
+- iniciar_lote() registra o lote (models/escalacao_lotes.py) e o enfileira como job
+  'escalar_lote' (models/jobs.py); no worker_jobs.py, processar_lote() prepara os
+  times (rankings, patrimônio) e os envia num pool de threads limitado
+  (ESCALACAO_LOTE_WORKERS), fora dos workers web;
+- entre as duas fases, distribuir_escalacoes() dá escalações diferentes aos times
+  que compartilham rankings e configuração (no máximo `max_repetidos` titulares em
+  comum), numa busca só por grupo; o time que não tem opção diferente dentro do
+  patrimônio recebe a melhor escalação e fica marcado com 'repetida' no lote;
+- os envios ao Cartola passam por http_cartola.aguardar_limite_host, no máximo
+  ESCALACAO_LOTE_RPS_HOST requisições por segundo por host;
+- o progresso de cada time fica no banco e é lido por polling
+  (GET /api/escalacao-ideal/escalar-lote/<lote_id>) em qualquer worker.
+
+As funções de montagem do payload e de envio também são usadas por
+/api/escalacao-ideal/escalar (um time, escalação vinda do navegador).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import get_db_connection, close_db_connection
+from utils.utilidades import get_temporada_atual
+
+# Threads por processo do worker_jobs.py que escalam times de lotes em paralelo
+ESCALACAO_LOTE_WORKERS = int(os.getenv('ESCALACAO_LOTE_WORKERS', '4'))
+# Requisições por segundo por host da API do Cartola durante os lotes
+ESCALACAO_LOTE_RPS_HOST = float(os.getenv('ESCALACAO_LOTE_RPS_HOST', '2'))
+
+POSICAO_IDS_ESCALACAO = {
+    'goleiro': 1, 'lateral': 2, 'zagueiro': 3,
+    'meia': 4, 'atacante': 5, 'treinador': 6
+}
+
+def carregar_rankings_escalacao(conn, user_id, team_id, configuration_id, rodada_atual):
+    """Rankings salvos de todas as posições, com preço e status_id atuais de acf_atletas.
+    
+    Faz sempre duas queries (rankings de todas as posições + preços/status de todos os
+    atletas), independente do número de posições. Retorna {posicao: [jogadores]} só
+    com as posições que têm ranking salvo.
+    """
+    from models.user_rankings import get_latest_team_rankings, get_atletas_preco_status
+    
+    rankings = get_latest_team_rankings(
+        conn, user_id, team_id, configuration_id, rodada_atual,
+        posicao_ids=POSICAO_IDS_ESCALACAO.values()
+    )
+    ranking_por_posicao = {}
+    for pos_nome, pos_id in POSICAO_IDS_ESCALACAO.items():
+        ranking_data = rankings.get(pos_id, {}).get('ranking_data', [])
+        if isinstance(ranking_data, list) and len(ranking_data) > 0:
+            ranking_por_posicao[pos_nome] = [j for j in ranking_data if isinstance(j, dict)]
+    
+    # Preço e status_id atuais de todos os atletas de todas as posições (não do ranking salvo)
+    atletas_mercado = get_atletas_preco_status(
+        conn,
+        (j.get('atleta_id') for ranking in ranking_por_posicao.values() for j in ranking),
+        get_temporada_atual()
+    )
+    
+    rankings_por_posicao = {}
+    for pos_nome, ranking_data in ranking_por_posicao.items():
+        ranking_normalizado = []
+        for jogador in ranking_data:
+            jogador_norm = dict(jogador)
+            atleta_id = jogador_norm.get('atleta_id')
+            preco_atual, status_atual = atletas_mercado.get(atleta_id, (0.0, 0))
+            
+            # Normalizar preço: tentar preco_num, depois preco, depois o da tabela
+            preco_valor = None
+            for campo in ('preco_num', 'preco'):
+                if jogador_norm.get(campo):
+                    try:
+                        preco_valor = float(jogador_norm[campo])
+                    except (ValueError, TypeError):
+                        preco_valor = None
+                    if preco_valor is not None and preco_valor > 0:
+                        break
+            if (preco_valor is None or preco_valor <= 0) and atleta_id in atletas_mercado:
+                preco_valor = preco_atual
+            if preco_valor is None or preco_valor <= 0:
+                preco_valor = 0.0
+            
+            jogador_norm['preco_num'] = preco_valor
+            jogador_norm['preco'] = preco_valor
+            jogador_norm['status_id'] = status_atual  # 0 = status desconhecido
+            ranking_normalizado.append(jogador_norm)
+        
+        rankings_por_posicao[pos_nome] = ranking_normalizado
+        print(f"[DEBUG] Ranking {pos_nome}: {len(ranking_normalizado)} jogadores normalizados")
+    
+    return rankings_por_posicao
+
+def buscar_patrimonio_time(conn, team_id):
+    """Patrimônio do time via API do Cartola (time.time_mercado.patrimonio, time.patrimonio ou patrimonio)"""
+    from api_cartola import fetch_team_data_by_team_id
+    team_data, _ = fetch_team_data_by_team_id(conn, team_id)
+    if not team_data:
+        return 0.0
+    patrimonio = 0
+    time_info = team_data.get('time') if isinstance(team_data.get('time'), dict) else {}
+    if isinstance(time_info.get('time_mercado'), dict):
+        patrimonio = time_info['time_mercado'].get('patrimonio', 0)
+    if not patrimonio:
+        patrimonio = time_info.get('patrimonio', 0) or team_data.get('patrimonio', 0)
+    try:
+        return float(patrimonio) if patrimonio else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+# Posições (plural, como na escalação) -> posicao_id usado pela API do Cartola
+POSICAO_ID_CARTOLA = {
+    'goleiros': 1,
+    'laterais': 2,
+    'zagueiros': 3,
+    'meias': 4,
+    'atacantes': 5,
+    'treinadores': 6
+}
+
+# Formação -> esquema da API do Cartola
+ESQUEMAS_CARTOLA = {
+    '4-3-3': 3,
+    '4-4-2': 1,
+    '3-5-2': 2,
+    '3-4-3': 4,
+    '4-5-1': 5,
+    '5-4-1': 6
+}
+
+def montar_time_para_escalacao(escalacao: Dict[str, Any], formacao: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Payload de /auth/time/salvar a partir de uma escalação (titulares/reservas por posição).
+
+    Retorna (payload, atletas_debug). Não valida a quantidade de titulares: quem chama
+    confere len(payload['atletas']) == 12.
+    """
+    titulares = escalacao.get('titulares', {})
+    reservas = escalacao.get('reservas', {})
+
+    atletas_ids = []
+    atletas_debug = []  # Lista legível para retornar na resposta
+    capitao_id = None
+    for posicao in ['goleiros', 'zagueiros', 'laterais', 'meias', 'atacantes', 'treinadores']:
+        for jogador in titulares.get(posicao, []):
+            atleta_id = jogador.get('atleta_id')
+            eh_capitao = jogador.get('eh_capitao', False)
+            atletas_ids.append(atleta_id)
+            atletas_debug.append({
+                'atleta_id': atleta_id, 'apelido': jogador.get('apelido', 'N/A'), 'posicao': posicao,
+                'preco': jogador.get('preco_num') or jogador.get('preco') or 0,
+                'tipo': 'titular', 'capitao': eh_capitao
+            })
+            if eh_capitao and capitao_id is None:
+                capitao_id = atleta_id
+
+    # Reservas {posicao_id: atleta_id}, chaves STRING; o reserva de luxo também entra aqui
+    reservas_map = {}
+    reserva_luxo_id = None
+    for posicao, jogadores in reservas.items():
+        posicao_id = POSICAO_ID_CARTOLA.get(posicao)
+        if not posicao_id:
+            continue
+        for jogador in jogadores:
+            atleta_id = jogador.get('atleta_id')
+            eh_luxo = jogador.get('eh_reserva_luxo', False)
+            reservas_map[str(posicao_id)] = atleta_id
+            if eh_luxo and reserva_luxo_id is None:
+                reserva_luxo_id = atleta_id
+            atletas_debug.append({
+                'atleta_id': atleta_id, 'apelido': jogador.get('apelido', 'N/A'), 'posicao': posicao,
+                'preco': jogador.get('preco_num') or jogador.get('preco') or 0,
+                'tipo': 'reserva_luxo' if eh_luxo else 'reserva', 'capitao': False
+            })
+
+    payload = {
+        'esquema': ESQUEMAS_CARTOLA.get(formacao, 3),
+        'atletas': atletas_ids,
+        'capitao': capitao_id,
+        'reservas': reservas_map,
+        'reserva_luxo_id': reserva_luxo_id
+    }
+    return payload, atletas_debug
+
+def headers_cartola(access_token: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json, text/plain, */*",
+        "Content-Type": "application/json;charset=UTF-8",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Origin": "https://cartola.globo.com",
+        "Referer": "https://cartola.globo.com/",
+        "x-glb-app": "cartola_web",
+        "x-glb-auth": "oidc",
+    }
+
+def enviar_escalacao_cartola(conn, team_id: int, access_token: str, payload: Dict[str, Any],
+                             por_segundo: float = 0):
+    """Envia a escalação ao Cartola, renovando o token uma vez em caso de 401.
+
+    por_segundo > 0 limita as requisições por host (lotes). Retorna a resposta, ou None
+    se o token expirou e não pôde ser renovado. Exceções de `requests` são propagadas.
+    """
+    from api_cartola import API_URL_SALVAR_TIME, refresh_access_token_by_team_id
+    from utils import http_cartola
+
+    headers = headers_cartola(access_token)
+    http_cartola.aguardar_limite_host(API_URL_SALVAR_TIME, por_segundo)
+    # Timeout de 10 segundos para não travar o cliente
+    response = http_cartola.post(API_URL_SALVAR_TIME, json=payload, headers=headers, timeout=10)
+    if response.status_code == 401:
+        # Token expirado, tentar refresh
+        print(f"[DEBUG] Token expirado (time {team_id}), tentando refresh...")
+        new_token = refresh_access_token_by_team_id(conn, team_id)
+        if not new_token:
+            return None
+        headers["Authorization"] = f"Bearer {new_token}"
+        http_cartola.aguardar_limite_host(API_URL_SALVAR_TIME, por_segundo)
+        response = http_cartola.post(API_URL_SALVAR_TIME, json=payload, headers=headers, timeout=10)
+    return response
+
+def rodada_atual_partidas(conn) -> int:
+    """Rodada da partida mais recente de acf_partidas (1 se vazia)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT rodada_id FROM acf_partidas ORDER BY partida_data DESC LIMIT 1')
+    row = cursor.fetchone()
+    return row[0] if row and row[0] else 1
+
+def calcular_rankings_time(conn, user_id: int, team_id: int, config: Dict[str, Any], rodada_atual: int,
+                           posicoes: List[str]) -> None:
+    """Calcula no servidor e salva os rankings das `posicoes` (singular) que o time não tem.
+
+    Mesmo cálculo do recálculo global (calculo_posicoes/orquestrador.py: atletas e agregados
+    da rodada, calcular_melhores_* sem banco), com os perfis de peso de jogo/SG da
+    configuração e os pesos do time (utils.weights.pesos_time). Os rankings são gravados
+    com save_team_rankings, como os calculados nas telas dos módulos.
+    """
+    from calculo_posicoes.orquestrador import calcular_posicoes
+    from models.user_rankings import save_team_rankings
+    from utils.weights import pesos_time
+
+    posicoes_por_id = {POSICAO_IDS_ESCALACAO[pos]: pos for pos in posicoes}
+    rankings = calcular_posicoes(
+        conn, rodada_atual, list(posicoes_por_id),
+        pesos={pos_id: pesos_time(pos, user_id, team_id) for pos_id, pos in posicoes_por_id.items()},
+        perfil_peso_jogo=config.get('perfil_peso_jogo', 2),
+        perfil_peso_sg=config.get('perfil_peso_sg', 2)
+    )
+    rankings = {pos_id: melhores for pos_id, melhores in rankings.items() if melhores}
+    for melhores in rankings.values():
+        for indice, jogador in enumerate(melhores):
+            jogador['rank'] = indice + 1
+    if rankings:
+        save_team_rankings(conn, user_id, team_id, config.get('id'), rodada_atual, rankings)
+    print(f"[DEBUG] Time {team_id}: rankings calculados no servidor para "
+          f"{', '.join(posicoes_por_id[pos_id] for pos_id in rankings) or 'nenhuma posição'}")
+
+def defesa_fechada_ids(conn, rankings_por_posicao: Dict[str, List[Dict[str, Any]]], formacao: str,
+                       perfil_peso_sg: int, rodada_atual: int, patrimonio: float) -> List[int]:
+    """Titulares fixos de "fechar defesa", como EscalacaoIdeal.fecharDefesaMelhorClube.
+
+    Goleiros, zagueiros e laterais do clube com maior peso de SG no perfil do time,
+    melhores primeiro, até a quantidade da formação e enquanto couberem no patrimônio.
+    As vagas que o clube não preenche ficam para o otimizador.
+    """
+    from utils.otimizador_escalacao import FORMACOES, get_preco, get_pontuacao
+
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT clube_id
+        FROM acp_peso_sg_perfis
+        WHERE perfil_id = %s AND rodada_atual = %s
+        ORDER BY peso_sg DESC
+        LIMIT 1
+    ''', (perfil_peso_sg, rodada_atual))
+    row = cursor.fetchone()
+    if not row:
+        return []
+    clube_id = row[0]
+
+    qts = FORMACOES.get(formacao, FORMACOES['4-3-3'])
+    fixos = []
+    custo = 0.0
+    for posicao in ('goleiro', 'zagueiro', 'lateral'):
+        do_clube = sorted((j for j in rankings_por_posicao.get(posicao, [])
+                           if j.get('clube_id') == clube_id and j.get('ignorado') is not True),
+                          key=get_pontuacao, reverse=True)
+        escalados = 0
+        for jogador in do_clube:
+            if escalados >= qts[posicao]:
+                break
+            if custo + get_preco(jogador) <= patrimonio:
+                fixos.append(jogador['atleta_id'])
+                custo += get_preco(jogador)
+                escalados += 1
+    return fixos
+
+def carregar_goleiros_nulos(conn, rodada_atual: int) -> List[Dict[str, Any]]:
+    """Goleiros do hack do goleiro, do mais barato ao mais caro.
+
+    Só Suspenso (3) e Contundido (5) de clubes com partida válida na rodada: o Cartola
+    recusa atletas com status Nulo (6), como em EscalacaoIdeal.aplicarHackGoleiro.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT a.atleta_id, a.apelido, a.clube_id, a.preco_num, a.status_id
+        FROM acf_atletas a
+        WHERE a.posicao_id = 1 AND a.temporada = %s AND a.status_id IN (3, 5)
+          AND EXISTS (
+              SELECT 1 FROM acf_partidas p
+              WHERE p.rodada_id = %s AND p.valida = TRUE
+                AND a.clube_id IN (p.clube_casa_id, p.clube_visitante_id)
+          )
+        ORDER BY a.preco_num ASC
+    ''', (get_temporada_atual(), rodada_atual))
+    return [
+        {'atleta_id': row[0], 'apelido': row[1], 'clube_id': row[2],
+         'preco_num': float(row[3]) if row[3] else 0.0, 'preco': float(row[3]) if row[3] else 0.0,
+         'status_id': row[4], 'pontuacao_total': 0}
+        for row in cursor.fetchall()
+    ]
+
+def aplicar_hack_goleiro(escalacao: Dict[str, Any], goleiros_nulos: List[Dict[str, Any]],
+                         patrimonio: float) -> Dict[str, Any]:
+    """Hack do goleiro (EscalacaoIdeal.aplicarHackGoleiro) sobre uma escalação do otimizador.
+
+    O goleiro nulo mais barato entre os mais caros que o titular entra como titular e o
+    titular vira o reserva (sem custo), se a diferença couber no patrimônio. Devolve uma
+    nova escalação (a original pode ser a de outro time do lote) ou a mesma, sem hack.
+    """
+    from utils.otimizador_escalacao import get_preco
+
+    goleiros = escalacao['titulares'].get('goleiros') or []
+    if not goleiros:
+        return escalacao
+    titular = goleiros[0]
+    preco_titular = get_preco(titular)
+    escalados = {j['atleta_id'] for jogadores in list(escalacao['titulares'].values()) +
+                 list(escalacao['reservas'].values()) for j in jogadores}
+    nulo = next((g for g in goleiros_nulos
+                 if g['atleta_id'] not in escalados and get_preco(g) > preco_titular), None)
+    if nulo is None:
+        return escalacao
+    diferenca = get_preco(nulo) - preco_titular
+    if escalacao['custo_total'] + diferenca > patrimonio:
+        print(f"[DEBUG] Hack do goleiro não cabe no patrimônio (diferença: R$ {diferenca:.2f})")
+        return escalacao
+
+    eh_capitao = titular.get('eh_capitao', False)
+    nulo = dict(nulo, eh_capitao=eh_capitao)
+    reserva = dict(titular, eh_capitao=False, eh_reserva_luxo=False)
+    resultado = dict(
+        escalacao,
+        titulares=dict(escalacao['titulares'], goleiros=[nulo]),
+        reservas=dict(escalacao['reservas'], goleiros=[reserva]),
+        custo_total=round(escalacao['custo_total'] + diferenca, 2),
+    )
+    if eh_capitao:
+        resultado['capitao_id'] = nulo['atleta_id']
+    return resultado
+
+def preparar_escalacao_servidor(conn, user_id: int, team_id: int) -> Dict[str, Any]:
+    """Entradas do otimizador de um time: rankings, patrimônio e configuração de escalação.
+
+    Posições sem ranking salvo na rodada são calculadas no servidor com os pesos e perfis
+    do time (calcular_rankings_time). Com fechar_defesa, 'fixos_ids' traz a defesa do
+    melhor clube por SG (vazia se ela não permite escalação dentro do patrimônio); com
+    hack_goleiro, 'goleiros_nulos' traz os candidatos do hack. Levanta ValueError com
+    mensagem legível em qualquer falha esperada (sem configuração, rankings, patrimônio).
+    """
+    from models.teams import get_team
+    from models.user_configurations import get_user_default_configuration
+    from models.user_escalacao_config import get_user_escalacao_config
+    from utils.otimizador_escalacao import otimizar_escalacao
+
+    team = get_team(conn, team_id, user_id)
+    if not team:
+        raise ValueError('Time não encontrado')
+
+    config = get_user_default_configuration(conn, user_id, team_id)
+    if not config:
+        raise ValueError('Configuração não encontrada: escolha os perfis do time')
+    escalacao_config = get_user_escalacao_config(conn, user_id, team_id) or {}
+
+    rodada_atual = rodada_atual_partidas(conn)
+    rankings_por_posicao = carregar_rankings_escalacao(conn, user_id, team_id, config.get('id'), rodada_atual)
+    faltando = [pos for pos in POSICAO_IDS_ESCALACAO if pos not in rankings_por_posicao]
+    if faltando:
+        calcular_rankings_time(conn, user_id, team_id, config, rodada_atual, faltando)
+        rankings_por_posicao = carregar_rankings_escalacao(conn, user_id, team_id, config.get('id'), rodada_atual)
+        faltando = [pos for pos in POSICAO_IDS_ESCALACAO if pos not in rankings_por_posicao]
+    if faltando:
+        raise ValueError(f"Sem atletas para os rankings da rodada {rodada_atual}: {', '.join(faltando)}")
+
+    patrimonio = buscar_patrimonio_time(conn, team_id)
+    if patrimonio <= 0:
+        raise ValueError('Patrimônio não encontrado. Verifique as credenciais do time.')
+
+    formacao = escalacao_config.get('formation') or '4-3-3'
+    posicao_capitao = escalacao_config.get('posicao_capitao') or 'atacantes'
+    posicao_reserva_luxo = escalacao_config.get('posicao_reserva_luxo') or posicao_capitao
+    fixos_ids = []
+    if escalacao_config.get('fechar_defesa'):
+        fixos_ids = defesa_fechada_ids(conn, rankings_por_posicao, formacao, config.get('perfil_peso_sg', 2),
+                                       rodada_atual, patrimonio)
+        if fixos_ids and otimizar_escalacao(rankings_por_posicao, patrimonio, formacao=formacao,
+                                            fixos_ids=fixos_ids) is None:
+            print(f"[DEBUG] Time {team_id}: defesa fechada não cabe no patrimônio, escalando sem ela")
+            fixos_ids = []
+    goleiros_nulos = carregar_goleiros_nulos(conn, rodada_atual) if escalacao_config.get('hack_goleiro') else []
+
+    return {
+        'team': team,
+        'rodada_atual': rodada_atual,
+        'rankings_por_posicao': rankings_por_posicao,
+        'patrimonio': patrimonio,
+        'formacao': formacao,
+        'posicao_capitao': posicao_capitao,
+        'posicao_reserva_luxo': posicao_reserva_luxo,
+        'fixos_ids': fixos_ids,
+        'goleiros_nulos': goleiros_nulos,
+    }
+
+def melhor_escalacao_preparo(preparo: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Melhor escalação de um preparo (fronteira compartilhada, ou otimizador com a defesa fechada)"""
+    from utils.fronteira_escalacao import melhor_escalacao
+    from utils.otimizador_escalacao import otimizar_escalacao
+
+    argumentos = dict(formacao=preparo['formacao'], posicao_capitao=preparo['posicao_capitao'],
+                      posicao_reserva_luxo=preparo['posicao_reserva_luxo'])
+    if preparo['fixos_ids']:
+        return otimizar_escalacao(preparo['rankings_por_posicao'], preparo['patrimonio'],
+                                  fixos_ids=preparo['fixos_ids'], **argumentos)
+    return melhor_escalacao(preparo['rodada_atual'], preparo['rankings_por_posicao'], preparo['patrimonio'],
+                            **argumentos)
+
+def montar_calculo(preparo: Dict[str, Any], escalacao: Dict[str, Any]) -> Dict[str, Any]:
+    """Cálculo pronto para enviar_escalacao_calculada (com o hack do goleiro, se ativado)"""
+    if preparo['goleiros_nulos']:
+        escalacao = aplicar_hack_goleiro(escalacao, preparo['goleiros_nulos'], preparo['patrimonio'])
+    return {'team': preparo['team'], 'rodada_atual': preparo['rodada_atual'],
+            'formacao': preparo['formacao'], 'escalacao': escalacao}
+
+def calcular_escalacao_servidor(conn, user_id: int, team_id: int) -> Dict[str, Any]:
+    """Calcula (sem enviar) a escalação de um time com os próprios rankings/configuração.
+
+    Retorna {'team', 'rodada_atual', 'formacao', 'escalacao'}. Levanta ValueError com
+    mensagem legível em qualquer falha esperada (sem configuração, rankings, patrimônio).
+    """
+    preparo = preparar_escalacao_servidor(conn, user_id, team_id)
+    escalacao = melhor_escalacao_preparo(preparo)
+    if escalacao is None:
+        raise ValueError('Não foi possível encontrar escalação válida dentro do patrimônio')
+    return montar_calculo(preparo, escalacao)
+
+def escalar_time_servidor(conn, user_id: int, team_id: int, progresso=None) -> Dict[str, Any]:
+    """Calcula a escalação de um time com os próprios rankings/configuração e envia ao Cartola.
+
+    progresso(status) é chamado antes do envio. Levanta ValueError com mensagem legível
+    em qualquer falha esperada (sem configuração, rankings, patrimônio, recusa do Cartola).
+    """
+    return enviar_escalacao_calculada(conn, calcular_escalacao_servidor(conn, user_id, team_id), progresso)
+
+def enviar_escalacao_calculada(conn, calculo: Dict[str, Any], progresso=None) -> Dict[str, Any]:
+    """Envia ao Cartola uma escalação de calcular_escalacao_servidor (ou do lote).
+
+    progresso(status) é chamado antes do envio. Levanta ValueError com mensagem legível
+    em qualquer falha esperada (sem token, escalação inválida, recusa do Cartola).
+    """
+    import requests
+    from models.escalacao_lotes import TIME_ENVIANDO
+
+    team = calculo['team']
+    if not team.get('access_token'):
+        raise ValueError('Token de acesso não encontrado')
+    rodada_atual = calculo['rodada_atual']
+    formacao = calculo['formacao']
+    escalacao = calculo['escalacao']
+
+    payload, _ = montar_time_para_escalacao(escalacao, formacao)
+    if len(payload['atletas']) != 12:
+        raise ValueError(f"Escalação inválida: {len(payload['atletas'])} atletas. Esperado: 12")
+
+    if progresso:
+        progresso(TIME_ENVIANDO)
+    try:
+        response = enviar_escalacao_cartola(conn, team['id'], team['access_token'], payload,
+                                            por_segundo=ESCALACAO_LOTE_RPS_HOST)
+    except requests.exceptions.Timeout:
+        raise ValueError('A API do Cartola demorou demais para responder')
+    except requests.exceptions.RequestException as e:
+        raise ValueError(f'Erro de conexão: {e}')
+    if response is None:
+        raise ValueError('Falha ao atualizar token')
+    try:
+        response_data = response.json()
+    except ValueError:
+        response_data = {}
+    if not (200 <= response.status_code < 300) or response_data.get('mensagem') != 'Time Escalado! Boa Sorte!':
+        raise ValueError(response_data.get('mensagem') or f'Erro HTTP {response.status_code}')
+
+    return {
+        'rodada_atual': rodada_atual,
+        'formacao': escalacao['formacao'],
+        'pontuacao_prevista': round(escalacao['pontuacao_total'], 2),
+        'custo_total': escalacao['custo_total'],
+        'patrimonio': escalacao['patrimonio'],
+        'repetida': escalacao.get('repetida', False),
+        'mensagem': response_data.get('mensagem'),
+    }
+
+_executor_lock = threading.Lock()
+_executor: Dict[str, Any] = {'pid': None, 'pool': None}
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Pool de threads do processo (recriado após fork)"""
+    pid = os.getpid()
+    with _executor_lock:
+        if _executor['pool'] is None or _executor['pid'] != pid:
+            _executor['pool'] = ThreadPoolExecutor(
+                max_workers=max(ESCALACAO_LOTE_WORKERS, 1), thread_name_prefix='escalacao-lote'
+            )
+            _executor['pid'] = pid
+        return _executor['pool']
+
+def distribuir_escalacoes(preparos: List[Dict[str, Any]],
+                          max_repetidos: Optional[int] = None) -> Dict[int, Optional[Dict[str, Any]]]:
+    """Escalação de cada time do lote ({team_id: escalação ou None se nada cabe no patrimônio}).
+
+    Times com os mesmos rankings, formação, capitão, reserva de luxo e defesa fechada
+    ('fixos_ids') formam um grupo: as tabelas da busca (otimizador_escalacao.BuscaEscalacoes)
+    são montadas uma vez, para o maior patrimônio do grupo, e a mesma busca segue de time
+    em time, do maior patrimônio para o menor: cada time recebe a melhor escalação que repete no máximo
+    `max_repetidos` titulares de cada escalação já dada no grupo. Se não houver opção
+    distinta dentro do patrimônio (ou a busca esgotar ESCALACOES_DIVERSAS_MAX_NOS), o
+    time fica com a melhor escalação, marcada com 'repetida': True.
+    """
+    from utils.fronteira_escalacao import assinatura_candidatos
+    from utils.otimizador_escalacao import BuscaEscalacoes, otimizar_escalacao, ESCALACOES_MAX_REPETIDOS
+
+    max_repetidos = ESCALACOES_MAX_REPETIDOS if max_repetidos is None else max_repetidos
+    grupos: Dict[tuple, List[Dict[str, Any]]] = {}
+    for preparo in preparos:
+        chave = (preparo['rodada_atual'], preparo['formacao'], preparo['posicao_capitao'],
+                 preparo['posicao_reserva_luxo'], tuple(preparo['fixos_ids']),
+                 assinatura_candidatos(preparo['rankings_por_posicao']))
+        grupos.setdefault(chave, []).append(preparo)
+
+    escalacoes: Dict[int, Optional[Dict[str, Any]]] = {}
+    for grupo in grupos.values():
+        if len(grupo) == 1:
+            escalacoes[grupo[0]['team']['id']] = melhor_escalacao_preparo(grupo[0])
+            continue
+        argumentos = dict(formacao=grupo[0]['formacao'], posicao_capitao=grupo[0]['posicao_capitao'],
+                          posicao_reserva_luxo=grupo[0]['posicao_reserva_luxo'], fixos_ids=grupo[0]['fixos_ids'])
+        rankings_por_posicao = grupo[0]['rankings_por_posicao']
+
+        grupo = sorted(grupo, key=lambda preparo: preparo['patrimonio'], reverse=True)
+        busca = BuscaEscalacoes(rankings_por_posicao, grupo[0]['patrimonio'],
+                                profundidade=len(grupo) - 1, **argumentos)
+        busca.iniciar(max_repetidos)
+        repetidas = 0
+        for preparo in grupo:
+            escalacao = busca.proxima(preparo['patrimonio'])
+            if escalacao is None:
+                escalacao = otimizar_escalacao(rankings_por_posicao, preparo['patrimonio'], **argumentos)
+                if escalacao is not None:
+                    escalacao['repetida'] = True
+                    repetidas += 1
+            escalacoes[preparo['team']['id']] = escalacao
+        print(f"[DEBUG] Lote: {len(grupo)} times com os mesmos rankings, {repetidas} com escalação repetida "
+              f"(até {max_repetidos} repetidos)")
+    return escalacoes
+
+def _registrar_erro(conn, lote_id: str, team_id: int, e: Exception) -> None:
+    from models.escalacao_lotes import update_escalacao_lote_time, TIME_ERRO
+    conn.rollback()
+    if isinstance(e, ValueError):
+        update_escalacao_lote_time(conn, lote_id, team_id, {'status': TIME_ERRO, 'erro': str(e)})
+        return
+    print(f"[ERRO] Lote {lote_id}, time {team_id}: {e}")
+    import traceback
+    traceback.print_exc()
+    update_escalacao_lote_time(conn, lote_id, team_id, {'status': TIME_ERRO, 'erro': f'Erro interno: {e}'})
+
+def _preparar_time(lote_id: str, user_id: int, team_id: int) -> Optional[Dict[str, Any]]:
+    from models.escalacao_lotes import update_escalacao_lote_time, TIME_CALCULANDO
+    conn = get_db_connection()
+    if conn is None:
+        print(f"[ERRO] Lote {lote_id}: sem conexão com o banco para o time {team_id}")
+        return None
+    try:
+        update_escalacao_lote_time(conn, lote_id, team_id, {'status': TIME_CALCULANDO})
+        try:
+            return preparar_escalacao_servidor(conn, user_id, team_id)
+        except Exception as e:
+            _registrar_erro(conn, lote_id, team_id, e)
+    except Exception as e:
+        print(f"[ERRO] Falha ao atualizar lote {lote_id} (time {team_id}): {e}")
+    finally:
+        close_db_connection(conn)
+    return None
+
+def _enviar_time(lote_id: str, calculo: Dict[str, Any]) -> None:
+    from models.escalacao_lotes import update_escalacao_lote_time, TIME_ESCALADO
+    team_id = calculo['team']['id']
+    conn = get_db_connection()
+    if conn is None:
+        print(f"[ERRO] Lote {lote_id}: sem conexão com o banco para o time {team_id}")
+        return
+    try:
+        try:
+            resultado = enviar_escalacao_calculada(
+                conn, calculo,
+                progresso=lambda status: update_escalacao_lote_time(conn, lote_id, team_id, {'status': status})
+            )
+            update_escalacao_lote_time(conn, lote_id, team_id, dict(resultado, status=TIME_ESCALADO))
+        except Exception as e:
+            _registrar_erro(conn, lote_id, team_id, e)
+    except Exception as e:
+        print(f"[ERRO] Falha ao atualizar lote {lote_id} (time {team_id}): {e}")
+    finally:
+        close_db_connection(conn)
+
+def processar_lote(conn, lote_id: str, user_id: int, max_repetidos: Optional[int] = None) -> Dict[str, Any]:
+    """Prepara os times em paralelo, distribui escalações diversas e envia em paralelo.
+
+    Executado pelo worker_jobs.py (job 'escalar_lote'). Times já em estado final não
+    são reprocessados, então uma nova tentativa do job não reenvia o que já foi escalado.
+    Retorna um resumo para o resultado do job; ValueError se o lote não existe.
+    """
+    from models.escalacao_lotes import get_escalacao_lote, update_escalacao_lote_time, TIME_ERRO, ESTADOS_FINAIS
+    lote = get_escalacao_lote(conn, lote_id, user_id)
+    if lote is None:
+        raise ValueError('Lote não encontrado')
+    team_ids = [time['team_id'] for time in lote['times'] if time.get('status') not in ESTADOS_FINAIS]
+
+    executor = _get_executor()
+    preparos = [futuro.result() for futuro in [executor.submit(_preparar_time, lote_id, user_id, team_id)
+                                               for team_id in team_ids]]
+    preparos = [preparo for preparo in preparos if preparo is not None]
+    try:
+        escalacoes = distribuir_escalacoes(preparos, max_repetidos)
+    except Exception as e:
+        print(f"[ERRO] Lote {lote_id}: falha ao calcular escalações: {e}")
+        import traceback
+        traceback.print_exc()
+        escalacoes = {}
+
+    envios = []
+    for preparo in preparos:
+        team_id = preparo['team']['id']
+        escalacao = escalacoes.get(team_id)
+        if escalacao is not None:
+            envios.append(executor.submit(_enviar_time, lote_id, montar_calculo(preparo, escalacao)))
+            continue
+        try:
+            update_escalacao_lote_time(conn, lote_id, team_id, {
+                'status': TIME_ERRO, 'erro': 'Não foi possível encontrar escalação válida dentro do patrimônio'
+            })
+        except Exception as e:
+            conn.rollback()
+            print(f"[ERRO] Falha ao atualizar lote {lote_id} (time {team_id}): {e}")
+    for futuro in envios:
+        futuro.result()
+    repetidas = sum(1 for escalacao in escalacoes.values() if escalacao and escalacao.get('repetida'))
+    return {'lote_id': lote_id, 'times': len(team_ids), 'calculados': len(preparos), 'enviados': len(envios),
+            'repetidas': repetidas}
+
+def iniciar_lote(conn, user_id: int, times: List[Dict[str, Any]], max_repetidos: Optional[int] = None) -> str:
+    """Registra o lote e o enfileira para o worker_jobs.py. times: [{'id', 'team_name'}]. Retorna o id do lote.
+
+    max_repetidos: titulares que times com os mesmos rankings podem repetir entre si
+    (padrão ESCALACOES_MAX_REPETIDOS; 12 desliga a diversificação). Levanta
+    LimiteJobsExcedido (com os times do lote marcados como erro) se a fila do usuário está cheia.
+    """
+    from models.escalacao_lotes import create_escalacao_lotes_table, create_escalacao_lote
+    from models.escalacao_lotes import update_escalacao_lote_time, TIME_ERRO
+    from models.jobs import enqueue_job, LimiteJobsExcedido
+    create_escalacao_lotes_table(conn)
+    lote_id = create_escalacao_lote(conn, user_id, times)
+    try:
+        enqueue_job(conn, 'escalar_lote', user_id, None, {'lote_id': lote_id, 'max_repetidos': max_repetidos})
+    except LimiteJobsExcedido as e:
+        for time in times:
+            update_escalacao_lote_time(conn, lote_id, time['id'], {'status': TIME_ERRO, 'erro': str(e)})
+        raise
+    return lote_id
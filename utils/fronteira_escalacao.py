@@ -0,0 +1,124 @@
+"""
+Fronteira custo x pontuação da escalação ideal, pré-calculada por rodada e conjunto de candidatos.
+
+Usuários da mesma rodada com os mesmos rankings (mesma configuração) diferem quase
+só no patrimônio. otimizador_escalacao.calcular_fronteira resolve todos os
+patrimônios numa DP só; aqui a fronteira é guardada e "melhor escalação para R$ X"
+vira uma busca binária nos custos dos pontos da fronteira.
+
+A chave é (rodada, formação, assinatura dos candidatos), com a assinatura tirada de
+atleta_id, preço, pontuação prevista e 'ignorado' de todos os atletas dos rankings:
+qualquer mudança de ranking ou de preço gera outra chave e a fronteira é recalculada
+na primeira consulta; sem mudança, qualquer usuário com os mesmos candidatos
+reaproveita a mesma fronteira.
+
+As fronteiras ficam em memória no processo (LRU de FRONTEIRA_CACHE_MAX_ITENS) e em
+arquivos .npz em FRONTEIRA_CACHE_DIR, para que os outros workers da máquina não
+precisem recalculá-las (mesmo esquema de utils/payload_modulos.py). Ao gravar a
+fronteira de uma rodada, os arquivos de rodadas anteriores são apagados.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from utils.otimizador_escalacao import FORMACOES, calcular_fronteira, escalacao_da_fronteira, get_preco, get_pontuacao
+from utils.utilidades import printdbg
+
+FRONTEIRA_CACHE_DIR = os.getenv(
+    'FRONTEIRA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'aerocartola_fronteiras')
+)
+# Quantidade de fronteiras mantidas em memória por processo
+FRONTEIRA_CACHE_MAX_ITENS = int(os.getenv('FRONTEIRA_CACHE_MAX_ITENS', '32'))
+
+_lock = threading.Lock()
+_fronteiras: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+
+
+def assinatura_candidatos(rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]]) -> str:
+    """Hash curto do que define a fronteira: atletas, preços, pontuações e ignorados.
+
+    Preço e pontuação entram como o otimizador os lê (get_preco/get_pontuacao), para
+    que um 'preco' sem 'preco_num' não faça rankings diferentes dividirem a chave.
+    """
+    h = hashlib.sha1()
+    for posicao in sorted(rankings_por_posicao):
+        for jogador in rankings_por_posicao[posicao]:
+            h.update(repr((posicao, jogador.get('atleta_id'), get_preco(jogador),
+                           get_pontuacao(jogador), jogador.get('ignorado') is True)).encode())
+    return h.hexdigest()[:20]
+
+
+def _arquivo(rodada_atual: int, formacao: str, assinatura: str) -> str:
+    return os.path.join(FRONTEIRA_CACHE_DIR, f'{rodada_atual}_{formacao}_{assinatura}.npz')
+
+
+def _ler_arquivo(caminho: str, formacao: str) -> Optional[Dict[str, Any]]:
+    try:
+        with np.load(caminho, allow_pickle=False) as dados:
+            return {'formacao': formacao, 'custos': dados['custos'], 'pontos': dados['pontos'],
+                    'escalacoes': dados['escalacoes']}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _gravar_arquivo(caminho: str, rodada_atual: int, fronteira: Dict[str, Any]) -> None:
+    try:
+        os.makedirs(FRONTEIRA_CACHE_DIR, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=FRONTEIRA_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as arquivo:
+            np.savez(arquivo, custos=fronteira['custos'], pontos=fronteira['pontos'],
+                     escalacoes=fronteira['escalacoes'])
+        os.replace(temporario, caminho)
+        for nome in os.listdir(FRONTEIRA_CACHE_DIR):
+            if nome.endswith('.npz') and not nome.startswith(f'{rodada_atual}_'):
+                os.remove(os.path.join(FRONTEIRA_CACHE_DIR, nome))
+    except OSError as e:
+        printdbg(f"Erro ao gravar fronteira em {caminho}: {e}")
+
+
+def obter_fronteira(rodada_atual: int, rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]],
+                    formacao: str = '4-3-3') -> Dict[str, Any]:
+    """Fronteira dos candidatos na rodada: memória do processo, arquivo ou cálculo (nessa ordem)"""
+    formacao = formacao if formacao in FORMACOES else '4-3-3'
+    chave = (rodada_atual, formacao, assinatura_candidatos(rankings_por_posicao))
+    with _lock:
+        fronteira = _fronteiras.get(chave)
+        if fronteira is not None:
+            _fronteiras.move_to_end(chave)
+            return fronteira
+
+    caminho = _arquivo(*chave)
+    fronteira = _ler_arquivo(caminho, formacao)
+    if fronteira is None:
+        fronteira = calcular_fronteira(rankings_por_posicao, formacao)
+        _gravar_arquivo(caminho, rodada_atual, fronteira)
+        printdbg(f"Fronteira calculada (rodada {rodada_atual}, {formacao}): {len(fronteira['custos'])} pontos")
+
+    with _lock:
+        _fronteiras[chave] = fronteira
+        while len(_fronteiras) > FRONTEIRA_CACHE_MAX_ITENS:
+            _fronteiras.popitem(last=False)
+    return fronteira
+
+
+def melhor_escalacao(rodada_atual: int, rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]],
+                     patrimonio: float, formacao: str = '4-3-3', posicao_capitao: str = 'atacantes',
+                     posicao_reserva_luxo: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Mesmo resultado de otimizar_escalacao (sem excluídos/fixos), consultado na fronteira"""
+    fronteira = obter_fronteira(rodada_atual, rankings_por_posicao, formacao)
+    return escalacao_da_fronteira(fronteira, rankings_por_posicao, patrimonio,
+                                  posicao_capitao=posicao_capitao, posicao_reserva_luxo=posicao_reserva_luxo)
+
+
+def invalidar_fronteiras() -> None:
+    """Descarta as fronteiras em memória deste processo (os arquivos são chaveados pelo conteúdo)."""
+    with _lock:
+        _fronteiras.clear()
@@ -0,0 +1,210 @@
+"""
+Cliente HTTP compartilhado para as chamadas à API do Cartola/Globo.
+
+Substitui os requests.get/post avulsos de api_cartola.py por uma única
+requests.Session por processo, com:
+
+- pool de conexões keep-alive por host (HTTPAdapter);
+- timeouts sempre definidos (conexão/leitura), para um upstream lento não
+  prender um worker do gunicorn pelos 120 s do timeout;
+- retry com backoff exponencial em erros de conexão e em 429/5xx (o
+  Retry-After do upstream é respeitado);
+- contadores de latência e erros por endpoint (get_http_metrics);
+- limite de requisições por segundo por host (aguardar_limite_host), usado
+  quando várias threads enviam ao mesmo host em paralelo;
+- transporte plugável (set_transport / set_base_url) para rodar contra um
+  servidor falso local em testes.
+
+As funções levantam as mesmas exceções de `requests`, então o tratamento de
+erros existente (RequestException, HTTPError com status 401 etc.) continua valendo.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Timeouts padrão (segundos): conexão e leitura
+HTTP_TIMEOUT_CONNECT = float(os.getenv('CARTOLA_HTTP_TIMEOUT_CONNECT', '3.05'))
+HTTP_TIMEOUT_READ = float(os.getenv('CARTOLA_HTTP_TIMEOUT_READ', '10'))
+# Retry em falhas transitórias
+HTTP_RETRIES = int(os.getenv('CARTOLA_HTTP_RETRIES', '3'))
+HTTP_BACKOFF = float(os.getenv('CARTOLA_HTTP_BACKOFF', '0.5'))
+# Conexões mantidas por host
+HTTP_POOL_MAXSIZE = int(os.getenv('CARTOLA_HTTP_POOL_MAXSIZE', '10'))
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# Hosts da API que podem ser redirecionados para um servidor local (ver set_base_url)
+CARTOLA_HOSTS = ('api.cartola.globo.com', 'api.cartolafc.globo.com', 'web-api.globoid.globo.com')
+
+_lock = threading.Lock()
+_estado: Dict[str, Any] = {
+    'pid': None,
+    'session': None,
+    'transport': None,
+    'base_url': os.getenv('CARTOLA_API_BASE_URL') or None,
+}
+_metrics: Dict[str, Dict[str, Any]] = {}
+_proxima_vez: Dict[str, float] = {}  # host -> instante (monotonic) da próxima requisição liberada
+
+
+def _retry() -> Retry:
+    return Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUS,
+        # POST (salvar time, refresh de token) só é repetido em falha de conexão
+        allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def _nova_session() -> requests.Session:
+    session = requests.Session()
+    adapter = _estado['transport'] or HTTPAdapter(
+        pool_connections=len(CARTOLA_HOSTS) + 2,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=_retry(),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Session do processo (recriada após fork, já que sockets não podem ser compartilhados)."""
+    pid = os.getpid()
+    session = _estado['session']
+    if session is not None and _estado['pid'] == pid:
+        return session
+    with _lock:
+        if _estado['session'] is None or _estado['pid'] != pid:
+            _estado['session'] = _nova_session()
+            _estado['pid'] = pid
+        return _estado['session']
+
+
+def set_transport(adapter: Optional[requests.adapters.BaseAdapter]) -> None:
+    """Troca o transporte da Session (ex.: adapter falso em testes). None volta ao padrão."""
+    with _lock:
+        _estado['transport'] = adapter
+        if _estado['session'] is not None:
+            _estado['session'].close()
+        _estado['session'] = None
+
+
+def set_base_url(base_url: Optional[str]) -> None:
+    """Redireciona os hosts do Cartola (CARTOLA_HOSTS) para base_url, ex.: 'http://127.0.0.1:8099'.
+
+    Também configurável pela variável de ambiente CARTOLA_API_BASE_URL. None desativa.
+    """
+    _estado['base_url'] = base_url.rstrip('/') if base_url else None
+
+
+def _resolver_url(url: str) -> str:
+    base_url = _estado['base_url']
+    if not base_url:
+        return url
+    partes = urlsplit(url)
+    if partes.hostname not in CARTOLA_HOSTS:
+        return url
+    destino = base_url + partes.path
+    return f'{destino}?{partes.query}' if partes.query else destino
+
+
+def _nome_endpoint(metodo: str, url: str) -> str:
+    """'GET api.cartola.globo.com/partidas/{n}': ids numéricos agrupados num só endpoint."""
+    partes = urlsplit(url)
+    caminho = re.sub(r'/\d+(?=/|$)', '/{n}', partes.path or '/')
+    return f'{metodo} {partes.hostname}{caminho}'
+
+
+def _registrar(endpoint: str, inicio: float, status: Optional[int], erro: bool) -> None:
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+    with _lock:
+        m = _metrics.setdefault(endpoint, {
+            'requests': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'status': {},
+        })
+        m['requests'] += 1
+        m['total_ms'] += duracao_ms
+        m['max_ms'] = max(m['max_ms'], duracao_ms)
+        if erro:
+            m['errors'] += 1
+        chave = str(status) if status is not None else 'exception'
+        m['status'][chave] = m['status'].get(chave, 0) + 1
+
+
+def aguardar_limite_host(url: str, por_segundo: float) -> float:
+    """Espera a vez de requisitar ao host de `url`, no máximo `por_segundo` req/s (no processo).
+
+    As vagas são distribuídas em ordem de chegada entre as threads. Retorna os
+    segundos esperados; por_segundo <= 0 não limita.
+    """
+    if por_segundo <= 0:
+        return 0.0
+    host = urlsplit(url).hostname or ''
+    with _lock:
+        agora = time.monotonic()
+        vez = max(agora, _proxima_vez.get(host, agora))
+        _proxima_vez[host] = vez + 1.0 / por_segundo
+    espera = vez - agora
+    if espera > 0:
+        time.sleep(espera)
+    return espera
+
+
+def request(metodo: str, url: str, timeout=None, **kwargs) -> requests.Response:
+    """Executa a requisição pela Session compartilhada, com timeout padrão e métricas."""
+    metodo = metodo.upper()
+    endpoint = _nome_endpoint(metodo, url)
+    if timeout is None:
+        timeout = (HTTP_TIMEOUT_CONNECT, HTTP_TIMEOUT_READ)
+    inicio = time.perf_counter()
+    try:
+        response = get_session().request(metodo, _resolver_url(url), timeout=timeout, **kwargs)
+    except requests.exceptions.RequestException:
+        _registrar(endpoint, inicio, None, True)
+        raise
+    _registrar(endpoint, inicio, response.status_code, response.status_code >= 400)
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request('GET', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request('POST', url, **kwargs)
+
+
+def get_http_metrics() -> Dict[str, Dict[str, Any]]:
+    """Contadores por endpoint deste processo (requests, errors, latência média/máxima, status)."""
+    with _lock:
+        resultado = {}
+        for endpoint, m in _metrics.items():
+            resultado[endpoint] = {
+                'requests': m['requests'],
+                'errors': m['errors'],
+                'avg_ms': round(m['total_ms'] / m['requests'], 2) if m['requests'] else 0.0,
+                'max_ms': round(m['max_ms'], 2),
+                'status': dict(m['status']),
+            }
+        return resultado
+
+
+def reset_http_metrics() -> None:
+    with _lock:
+        _metrics.clear()
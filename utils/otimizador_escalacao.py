@@ -0,0 +1,673 @@
+"""
+Otimizador exato da escalação ideal.
+
+Resolve "maximizar a pontuação prevista dos titulares respeitando patrimônio e
+formação" como uma mochila com grupos (uma por posição, com quantidade exata de
+atletas por grupo) via programação dinâmica sobre o custo em centavos. Diferente
+de combinations() x product() sobre o top-N de cada posição (calculo_escalacao_ideal.py
+e static/js/escalacao_ideal.js), considera o ranking inteiro e sempre encontra o
+ótimo, em poucos milissegundos.
+
+Antes da DP, candidatos dominados são descartados: se ao menos `qt` outros atletas
+da mesma posição custam o mesmo ou menos e pontuam o mesmo ou mais, o candidato
+nunca é necessário numa solução ótima.
+
+Reservas seguem a regra do Cartola usada no frontend: não custam patrimônio e
+precisam ser mais baratos que o titular mais barato da posição.
+
+BuscaEscalacoes devolve as K melhores escalações distintas com limite de titulares
+repetidos entre elas (multi-escalação), numa só busca sobre as mesmas tabelas.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Mesmas formações de EscalacaoIdeal.parseFormacao (static/js/escalacao_ideal.js)
+FORMACOES = {
+    '4-3-3': {'goleiro': 1, 'zagueiro': 2, 'lateral': 2, 'meia': 3, 'atacante': 3, 'treinador': 1},
+    '4-4-2': {'goleiro': 1, 'zagueiro': 2, 'lateral': 2, 'meia': 4, 'atacante': 2, 'treinador': 1},
+    '3-5-2': {'goleiro': 1, 'zagueiro': 3, 'lateral': 0, 'meia': 5, 'atacante': 2, 'treinador': 1},
+    '3-4-3': {'goleiro': 1, 'zagueiro': 3, 'lateral': 0, 'meia': 4, 'atacante': 3, 'treinador': 1},
+    '4-5-1': {'goleiro': 1, 'zagueiro': 2, 'lateral': 2, 'meia': 5, 'atacante': 1, 'treinador': 1},
+    '5-4-1': {'goleiro': 1, 'zagueiro': 3, 'lateral': 2, 'meia': 4, 'atacante': 1, 'treinador': 1},
+}
+
+SINGULAR_PARA_PLURAL = {
+    'goleiro': 'goleiros', 'lateral': 'laterais', 'zagueiro': 'zagueiros',
+    'meia': 'meias', 'atacante': 'atacantes', 'treinador': 'treinadores',
+}
+PLURAL_PARA_SINGULAR = {v: k for k, v in SINGULAR_PARA_PLURAL.items()}
+
+# Escalações diversas (BuscaEscalacoes): titulares não fixos que duas escalações podem
+# repetir, máximo de escalações por busca e limite de nós retirados da heap por escalação
+ESCALACOES_MAX_REPETIDOS = int(os.getenv('ESCALACOES_MAX_REPETIDOS', '8'))
+ESCALACOES_DIVERSAS_MAXIMO = 20
+ESCALACOES_DIVERSAS_MAX_NOS = int(os.getenv('ESCALACOES_DIVERSAS_MAX_NOS', '100000'))
+# Limite superior com repetidos: nós retirados da heap antes de ajustar os
+# multiplicadores, passos do subgradiente e colunas de custo (reduzido) usadas nele
+ESCALACOES_DIVERSAS_NOS_SEM_AJUSTE = int(os.getenv('ESCALACOES_DIVERSAS_NOS_SEM_AJUSTE', '1000'))
+ESCALACOES_DIVERSAS_ITERACOES = int(os.getenv('ESCALACOES_DIVERSAS_ITERACOES', '30'))
+ESCALACOES_DIVERSAS_LARGURA = int(os.getenv('ESCALACOES_DIVERSAS_LARGURA', '1000'))
+
+
+def get_preco(jogador: Dict[str, Any]) -> float:
+    try:
+        return float(jogador.get('preco_num') or jogador.get('preco') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def get_pontuacao(jogador: Dict[str, Any]) -> float:
+    try:
+        return float(jogador.get('pontuacao_total') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _centavos(valor: float) -> int:
+    return int(round(valor * 100))
+
+
+def _podar_dominados(precos: np.ndarray, pontos: np.ndarray, qt: int) -> np.ndarray:
+    """Índices dos candidatos não dominados por `qt` ou mais atletas da posição."""
+    n = len(precos)
+    if n <= qt:
+        return np.arange(n)
+    idx = np.arange(n)
+    melhor_ou_igual = (precos[None, :] <= precos[:, None]) & (pontos[None, :] >= pontos[:, None])
+    estritamente = (precos[None, :] < precos[:, None]) | (pontos[None, :] > pontos[:, None])
+    # Empates exatos: só o de menor índice domina, para não descartar os dois
+    domina = melhor_ou_igual & (estritamente | (idx[None, :] < idx[:, None]))
+    np.fill_diagonal(domina, False)
+    return np.flatnonzero(domina.sum(axis=1) < qt)
+
+
+def _resolver_titulares(grupos: List[Dict[str, Any]], orcamento: int) -> Optional[List[List[int]]]:
+    """DP exata da mochila por grupos. Retorna, por grupo, os índices escolhidos (ou None se inviável).
+
+    grupos: [{'qt': int, 'custos': array int (centavos), 'pontos': array float}]
+    """
+    # Atalho: se o melhor de cada posição cabe no orçamento, ele é o ótimo
+    escolha_livre = []
+    custo_livre = 0
+    for grupo in grupos:
+        ordem = np.argsort(-grupo['pontos'], kind='stable')[:grupo['qt']]
+        escolha_livre.append(sorted(ordem.tolist()))
+        custo_livre += int(grupo['custos'][ordem].sum())
+    if custo_livre <= orcamento:
+        return escolha_livre
+
+    # O orçamento útil nunca passa da soma dos `qt` mais caros de cada posição
+    orcamento = min(orcamento, _teto_orcamento(grupos))
+    if orcamento < 0:
+        return None
+
+    anterior, decisoes = _tabelas_titulares(grupos, orcamento)
+    if not np.isfinite(anterior[orcamento]):
+        return None
+    return _reconstruir_titulares(grupos, decisoes, orcamento)
+
+
+def _teto_orcamento(grupos: List[Dict[str, Any]]) -> int:
+    return sum(int(np.sort(g['custos'])[::-1][:g['qt']].sum()) for g in grupos)
+
+
+def _tabelas_titulares(grupos: List[Dict[str, Any]], orcamento: int):
+    """DP da mochila por grupos para todos os orçamentos de 0 a `orcamento` (centavos).
+
+    Retorna (melhor pontuação com custo <= c para cada c, decisões por grupo).
+    """
+    largura = orcamento + 1
+    anterior = np.zeros(largura)  # melhor pontuação com custo <= c
+    decisoes = []
+    for grupo in grupos:
+        qt = grupo['qt']
+        tabela = np.full((qt + 1, largura), -np.inf)
+        tabela[0] = anterior
+        pegou = np.zeros((len(grupo['custos']), qt + 1, largura), dtype=bool)
+        for i, (custo, ponto) in enumerate(zip(grupo['custos'].tolist(), grupo['pontos'].tolist())):
+            if custo >= largura:
+                continue
+            for j in range(min(qt, i + 1), 0, -1):
+                candidato = tabela[j - 1, :largura - custo] + ponto
+                atual = tabela[j, custo:]
+                melhora = candidato > atual
+                atual[melhora] = candidato[melhora]
+                pegou[i, j, custo:] = melhora
+        decisoes.append(pegou)
+        anterior = tabela[qt]
+    return anterior, decisoes
+
+
+def _reconstruir_titulares(grupos: List[Dict[str, Any]], decisoes: List[np.ndarray], orcamento: int) -> List[List[int]]:
+    """Índices escolhidos por grupo na solução ótima para `orcamento` (de trás para frente)"""
+    escolhas: List[List[int]] = [[] for _ in grupos]
+    c = orcamento
+    for g in range(len(grupos) - 1, -1, -1):
+        j = grupos[g]['qt']
+        custos = grupos[g]['custos']
+        for i in range(len(custos) - 1, -1, -1):
+            if j == 0:
+                break
+            if decisoes[g][i, j, c]:
+                escolhas[g].append(i)
+                c -= int(custos[i])
+                j -= 1
+        escolhas[g].reverse()
+    return escolhas
+
+
+def _preparar_grupos(rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]], qts: Dict[str, int],
+                     excluir_ids: Sequence[int], fixos_ids: Sequence[int],
+                     profundidade: int = 0) -> Optional[Dict[str, Any]]:
+    """Candidatos por posição, fixados e grupos (podados) da mochila; None se faltar atleta.
+
+    profundidade > 0 mantém candidatos dominados por até `qt * (profundidade + 1) - 1`
+    outros, necessários quando se quer além da melhor escalação (as `profundidade + 1`
+    melhores, distintas ou com limite de repetidos): cada escalação anterior pode ocupar
+    `qt` dos que dominam um candidato, e sempre sobra um livre para trocá-lo.
+    """
+    excluir = set(excluir_ids)
+    fixos = set(fixos_ids)
+    custo_fixos = 0
+    posicoes = []
+    grupos = []
+    fixados: Dict[str, List[Dict[str, Any]]] = {}
+    candidatos_por_posicao: Dict[str, List[Dict[str, Any]]] = {}
+
+    for posicao, qt in qts.items():
+        vistos = set()
+        candidatos = []
+        for jogador in rankings_por_posicao.get(posicao) or []:
+            atleta_id = jogador.get('atleta_id')
+            if jogador.get('ignorado') is True or atleta_id in excluir or atleta_id in vistos:
+                continue
+            vistos.add(atleta_id)
+            candidatos.append(jogador)
+        candidatos_por_posicao[posicao] = candidatos
+
+        fixados[posicao] = [j for j in candidatos if j.get('atleta_id') in fixos][:qt]
+        custo_fixos += sum(_centavos(get_preco(j)) for j in fixados[posicao])
+        restante = qt - len(fixados[posicao])
+        if restante == 0:
+            continue
+
+        livres = [j for j in candidatos if j.get('atleta_id') not in fixos]
+        if len(livres) < restante:
+            return None
+        custos = np.array([_centavos(get_preco(j)) for j in livres], dtype=np.int64)
+        pontos = np.array([get_pontuacao(j) for j in livres], dtype=np.float64)
+        manter = _podar_dominados(custos, pontos, restante * (profundidade + 1))
+        posicoes.append((posicao, [livres[i] for i in manter]))
+        grupos.append({'qt': restante, 'custos': custos[manter], 'pontos': pontos[manter]})
+
+    return {
+        'posicoes': posicoes,
+        'grupos': grupos,
+        'fixados': fixados,
+        'candidatos_por_posicao': candidatos_por_posicao,
+        'custo_fixos': custo_fixos,
+    }
+
+
+def _montar_resultado(escolhidos: Dict[str, List[Dict[str, Any]]], qts: Dict[str, int],
+                      candidatos_por_posicao: Dict[str, List[Dict[str, Any]]], posicao_capitao: str,
+                      posicao_reserva_luxo: str, patrimonio: float, formacao: str, inicio: float) -> Dict[str, Any]:
+    """Titulares (por posição no singular) -> dicionário de retorno de otimizar_escalacao"""
+    titulares = {SINGULAR_PARA_PLURAL[p]: [dict(j) for j in escolhidos[p]] for p in qts}
+    for posicao in titulares:
+        titulares[posicao].sort(key=get_pontuacao, reverse=True)
+
+    # Reservas: melhor atleta não escalado e mais barato que o titular mais barato. O reserva
+    # de luxo pode custar o mesmo que o titular mais barato, como em EscalacaoIdeal.escalarPosicao
+    # (static/js/escalacao_ideal.js), onde ele é o mais barato dos N+1 melhores da posição.
+    escalados = {j['atleta_id'] for jogadores in titulares.values() for j in jogadores}
+    reservas: Dict[str, List[Dict[str, Any]]] = {}
+    for posicao, qt in qts.items():
+        plural = SINGULAR_PARA_PLURAL[posicao]
+        if posicao == 'treinador':
+            continue
+        reservas[plural] = []
+        if not titulares[plural]:
+            continue
+        luxo = plural == posicao_reserva_luxo
+        preco_max = min(_centavos(get_preco(j)) for j in titulares[plural]) - (0 if luxo else 1)
+        opcoes = [j for j in candidatos_por_posicao[posicao]
+                  if j['atleta_id'] not in escalados and _centavos(get_preco(j)) <= preco_max]
+        if opcoes:
+            reserva = dict(max(opcoes, key=get_pontuacao))
+            reserva['eh_reserva_luxo'] = luxo
+            reservas[plural] = [reserva]
+
+    capitao = None
+    if titulares.get(posicao_capitao):
+        capitao = titulares[posicao_capitao][0]
+        capitao['eh_capitao'] = True
+
+    todos = [j for jogadores in titulares.values() for j in jogadores]
+    return {
+        'titulares': titulares,
+        'reservas': reservas,
+        'capitao_id': capitao['atleta_id'] if capitao else None,
+        'custo_total': round(sum(get_preco(j) for j in todos), 2),
+        'pontuacao_total': sum(get_pontuacao(j) for j in todos),
+        'patrimonio': float(patrimonio or 0),
+        'formacao': formacao if formacao in FORMACOES else '4-3-3',
+        'tempo_ms': round((time.perf_counter() - inicio) * 1000, 2),
+    }
+
+
+def otimizar_escalacao(rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]], patrimonio: float,
+                       formacao: str = '4-3-3', posicao_capitao: str = 'atacantes',
+                       posicao_reserva_luxo: Optional[str] = None,
+                       excluir_ids: Sequence[int] = (), fixos_ids: Sequence[int] = ()) -> Optional[Dict[str, Any]]:
+    """Calcula a escalação de maior pontuação prevista que cabe no patrimônio.
+
+    Args:
+        rankings_por_posicao: {'goleiro': [...], 'lateral': [...], ...} com atleta_id,
+            pontuacao_total e preco_num (mesmo formato de /api/escalacao-ideal/dados).
+            Atletas com 'ignorado' = True são desconsiderados.
+        patrimonio: cartoletas disponíveis para os titulares.
+        formacao: chave de FORMACOES.
+        posicao_capitao: posição (plural) de onde sai o capitão.
+        posicao_reserva_luxo: posição (plural) do reserva de luxo; padrão = posição do capitão.
+        excluir_ids: atletas que não podem ser escalados.
+        fixos_ids: atletas que devem estar entre os titulares (ex.: defesa fechada).
+
+    Returns:
+        Dicionário no formato de EscalacaoIdeal.calcular() (titulares/reservas por posição
+        no plural, custo_total, pontuacao_total, capitao) ou None se não houver escalação
+        possível dentro do patrimônio.
+    """
+    inicio = time.perf_counter()
+    qts = FORMACOES.get(formacao, FORMACOES['4-3-3'])
+    preparo = _preparar_grupos(rankings_por_posicao, qts, excluir_ids, fixos_ids)
+    if preparo is None:
+        return None
+    orcamento = _centavos(float(patrimonio or 0)) - preparo['custo_fixos']
+    if orcamento < 0:
+        return None
+
+    escolhas = _resolver_titulares(preparo['grupos'], orcamento)
+    if escolhas is None:
+        return None
+
+    escolhidos = {p: list(preparo['fixados'][p]) for p in qts}
+    for (posicao, livres), indices in zip(preparo['posicoes'], escolhas):
+        escolhidos[posicao].extend(livres[i] for i in indices)
+    return _montar_resultado(escolhidos, qts, preparo['candidatos_por_posicao'], posicao_capitao,
+                             posicao_reserva_luxo or posicao_capitao, patrimonio, formacao, inicio)
+
+
+def _tabelas_busca(grupos: List[Dict[str, Any]], largura: int,
+                   penalidade: Optional[np.ndarray] = None) -> List[np.ndarray]:
+    """Tabelas da DP em ordem reversa: para cada posição, [atleta i, quantidade j ainda a
+    escolher, custo] -> melhor pontuação dali até o fim (-inf se nada cabe).
+
+    penalidade: valor descontado dos pontos de cada candidato (na ordem dos grupos).
+    """
+    tabelas = []
+    proxima = np.zeros(largura, dtype=np.float32)
+    deslocamento = sum(len(g['custos']) for g in grupos)
+    for grupo in reversed(grupos):
+        qt, n = grupo['qt'], len(grupo['custos'])
+        deslocamento -= n
+        pontos = grupo['pontos'] if penalidade is None else grupo['pontos'] - penalidade[deslocamento:deslocamento + n]
+        tabela = np.full((n + 1, qt + 1, largura), -np.inf, dtype=np.float32)
+        tabela[n, 0] = proxima
+        for i in range(n - 1, -1, -1):
+            tabela[i] = tabela[i + 1]
+            custo, ponto = int(grupo['custos'][i]), np.float32(pontos[i])
+            if custo >= largura:
+                continue
+            for j in range(1, qt + 1):
+                np.maximum(tabela[i, j, custo:], tabela[i + 1, j - 1, :largura - custo] + ponto,
+                           out=tabela[i, j, custo:])
+        tabelas.append(tabela)
+        proxima = tabela[0, qt]
+    tabelas.reverse()
+    return tabelas
+
+
+class BuscaEscalacoes:
+    """Busca das melhores escalações distintas (com limite de atletas repetidos) num só passe.
+
+    Monta uma vez, para o maior patrimônio, as tabelas da DP (_tabelas_busca). A busca
+    melhor-primeiro (heap de escalações parciais com prioridade = pontos escolhidos +
+    limite superior do resto) completa as escalações em ordem decrescente de pontuação.
+    Parciais que já repetem mais de `max_repetidos` atletas (não fixos) de uma escalação
+    aceita ou de `evitar` são descartadas.
+
+    Com escalações aceitas, o limite superior também leva em conta os repetidos
+    (relaxação lagrangiana): cada atleta de uma escalação aceita tem os pontos
+    descontados do multiplicador dela, e cada repetição ainda permitida devolve o
+    multiplicador. Quando a busca passa de ESCALACOES_DIVERSAS_NOS_SEM_AJUSTE nós sem
+    achar a escalação, os multiplicadores são ajustados por subgradiente na escalação
+    completa (ESCALACOES_DIVERSAS_ITERACOES passos) e o limite passa a ser o menor
+    entre as tabelas sem e com desconto.
+
+    A heap é uma só entre chamadas de proxima(): cada chamada devolve a próxima
+    escalação para um patrimônio igual ou menor que o da anterior (parciais que não
+    cabiam num patrimônio maior não cabem num menor). Prioridades calculadas antes de
+    uma escalação aceita ou de um patrimônio menor são recalculadas quando a parcial
+    sai da heap.
+    """
+
+    def __init__(self, rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]], patrimonio_maximo: float,
+                 formacao: str = '4-3-3', posicao_capitao: str = 'atacantes',
+                 posicao_reserva_luxo: Optional[str] = None, excluir_ids: Sequence[int] = (),
+                 fixos_ids: Sequence[int] = (), profundidade: int = ESCALACOES_DIVERSAS_MAXIMO - 1):
+        self.formacao = formacao
+        self.qts = FORMACOES.get(formacao, FORMACOES['4-3-3'])
+        self.posicao_capitao = posicao_capitao
+        self.posicao_reserva_luxo = posicao_reserva_luxo or posicao_capitao
+        self.preparo = _preparar_grupos(rankings_por_posicao, self.qts, excluir_ids, fixos_ids, profundidade)
+        self.tabelas: List[np.ndarray] = []
+        self.largura = 0
+        self.livres: List[Dict[str, Any]] = []
+        if self.preparo is not None:
+            grupos = self.preparo['grupos']
+            orcamento = _centavos(float(patrimonio_maximo or 0)) - self.preparo['custo_fixos']
+            # Acima da soma dos `qt` mais caros de cada posição o orçamento não muda nada
+            self.largura = max(min(orcamento, _teto_orcamento(grupos)), -1) + 1
+        if self.largura > 0:
+            self.tabelas = _tabelas_busca(grupos, self.largura)
+            self.livres = [jogador for _, jogadores in self.preparo['posicoes'] for jogador in jogadores]
+            self.atleta_ids = [j.get('atleta_id') for j in self.livres]
+            self.deslocamentos = np.concatenate(
+                [[0], np.cumsum([len(g['custos']) for g in grupos])]).astype(int).tolist()
+            self.vagas = sum(g['qt'] for g in grupos)
+        self.iniciar()
+
+    def iniciar(self, max_repetidos: Optional[int] = None, evitar: Sequence[Sequence[int]] = ()) -> None:
+        """Recomeça a busca. evitar: titulares (atleta_ids) de escalações já usadas, que
+        também contam para o limite de repetidos."""
+        self.limite = float('inf') if max_repetidos is None else max_repetidos
+        self.orcamento: Optional[int] = None
+        # membros[k]: escalações aceitas (índices) que contêm o candidato k
+        self.membros: List[List[int]] = [[] for _ in self.livres]
+        self.aceitos = 0
+        self.multiplicadores = np.zeros(0)
+        self.tabelas_penalizadas: List[np.ndarray] = []
+        self.versao_penalizadas = None
+        self.contador = 0
+        self.heap: List[tuple] = []
+        if self.largura == 0:
+            return
+        # Raiz com prioridade infinita: é avaliada ao sair da heap, já com o patrimônio
+        grupos = self.preparo['grupos']
+        self.heap.append((-float('inf'), 0, 0, 0, grupos[0]['qt'] if grupos else 0, 0, 0.0, (), (), None))
+        for ids in evitar:
+            self._aceitar(ids)
+
+    def _aceitar(self, ids) -> None:
+        ids = set(ids)
+        for k, atleta_id in enumerate(self.atleta_ids):
+            if atleta_id in ids:
+                self.membros[k].append(self.aceitos)
+        self.aceitos += 1
+
+    def _ajustar_multiplicadores(self) -> None:
+        """Multiplicadores das escalações aceitas que minimizam o limite superior da
+        escalação completa no patrimônio atual, e as tabelas com os pontos descontados."""
+        self.versao_penalizadas = (self.orcamento, self.aceitos)
+        # Sem limite que alguma escalação possa atingir, a tabela sem desconto já é exata
+        if not self.aceitos or self.limite >= self.vagas:
+            return
+        grupos = self.preparo['grupos']
+        membro = np.zeros((self.aceitos, len(self.livres)))
+        for k, aceitas in enumerate(self.membros):
+            membro[aceitas, k] = 1
+        # Subgradiente em custos reduzidos (largura até ESCALACOES_DIVERSAS_LARGURA): os
+        # multiplicadores só precisam ser bons, o limite sai das tabelas em centavos
+        unidade = -(-self.largura // ESCALACOES_DIVERSAS_LARGURA)
+        reduzidos = [dict(g, custos=g['custos'] // unidade) for g in grupos]
+        orcamento = min(self.orcamento, self.largura - 1) // unidade
+        pontos = np.concatenate([g['pontos'] for g in grupos])
+        # Recomeça dos multiplicadores anteriores (zero para as escalações novas)
+        multiplicadores = np.concatenate([self.multiplicadores, np.zeros(self.aceitos - len(self.multiplicadores))])
+        passo = float(np.mean(np.abs(pontos))) / 4
+        melhor, melhores = float('inf'), multiplicadores
+        for _ in range(ESCALACOES_DIVERSAS_ITERACOES):
+            penalizados = pontos - multiplicadores @ membro
+            escolhas = _resolver_titulares([dict(g, pontos=penalizados[d:d + len(g['custos'])])
+                                            for g, d in zip(reduzidos, self.deslocamentos)], orcamento)
+            if escolhas is None:
+                break
+            escolhidos = [d + i for d, indices in zip(self.deslocamentos, escolhas) for i in indices]
+            valor = float(penalizados[escolhidos].sum()) + float(multiplicadores.sum()) * self.limite
+            if valor < melhor:
+                melhor, melhores = valor, multiplicadores
+            folga = self.limite - membro[:, escolhidos].sum(axis=1)
+            if (folga >= 0).all() and not (multiplicadores * folga).any():
+                break  # ótimo da relaxação
+            multiplicadores = np.maximum(multiplicadores - passo * folga, 0)
+            passo *= 0.85
+        self.multiplicadores = melhores
+        self.tabelas_penalizadas = (_tabelas_busca(grupos, self.largura, melhores @ membro)
+                                    if melhores.any() else [])
+
+    def _normalizar(self, g: int, i: int, j: int):
+        # Fim da posição: passa para a próxima (ou fim da escalação)
+        grupos = self.preparo['grupos']
+        while g < len(grupos) and i == len(grupos[g]['custos']) and j == 0:
+            g, i = g + 1, 0
+            j = grupos[g]['qt'] if g < len(grupos) else 0
+        return g, i, j
+
+    def _limite_superior(self, g: int, i: int, j: int, gasto: int, repetidos: tuple) -> float:
+        """Melhor pontuação possível do resto da escalação no patrimônio atual (-inf se nada cabe)"""
+        resto = self.orcamento - gasto
+        if resto < 0:
+            return -np.inf
+        if g == len(self.tabelas):
+            return 0.0
+        c = min(resto, self.largura - 1)
+        limite_superior = float(self.tabelas[g][i, j, c])
+        if self.tabelas_penalizadas and np.isfinite(limite_superior):
+            # Multiplicadores de antes das últimas escalações aceitas valem zero para elas
+            ajustados = len(self.multiplicadores)
+            devolvido = float(np.dot(self.multiplicadores, self.limite - np.asarray(repetidos[:ajustados])))
+            limite_superior = min(limite_superior, float(self.tabelas_penalizadas[g][i, j, c]) + devolvido)
+        return limite_superior
+
+    def _atualizar_repetidos(self, escolhidos: tuple, repetidos: tuple) -> Optional[tuple]:
+        """Inclui nas contagens as escalações aceitas depois que a parcial foi criada (None se repete demais)"""
+        if len(repetidos) == self.aceitos:
+            return repetidos
+        novos = [0] * (self.aceitos - len(repetidos))
+        for k in escolhidos:
+            for a in self.membros[k]:
+                if a >= len(repetidos):
+                    novos[a - len(repetidos)] += 1
+        if max(novos) > self.limite:
+            return None
+        return repetidos + tuple(novos)
+
+    def proxima(self, patrimonio: float) -> Optional[Dict[str, Any]]:
+        """Próxima melhor escalação dentro do patrimônio, respeitando o limite de repetidos
+        com as já aceitas; None se não há mais opção ou se ESCALACOES_DIVERSAS_MAX_NOS acabar.
+
+        O patrimônio não pode ser maior que o da chamada anterior desde iniciar().
+        """
+        inicio = time.perf_counter()
+        if self.largura == 0:
+            return None
+        orcamento = _centavos(float(patrimonio or 0)) - self.preparo['custo_fixos']
+        if self.orcamento is not None and orcamento > self.orcamento:
+            raise ValueError('O patrimônio não pode aumentar entre chamadas de proxima()')
+        self.orcamento = orcamento
+        if orcamento < 0:
+            return None
+
+        grupos = self.preparo['grupos']
+        nos = 0
+        while self.heap and nos < ESCALACOES_DIVERSAS_MAX_NOS:
+            versao = (orcamento, self.aceitos)
+            if self.versao_penalizadas != versao and nos >= ESCALACOES_DIVERSAS_NOS_SEM_AJUSTE:
+                self._ajustar_multiplicadores()
+            _, _, g, i, j, gasto, pontos, escolhidos, repetidos, versao_no = heapq.heappop(self.heap)
+            nos += 1
+            if versao_no != versao:
+                # Prioridade de antes de uma escalação aceita ou de patrimônio maior: recalcular
+                repetidos = self._atualizar_repetidos(escolhidos, repetidos)
+                if repetidos is None:
+                    continue
+                g, i, j = self._normalizar(g, i, j)
+                limite_superior = self._limite_superior(g, i, j, gasto, repetidos)
+                if np.isfinite(limite_superior):
+                    self.contador += 1
+                    heapq.heappush(self.heap, (-(pontos + limite_superior), self.contador, g, i, j, gasto, pontos,
+                                               escolhidos, repetidos, versao))
+                continue
+            if g == len(grupos):
+                self._aceitar(self.atleta_ids[k] for k in escolhidos)
+                return self._montar(escolhidos, patrimonio, inicio)
+
+            k = self.deslocamentos[g] + i
+            filhos = [(g, i + 1, j, gasto, pontos, escolhidos, repetidos)]
+            custo = int(grupos[g]['custos'][i])
+            if j > 0 and gasto + custo <= orcamento:
+                if self.membros[k]:
+                    repetidos_k = list(repetidos)
+                    for a in self.membros[k]:
+                        repetidos_k[a] += 1
+                    repetidos_k = tuple(repetidos_k)
+                else:
+                    repetidos_k = repetidos
+                if not repetidos_k or max(repetidos_k) <= self.limite:
+                    filhos.append((g, i + 1, j - 1, gasto + custo, pontos + float(grupos[g]['pontos'][i]),
+                                   escolhidos + (k,), repetidos_k))
+            for g2, i2, j2, gasto2, pontos2, escolhidos2, repetidos2 in filhos:
+                g2, i2, j2 = self._normalizar(g2, i2, j2)
+                limite_superior = self._limite_superior(g2, i2, j2, gasto2, repetidos2)
+                if np.isfinite(limite_superior):
+                    self.contador += 1
+                    heapq.heappush(self.heap, (-(pontos2 + limite_superior), self.contador, g2, i2, j2, gasto2,
+                                               pontos2, escolhidos2, repetidos2, versao))
+        return None
+
+    def _montar(self, escolhidos: tuple, patrimonio: float, inicio: float) -> Dict[str, Any]:
+        posicoes = self.preparo['posicoes']
+        por_posicao = {p: list(self.preparo['fixados'][p]) for p in self.qts}
+        for k in escolhidos:
+            g = int(np.searchsorted(self.deslocamentos, k, side='right')) - 1
+            por_posicao[posicoes[g][0]].append(self.livres[k])
+        return _montar_resultado(por_posicao, self.qts, self.preparo['candidatos_por_posicao'],
+                                 self.posicao_capitao, self.posicao_reserva_luxo, patrimonio, self.formacao, inicio)
+
+    def buscar(self, patrimonio: float, quantidade: int = 1, max_repetidos: Optional[int] = None,
+               evitar: Sequence[Sequence[int]] = ()) -> List[Dict[str, Any]]:
+        """Até `quantidade` escalações em ordem decrescente de pontuação, numa busca nova.
+
+        evitar: titulares (atleta_ids) de escalações já usadas, que também contam
+        para o limite de repetidos. Retorna menos escalações se o patrimônio não
+        comporta mais opções distintas ou se ESCALACOES_DIVERSAS_MAX_NOS acabar.
+        """
+        self.iniciar(max_repetidos, evitar)
+        resultados: List[Dict[str, Any]] = []
+        while len(resultados) < quantidade:
+            escalacao = self.proxima(patrimonio)
+            if escalacao is None:
+                break
+            resultados.append(escalacao)
+        return resultados
+
+
+def otimizar_escalacoes_diversas(rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]], patrimonio: float,
+                                 quantidade: int, max_repetidos: int = ESCALACOES_MAX_REPETIDOS,
+                                 formacao: str = '4-3-3', posicao_capitao: str = 'atacantes',
+                                 posicao_reserva_luxo: Optional[str] = None, excluir_ids: Sequence[int] = (),
+                                 fixos_ids: Sequence[int] = ()) -> List[Dict[str, Any]]:
+    """As `quantidade` melhores escalações que repetem no máximo `max_repetidos` titulares
+    não fixos entre si (a primeira é a de otimizar_escalacao), no formato de otimizar_escalacao."""
+    busca = BuscaEscalacoes(rankings_por_posicao, patrimonio, formacao=formacao, posicao_capitao=posicao_capitao,
+                            posicao_reserva_luxo=posicao_reserva_luxo, excluir_ids=excluir_ids,
+                            fixos_ids=fixos_ids, profundidade=max(quantidade - 1, 0))
+    return busca.buscar(patrimonio, quantidade, max_repetidos)
+
+
+def calcular_fronteira(rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]],
+                       formacao: str = '4-3-3') -> Dict[str, Any]:
+    """Fronteira custo x pontuação: a escalação ótima para todo patrimônio possível.
+
+    Uma DP só, até o custo da escalação sem restrição de patrimônio (acima dele nada
+    muda), dá a melhor pontuação para cada orçamento em centavos; os pontos da
+    fronteira são os orçamentos em que ela sobe, e a escalação de cada ponto custa
+    exatamente aquele valor. As escalações de todos os pontos são reconstruídas
+    juntas, vetorizadas sobre os pontos.
+
+    Retorna {'formacao', 'custos' (centavos, crescente), 'pontos', 'escalacoes'
+    (atleta_ids dos titulares, uma linha por ponto, posições na ordem de FORMACOES)}.
+    """
+    formacao = formacao if formacao in FORMACOES else '4-3-3'
+    qts = FORMACOES[formacao]
+    vazia = {'formacao': formacao, 'custos': np.zeros(0, dtype=np.int64), 'pontos': np.zeros(0),
+             'escalacoes': np.zeros((0, sum(qts.values())), dtype=np.int64)}
+    preparo = _preparar_grupos(rankings_por_posicao, qts, (), ())
+    if preparo is None:
+        return vazia
+    grupos, posicoes = preparo['grupos'], preparo['posicoes']
+    custo_livre = sum(int(g['custos'][np.argsort(-g['pontos'], kind='stable')[:g['qt']]].sum()) for g in grupos)
+    anterior, decisoes = _tabelas_titulares(grupos, min(custo_livre, _teto_orcamento(grupos)))
+
+    finitos = np.isfinite(anterior)
+    if not finitos.any():
+        return vazia
+    sobe = np.zeros(len(anterior), dtype=bool)
+    sobe[1:] = finitos[1:] & (~finitos[:-1] | (anterior[1:] > anterior[:-1]))
+    sobe[0] = finitos[0]
+    custos = np.flatnonzero(sobe)
+
+    # Reconstrução de todos os pontos de uma vez (mesma lógica de _reconstruir_titulares)
+    escolhas = np.zeros((len(custos), sum(g['qt'] for g in grupos)), dtype=np.int64)
+    inicio_grupo = np.concatenate([[0], np.cumsum([g['qt'] for g in grupos])])
+    c = custos.copy()
+    for g in range(len(grupos) - 1, -1, -1):
+        j = np.full(len(custos), grupos[g]['qt'])
+        for i in range(len(grupos[g]['custos']) - 1, -1, -1):
+            pega = decisoes[g][i, j, c]
+            if pega.any():
+                escolhas[pega, inicio_grupo[g] + j[pega] - 1] = i
+                c[pega] -= int(grupos[g]['custos'][i])
+                j[pega] -= 1
+
+    escalacoes = np.zeros_like(escolhas)
+    for g, (_, livres) in enumerate(posicoes):
+        ids = np.array([jogador['atleta_id'] for jogador in livres], dtype=np.int64)
+        colunas = slice(inicio_grupo[g], inicio_grupo[g + 1])
+        escalacoes[:, colunas] = ids[escolhas[:, colunas]]
+    return {'formacao': formacao, 'custos': custos.astype(np.int64), 'pontos': anterior[custos],
+            'escalacoes': escalacoes}
+
+
+def escalacao_da_fronteira(fronteira: Dict[str, Any], rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]],
+                           patrimonio: float, posicao_capitao: str = 'atacantes',
+                           posicao_reserva_luxo: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Melhor escalação da fronteira para o patrimônio (busca binária), no formato de
+    otimizar_escalacao. `rankings_por_posicao` são os mesmos usados na fronteira."""
+    inicio = time.perf_counter()
+    indice = int(np.searchsorted(fronteira['custos'], _centavos(float(patrimonio or 0)), side='right')) - 1
+    if indice < 0:
+        return None
+    qts = FORMACOES[fronteira['formacao']]
+    ids = fronteira['escalacoes'][indice].tolist()
+    escolhidos: Dict[str, List[Dict[str, Any]]] = {}
+    candidatos_por_posicao: Dict[str, List[Dict[str, Any]]] = {}
+    coluna = 0
+    for posicao, qt in qts.items():
+        candidatos = [j for j in rankings_por_posicao.get(posicao) or [] if j.get('ignorado') is not True]
+        por_id = {}
+        for jogador in candidatos:
+            por_id.setdefault(jogador.get('atleta_id'), jogador)
+        candidatos_por_posicao[posicao] = list(por_id.values())
+        escolhidos[posicao] = [por_id[atleta_id] for atleta_id in ids[coluna:coluna + qt]]
+        coluna += qt
+    return _montar_resultado(escolhidos, qts, candidatos_por_posicao, posicao_capitao,
+                             posicao_reserva_luxo or posicao_capitao, patrimonio, fronteira['formacao'], inicio)
@@ -0,0 +1,215 @@
+"""
+Cache versionado dos payloads de /api/modulos/<modulo>/dados.
+
+A maior parte da resposta (atletas, pesos de perfil por clube, médias de scouts,
+cedidos, gols, clubes, escalações) é igual para todos os usuários de uma mesma
+(rodada, posição, perfil_peso_jogo, perfil_peso_sg). Essa parte é montada uma vez,
+guardada já serializada e comprimida, e reaproveitada enquanto a versão dos dados
+não mudar. Por requisição só se serializa a parte do usuário (pesos e ranking salvo).
+
+Versão dos dados: contadores de inserções/atualizações/remoções de
+pg_stat_user_tables das tabelas acf_*/acp_* de origem. Qualquer escrita nessas
+tabelas muda a versão (o PostgreSQL publica os contadores com até alguns
+segundos de atraso). PAYLOAD_CACHE_MAX_AGE limita a idade de um payload mesmo sem
+mudança detectada, e invalidar_payloads() descarta tudo na hora.
+
+Compressão: o JSON compartilhado é comprimido uma vez (gzip) e o estado do
+compressor é guardado; por requisição, uma cópia do compressor recebe só a parte
+do usuário, então o corpo gzip final custa a compressão de poucos KB.
+
+Os payloads ficam em memória no processo e em arquivos .json.gz em
+PAYLOAD_CACHE_DIR, para que os outros workers da máquina não precisem remontá-los.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Response, current_app, request
+
+PAYLOAD_CACHE_DIR = os.getenv(
+    'PAYLOAD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'aerocartola_payloads')
+)
+# Idade máxima de um payload, mesmo sem mudança de versão detectada (segundos)
+PAYLOAD_CACHE_MAX_AGE = float(os.getenv('PAYLOAD_CACHE_MAX_AGE', '600'))
+# Por quanto tempo a versão lida do banco é reaproveitada no processo (segundos)
+PAYLOAD_VERSAO_TTL = float(os.getenv('PAYLOAD_VERSAO_TTL', '5'))
+# Quantidade de payloads mantidos em memória por processo
+PAYLOAD_CACHE_MAX_ITENS = int(os.getenv('PAYLOAD_CACHE_MAX_ITENS', '64'))
+# Arquivo marcador tocado por invalidar_payloads (mesmo esquema de utils/weights.py)
+PAYLOAD_CACHE_MARKER = os.getenv(
+    'PAYLOAD_CACHE_MARKER', os.path.join(tempfile.gettempdir(), 'aerocartola_payloads.version')
+)
+PAYLOAD_GZIP_NIVEL = 6
+
+# Tabelas de onde vem a parte compartilhada do payload
+TABELAS_ORIGEM = (
+    'acf_atletas', 'acf_clubes', 'acf_partidas', 'acf_pontuados', 'acf_destaques',
+    'acp_peso_jogo_perfis', 'acp_peso_sg_perfis',
+)
+
+_lock = threading.Lock()
+_versao: Dict[str, Any] = {'valor': None, 'lida_em': None}
+_payloads: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+
+
+def _ler_marcador() -> int:
+    try:
+        return os.stat(PAYLOAD_CACHE_MARKER).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def versao_dados(conn) -> str:
+    """Versão atual das tabelas de origem (hash curto), reaproveitada por PAYLOAD_VERSAO_TTL."""
+    agora = time.monotonic()
+    with _lock:
+        if _versao['lida_em'] is not None and agora - _versao['lida_em'] < PAYLOAD_VERSAO_TTL:
+            return _versao['valor']
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT relname, n_tup_ins, n_tup_upd, n_tup_del
+            FROM pg_stat_user_tables
+            WHERE relname = ANY(%s)
+            ORDER BY relname
+        ''', (list(TABELAS_ORIGEM),))
+        contadores = repr(cursor.fetchall())
+    except Exception as e:
+        print(f"[AVISO] Não foi possível ler a versão dos dados: {e}")
+        conn.rollback()
+        # Sem contadores: a versão muda a cada PAYLOAD_CACHE_MAX_AGE
+        contadores = str(int(time.time() // max(PAYLOAD_CACHE_MAX_AGE, 1)))
+    valor = hashlib.sha1(f'{contadores}|{_ler_marcador()}'.encode()).hexdigest()[:16]
+    with _lock:
+        _versao['valor'] = valor
+        _versao['lida_em'] = agora
+    return valor
+
+
+def _nome_base(chave: tuple) -> str:
+    return '_'.join(str(parte) for parte in chave)
+
+
+def _nome_arquivo(chave: tuple, versao: str) -> str:
+    return os.path.join(PAYLOAD_CACHE_DIR, f'{_nome_base(chave)}_{versao}.json.gz')
+
+
+def _preparar(chave: tuple, versao: str, corpo: bytes, criado_em: float) -> Dict[str, Any]:
+    """Monta a entrada em memória: JSON sem o '}' final e o gzip parcial correspondente."""
+    prefixo = corpo.rstrip()[:-1]  # remove o '}' final para anexar os campos do usuário
+    compressor = zlib.compressobj(PAYLOAD_GZIP_NIVEL, zlib.DEFLATED, 31)
+    gzip_prefixo = compressor.compress(prefixo)
+    return {
+        'chave': chave,
+        'versao': versao,
+        'criado_em': criado_em,
+        'hash': hashlib.sha1(corpo).hexdigest()[:16],
+        'prefixo': prefixo,
+        'vazio': prefixo.rstrip().endswith(b'{'),
+        'gzip_prefixo': gzip_prefixo,
+        'compressor': compressor,
+    }
+
+
+def _gravar_arquivo(chave: tuple, versao: str, corpo: bytes) -> None:
+    try:
+        os.makedirs(PAYLOAD_CACHE_DIR, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=PAYLOAD_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(corpo, PAYLOAD_GZIP_NIVEL))
+        destino = _nome_arquivo(chave, versao)
+        os.replace(temporario, destino)
+        # Remove as versões anteriores da mesma chave
+        prefixo = _nome_base(chave) + '_'
+        for nome in os.listdir(PAYLOAD_CACHE_DIR):
+            caminho = os.path.join(PAYLOAD_CACHE_DIR, nome)
+            if nome.startswith(prefixo) and nome.endswith('.json.gz') and caminho != destino:
+                os.remove(caminho)
+    except OSError as e:
+        print(f"[AVISO] Falha ao gravar payload em cache ({chave}): {e}")
+
+
+def _ler_arquivo(chave: tuple, versao: str) -> Optional[Tuple[bytes, float]]:
+    caminho = _nome_arquivo(chave, versao)
+    try:
+        criado_em = os.stat(caminho).st_mtime
+        if time.time() - criado_em > PAYLOAD_CACHE_MAX_AGE:
+            return None
+        with open(caminho, 'rb') as f:
+            return gzip.decompress(f.read()), criado_em
+    except (OSError, EOFError, zlib.error):
+        return None
+
+
+def obter_payload(chave: tuple, versao: str, construir: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Payload compartilhado de `chave` na `versao` dos dados, montando-o com `construir()` se preciso."""
+    with _lock:
+        entrada = _payloads.get(chave)
+        if (entrada is not None and entrada['versao'] == versao
+                and time.time() - entrada['criado_em'] <= PAYLOAD_CACHE_MAX_AGE):
+            _payloads.move_to_end(chave)
+            return entrada
+
+    lido = _ler_arquivo(chave, versao)
+    if lido is not None:
+        corpo, criado_em = lido
+    else:
+        corpo = current_app.json.dumps(construir()).encode('utf-8')
+        criado_em = time.time()
+        _gravar_arquivo(chave, versao, corpo)
+
+    entrada = _preparar(chave, versao, corpo, criado_em)
+    with _lock:
+        _payloads[chave] = entrada
+        _payloads.move_to_end(chave)
+        while len(_payloads) > PAYLOAD_CACHE_MAX_ITENS:
+            _payloads.popitem(last=False)
+    return entrada
+
+
+def responder(payload: Dict[str, Any], extras: Dict[str, Any]) -> Response:
+    """Resposta JSON = payload compartilhado + campos do usuário, com ETag, 304 e gzip."""
+    sufixo = current_app.json.dumps(extras).encode('utf-8')
+    # '{"a": 1}' -> ',"a": 1}' (ou sem a vírgula se um dos lados estiver vazio)
+    if sufixo.strip() == b'{}':
+        cauda = b'}'
+    else:
+        cauda = (b'' if payload['vazio'] else b',') + sufixo.lstrip()[1:]
+
+    # ETag = conteúdo compartilhado + parte do usuário (fraca: vale para gzip e identidade)
+    etag = f"{payload['hash']}-{hashlib.sha1(cauda).hexdigest()[:16]}"
+    if request.if_none_match.contains_weak(etag):
+        resposta = Response(status=304)
+    elif 'gzip' in request.accept_encodings:
+        compressor = payload['compressor'].copy()
+        corpo = payload['gzip_prefixo'] + compressor.compress(cauda) + compressor.flush()
+        resposta = Response(corpo, mimetype='application/json')
+        resposta.headers['Content-Encoding'] = 'gzip'
+    else:
+        resposta = Response(payload['prefixo'] + cauda, mimetype='application/json')
+
+    resposta.set_etag(etag, weak=True)
+    resposta.headers['Vary'] = 'Accept-Encoding, Cookie'
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+
+def invalidar_payloads() -> None:
+    """Descarta os payloads deste processo e, via arquivo marcador, muda a versão para os demais."""
+    with _lock:
+        _payloads.clear()
+        _versao['lida_em'] = None
+    try:
+        with open(PAYLOAD_CACHE_MARKER, 'a'):
+            os.utime(PAYLOAD_CACHE_MARKER, None)
+    except OSError:
+        pass
@@ -0,0 +1,195 @@
+"""
+Kernel vetorizado (NumPy) de pontuação por posição.
+
+Os atletas e seus scouts são carregados uma vez em arrays (montar_features) e cada
+posição aplica seu vetor de FATOR_* como uma expressão vetorizada (pontuar). As
+fórmulas são as mesmas dos módulos calculo_posicoes/calculo_*.py, então o ranking
+resultante é idêntico ao cálculo atleta a atleta.
+
+pontuar_lote() reaproveita as mesmas features para vários conjuntos de pesos de uma
+vez (broadcasting), útil para re-pontuar a liga sob muitas configurações.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+POSICAO_IDS = {
+    'goleiro': 1,
+    'lateral': 2,
+    'zagueiro': 3,
+    'meia': 4,
+    'atacante': 5,
+    'treinador': 6,
+}
+
+SCOUTS_ATLETA = ('ds', 'ff', 'fs', 'fd', 'g', 'a')
+
+
+def _array(valores) -> np.ndarray:
+    return np.array([float(v) if v is not None else 0.0 for v in valores], dtype=np.float64)
+
+
+def montar_features(posicao_id: int, atletas: Sequence[Dict[str, Any]], agregados: Dict[str, Any]) -> Dict[str, Any]:
+    """Monta as colunas (arrays) usadas pelo kernel a partir dos atletas e dos agregados da rodada.
+
+    atletas: lista de dicts com ao menos atleta_id, clube_id e media. Para atacante/meia,
+    'peso_jogo' vem de acf_atletas; para as demais posições é lido dos perfis em agregados.
+    agregados: dicionário de utils.scouts.carregar_agregados_rodada().
+    """
+    confrontos = agregados['confrontos']
+    clubes = agregados['clubes']
+    medias_scouts = agregados['medias_scouts']
+    cedidos = agregados['cedidos'].get(posicao_id, {})
+    medias_clube = agregados['medias_clube']
+    gols_clube = agregados['gols_clube']
+    peso_jogo_perfil = agregados['peso_jogo_perfil']
+    peso_sg_perfil = agregados['peso_sg_perfil']
+    escalacoes = agregados['escalacoes']
+    total_escalacoes_top = agregados['total_escalacoes_top']
+
+    adversarios = [confrontos.get(a['clube_id']) for a in atletas]
+    vazio: Dict[str, float] = {}
+
+    features = {
+        'n': len(atletas),
+        'tem_partida': np.array([adv is not None for adv in adversarios], dtype=bool),
+        'adversario_nome': [
+            clubes.get(adv, "Desconhecido") if adv is not None else "N/A" for adv in adversarios
+        ],
+        'media': _array(a['media'] for a in atletas),
+        'peso_jogo_atleta': _array(a.get('peso_jogo') for a in atletas),
+        'peso_jogo_perfil': _array(peso_jogo_perfil.get(a['clube_id'], 0) for a in atletas),
+        'peso_sg_perfil': _array(peso_sg_perfil.get(a['clube_id'], 0) for a in atletas),
+        'peso_sg_adversario': _array(
+            peso_sg_perfil.get(adv, 0.0) if adv is not None else 0.0 for adv in adversarios
+        ),
+        'ds_cedidos': _array(
+            cedidos.get(adv, vazio).get('ds', 0.0) if adv is not None else 0.0 for adv in adversarios
+        ),
+        'ff_adversario': _array(medias_clube.get(adv, vazio).get('ff', 0.0) for adv in adversarios),
+        'fd_adversario': _array(medias_clube.get(adv, vazio).get('fd', 0.0) for adv in adversarios),
+        'gols_adversario': _array(gols_clube.get(adv, 0.0) for adv in adversarios),
+        'escalacoes': _array(escalacoes.get(a['atleta_id'], 0) for a in atletas),
+    }
+    for scout in SCOUTS_ATLETA:
+        features[scout] = _array(medias_scouts.get(a['atleta_id'], vazio).get(scout, 0.0) for a in atletas)
+
+    if total_escalacoes_top > 0:
+        features['percentual_escalacoes'] = features['escalacoes'] / total_escalacoes_top
+    else:
+        features['percentual_escalacoes'] = np.zeros(len(atletas))
+    return features
+
+
+def _peso_escalacao(f, w):
+    return 1 + f['percentual_escalacoes'] * w['FATOR_ESCALACAO']
+
+
+def _pontuar_ofensivo(f, w):
+    """Atacante e meia: sqrt(base) * peso_escalacao, com peso_jogo de acf_atletas."""
+    tem = f['tem_partida']
+    peso_jogo = np.where(tem, f['peso_jogo_atleta'] * w['FATOR_PESO_JOGO'], 0.0)
+    ds_cedidos = np.where(tem, f['ds_cedidos'], 0.0)
+    base = (f['media'] * w['FATOR_MEDIA'] + peso_jogo + f['ds'] * ds_cedidos * w['FATOR_DS'] +
+            f['ff'] * w['FATOR_FF'] + f['fs'] * w['FATOR_FS'] + f['fd'] * w['FATOR_FD'] +
+            f['g'] * w['FATOR_G'] + f['a'] * w['FATOR_A'])
+    peso_escalacao = _peso_escalacao(f, w)
+    total = np.maximum(np.sqrt(np.maximum(base, 0)) * peso_escalacao, 0)
+    return {'pontuacao_total': total, 'peso_jogo': peso_jogo, 'media_ds_cedidos': ds_cedidos,
+            'peso_escalacao': peso_escalacao}
+
+
+def _pontuar_lateral(f, w):
+    """Lateral: o peso_jogo do perfil é multiplicado por FATOR_PESO_JOGO duas vezes (como no módulo)."""
+    tem = f['tem_partida']
+    peso_sg = np.maximum(f['peso_sg_perfil'], 0)
+    peso_jogo = np.where(tem, np.maximum(f['peso_jogo_perfil'], 0) * w['FATOR_PESO_JOGO'], 0.0)
+    ds_cedidos = np.where(tem, f['ds_cedidos'], 0.0)
+    base = (f['media'] * w['FATOR_MEDIA'] + peso_jogo * w['FATOR_PESO_JOGO'] +
+            f['ds'] * ds_cedidos * w['FATOR_DS'] +
+            f['ff'] * w['FATOR_FF'] + f['fs'] * w['FATOR_FS'] + f['fd'] * w['FATOR_FD'] +
+            f['g'] * w['FATOR_G'] + f['a'] * w['FATOR_A'])
+    total = np.maximum(base * (1 + peso_sg * w['FATOR_SG']), 0)
+    peso_escalacao = _peso_escalacao(f, w)
+    return {'pontuacao_total': np.sqrt(total) * peso_escalacao, 'peso_jogo': peso_jogo, 'peso_sg': peso_sg,
+            'media_ds_cedidos': ds_cedidos, 'peso_escalacao': peso_escalacao}
+
+
+def _pontuar_zagueiro(f, w):
+    tem = f['tem_partida']
+    peso_sg = f['peso_sg_perfil']
+    peso_jogo = np.where(tem, f['peso_jogo_perfil'] * w['FATOR_PESO_JOGO'], 0.0)
+    ds_cedidos = np.where(tem, f['ds_cedidos'], 0.0)
+    base = f['media'] * w['FATOR_MEDIA'] + peso_jogo + f['ds'] * ds_cedidos * w['FATOR_DS']
+    total = base * (1 + peso_sg * w['FATOR_SG'])
+    peso_escalacao = _peso_escalacao(f, w)
+    return {'pontuacao_total': np.sqrt(np.maximum(0, total * peso_escalacao)), 'peso_jogo': peso_jogo,
+            'peso_sg': peso_sg, 'media_ds_cedidos': ds_cedidos, 'peso_escalacao': peso_escalacao}
+
+
+def _pontuar_goleiro(f, w):
+    tem = f['tem_partida']
+    peso_sg = f['peso_sg_perfil']
+    peso_jogo = np.where(tem, f['peso_jogo_perfil'] * w['FATOR_PESO_JOGO'], 0.0)
+    peso_finalizacoes = np.where(
+        tem, (f['ff_adversario'] * w['FATOR_FF']) + (f['fd_adversario'] * w['FATOR_FD']), 0.0
+    )
+    gols_adversario = np.where(tem, f['gols_adversario'], 0.0)
+    base = (f['media'] * w['FATOR_MEDIA'] + peso_jogo + peso_finalizacoes -
+            (gols_adversario * w['FATOR_GOL_ADVERSARIO']))
+    return {'pontuacao_total': base * (w['FATOR_SG'] + peso_sg), 'peso_jogo': peso_jogo, 'peso_sg': peso_sg,
+            'peso_finalizacoes': peso_finalizacoes, 'media_gols_adversario': gols_adversario}
+
+
+def _pontuar_treinador(f, w):
+    tem = f['tem_partida']
+    peso_jogo = np.where(tem, f['peso_jogo_perfil'], 0.0)
+    return {'pontuacao_total': peso_jogo * w['FATOR_PESO_JOGO'], 'peso_jogo': peso_jogo,
+            'peso_sg': f['peso_sg_perfil'], 'peso_sg_adversario': np.where(tem, f['peso_sg_adversario'], 0.0)}
+
+
+_KERNELS = {
+    'atacante': _pontuar_ofensivo,
+    'meia': _pontuar_ofensivo,
+    'lateral': _pontuar_lateral,
+    'zagueiro': _pontuar_zagueiro,
+    'goleiro': _pontuar_goleiro,
+    'treinador': _pontuar_treinador,
+}
+
+
+def pontuar(posicao: str, features: Dict[str, Any], pesos: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """Pontua todos os atletas de uma vez para um conjunto de pesos.
+
+    Retorna um dict de arrays com 'pontuacao_total' e as colunas intermediárias
+    (peso_jogo efetivo, peso_escalacao etc.) usadas na saída de cada módulo.
+    """
+    return _KERNELS[posicao](features, {k: float(v) for k, v in pesos.items()})
+
+
+def pontuar_lote(posicao: str, features: Dict[str, Any], lista_pesos: Sequence[Dict[str, float]]) -> np.ndarray:
+    """Pontua os mesmos atletas sob vários conjuntos de pesos.
+
+    Retorna uma matriz (len(lista_pesos), n_atletas) com a pontuacao_total de cada
+    combinação, calculada numa única passada vetorizada.
+    """
+    if not lista_pesos:
+        return np.zeros((0, features['n']))
+    chaves = set().union(*lista_pesos)
+    pesos = {
+        k: np.array([float(p[k]) for p in lista_pesos], dtype=np.float64)[:, None]
+        for k in chaves
+    }
+    total = _KERNELS[posicao](features, pesos)['pontuacao_total']
+    return np.broadcast_to(total, (len(lista_pesos), features['n']))
+
+
+def ranking(pontuacoes: np.ndarray, top_n: int | None = None) -> List[int]:
+    """Índices em ordem decrescente de pontuação (estável, como sorted(..., reverse=True))."""
+    ordem = np.argsort(-pontuacoes, kind='stable')
+    if top_n is not None:
+        ordem = ordem[:top_n]
+    return ordem.tolist()
@@ -0,0 +1,50 @@
+"""
+Recálculo dos dados derivados usados pelos módulos de posição.
+
+Usado pelo worker da fila (worker_jobs.py, job recalcular_modulo) e pelo agendador
+dirigido por mudanças (agendador_recalculo.py):
+
+- atualizar_bases(): somas materializadas de scouts e matriz de cedidos até a
+  rodada anterior (incrementais: só aplicam o que mudou);
+- preparar_payload_modulo(): monta e grava o payload compartilhado de
+  /api/modulos/<modulo>/dados de uma (posição, perfil de peso de jogo, perfil de SG),
+  para a primeira requisição já encontrá-lo pronto.
+"""
+
+from typing import Any, Dict
+
+from flask import Flask
+
+# Aplicação mínima só para o contexto que utils.payload_modulos usa (current_app.json):
+# importar app.py aqui carregaria a aplicação web inteira em cada worker
+_flask_app = Flask(__name__)
+
+
+def atualizar_bases(conn, temporada: int, rodada_atual: int) -> int:
+    """Atualiza agregados e cedidos até rodada_atual - 1. Retorna as rodadas agregadas aplicadas."""
+    from models.scouts_agregados import atualizar_scouts_agregados
+    from models.scouts_cedidos import montar_matriz_cedidos
+
+    rodadas_aplicadas = atualizar_scouts_agregados(conn, temporada, rodada_atual - 1)
+    if rodadas_aplicadas < 0:
+        raise RuntimeError('Falha ao atualizar scouts agregados')
+    if not montar_matriz_cedidos(conn, temporada, rodada_atual - 1):
+        raise RuntimeError('Falha ao montar matriz de cedidos')
+    return rodadas_aplicadas
+
+
+def preparar_payload_modulo(conn, posicao_id: int, rodada_atual: int,
+                            perfil_peso_jogo: int, perfil_peso_sg: int) -> Dict[str, Any]:
+    """Monta (se a versão dos dados mudou) o payload compartilhado do módulo"""
+    from utils import payload_modulos
+    from utils.dados_modulo import montar_dados_modulo
+
+    with _flask_app.app_context():
+        versao = payload_modulos.versao_dados(conn)
+        payload = payload_modulos.obter_payload(
+            ('modulo', rodada_atual, posicao_id, perfil_peso_jogo, perfil_peso_sg),
+            versao,
+            lambda: montar_dados_modulo(conn, posicao_id, rodada_atual, perfil_peso_jogo, perfil_peso_sg, versao)
+        )
+    conn.commit()
+    return payload
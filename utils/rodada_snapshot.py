@@ -0,0 +1,286 @@
+"""
+Snapshot imutável dos dados da rodada compartilhados por todas as posições.
+
+Cada módulo de posição (e /api/modulos/<modulo>/dados) consultava por conta própria
+as partidas da rodada para achar o adversário, os nomes dos clubes, o top 20 de
+acf_destaques e os pesos dos perfis. RoundSnapshot junta tudo isso, carregado uma
+vez por rodada (poucas queries) e reaproveitado pelo processo:
+
+- adversário e mando de cada clube na rodada, nomes/abreviações dos clubes;
+- escalações do top de destaques e o total do top;
+- peso_jogo e peso_sg de TODOS os perfis da rodada (matriz perfil x clube);
+- atletas prováveis (provaveis_cartola).
+
+Os dados ficam em arrays NumPy somente leitura alinhados a `clube_ids` (ordenado),
+tuplas e frozenset, com __slots__; atribuições levantam AttributeError. O objeto é
+serializável (pickle) para ser enviado a pools de processos.
+
+obter_snapshot_rodada() guarda o snapshot no processo por SNAPSHOT_RODADA_TTL
+segundos (mesmo esquema da matriz de cedidos); invalidar_snapshot_rodada() descarta
+e toca SNAPSHOT_RODADA_MARKER, para que os outros processos da máquina (workers do
+gunicorn, worker de jobs) também recarreguem (mesmo esquema de utils/weights.py).
+Quem guarda o resultado em cache por versão dos dados (payloads dos módulos) passa
+`versao` e não recebe um snapshot lido sob outra versão.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from utils.utilidades import get_temporada_atual, printdbg
+
+# Por quanto tempo o snapshot da rodada é reaproveitado no processo (segundos)
+SNAPSHOT_RODADA_TTL = float(os.getenv('SNAPSHOT_RODADA_TTL', '300'))
+# Arquivo marcador tocado por invalidar_snapshot_rodada (o agendador roda em outro processo)
+SNAPSHOT_RODADA_MARKER = os.getenv(
+    'SNAPSHOT_RODADA_MARKER', os.path.join(tempfile.gettempdir(), 'aerocartola_snapshot.version')
+)
+# Tamanho do top de acf_destaques usado no peso de escalação
+DESTAQUES_TOP = 20
+
+_SEM_ADVERSARIO = -1
+
+_memo_lock = threading.Lock()
+_memo: Dict[tuple, tuple] = {}
+
+
+def _ler_marcador() -> int:
+    try:
+        return os.stat(SNAPSHOT_RODADA_MARKER).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _somente_leitura(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+class RoundSnapshot:
+    """Dados da rodada compartilhados pelas posições (imutável)"""
+
+    __slots__ = (
+        'temporada', 'rodada_atual', 'clube_ids', 'adversario', 'mandante', 'clube_nomes',
+        'clube_abrevs', 'destaque_ids', 'destaque_escalacoes', 'total_escalacoes_top',
+        'perfis_jogo', 'peso_jogo', 'perfis_sg', 'peso_sg', 'provaveis', '_indice',
+    )
+
+    def __init__(self, temporada: int, rodada_atual: int, clube_ids, adversario, mandante,
+                 clube_nomes: Tuple[str, ...], clube_abrevs: Tuple[str, ...], destaque_ids,
+                 destaque_escalacoes, perfis_jogo: Tuple[int, ...], peso_jogo,
+                 perfis_sg: Tuple[int, ...], peso_sg, provaveis: Iterable[int]):
+        n_clubes = len(clube_ids)
+        valores = {
+            'temporada': temporada,
+            'rodada_atual': rodada_atual,
+            'clube_ids': _somente_leitura(np.asarray(clube_ids, dtype=np.int64)),
+            'adversario': _somente_leitura(np.asarray(adversario, dtype=np.int64)),
+            'mandante': _somente_leitura(np.asarray(mandante, dtype=bool)),
+            'clube_nomes': tuple(clube_nomes),
+            'clube_abrevs': tuple(clube_abrevs),
+            'destaque_ids': _somente_leitura(np.asarray(destaque_ids, dtype=np.int64)),
+            'destaque_escalacoes': _somente_leitura(np.asarray(destaque_escalacoes, dtype=np.float64)),
+            'perfis_jogo': tuple(perfis_jogo),
+            'peso_jogo': _somente_leitura(np.asarray(peso_jogo, dtype=np.float64).reshape(len(perfis_jogo), n_clubes)),
+            'perfis_sg': tuple(perfis_sg),
+            'peso_sg': _somente_leitura(np.asarray(peso_sg, dtype=np.float64).reshape(len(perfis_sg), n_clubes)),
+            'provaveis': frozenset(provaveis),
+        }
+        valores['total_escalacoes_top'] = float(valores['destaque_escalacoes'].sum()) or 1.0
+        valores['_indice'] = {int(c): i for i, c in enumerate(valores['clube_ids'])}
+        for nome, valor in valores.items():
+            object.__setattr__(self, nome, valor)
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError('RoundSnapshot é imutável')
+
+    def __delattr__(self, nome):
+        raise AttributeError('RoundSnapshot é imutável')
+
+    def __reduce__(self):
+        return (RoundSnapshot, (
+            self.temporada, self.rodada_atual, self.clube_ids, self.adversario, self.mandante,
+            self.clube_nomes, self.clube_abrevs, self.destaque_ids, self.destaque_escalacoes,
+            self.perfis_jogo, self.peso_jogo, self.perfis_sg, self.peso_sg, self.provaveis,
+        ))
+
+    def __repr__(self):
+        return (f'RoundSnapshot(temporada={self.temporada}, rodada={self.rodada_atual}, '
+                f'clubes={len(self.clube_ids)}, perfis_jogo={len(self.perfis_jogo)}, '
+                f'perfis_sg={len(self.perfis_sg)}, provaveis={len(self.provaveis)})')
+
+    # Consultas pontuais
+
+    def adversario_de(self, clube_id) -> Optional[int]:
+        i = self._indice.get(clube_id)
+        if i is None or self.adversario[i] == _SEM_ADVERSARIO:
+            return None
+        return int(self.adversario[i])
+
+    def joga_em_casa(self, clube_id) -> Optional[bool]:
+        """True/False se o clube joga em casa/fora na rodada; None se não tem partida"""
+        if self.adversario_de(clube_id) is None:
+            return None
+        return bool(self.mandante[self._indice[clube_id]])
+
+    def nome_clube(self, clube_id, padrao: str = 'Desconhecido') -> str:
+        i = self._indice.get(clube_id)
+        return self.clube_nomes[i] if i is not None else padrao
+
+    def dados_clube(self, clube_id) -> Optional[Tuple[str, str]]:
+        """(nome, abreviação) do clube, ou None se não existe em acf_clubes"""
+        i = self._indice.get(clube_id)
+        return (self.clube_nomes[i], self.clube_abrevs[i]) if i is not None else None
+
+    def provavel(self, atleta_id) -> bool:
+        return atleta_id in self.provaveis
+
+    # Dicionários no formato usado por utils.scouts / utils.pontuacao (cópias novas)
+
+    def confrontos(self) -> Dict[int, int]:
+        """{clube_id: adversario_id} dos clubes com partida válida na rodada"""
+        tem = self.adversario != _SEM_ADVERSARIO
+        return dict(zip(self.clube_ids[tem].tolist(), self.adversario[tem].tolist()))
+
+    def mandos(self) -> Dict[int, bool]:
+        """{clube_id: joga em casa} dos clubes com partida válida na rodada"""
+        tem = self.adversario != _SEM_ADVERSARIO
+        return dict(zip(self.clube_ids[tem].tolist(), self.mandante[tem].tolist()))
+
+    def clubes(self) -> Dict[int, str]:
+        return dict(zip(self.clube_ids.tolist(), self.clube_nomes))
+
+    def escalacoes(self) -> Dict[int, float]:
+        return dict(zip(self.destaque_ids.tolist(), self.destaque_escalacoes.tolist()))
+
+    def _pesos(self, perfis, matriz, perfil_id) -> Dict[int, float]:
+        if perfil_id not in perfis:
+            return {}
+        linha = matriz[perfis.index(perfil_id)]
+        presentes = ~np.isnan(linha)
+        return dict(zip(self.clube_ids[presentes].tolist(), linha[presentes].tolist()))
+
+    def pesos_jogo(self, perfil_id) -> Dict[int, float]:
+        """{clube_id: peso_jogo} do perfil na rodada (clubes sem peso ficam de fora)"""
+        return self._pesos(self.perfis_jogo, self.peso_jogo, perfil_id)
+
+    def pesos_sg(self, perfil_id) -> Dict[int, float]:
+        """{clube_id: peso_sg} do perfil na rodada (clubes sem peso ficam de fora)"""
+        return self._pesos(self.perfis_sg, self.peso_sg, perfil_id)
+
+
+def _matriz_perfis(cursor, tabela: str, coluna: str, rodada_atual: int, indice: Dict[int, int]):
+    """(perfis, matriz perfil x clube) com NaN onde o perfil não tem peso para o clube"""
+    try:
+        cursor.execute(f'''
+            SELECT perfil_id, clube_id, {coluna}
+            FROM {tabela}
+            WHERE rodada_atual = %s
+        ''', (rodada_atual,))
+        linhas = cursor.fetchall()
+    except Exception as e:
+        printdbg(f"Erro ao buscar {coluna} dos perfis: {e}")
+        cursor.connection.rollback()
+        linhas = []
+    perfis = tuple(sorted({perfil_id for perfil_id, _, _ in linhas}))
+    posicao_perfil = {perfil_id: i for i, perfil_id in enumerate(perfis)}
+    matriz = np.full((len(perfis), len(indice)), np.nan)
+    for perfil_id, clube_id, peso in linhas:
+        i = indice.get(clube_id)
+        if i is not None:
+            matriz[posicao_perfil[perfil_id], i] = float(peso) if peso else 0.0
+    return perfis, matriz
+
+
+def carregar_snapshot_rodada(cursor, rodada_atual: int, temporada: Optional[int] = None) -> RoundSnapshot:
+    """Carrega do banco o snapshot da rodada (sem cache)"""
+    temporada = get_temporada_atual() if temporada is None else temporada
+
+    cursor.execute('SELECT id, nome, abreviacao FROM acf_clubes ORDER BY id')
+    clubes = cursor.fetchall()
+    clube_ids = [row[0] for row in clubes]
+    indice = {clube_id: i for i, clube_id in enumerate(clube_ids)}
+
+    adversario = np.full(len(clube_ids), _SEM_ADVERSARIO, dtype=np.int64)
+    mandante = np.zeros(len(clube_ids), dtype=bool)
+    cursor.execute('''
+        SELECT clube_casa_id, clube_visitante_id
+        FROM acf_partidas
+        WHERE rodada_id = %s AND valida = TRUE
+    ''', (rodada_atual,))
+    for casa_id, visitante_id in cursor.fetchall():
+        # Como em utils.scouts: vale a primeira partida do clube na rodada
+        for clube_id, outro_id, em_casa in ((casa_id, visitante_id, True), (visitante_id, casa_id, False)):
+            i = indice.get(clube_id)
+            if i is not None and adversario[i] == _SEM_ADVERSARIO:
+                adversario[i] = outro_id
+                mandante[i] = em_casa
+
+    cursor.execute('''
+        SELECT atleta_id, escalacoes
+        FROM acf_destaques
+        ORDER BY escalacoes DESC
+        LIMIT %s
+    ''', (DESTAQUES_TOP,))
+    destaques = cursor.fetchall()
+
+    perfis_jogo, peso_jogo = _matriz_perfis(cursor, 'acp_peso_jogo_perfis', 'peso_jogo', rodada_atual, indice)
+    perfis_sg, peso_sg = _matriz_perfis(cursor, 'acp_peso_sg_perfis', 'peso_sg', rodada_atual, indice)
+
+    try:
+        cursor.execute("SELECT atleta_id FROM provaveis_cartola WHERE status = 'provavel'")
+        provaveis = [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        printdbg(f"Erro ao buscar prováveis: {e}")
+        cursor.connection.rollback()
+        provaveis = []
+
+    snapshot = RoundSnapshot(
+        temporada, rodada_atual, clube_ids, adversario, mandante,
+        tuple(row[1] or '' for row in clubes), tuple(row[2] or '' for row in clubes),
+        [d[0] for d in destaques], [float(d[1]) if d[1] else 0.0 for d in destaques],
+        perfis_jogo, peso_jogo, perfis_sg, peso_sg, provaveis,
+    )
+    printdbg(f"Snapshot carregado: {snapshot!r}")
+    return snapshot
+
+
+def obter_snapshot_rodada(conn, rodada_atual: int, temporada: Optional[int] = None,
+                          versao: Optional[str] = None) -> RoundSnapshot:
+    """Snapshot da rodada, reaproveitado no processo por SNAPSHOT_RODADA_TTL segundos
+    (ou até invalidar_snapshot_rodada, em qualquer processo da máquina).
+
+    versao: versão dos dados (utils.payload_modulos.versao_dados) de quem vai guardar
+    o resultado em cache; um snapshot lido sob outra versão não é reaproveitado.
+    """
+    temporada = get_temporada_atual() if temporada is None else temporada
+    chave = (temporada, rodada_atual, _ler_marcador())
+    with _memo_lock:
+        memo = _memo.get(chave)
+    if (memo is not None and time.monotonic() - memo[0] < SNAPSHOT_RODADA_TTL
+            and (versao is None or memo[2] == versao)):
+        return memo[1]
+
+    snapshot = carregar_snapshot_rodada(conn.cursor(), rodada_atual, temporada)
+    with _memo_lock:
+        # Só a rodada mais recente interessa; descarta as demais
+        _memo.clear()
+        _memo[chave] = (time.monotonic(), snapshot, versao)
+    return snapshot
+
+
+def invalidar_snapshot_rodada() -> None:
+    """Descarta o snapshot em memória deste processo e, via arquivo marcador, o dos demais."""
+    with _memo_lock:
+        _memo.clear()
+    try:
+        with open(SNAPSHOT_RODADA_MARKER, 'a'):
+            os.utime(SNAPSHOT_RODADA_MARKER, None)
+    except OSError:
+        pass
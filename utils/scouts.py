@@ -0,0 +1,143 @@
+"""
+Agregação de scouts em lote para os módulos de calculo_posicoes.
+
+Em vez de consultar o banco atleta por atleta (uma query por scout, partida,
+nome de clube e cedidos), cada função aqui busca os dados de TODOS os atletas
+ou clubes de uma vez (GROUP BY), e os módulos calcular_melhores_* consomem os
+dicionários resultantes em memória.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from utils.utilidades import get_temporada_atual, printdbg
+
+# Scouts agregados por atleta / cedidos por adversário
+SCOUTS = ('ds', 'ff', 'fs', 'fd', 'g', 'a', 'sg', 'de', 'fc', 'ca', 'cv', 'i')
+
+
+def _float(valor) -> float:
+    return float(valor) if valor is not None else 0.0
+
+
+def _colunas_avg(scouts: Iterable[str], alias: str = 'p') -> str:
+    return ', '.join(f'AVG(COALESCE({alias}.scout_{s}, 0))' for s in scouts)
+
+
+def carregar_medias_scouts(cursor, rodada_atual: int, atleta_ids: Optional[Iterable[int]] = None,
+                           scouts: Tuple[str, ...] = SCOUTS) -> Dict[int, Dict[str, float]]:
+    """Médias de todos os scouts por atleta até a rodada anterior (entrou_em_campo = TRUE).
+
+    Lê as somas materializadas de acw_scouts_agregados (models/scouts_agregados.py)
+    da temporada atual. Retorna {atleta_id: {'ds': ..., 'ff': ..., ...}}. Atletas sem
+    jogos não aparecem no dicionário; o chamador deve tratar a ausência como média 0.
+    """
+    # Import local: models.scouts_agregados importa SCOUTS deste módulo
+    from models.scouts_agregados import medias_scouts_atletas
+
+    medias = medias_scouts_atletas(cursor.connection, get_temporada_atual(), rodada_atual, atleta_ids)
+    return {
+        atleta_id: {s: m[s] for s in scouts}
+        for atleta_id, m in medias.items()
+    }
+
+
+def carregar_medias_scouts_clube(cursor, rodada_atual: int,
+                                 scouts: Tuple[str, ...] = ('ff', 'fd')) -> Dict[int, Dict[str, float]]:
+    """Médias de scouts por clube (todos os atletas que entraram em campo) até a rodada anterior.
+
+    Só a temporada atual, e scouts nulos contam como 0 (como em models/scouts_agregados.py
+    e utils/backtest.py).
+    """
+    cursor.execute(f'''
+        SELECT p.clube_id, {_colunas_avg(scouts)}
+        FROM acf_pontuados p
+        WHERE p.temporada = %s AND p.rodada_id <= %s AND p.entrou_em_campo = TRUE
+        GROUP BY p.clube_id
+    ''', (get_temporada_atual(), rodada_atual - 1))
+    return {
+        row[0]: {s: _float(v) for s, v in zip(scouts, row[1:])}
+        for row in cursor.fetchall()
+    }
+
+
+def carregar_cedidos(cursor, rodada_atual: int,
+                     scouts: Tuple[str, ...] = SCOUTS) -> Dict[int, Dict[int, Dict[str, Any]]]:
+    """Médias de scouts cedidos por cada clube, por posição, até a rodada anterior.
+
+    "Cedido" pelo clube X = scouts dos atletas que jogaram CONTRA X. Os valores vêm da
+    matriz clube x posição x scout montada uma vez por rodada (models/scouts_cedidos.py).
+
+    Retorna {posicao_id: {adversario_id: {'ds': ..., ..., 'casa': {...}, 'fora': {...}}}},
+    com 'casa'/'fora' separando as partidas em que o adversário era mandante/visitante.
+    """
+    # Import local: models.scouts_cedidos importa SCOUTS deste módulo
+    from models.scouts_cedidos import MANDOS, matriz_cedidos
+
+    matriz = matriz_cedidos(cursor.connection, get_temporada_atual(), rodada_atual)
+    cedidos: Dict[int, Dict[int, Dict[str, Any]]] = {}
+    for posicao_id, por_clube in matriz.items():
+        for adversario_id, medias in por_clube.items():
+            celula = {s: medias[s] for s in scouts}
+            for mando in MANDOS:
+                celula[mando] = {s: medias[mando][s] for s in scouts}
+            cedidos.setdefault(posicao_id, {})[adversario_id] = celula
+    return cedidos
+
+
+def carregar_media_gols_clube(cursor, rodada_atual: int) -> Dict[int, float]:
+    """Média de gols marcados por clube nas partidas válidas com placar, antes da rodada atual."""
+    cursor.execute('''
+        SELECT g.clube_id, SUM(g.gols), COUNT(*)
+        FROM (
+            SELECT clube_casa_id AS clube_id, placar_oficial_mandante AS gols
+            FROM acf_partidas
+            WHERE rodada_id < %s AND valida = TRUE
+              AND placar_oficial_mandante IS NOT NULL AND placar_oficial_visitante IS NOT NULL
+            UNION ALL
+            SELECT clube_visitante_id AS clube_id, placar_oficial_visitante AS gols
+            FROM acf_partidas
+            WHERE rodada_id < %s AND valida = TRUE
+              AND placar_oficial_mandante IS NOT NULL AND placar_oficial_visitante IS NOT NULL
+        ) g
+        GROUP BY g.clube_id
+    ''', (rodada_atual, rodada_atual))
+    return {
+        clube_id: float(gols) / float(jogos)
+        for clube_id, gols, jogos in cursor.fetchall()
+        if jogos
+    }
+
+
+def carregar_agregados_rodada(cursor, rodada_atual: int, perfil_peso_jogo: int = 1,
+                              perfil_peso_sg: int = 2, snapshot=None) -> Dict[str, Any]:
+    """Carrega, em poucas queries, tudo que os calcular_melhores_* precisam para a rodada.
+
+    Confrontos, nomes dos clubes, destaques e pesos dos perfis vêm do RoundSnapshot da
+    rodada (utils.rodada_snapshot, reaproveitado no processo); passe `snapshot` para
+    usar um já carregado. O dicionário retornado pode ser reutilizado entre as posições
+    (passe-o via parâmetro `agregados`) para que o recálculo completo faça as
+    agregações uma vez só.
+    """
+    from utils.rodada_snapshot import obter_snapshot_rodada
+
+    if snapshot is None:
+        snapshot = obter_snapshot_rodada(cursor.connection, rodada_atual)
+    agregados = {
+        'rodada_atual': rodada_atual,
+        'snapshot': snapshot,
+        'medias_scouts': carregar_medias_scouts(cursor, rodada_atual),
+        'medias_clube': carregar_medias_scouts_clube(cursor, rodada_atual),
+        'cedidos': carregar_cedidos(cursor, rodada_atual),
+        'gols_clube': carregar_media_gols_clube(cursor, rodada_atual),
+        'confrontos': snapshot.confrontos(),
+        'clubes': snapshot.clubes(),
+        'peso_jogo_perfil': snapshot.pesos_jogo(perfil_peso_jogo),
+        'peso_sg_perfil': snapshot.pesos_sg(perfil_peso_sg),
+        'escalacoes': snapshot.escalacoes(),
+        'total_escalacoes_top': snapshot.total_escalacoes_top,
+    }
+    printdbg(f"Agregados da rodada {rodada_atual}: {len(agregados['medias_scouts'])} atletas, "
+             f"{len(agregados['confrontos'])} clubes com partida")
+    return agregados
@@ -0,0 +1,374 @@
+"""
+Simulação de Monte Carlo da pontuação da escalação e escolha por nível de risco.
+
+O otimizador exato (utils/otimizador_escalacao.py) maximiza a soma de
+pontuacao_total, uma estimativa pontual. Aqui cada atleta ganha uma distribuição de
+pontos na rodada, montada com o histórico da temporada em acf_pontuados (mesmo
+histórico do backtest, só rodadas anteriores à atual):
+
+- média do atleta encolhida para a média da posição (SIMULACAO_SUAVIZACAO jogos
+  "fictícios" da posição), mais o ajuste do adversário da rodada: quanto a posição
+  pontua contra aquele clube acima/abaixo da média da liga (também encolhido);
+- o desvio vem de um bootstrap: com probabilidade n / (n + SIMULACAO_SUAVIZACAO) o
+  resíduo é sorteado das pontuações do próprio atleta, senão das da posição, o que
+  preserva a assimetria (gols, SG) que uma normal perderia;
+- um choque comum por clube (normal, fração SIMULACAO_CORRELACAO_CLUBE da variância)
+  correlaciona atletas do mesmo time.
+
+Todos os cenários (SIMULACAO_AMOSTRAS, 20 mil por padrão) são sorteados de uma vez
+numa matriz amostras x atletas. A soma da escalação não é separável por atleta nos
+percentis, então os candidatos saem do otimizador exato com utilidade média + λ x
+desvio para uma grade de λ (mais a escalação do ranking original), todos são
+avaliados nos mesmos cenários e vence o de maior média (esperado), percentil baixo
+(piso) ou percentil alto (teto). O nível de risco (models.plans.get_nivel_risco)
+afasta o percentil da mediana: nível 1 = p50, nível 10 = p10 (piso) ou p90 (teto).
+
+O modelo da rodada e os resultados (por rankings, patrimônio e parâmetros) ficam no
+processo por SIMULACAO_CACHE_TTL segundos; a semente é fixa por rodada, então a mesma
+requisição sempre devolve a mesma escalação.
+"""
+
+from __future__ import annotations
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils import backtest
+from utils.otimizador_escalacao import (
+    FORMACOES, PLURAL_PARA_SINGULAR, get_pontuacao, otimizar_escalacao
+)
+from utils.pontuacao import POSICAO_IDS
+from utils.rodada_snapshot import obter_snapshot_rodada
+from utils.utilidades import get_temporada_atual, printdbg
+
+SIMULACAO_AMOSTRAS = int(os.getenv('SIMULACAO_AMOSTRAS', '20000'))
+# Por quanto tempo o modelo da rodada e os resultados são reaproveitados no processo (segundos)
+SIMULACAO_CACHE_TTL = float(os.getenv('SIMULACAO_CACHE_TTL', '1800'))
+SIMULACAO_RESULTADOS_MAX = 256
+SIMULACAO_SUAVIZACAO = 3.0
+SIMULACAO_SUAVIZACAO_ADVERSARIO = 20.0
+SIMULACAO_CORRELACAO_CLUBE = 0.15
+
+MODOS_RISCO = ('esperado', 'piso', 'teto')
+NIVEL_RISCO_MAXIMO = 10
+# Grade de λ (utilidade = média + λ x desvio) para gerar escalações candidatas
+LAMBDAS_RISCO = (-2.0, -1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0)
+_PERCENTIS_RESUMO = (10, 25, 50, 75, 90)
+
+_memo_lock = threading.Lock()
+_memo: Dict[tuple, tuple] = {}
+
+
+def percentil_risco(modo: str, nivel: int) -> Optional[float]:
+    """Percentil usado para escolher a escalação (None = média, modo esperado)"""
+    if modo == 'esperado':
+        return None
+    deslocamento = 40.0 * (min(max(int(nivel), 1), NIVEL_RISCO_MAXIMO) - 1) / (NIVEL_RISCO_MAXIMO - 1)
+    return round(50.0 - deslocamento if modo == 'piso' else 50.0 + deslocamento, 2)
+
+
+def montar_modelo(historico: Dict[str, Any], snapshot) -> Dict[str, Any]:
+    """Estatísticas por atleta/posição/adversário com as rodadas anteriores à do snapshot"""
+    h = historico
+    selecao = h['linha_rodada'] < snapshot.rodada_atual
+    atleta = h['linha_atleta'][selecao]
+    posicao = h['linha_posicao'][selecao]
+    pontos = h['linha_pontuacao'][selecao]
+    clube = h['linha_clube'][selecao]
+    rodada = h['linha_rodada'][selecao]
+    if len(pontos) == 0:
+        raise ValueError('Sem pontuações anteriores à rodada na temporada para simular')
+
+    n_atletas = len(h['atleta_ids'])
+    n_atleta = np.bincount(atleta, minlength=n_atletas)
+    soma_atleta = np.bincount(atleta, weights=pontos, minlength=n_atletas)
+    soma2_atleta = np.bincount(atleta, weights=pontos ** 2, minlength=n_atletas)
+
+    # Pontuações agrupadas (atleta e posição) para o bootstrap por índice
+    n_posicao = np.bincount(posicao, minlength=7)
+    soma_posicao = np.bincount(posicao, weights=pontos, minlength=7)
+    soma2_posicao = np.bincount(posicao, weights=pontos ** 2, minlength=7)
+    vazia = n_posicao == 0
+    media_posicao = np.where(vazia, pontos.mean(), soma_posicao / np.maximum(n_posicao, 1))
+    var_posicao = np.where(vazia, pontos.var(), soma2_posicao / np.maximum(n_posicao, 1) - media_posicao ** 2)
+    inicio_posicao = np.concatenate([[0], np.cumsum(n_posicao)[:-1]])
+    # Posição sem histórico (ex.: técnicos) sorteia do conjunto todo
+    inicio_posicao = np.where(vazia, 0, inicio_posicao)
+    tamanho_posicao = np.where(vazia, len(pontos), n_posicao)
+
+    # Quanto cada posição pontua contra cada clube, relativo à média da posição
+    adversario = h['adversario'][rodada, clube]
+    contra = adversario >= 0
+    n_clubes = len(h['clube_ids'])
+    cedidos = np.zeros((7, n_clubes))
+    cedidos_linhas = np.zeros((7, n_clubes))
+    np.add.at(cedidos, (posicao[contra], adversario[contra]), pontos[contra])
+    np.add.at(cedidos_linhas, (posicao[contra], adversario[contra]), 1)
+    k = SIMULACAO_SUAVIZACAO_ADVERSARIO
+    ajuste = (cedidos + k * media_posicao[:, None]) / (cedidos_linhas + k) - media_posicao[:, None]
+
+    return {
+        'temporada': h['temporada'],
+        'rodada_atual': snapshot.rodada_atual,
+        'indice_atleta': {int(a): i for i, a in enumerate(h['atleta_ids'])},
+        'indice_clube': {int(c): i for i, c in enumerate(h['clube_ids'])},
+        'confrontos': snapshot.confrontos(),
+        'n_atleta': n_atleta,
+        'soma_atleta': soma_atleta,
+        'soma2_atleta': soma2_atleta,
+        'inicio_atleta': np.concatenate([[0], np.cumsum(n_atleta)[:-1]]),
+        'pontos_atleta': pontos[np.argsort(atleta, kind='stable')],
+        'media_posicao': media_posicao,
+        'var_posicao': np.maximum(var_posicao, 0.0),
+        'inicio_posicao': inicio_posicao,
+        'tamanho_posicao': tamanho_posicao,
+        'pontos_posicao': pontos[np.argsort(posicao, kind='stable')],
+        'ajuste_adversario': ajuste,
+    }
+
+
+def parametros_atletas(modelo: Dict[str, Any], atletas: Sequence[tuple]) -> Dict[str, np.ndarray]:
+    """Média, desvio e ponteiros do bootstrap de cada (atleta_id, posicao_id, clube_id)"""
+    m = modelo
+    idx = np.array([m['indice_atleta'].get(a, -1) for a, _, _ in atletas], dtype=np.int64)
+    posicao = np.array([p for _, p, _ in atletas], dtype=np.int64)
+    tem = idx >= 0
+    seguro = np.where(tem, idx, 0)
+    n = np.where(tem, m['n_atleta'][seguro], 0).astype(np.float64)
+    soma = np.where(tem, m['soma_atleta'][seguro], 0.0)
+    soma2 = np.where(tem, m['soma2_atleta'][seguro], 0.0)
+    media_propria = soma / np.maximum(n, 1)
+    var_propria = np.maximum(soma2 / np.maximum(n, 1) - media_propria ** 2, 0.0)
+
+    adversarios = []
+    for _, p, clube_id in atletas:
+        i = m['indice_clube'].get(m['confrontos'].get(clube_id))
+        adversarios.append(m['ajuste_adversario'][p, i] if i is not None else 0.0)
+
+    k = SIMULACAO_SUAVIZACAO
+    media_pos, var_pos = m['media_posicao'][posicao], m['var_posicao'][posicao]
+    return {
+        'media': (soma + k * media_pos) / (n + k) + np.array(adversarios),
+        'desvio': np.sqrt((n * var_propria + k * var_pos) / (n + k)),
+        'peso_proprio': n / (n + k),
+        'n': n.astype(np.int64),
+        'media_propria': media_propria,
+        'inicio': np.where(tem, m['inicio_atleta'][seguro], 0),
+        'posicao': posicao,
+        'clube': np.unique([c for _, _, c in atletas], return_inverse=True)[1].reshape(-1),
+    }
+
+
+def simular(modelo: Dict[str, Any], parametros: Dict[str, np.ndarray], amostras: int,
+            rng: np.random.Generator) -> np.ndarray:
+    """Matriz amostras x atletas (float32) de pontuações sorteadas na rodada"""
+    m, p = modelo, parametros
+    n_atletas = len(p['media'])
+    sorteio = rng.random((amostras, n_atletas), dtype=np.float32)
+    usa_proprio = rng.random((amostras, n_atletas), dtype=np.float32) < p['peso_proprio']
+
+    # O mesmo sorteio serve aos dois bootstraps: para cada célula só um deles é usado
+    proprio = m['pontos_atleta'][p['inicio'] + (sorteio * np.maximum(p['n'], 1)).astype(np.int64)
+                                 % np.maximum(p['n'], 1)] - p['media_propria']
+    tamanho = m['tamanho_posicao'][p['posicao']]
+    da_posicao = (m['pontos_posicao'][m['inicio_posicao'][p['posicao']] + (sorteio * tamanho).astype(np.int64) % tamanho]
+                  - m['media_posicao'][p['posicao']])
+    residuo = np.where(usa_proprio, proprio, da_posicao)
+
+    choque_clube = rng.standard_normal((amostras, int(p['clube'].max(initial=-1)) + 1), dtype=np.float32)
+    rho = SIMULACAO_CORRELACAO_CLUBE
+    return (p['media'] + np.sqrt(1 - rho) * residuo
+            + np.sqrt(rho) * p['desvio'] * choque_clube[:, p['clube']]).astype(np.float32)
+
+
+def _resumo_distribuicao(totais: np.ndarray) -> Dict[str, float]:
+    percentis = np.percentile(totais, _PERCENTIS_RESUMO)
+    return {
+        'media': round(float(totais.mean()), 2),
+        'desvio': round(float(totais.std()), 2),
+        **{f'p{q}': round(float(v), 2) for q, v in zip(_PERCENTIS_RESUMO, percentis)},
+    }
+
+
+def _titulares_ids(escalacao: Dict[str, Any]) -> List[int]:
+    return sorted(j['atleta_id'] for jogadores in escalacao['titulares'].values() for j in jogadores)
+
+
+def escalacao_por_risco(modelo: Dict[str, Any], rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]],
+                        patrimonio: float, modo: str = 'esperado', nivel: int = 1,
+                        formacao: str = '4-3-3', posicao_capitao: str = 'atacantes',
+                        posicao_reserva_luxo: Optional[str] = None, excluir_ids: Sequence[int] = (),
+                        fixos_ids: Sequence[int] = (), amostras: int = SIMULACAO_AMOSTRAS) -> Optional[Dict[str, Any]]:
+    """Escalação escolhida pela média ou por um percentil da pontuação simulada.
+
+    Mesmos argumentos e formato de retorno de otimizar_escalacao (pontuacao_total dos
+    atletas continua a do ranking), mais 'risco' com a distribuição da escalação
+    escolhida e a da escalação de maior média. None se nenhuma escalação couber.
+    """
+    if modo not in MODOS_RISCO:
+        raise ValueError(f"modo de risco inválido. Use: {', '.join(MODOS_RISCO)}")
+    inicio = time.perf_counter()
+    percentil = percentil_risco(modo, nivel)
+
+    atletas, chaves = [], {}
+    for posicao, jogadores in rankings_por_posicao.items():
+        posicao_id = POSICAO_IDS.get(posicao)
+        if posicao_id is None:
+            continue
+        for jogador in jogadores:
+            chave = (jogador.get('atleta_id'), posicao)
+            if chave not in chaves:
+                chaves[chave] = len(atletas)
+                atletas.append((jogador.get('atleta_id'), posicao_id, int(jogador.get('clube_id') or 0)))
+    if not atletas:
+        return None
+    parametros = parametros_atletas(modelo, atletas)
+
+    argumentos = dict(formacao=formacao, posicao_capitao=posicao_capitao, posicao_reserva_luxo=posicao_reserva_luxo,
+                      excluir_ids=excluir_ids, fixos_ids=fixos_ids)
+    # Candidatas: a do ranking original e uma por λ; repetidas são descartadas
+    candidatas, vistas = [], set()
+    for lam in (None,) + LAMBDAS_RISCO:
+        if lam is None:
+            rankings = rankings_por_posicao
+        else:
+            utilidade = parametros['media'] + lam * parametros['desvio']
+            rankings = {
+                posicao: [{**j, 'pontuacao_total': float(utilidade[chaves[(j.get('atleta_id'), posicao)]])}
+                          for j in jogadores]
+                for posicao, jogadores in rankings_por_posicao.items() if POSICAO_IDS.get(posicao)
+            }
+        escalacao = otimizar_escalacao(rankings, patrimonio, **argumentos)
+        if escalacao is None:
+            continue
+        ids = tuple(_titulares_ids(escalacao))
+        if ids not in vistas:
+            vistas.add(ids)
+            candidatas.append((lam, escalacao))
+    if not candidatas:
+        return None
+
+    # Colunas da simulação: só os titulares de alguma candidata
+    colunas: Dict[int, int] = {}
+    indices = []
+    for _, escalacao in candidatas:
+        linha = []
+        for plural, jogadores in escalacao['titulares'].items():
+            posicao = PLURAL_PARA_SINGULAR[plural]
+            for j in jogadores:
+                linha.append(colunas.setdefault(chaves[(j['atleta_id'], posicao)], len(colunas)))
+        indices.append(linha)
+    selecionados = np.array(list(colunas), dtype=np.int64)
+    parametros_sim = {chave: valor[selecionados] for chave, valor in parametros.items()}
+    parametros_sim['clube'] = np.unique(parametros_sim['clube'], return_inverse=True)[1].reshape(-1)
+
+    rng = np.random.default_rng([int(modelo['temporada']), int(modelo['rodada_atual'])])
+    cenarios = simular(modelo, parametros_sim, amostras, rng)
+    totais = np.stack([cenarios[:, linha].sum(axis=1) for linha in indices], axis=1)
+
+    medias = totais.mean(axis=0)
+    criterio = medias if percentil is None else np.percentile(totais, percentil, axis=0)
+    escolhida = int(np.argmax(criterio))
+    lam, escalacao = candidatas[escolhida]
+
+    # Pontuação do ranking de volta nos atletas; média/desvio simulados ao lado
+    originais = {(jogador.get('atleta_id'), posicao): jogador
+                 for posicao, jogadores in rankings_por_posicao.items() for jogador in jogadores}
+    for grupo in ('titulares', 'reservas'):
+        for plural, jogadores in escalacao[grupo].items():
+            posicao = PLURAL_PARA_SINGULAR[plural]
+            for j in jogadores:
+                i = chaves[(j['atleta_id'], posicao)]
+                j['pontuacao_total'] = originais[(j['atleta_id'], posicao)].get('pontuacao_total')
+                j['media_simulada'] = round(float(parametros['media'][i]), 2)
+                j['desvio_simulado'] = round(float(parametros['desvio'][i]), 2)
+    escalacao['pontuacao_total'] = sum(get_pontuacao(j) for jogadores in escalacao['titulares'].values()
+                                       for j in jogadores)
+    escalacao['risco'] = {
+        'modo': modo,
+        'nivel': int(nivel),
+        'percentil': percentil,
+        'valor': round(float(criterio[escolhida]), 2),
+        'lambda': lam,
+        'amostras': amostras,
+        'candidatas': len(candidatas),
+        'distribuicao': _resumo_distribuicao(totais[:, escolhida]),
+        'distribuicao_esperado': _resumo_distribuicao(totais[:, int(np.argmax(medias))]),
+        'tempo_ms': round((time.perf_counter() - inicio) * 1000, 2),
+    }
+    return escalacao
+
+
+def obter_modelo(conn, rodada_atual: int, temporada: Optional[int] = None) -> Dict[str, Any]:
+    """Modelo da rodada, reaproveitado no processo por SIMULACAO_CACHE_TTL segundos"""
+    return _entrada_memo(conn, rodada_atual, temporada)[1]
+
+
+def _entrada_memo(conn, rodada_atual: int, temporada: Optional[int]) -> tuple:
+    temporada = get_temporada_atual() if temporada is None else temporada
+    chave = (temporada, rodada_atual)
+    with _memo_lock:
+        memo = _memo.get(chave)
+    if memo is not None and time.monotonic() - memo[0] < SIMULACAO_CACHE_TTL:
+        return memo
+
+    historico = backtest.obter_historico(conn, temporada)
+    modelo = montar_modelo(historico, obter_snapshot_rodada(conn, rodada_atual, temporada))
+    memo = (time.monotonic(), modelo, OrderedDict())
+    with _memo_lock:
+        # Só a rodada mais recente interessa; descarta as demais (e seus resultados)
+        _memo.clear()
+        _memo[chave] = memo
+    printdbg(f"Modelo de simulação da rodada {rodada_atual}: {len(historico['atleta_ids'])} atletas")
+    return memo
+
+
+def otimizar_escalacao_risco(conn, rodada_atual: int, rankings_por_posicao: Dict[str, Sequence[Dict[str, Any]]],
+                             patrimonio: float, modo: str = 'esperado', nivel: int = 1,
+                             formacao: str = '4-3-3', posicao_capitao: str = 'atacantes',
+                             posicao_reserva_luxo: Optional[str] = None, excluir_ids: Sequence[int] = (),
+                             fixos_ids: Sequence[int] = (), amostras: int = SIMULACAO_AMOSTRAS,
+                             temporada: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """escalacao_por_risco com o modelo da rodada em cache e resultado memorizado por entrada"""
+    _, modelo, resultados = _entrada_memo(conn, rodada_atual, temporada)
+    chave = (
+        modo, int(nivel), amostras, formacao if formacao in FORMACOES else '4-3-3', posicao_capitao,
+        posicao_reserva_luxo, round(float(patrimonio), 2), tuple(sorted(excluir_ids)), tuple(sorted(fixos_ids)),
+        tuple(
+            (posicao, j.get('atleta_id'), j.get('clube_id'), j.get('preco_num'), j.get('pontuacao_total'),
+             j.get('ignorado') is True)
+            for posicao, jogadores in sorted(rankings_por_posicao.items()) for j in jogadores
+        ),
+    )
+    with _memo_lock:
+        if chave in resultados:
+            resultados.move_to_end(chave)
+            escalacao = copy.deepcopy(resultados[chave])
+            if escalacao is not None:
+                escalacao['risco']['cache'] = True
+            return escalacao
+
+    escalacao = escalacao_por_risco(
+        modelo, rankings_por_posicao, patrimonio, modo=modo, nivel=nivel, formacao=formacao,
+        posicao_capitao=posicao_capitao, posicao_reserva_luxo=posicao_reserva_luxo,
+        excluir_ids=excluir_ids, fixos_ids=fixos_ids, amostras=amostras
+    )
+    if escalacao is not None:
+        escalacao['risco']['cache'] = False
+    with _memo_lock:
+        resultados[chave] = copy.deepcopy(escalacao)
+        while len(resultados) > SIMULACAO_RESULTADOS_MAX:
+            resultados.popitem(last=False)
+    return escalacao
+
+
+def invalidar_simulacao() -> None:
+    """Descarta o modelo e os resultados em memória deste processo."""
+    with _memo_lock:
+        _memo.clear()
@@ -1,30 +1,12 @@
-import requests
 import json
-from functools import lru_cache
 
-# Cache para armazenar os dados dos clubes
-_clubes_cache = None
-
-@lru_cache(maxsize=1)
 def get_clubes_data():
     """
     Busca dados dos clubes da API do Cartola
+    (cache compartilhado de 24 horas, ver api_cartola.fetch_clubes_data)
     """
-    global _clubes_cache
-    
-    if _clubes_cache is None:
-        try:
-            response = requests.get('https://api.cartola.globo.com/clubes', timeout=10)
-            if response.status_code == 200:
-                _clubes_cache = response.json()
-            else:
-                print(f"Erro ao buscar dados dos clubes: {response.status_code}")
-                _clubes_cache = {}
-        except Exception as e:
-            print(f"Erro ao conectar com API dos clubes: {e}")
-            _clubes_cache = {}
-    
-    return _clubes_cache
+    from api_cartola import fetch_clubes_data
+    return fetch_clubes_data() or {}
 
 def get_team_shield(clube_id, size='30x30'):
     """
@@ -66,6 +48,5 @@ def clear_cache():
     """
     Limpa o cache dos clubes (útil para testes)
     """
-    global _clubes_cache
-    _clubes_cache = None
-    get_clubes_data.cache_clear()
+    from utils import cache_cartola
+    cache_cartola.invalidar('clubes')
@@ -89,8 +89,9 @@ _TEMPORADA_CACHE_TIMESTAMP = None
 _CACHE_DURATION = 3600  # 1 hora
 
 def get_temporada_atual() -> int:
-    """Retorna a temporada atual buscando da API de status do Cartola.
-    Usa cache de 1 hora. Fallback para ano atual se a API falhar."""
+    """Retorna a temporada atual a partir do status do mercado do Cartola.
+    Usa cache de 1 hora no processo (e o cache compartilhado de fetch_status_data).
+    Fallback para ano atual se a API falhar."""
     import time
     from datetime import datetime
     
@@ -102,11 +103,10 @@ def get_temporada_atual() -> int:
             return _TEMPORADA_CACHE
     
     try:
-        import requests
-        response = requests.get('https://api.cartola.globo.com/mercado/status', timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if 'temporada' in data:
+        # Status do mercado via cache compartilhado entre workers (api_cartola)
+        from api_cartola import fetch_status_data
+        data = fetch_status_data()
+        if data and 'temporada' in data:
             _TEMPORADA_CACHE = int(data['temporada'])
             _TEMPORADA_CACHE_TIMESTAMP = current_time
             return _TEMPORADA_CACHE
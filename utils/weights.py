@@ -1,42 +1,204 @@
 from __future__ import annotations
 
 import json
-from typing import Dict, Any
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
 from database import get_db_connection, close_db_connection
+from utils.utilidades import printdbg
+
+# Tempo de vida do cache de pesos (segundos)
+WEIGHTS_CACHE_TTL_SECONDS = float(os.getenv('WEIGHTS_CACHE_TTL', '60'))
+# Arquivo marcador tocado a cada invalidação: os demais workers/processos da mesma
+# máquina comparam o mtime e recarregam sem esperar o TTL.
+WEIGHTS_CACHE_MARKER = os.getenv(
+    'WEIGHTS_CACHE_MARKER', os.path.join(tempfile.gettempdir(), 'aerocartola_pesos.version')
+)
+
+# Pesos padrão (FATOR_*) de cada posição: usados pelos calculo_posicoes/calculo_*.py,
+# pelas telas/APIs de módulos e pelo backtest/auto-ajuste quando o time não tem pesos salvos
+PESOS_PADRAO: Dict[str, Dict[str, float]] = {
+    'goleiro': {
+        'FATOR_MEDIA': 0.2, 'FATOR_FF': 4.5, 'FATOR_FD': 6.5, 'FATOR_SG': 1.5,
+        'FATOR_PESO_JOGO': 1.5, 'FATOR_GOL_ADVERSARIO': 2.0,
+    },
+    'lateral': {
+        'FATOR_MEDIA': 3.0, 'FATOR_DS': 8.0, 'FATOR_SG': 2.0, 'FATOR_ESCALACAO': 10.0,
+        'FATOR_FF': 2.0, 'FATOR_FS': 1.0, 'FATOR_FD': 2.0, 'FATOR_G': 4.0,
+        'FATOR_A': 4.0, 'FATOR_PESO_JOGO': 1.0,
+    },
+    'zagueiro': {
+        'FATOR_MEDIA': 1.5, 'FATOR_DS': 4.5, 'FATOR_SG': 4.0, 'FATOR_ESCALACAO': 5.0,
+        'FATOR_PESO_JOGO': 5.0,
+    },
+    'meia': {
+        'FATOR_MEDIA': 1.0, 'FATOR_DS': 3.6, 'FATOR_FF': 0.7, 'FATOR_FS': 0.8,
+        'FATOR_FD': 0.9, 'FATOR_G': 2.5, 'FATOR_A': 2.0, 'FATOR_ESCALACAO': 10.0,
+        'FATOR_PESO_JOGO': 9.5,
+    },
+    'atacante': {
+        'FATOR_MEDIA': 2.5, 'FATOR_DS': 2.0, 'FATOR_FF': 1.2, 'FATOR_FS': 1.3,
+        'FATOR_FD': 1.3, 'FATOR_G': 2.5, 'FATOR_A': 2.5, 'FATOR_ESCALACAO': 10.0,
+        'FATOR_PESO_JOGO': 10.0,
+    },
+    'treinador': {
+        'FATOR_PESO_JOGO': 1.0,
+    },
+}
+
+_cache_lock = threading.Lock()
+_cache: Dict[str, Any] = {
+    'carregado_em': None,
+    'marcador': None,
+    'globais': {},
+    'por_time': {},
+}
+
+
+def _parse_weights(weights_data) -> Dict[str, Any]:
+    # Se já for dict (JSONB), retorna direto; se for string, faz parse
+    if isinstance(weights_data, dict):
+        return weights_data
+    try:
+        return json.loads(weights_data) if isinstance(weights_data, str) else {}
+    except Exception:
+        return {}
+
+
+def _carregar_todos() -> Optional[Tuple[Dict[str, Dict[str, Any]], Dict[Tuple[int, int, str], Dict[str, Any]]]]:
+    """Lê toda a tabela acw_posicao_weights numa única query.
+
+    Retorna (globais, por_time): globais[posicao] é o primeiro registro da posição
+    (equivalente ao antigo `LIMIT 1`) e por_time[(user_id, team_id, posicao)] os pesos do time
+    (None quando weights_json é nulo). Retorna None se a leitura falhar.
+    """
+    globais: Dict[str, Dict[str, Any]] = {}
+    por_time: Dict[Tuple[int, int, str], Dict[str, Any]] = {}
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT user_id, team_id, posicao, weights_json
+            FROM acw_posicao_weights
+            ORDER BY id
+        ''')
+        for user_id, team_id, posicao, weights_data in cur.fetchall():
+            weights = _parse_weights(weights_data) if weights_data is not None else None
+            por_time[(user_id, team_id, posicao)] = weights
+            globais.setdefault(posicao, weights)
+    except Exception as e:
+        # Se houver erro (tabela não existe, etc.), não guarda nada no cache
+        conn.rollback()
+        printdbg(f"Erro ao carregar pesos: {e}")
+        return None
+    finally:
+        close_db_connection(conn)
+    return globais, por_time
+
+
+def _ler_marcador():
+    try:
+        return os.stat(WEIGHTS_CACHE_MARKER).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _cache_valido(marcador) -> bool:
+    carregado_em = _cache['carregado_em']
+    return (carregado_em is not None
+            and time.monotonic() - carregado_em < WEIGHTS_CACHE_TTL_SECONDS
+            and _cache['marcador'] == marcador)
+
+
+def _get_cache() -> Dict[str, Any]:
+    marcador = _ler_marcador()
+    if _cache_valido(marcador):
+        return _cache
+    with _cache_lock:
+        if not _cache_valido(marcador):
+            carregado = _carregar_todos()
+            if carregado is None:
+                # Falha de leitura: mantém o último conteúdo (ou vazio) sem marcá-lo como válido
+                return _cache
+            globais, por_time = carregado
+            _cache['globais'] = globais
+            _cache['por_time'] = por_time
+            _cache['marcador'] = marcador
+            _cache['carregado_em'] = time.monotonic()
+    return _cache
+
+
+def invalidar_pesos() -> None:
+    """Descarta o cache de pesos; a próxima leitura recarrega a tabela.
+
+    Deve ser chamada sempre que acw_posicao_weights for alterada. Também toca o
+    arquivo marcador para que os outros processos da máquina recarreguem.
+    """
+    with _cache_lock:
+        _cache['carregado_em'] = None
+    try:
+        with open(WEIGHTS_CACHE_MARKER, 'a'):
+            os.utime(WEIGHTS_CACHE_MARKER, None)
+    except OSError:
+        pass
 
 
 def load_weights_from_db(posicao: str, user_id: int = None, team_id: int = None) -> Dict[str, Any]:
     """Carrega o JSON de weights da tabela acw_posicao_weights para a posicao fornecida.
     Retorna dicionário vazio se não houver registro.
     Se user_id e team_id forem fornecidos, busca os pesos específicos do time.
+    Os dados vêm do cache em memória (ver invalidar_pesos).
     """
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        if user_id and team_id:
-            cur.execute('''
-                SELECT weights_json FROM acw_posicao_weights 
-                WHERE posicao = %s AND user_id = %s AND team_id = %s
-            ''', (posicao, user_id, team_id))
-        else:
-            cur.execute('SELECT weights_json FROM acw_posicao_weights WHERE posicao = %s LIMIT 1', (posicao,))
-        row = cur.fetchone()
-        close_db_connection(conn)
-        if not row or not row[0]:
-            return {}
-        weights_data = row[0]
-        # Se já for dict (JSONB), retorna direto; se for string, faz parse
-        if isinstance(weights_data, dict):
-            return weights_data
-        try:
-            return json.loads(weights_data) if isinstance(weights_data, str) else {}
-        except Exception:
-            return {}
-    except Exception:
-        # Se houver erro (tabela não existe, etc.), retorna dicionário vazio
-        return {}
+    cache = _get_cache()
+    if user_id and team_id:
+        weights = cache['por_time'].get((user_id, team_id, posicao))
+    else:
+        weights = cache['globais'].get(posicao)
+    return dict(weights) if weights else {}
+
+
+def tem_pesos_time(posicao: str, user_id: int, team_id: int) -> bool:
+    """True se o time tem pesos salvos (weights_json não nulo) para a posição"""
+    return _get_cache()['por_time'].get((user_id, team_id, posicao)) is not None
 
 
 def get_weight(posicao: str, key: str, default=None):
-    weights = load_weights_from_db(posicao)
+    weights = _get_cache()['globais'].get(posicao) or {}
     return weights.get(key, default)
+
+
+def pesos_padrao(posicao: str) -> Dict[str, float]:
+    """Cópia dos pesos padrão da posição (KeyError se a posição não existe)"""
+    return dict(PESOS_PADRAO[posicao])
+
+
+def pesos_time(posicao: str, user_id: int = None, team_id: int = None) -> Dict[str, float]:
+    """Pesos padrão da posição sobrepostos pelos salvos do time (só chaves conhecidas)"""
+    pesos = pesos_padrao(posicao)
+    salvos = load_weights_from_db(posicao, user_id, team_id) if user_id and team_id else {}
+    for key, default in pesos.items():
+        pesos[key] = float(salvos.get(key, default))
+    return pesos
+
+
+def salvar_pesos_time(conn, user_id: int, team_id: int, posicao: str, pesos: Dict[str, Any]) -> None:
+    """Grava (upsert) os pesos do time para a posição e invalida o cache de pesos"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            INSERT INTO acw_posicao_weights (user_id, team_id, posicao, weights_json, updated_at)
+            VALUES (%s, %s, %s, %s::jsonb, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id, team_id, posicao)
+            DO UPDATE SET
+                weights_json = EXCLUDED.weights_json,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (user_id, team_id, posicao, json.dumps(pesos, ensure_ascii=False)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    invalidar_pesos()
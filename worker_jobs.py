@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker da fila de jobs (models/jobs.py)
+
+Roda fora do gunicorn (serviço jobs-worker do docker-compose) e executa o trabalho
+pesado que antes ficava dentro das requisições:
+
+- recalcular_modulo: atualiza scouts agregados e matriz de cedidos da rodada e
+  deixa pronto o payload compartilhado de /api/modulos/<modulo>/dados;
+- escalacao_ideal: calcula a escalação ideal de um time (sem enviar ao Cartola);
+- escalar_time: calcula e envia a escalação de um time ao Cartola;
+- escalar_lote: escala os times de um lote (Escalar Todos os Times, utils/escalacao_lote.py);
+- ajustar_pesos: busca os melhores pesos de uma posição pelo backtest (utils/ajuste_pesos.py)
+  e, se pedido, grava a proposta nos pesos do time.
+
+JOBS_WORKER_THREADS threads pegam jobs da fila com SKIP LOCKED; a thread principal
+fica em LISTEN no canal da fila e acorda as threads a cada job novo (e, no máximo,
+a cada JOBS_POLL_SEGUNDOS mesmo sem aviso). Um heartbeat periódico mantém os jobs
+em execução como vivos; jobs de workers que morreram voltam para a fila.
+
+Uso: python worker_jobs.py
+"""
+
+import os
+import select
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from dotenv import load_dotenv
+
+# Adicionar diretório ao path
+sys.path.insert(0, os.path.dirname(__file__))
+load_dotenv()
+
+import psycopg2
+
+from database import get_db_connection, close_db_connection, POSTGRES_CONFIG
+from models.jobs import (
+    create_jobs_table, claim_next_job, heartbeat_job, finish_job, fail_job,
+    requeue_stale_jobs, JOBS_CANAL, JOBS_TIMEOUT
+)
+
+JOBS_WORKER_THREADS = int(os.getenv('JOBS_WORKER_THREADS', '2'))
+# Intervalo máximo entre consultas à fila quando nenhum NOTIFY chega (segundos)
+JOBS_POLL_SEGUNDOS = float(os.getenv('JOBS_POLL_SEGUNDOS', '5'))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_acordar = threading.Event()
+_parar = threading.Event()
+_em_execucao = set()
+_em_execucao_lock = threading.Lock()
+
+
+def job_recalcular_modulo(conn, job):
+    """Atualiza agregados/cedidos até a rodada anterior e monta o payload compartilhado do módulo"""
+    from utils.recalculo import atualizar_bases, preparar_payload_modulo
+    from utils.utilidades import get_temporada_atual
+
+    parametros = job['parametros']
+    rodada_atual = int(parametros['rodada_atual'])
+
+    inicio = time.perf_counter()
+    rodadas_aplicadas = atualizar_bases(conn, get_temporada_atual(), rodada_atual)
+    preparar_payload_modulo(conn, int(parametros['posicao_id']), rodada_atual,
+                            parametros['perfil_peso_jogo'], parametros['perfil_peso_sg'])
+
+    return {
+        'modulo': parametros.get('modulo'),
+        'rodada_atual': rodada_atual,
+        'rodadas_agregadas': rodadas_aplicadas,
+        'tempo_ms': round((time.perf_counter() - inicio) * 1000, 2)
+    }
+
+
+def job_escalacao_ideal(conn, job):
+    """Calcula a escalação ideal do time com os rankings salvos (não envia ao Cartola)"""
+    from utils.escalacao_lote import calcular_escalacao_servidor
+
+    calculo = calcular_escalacao_servidor(conn, job['user_id'], job['team_id'])
+    return {
+        'rodada_atual': calculo['rodada_atual'],
+        'escalacao': calculo['escalacao']
+    }
+
+
+def job_escalar_time(conn, job):
+    """Calcula e envia a escalação do time ao Cartola"""
+    from utils.escalacao_lote import escalar_time_servidor
+    return escalar_time_servidor(conn, job['user_id'], job['team_id'])
+
+
+def job_ajustar_pesos(conn, job):
+    """Procura os melhores pesos do módulo no backtest e, com salvar, grava a proposta se melhorar
+    (nas rodadas da busca e nas de validação)"""
+    from models.user_configurations import get_user_default_configuration
+    from utils import backtest
+    from utils.ajuste_pesos import ajustar_pesos, proposta_melhora
+    from utils.utilidades import get_temporada_atual
+    from utils.weights import pesos_time, salvar_pesos_time
+
+    parametros = job['parametros']
+    modulo = parametros['modulo']
+    config = get_user_default_configuration(conn, job['user_id'], job['team_id'])
+    if not config:
+        raise ValueError('Configuração não encontrada para este time')
+
+    historico = backtest.obter_historico(conn, get_temporada_atual(),
+                                         config['perfil_peso_jogo'], config['perfil_peso_sg'])
+    resultado = ajustar_pesos(
+        historico, modulo, pesos_time(modulo, job['user_id'], job['team_id']),
+        estrategia=parametros['estrategia'], objetivo=parametros['objetivo'],
+        avaliacoes=int(parametros['avaliacoes']), top_k=int(parametros['top_k']),
+        pontos_grade=int(parametros.get('pontos_grade', 3))
+    )
+    resultado['salvo'] = bool(parametros.get('salvar')) and proposta_melhora(resultado)
+    if resultado['salvo']:
+        salvar_pesos_time(conn, job['user_id'], job['team_id'], modulo, resultado['melhores'][0]['pesos'])
+    return resultado
+
+
+def job_escalar_lote(conn, job):
+    """Escala os times do lote criado por /api/escalacao-ideal/escalar-lote"""
+    from utils.escalacao_lote import processar_lote
+    parametros = job['parametros']
+    return processar_lote(conn, parametros['lote_id'], job['user_id'], parametros.get('max_repetidos'))
+
+
+HANDLERS = {
+    'recalcular_modulo': job_recalcular_modulo,
+    'escalacao_ideal': job_escalacao_ideal,
+    'escalar_time': job_escalar_time,
+    'escalar_lote': job_escalar_lote,
+    'ajustar_pesos': job_ajustar_pesos,
+}
+
+
+def executar_job(conn, job):
+    """Executa um job e grava o resultado; ValueError é falha definitiva (sem nova tentativa)"""
+    handler = HANDLERS.get(job['tipo'])
+    if handler is None:
+        fail_job(conn, job['id'], f"Tipo de job desconhecido: {job['tipo']}", repetir=False)
+        return
+
+    print(f"[JOBS] {WORKER_ID} executando job {job['id']} ({job['tipo']}, usuário {job['user_id']}, "
+          f"tentativa {job['tentativas']})")
+    try:
+        resultado = handler(conn, job)
+        finish_job(conn, job['id'], resultado)
+        print(f"[JOBS] Job {job['id']} concluído")
+    except ValueError as e:
+        conn.rollback()
+        fail_job(conn, job['id'], str(e), repetir=False)
+        print(f"[JOBS] Job {job['id']} falhou: {e}")
+    except Exception as e:
+        conn.rollback()
+        print(f"[ERRO] Job {job['id']} falhou: {e}")
+        traceback.print_exc()
+        fail_job(conn, job['id'], f'Erro interno: {e}')
+
+
+def _loop_execucao():
+    """Pega e executa jobs até a fila esvaziar; depois espera um NOTIFY ou o intervalo de polling"""
+    while not _parar.is_set():
+        conn = get_db_connection()
+        if conn is None:
+            _parar.wait(JOBS_POLL_SEGUNDOS)
+            continue
+        try:
+            while not _parar.is_set():
+                job = claim_next_job(conn, WORKER_ID)
+                if job is None:
+                    break
+                with _em_execucao_lock:
+                    _em_execucao.add(job['id'])
+                try:
+                    executar_job(conn, job)
+                finally:
+                    with _em_execucao_lock:
+                        _em_execucao.discard(job['id'])
+        except Exception as e:
+            print(f"[ERRO] Loop de jobs: {e}")
+            traceback.print_exc()
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        finally:
+            close_db_connection(conn)
+        _acordar.wait(JOBS_POLL_SEGUNDOS)
+        _acordar.clear()
+
+
+def _loop_heartbeat():
+    """Renova o heartbeat dos jobs em execução e devolve à fila os abandonados por outros workers"""
+    intervalo = max(JOBS_TIMEOUT / 3, 1)
+    while not _parar.wait(intervalo):
+        conn = get_db_connection()
+        if conn is None:
+            continue
+        try:
+            with _em_execucao_lock:
+                ids = list(_em_execucao)
+            for job_id in ids:
+                heartbeat_job(conn, job_id)
+            recolocados = requeue_stale_jobs(conn)
+            if recolocados:
+                print(f"[JOBS] {recolocados} job(s) abandonado(s) devolvido(s) à fila")
+                _acordar.set()
+        except Exception as e:
+            print(f"[ERRO] Heartbeat de jobs: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        finally:
+            close_db_connection(conn)
+
+
+def _escutar_fila():
+    """LISTEN no canal da fila (conexão própria, fora do pool); acorda as threads a cada NOTIFY"""
+    while not _parar.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(**POSTGRES_CONFIG)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f'LISTEN {JOBS_CANAL}')
+            print(f"[JOBS] {WORKER_ID} escutando o canal {JOBS_CANAL}")
+            _acordar.set()
+            while not _parar.is_set():
+                if select.select([conn], [], [], JOBS_POLL_SEGUNDOS) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    _acordar.set()
+        except psycopg2.Error as e:
+            print(f"[ERRO] Conexão LISTEN perdida: {e}. Reconectando...")
+            _parar.wait(JOBS_POLL_SEGUNDOS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def main():
+    conn = get_db_connection()
+    try:
+        create_jobs_table(conn)
+    finally:
+        close_db_connection(conn)
+
+    threads = [threading.Thread(target=_loop_heartbeat, name='jobs-heartbeat', daemon=True)]
+    threads += [
+        threading.Thread(target=_loop_execucao, name=f'jobs-{i}', daemon=True)
+        for i in range(max(JOBS_WORKER_THREADS, 1))
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"[JOBS] Worker {WORKER_ID} iniciado com {JOBS_WORKER_THREADS} thread(s)")
+
+    try:
+        _escutar_fila()
+    except KeyboardInterrupt:
+        print("\n[JOBS] Encerrando worker...")
+    finally:
+        _parar.set()
+        _acordar.set()
+
+
+if __name__ == '__main__':
+    main()